@@ -0,0 +1,132 @@
+"""Compara los motores de almacenamiento SQLite y en memoria con los mismos datos.
+
+Carga en ambos los mismos usuarios y eventos, mide las operaciones de Sistema
+que pasan por Almacenamiento (páginas por cada orden y filtro, recorrido por
+páginas, eventos por id, inicio de sesión, favoritos, asistencia y
+recomendaciones) con la caché de
+exploración desactivada, y falla (AssertionError) si los motores devuelven
+eventos distintos para la misma consulta.
+
+Uso: python -m benchmarks.bench_almacenamiento [n_eventos] [repeticiones]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from models.fechas import fin_de_semana
+from models.sesion import Sesion
+from models.sistema import Sistema
+from benchmarks.datos import poblar
+
+N_USUARIOS = 1000
+PAGINAS_RECORRIDO = 50
+
+
+def cargar(n_eventos: int, directorio: str) -> dict:
+    sqlite = Sistema(os.path.join(directorio, 'bench.db'))
+    inicio = time.perf_counter()
+    with sqlite.pool.conexion() as conn:
+        poblar(conn, n_eventos, n_usuarios=N_USUARIOS)
+        conn.execute('ANALYZE')
+        usuarios = conn.execute('SELECT nombre, email, password_hash FROM usuarios ORDER BY id').fetchall()
+        filas = conn.execute('SELECT nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id, '
+                             'latitud, longitud, hora FROM eventos ORDER BY id').fetchall()
+        preferencias = conn.execute('SELECT usuario_id, categoria FROM usuario_categorias').fetchall()
+    print(f'carga SQLite (poblar): {time.perf_counter() - inicio:.1f} s')
+
+    memoria = Sistema(motor='memoria')
+    inicio = time.perf_counter()
+    for usuario in usuarios:
+        memoria.almacen.crear_usuario(*usuario)
+    memoria.almacen.insertar_eventos(filas)
+    for preferencia in preferencias:
+        memoria.almacen.agregar_categoria(*preferencia)
+    print(f'carga en memoria (insertar_eventos): {time.perf_counter() - inicio:.1f} s')
+    return {'sqlite': sqlite, 'memoria': memoria}
+
+
+def recorrer(sistema: Sistema) -> list:
+    eventos, pagina = [], sistema.explorar_eventos_pagina()
+    for _ in range(PAGINAS_RECORRIDO):
+        eventos.extend(pagina)
+        pagina = sistema.explorar_eventos_pagina(despues=Sistema.clave_pagina(pagina[-1]))
+    return eventos
+
+
+def operaciones(n_eventos: int) -> dict:
+    """nombre -> función(sistema, rnd); las lecturas devuelven una lista de eventos"""
+    hoy = date.today()
+    finde = fin_de_semana()
+    return {
+        'página por fecha': lambda s, rnd: s.explorar_eventos_pagina(),
+        'página por nombre': lambda s, rnd: s.explorar_eventos_pagina(orden='nombre'),
+        'página por categoría': lambda s, rnd: s.explorar_eventos_pagina(orden='categoria'),
+        'categoría, próximos 30 días': lambda s, rnd: s.explorar_eventos_pagina(
+            categoria='Cine', desde=hoy, hasta=hoy + timedelta(days=29)),
+        '3 categorías, fin de semana': lambda s, rnd: s.explorar_eventos_pagina(
+            categoria=['Cine', 'Teatro', 'Concierto'], desde=finde[0], hasta=finde[1]),
+        'ubicación (LIKE)': lambda s, rnd: s.explorar_eventos_pagina(ubicacion='Cartagena', orden='nombre'),
+        'página anterior por categoría': lambda s, rnd: s.explorar_eventos_pagina(
+            orden='categoria', antes=Sistema.clave_pagina(s.obtener_evento_por_id(n_eventos // 2), 'categoria')),
+        f'recorrido de {PAGINAS_RECORRIDO} páginas': lambda s, rnd: recorrer(s),
+        'listado completo de un día': lambda s, rnd: s.explorar_eventos(fecha=hoy.isoformat(), orden='nombre'),
+        'evento por id': lambda s, rnd: [s.obtener_evento_por_id(rnd.randint(1, n_eventos))],
+        # Los usuarios de poblar no tienen contraseña válida: se mide la búsqueda por email
+        'inicio de sesión': lambda s, rnd: s.iniciar_sesion(
+            f'usuario{rnd.randrange(N_USUARIOS)}@example.com', 'x', Sesion()),
+        'agregar favorito': lambda s, rnd: s.agregar_favorito(rnd.randint(1, n_eventos)),
+        'confirmar asistencia': lambda s, rnd: s.confirmar_asistencia(rnd.randint(1, n_eventos)),
+        'cancelar asistencia': lambda s, rnd: s.cancelar_asistencia(rnd.randint(1, n_eventos)),
+        # Tras los favoritos agregados arriba; la primera llamada construye el índice
+        'recomendaciones': lambda s, rnd: s.obtener_recomendaciones(k=20),
+    }
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    with tempfile.TemporaryDirectory() as directorio:
+        motores = cargar(n_eventos, directorio)
+        for sistema in motores.values():
+            sistema.cache_eventos.capacidad = 0  # se miden los motores, no la caché
+            sistema.usuario_actual = sistema.almacen.usuario_por_email('usuario1@example.com')
+
+        filas = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for nombre, operacion in operaciones(n_eventos).items():
+                # Misma secuencia aleatoria en ambos motores: los resultados deben coincidir
+                resultados, tiempos = {}, {}
+                for motor, sistema in motores.items():
+                    rnd = random.Random(7)
+                    leidos = operacion(sistema, rnd)
+                    resultados[motor] = [evento.id for evento in leidos] if isinstance(leidos, list) else leidos
+                    inicio = time.perf_counter()
+                    for _ in range(repeticiones):
+                        operacion(sistema, rnd)
+                    tiempos[motor] = (time.perf_counter() - inicio) / repeticiones * 1000
+                assert resultados['sqlite'] == resultados['memoria'], f'{nombre}: los motores difieren'
+                filas.append((nombre, tiempos['sqlite'], tiempos['memoria']))
+
+        for sistema in motores.values():
+            favoritos = sorted(evento.id for evento in sistema.obtener_favoritos())
+            assert favoritos == sorted(sistema.usuario_actual.favoritos), 'favoritos distintos de la sesión'
+        assert (sorted(e.id for e in motores['sqlite'].obtener_favoritos())
+                == sorted(e.id for e in motores['memoria'].obtener_favoritos())), 'favoritos distintos'
+        for sistema in motores.values():
+            sistema.cerrar()
+
+    print(f'\n{"operación":<30}{"sqlite (ms)":>14}{"memoria (ms)":>14}{"relación":>10}')
+    for nombre, sqlite, memoria in filas:
+        print(f'{nombre:<30}{sqlite:>14.3f}{memoria:>14.3f}{sqlite / memoria:>9.1f}x')
+
+    print('OK: ambos motores devuelven los mismos eventos')
+
+
+if __name__ == '__main__':
+    main()
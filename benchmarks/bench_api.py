@@ -0,0 +1,122 @@
+"""Prueba de carga local del servicio HTTP (interfaces/api.py).
+
+Levanta el servicio en un subproceso sobre una base de datos sintética y lo
+ataca con clientes asyncio con keep-alive; cada cliente envía `profundidad`
+peticiones encadenadas (pipelining) antes de leer las respuestas.
+
+Uso: python -m benchmarks.bench_api [clientes] [segundos] [profundidad]
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from models import claves
+from models.sistema import Sistema
+from benchmarks.datos import CATEGORIAS, poblar
+
+N_EVENTOS = 50_000
+N_USUARIOS = 200
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def peticion(metodo: str, ruta: str, token: str = '', cuerpo: dict = None) -> bytes:
+    datos = json.dumps(cuerpo).encode() if cuerpo is not None else b''
+    cabeceras = f'{metodo} {ruta} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(datos)}\r\n'
+    if token:
+        cabeceras += f'Authorization: Bearer {token}\r\n'
+    return (cabeceras + '\r\n').encode() + datos
+
+
+async def leer_respuesta(reader: asyncio.StreamReader) -> tuple:
+    encabezado = await reader.readuntil(b'\r\n\r\n')
+    lineas = encabezado.decode('latin-1').split('\r\n')
+    estado = int(lineas[0].split()[1])
+    longitud = next(int(l.split(':')[1]) for l in lineas if l.lower().startswith('content-length'))
+    return estado, await reader.readexactly(longitud)
+
+
+async def cliente(numero: int, puerto: int, fin: float, profundidad: int, latencias: list, errores: list):
+    rnd = random.Random(numero)
+    reader, writer = await asyncio.open_connection('127.0.0.1', puerto)
+    writer.write(peticion('POST', '/sesiones', cuerpo={
+        'email': f'usuario{numero % N_USUARIOS}@example.com', 'password': 'clave123'}))
+    _, datos = await leer_respuesta(reader)
+    token = json.loads(datos)['token']
+
+    while time.perf_counter() < fin:
+        lote = []
+        for _ in range(profundidad):
+            eleccion = rnd.random()
+            if eleccion < 0.6:
+                lote.append(peticion('GET', f'/eventos?categoria={rnd.choice(CATEGORIAS)}&tamano=20'))
+            elif eleccion < 0.8:
+                lote.append(peticion('GET', '/recomendaciones', token))
+            elif eleccion < 0.95:
+                lote.append(peticion('POST', '/favoritos', token, {'evento_id': rnd.randint(1, N_EVENTOS)}))
+            else:
+                lote.append(peticion('GET', f'/eventos?q=evento+{rnd.randint(1, N_EVENTOS)}'))
+
+        inicio = time.perf_counter()
+        writer.write(b''.join(lote))
+        await writer.drain()
+        for _ in lote:
+            estado, _ = await leer_respuesta(reader)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if estado >= 500:
+                errores.append(estado)
+    writer.close()
+
+
+async def atacar(puerto: int, clientes: int, segundos: float, profundidad: int):
+    latencias, errores = [], []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(i, puerto, inicio + segundos, profundidad, latencias, errores)
+                           for i in range(clientes)))
+    total = time.perf_counter() - inicio
+    return latencias, errores, total
+
+
+def main():
+    clientes = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    segundos = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    profundidad = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'bench.db')
+        sistema = Sistema(ruta)
+        with sistema.pool.conexion() as conn:
+            poblar(conn, N_EVENTOS, n_usuarios=N_USUARIOS)
+            conn.execute('UPDATE usuarios SET password_hash = ?', (claves.hashear('clave123'),))
+            conn.commit()
+        sistema.cerrar()
+
+        puerto = puerto_libre()
+        servidor = subprocess.Popen([sys.executable, '-m', 'interfaces.api', '--db', ruta, '--puerto', str(puerto)],
+                                    stderr=subprocess.PIPE)
+        try:
+            servidor.stderr.readline()  # espera el mensaje "Sirviendo ..."
+            latencias, errores, total = asyncio.run(atacar(puerto, clientes, segundos, profundidad))
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+    percentiles = statistics.quantiles(latencias, n=100)
+    print(f'{clientes} clientes, pipelining de {profundidad}, {total:.1f} s')
+    print(f'  peticiones: {len(latencias)} ({len(latencias) / total:,.0f} req/s), errores 5xx: {len(errores)}')
+    print(f'  latencia p50={percentiles[49]:.2f} ms  p99={percentiles[98]:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Arranque en frío de main.py y cli.py (importaciones perezosas y esquema diferido).
+
+Lanza cada comando como un proceso nuevo y reporta la mediana y el mínimo del
+tiempo de reloj de sus repeticiones: el intérprete vacío (referencia), main.py
+hasta mostrar el menú y salir con una base de datos nueva y con una ya migrada,
+y cli.py exportando una categoría. Con `-X importtime` lista los módulos que
+más tardan en importarse al cargar main.py.
+
+Verifica que importar main y construir Sistema no cargue módulos pesados
+(PESADOS), que Sistema no abra la base de datos hasta la primera consulta y
+que con el esquema al día esa consulta no ejecute sentencias de migración.
+
+Uso: python -m benchmarks.bench_arranque [repeticiones]
+"""
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from models.sistema import Sistema
+from benchmarks.datos import poblar
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Módulos que solo necesitan la API, los correos, los hashes o el cálculo por lotes
+PESADOS = ['asyncio', 'concurrent.futures', 'urllib.request', 'smtplib', 'email.message', 'getpass', 'numpy']
+MODULOS_LENTOS = 10
+
+CHEQUEO = f'''
+import json, sys
+import main
+from models.sistema import Sistema
+sistema = Sistema(sys.argv[1])
+resultado = {{'pesados': [m for m in {PESADOS!r} if m in sys.modules], 'abiertas': len(sistema.pool._todas)}}
+sistema.explorar_eventos_pagina(tamano=1)
+resultado['sentencias'] = list(sistema.estadisticas_consultas()['consultas'])
+sistema.cerrar()
+print(json.dumps(resultado))
+'''
+
+
+def cronometrar(comando: list, repeticiones: int, directorio: str, entrada: str = '', antes=None) -> tuple:
+    """(mediana, mínimo) en ms de lanzar el comando como proceso nuevo"""
+    tiempos = []
+    for _ in range(repeticiones):
+        if antes:
+            antes()
+        inicio = time.perf_counter()
+        subprocess.run(comando, input=entrada, text=True, cwd=directorio, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos), min(tiempos)
+
+
+def importaciones(directorio: str) -> tuple:
+    """Total en ms y los módulos de mayor tiempo propio al importar main"""
+    salida = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=RAIZ,
+                            capture_output=True, text=True, check=True).stderr
+    modulos = []
+    for linea in salida.splitlines():
+        coincidencia = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)', linea)
+        if coincidencia:
+            modulos.append((int(coincidencia[1]) / 1000, int(coincidencia[2]) / 1000, coincidencia[4]))
+    total = sum(propio for propio, _, _ in modulos)
+    return total, sorted(modulos, reverse=True)[:MODULOS_LENTOS]
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'database', 'quehaypahacer.db')
+        sistema = Sistema(ruta)
+        with sistema.pool.conexion() as conn:
+            poblar(conn, 2000, n_usuarios=100)
+        sistema.cerrar()
+        migrada = os.path.join(directorio, 'migrada.db')
+        shutil.copy(ruta, migrada)
+
+        def base_nueva():
+            shutil.rmtree(os.path.join(directorio, 'database'), ignore_errors=True)
+
+        python = [sys.executable]
+        casos = {
+            'intérprete vacío': (python + ['-c', 'pass'], '', None),
+            'main.py (base nueva)': (python + [os.path.join(RAIZ, 'main.py')], '4\n', base_nueva),
+            'main.py (base migrada)': (python + [os.path.join(RAIZ, 'main.py')], '4\n', None),
+            'cli.py exportar': (python + [os.path.join(RAIZ, 'cli.py'), '--db', migrada, 'exportar', '-',
+                                          '--categoria', 'Cine'], '', None),
+        }
+        print(f'arranque en frío, {repeticiones} repeticiones')
+        print(f'{"comando":<26}{"mediana (ms)":>14}{"mínimo (ms)":>14}')
+        for nombre, (comando, entrada, antes) in casos.items():
+            mediana, minimo = cronometrar(comando, repeticiones, directorio, entrada, antes)
+            print(f'{nombre:<26}{mediana:>14.1f}{minimo:>14.1f}')
+
+        total, lentos = importaciones(directorio)
+        print(f'\nimport main: {total:.1f} ms en total; módulos más lentos (propio / acumulado, ms):')
+        for propio, acumulado, modulo in lentos:
+            print(f'  {modulo:<28}{propio:>8.1f}{acumulado:>10.1f}')
+
+        chequeo = json.loads(subprocess.run([sys.executable, '-c', CHEQUEO, migrada], cwd=RAIZ,
+                                            capture_output=True, text=True, check=True).stdout)
+    assert not chequeo['pesados'], f"el arranque importa módulos pesados: {', '.join(chequeo['pesados'])}"
+    assert chequeo['abiertas'] == 0, 'Sistema abre la base de datos antes de la primera consulta'
+    migraciones = [sql for sql in chequeo['sentencias'] if re.match(r'(CREATE|INSERT|DROP|ALTER)\b', sql)]
+    assert not migraciones, f'con el esquema al día se ejecutaron migraciones: {migraciones}'
+    print(f"\nprimera consulta con el esquema al día: {len(chequeo['sentencias'])} sentencias "
+          f"({', '.join(sql.split(' =')[0] for sql in chequeo['sentencias'])})")
+    print('OK: el arranque no importa módulos pesados ni migra una base de datos al día')
+
+
+if __name__ == '__main__':
+    main()
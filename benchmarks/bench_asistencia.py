@@ -0,0 +1,119 @@
+"""Contención por los últimos cupos de un evento muy solicitado.
+
+Muchos hilos inscriben usuarios en el mismo evento y una parte cancela justo
+después, lo que promueve a los de la lista de espera. Reporta inscripciones por
+segundo y latencias, y falla (AssertionError) si el evento queda con sobrecupo,
+si el contador de inscritos no coincide con asistentes o si queda un cupo libre
+con gente esperando. Como referencia mide también la versión ingenua
+(COUNT(*) y luego INSERT, sin BEGIN IMMEDIATE), que sí puede sobrevender.
+
+Uso: python -m benchmarks.bench_asistencia [hilos] [n_usuarios] [capacidad]
+"""
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from models.sesion import Sesion
+from models.sistema import Sistema
+from models.usuario import Usuario
+from benchmarks.datos import poblar
+
+N_EVENTOS = 1000
+EVENTO = 1
+EVENTO_INGENUO = 2
+# Fracción de inscritos que cancela enseguida
+CANCELAN = 0.2
+
+
+def participar(sistema: Sistema, usuarios: range) -> tuple:
+    rnd = random.Random(usuarios.start)
+    latencias, cancelados = [], []
+    for usuario_id in usuarios:
+        sesion = Sesion()
+        sesion.usuario = Usuario(usuario_id, '', '', '')
+        inicio = time.perf_counter()
+        sistema.confirmar_asistencia(EVENTO, sesion)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        if rnd.random() < CANCELAN:
+            inicio = time.perf_counter()
+            sistema.cancelar_asistencia(EVENTO, sesion)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            cancelados.append(usuario_id)
+    return latencias, cancelados
+
+
+def participar_ingenuo(sistema: Sistema, usuarios: range):
+    for usuario_id in usuarios:
+        with sistema.pool.conexion() as conn:
+            inscritos = conn.execute('SELECT count(*) FROM asistentes WHERE evento_id = ?',
+                                     (EVENTO_INGENUO,)).fetchone()[0]
+            capacidad = conn.execute('SELECT capacidad FROM eventos WHERE id = ?',
+                                     (EVENTO_INGENUO,)).fetchone()[0]
+            if inscritos < capacidad:
+                conn.execute('INSERT INTO asistentes (usuario_id, evento_id) VALUES (?, ?)',
+                             (usuario_id, EVENTO_INGENUO))
+                conn.commit()
+
+
+def repartir(n_usuarios: int, hilos: int) -> list:
+    return [range(1 + h, n_usuarios + 1, hilos) for h in range(hilos)]
+
+
+def main():
+    hilos = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    n_usuarios = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    capacidad = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'), tamano_pool=8)
+        with sistema.pool.conexion() as conn:
+            poblar(conn, N_EVENTOS, n_usuarios=n_usuarios)
+            conn.execute('UPDATE eventos SET capacidad = ? WHERE id IN (?, ?)', (capacidad, EVENTO, EVENTO_INGENUO))
+            conn.commit()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+                resultados = list(ejecutor.map(lambda usuarios: participar(sistema, usuarios),
+                                               repartir(n_usuarios, hilos)))
+            total = time.perf_counter() - inicio
+
+            with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+                list(ejecutor.map(lambda usuarios: participar_ingenuo(sistema, usuarios),
+                                  repartir(n_usuarios, hilos)))
+
+        latencias = [valor for resultado in resultados for valor in resultado[0]]
+        cancelados = {usuario_id for resultado in resultados for usuario_id in resultado[1]}
+        asistencia = sistema.obtener_asistencia(EVENTO)
+        with sistema.pool.conexion() as conn:
+            asistentes = {fila[0] for fila in conn.execute(
+                'SELECT usuario_id FROM asistentes WHERE evento_id = ?', (EVENTO,))}
+            en_espera = {fila[0] for fila in conn.execute(
+                'SELECT usuario_id FROM lista_espera WHERE evento_id = ?', (EVENTO,))}
+            ingenuos = conn.execute('SELECT count(*) FROM asistentes WHERE evento_id = ?',
+                                    (EVENTO_INGENUO,)).fetchone()[0]
+        sistema.cerrar()
+
+    operaciones = len(latencias)
+    cuantiles = statistics.quantiles(latencias, n=100)
+    print(f'{hilos} hilos, {n_usuarios} usuarios por {capacidad} cupos ({len(cancelados)} cancelan)')
+    print(f'  {operaciones / total:,.0f} operaciones/s; p50={cuantiles[49]:.2f} ms  p99={cuantiles[98]:.2f} ms')
+    print(f'  inscritos {asistencia.inscritos}/{asistencia.capacidad}, en espera {asistencia.en_espera}')
+    print(f'  versión ingenua (COUNT(*) + INSERT): {ingenuos}/{capacidad} inscritos')
+
+    assert len(asistentes) == asistencia.inscritos, 'el contador no coincide con asistentes'
+    assert asistencia.inscritos <= capacidad, 'sobrecupo'
+    assert not asistentes & en_espera, 'usuarios inscritos y en espera a la vez'
+    assert not en_espera or asistencia.inscritos == capacidad, 'cupo libre con gente en espera'
+    assert asistentes | en_espera == set(range(1, n_usuarios + 1)) - cancelados, 'inscripciones perdidas'
+    print('OK: sin sobrecupo ni inscripciones perdidas')
+
+
+if __name__ == '__main__':
+    main()
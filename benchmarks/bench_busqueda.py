@@ -0,0 +1,59 @@
+"""Compara la búsqueda FTS5 (Sistema.buscar_eventos) con el filtro LIKE '%...%'.
+
+El costo de LIKE crece con el tamaño de la tabla (y no encuentra "medellin" en
+"Medellín"); el de FTS5 crece con el número de coincidencias que hay que ordenar.
+
+Uso: python -m benchmarks.bench_busqueda [n_eventos]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from models.sistema import Sistema
+from benchmarks.datos import poblar
+
+REPETICIONES = 20
+LIMITE = 20
+BUSQUEDAS = ['medellin', 'Medellín', 'estadio barranq', 'Evento 4242', 'evento 4242 cali', 'silleteros']
+
+LIKE = '''
+    SELECT * FROM eventos
+    WHERE nombre LIKE ? OR descripcion LIKE ? OR ubicacion LIKE ?
+    LIMIT ?
+'''
+
+
+def cronometrar(funcion) -> float:
+    funcion()
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        funcion()
+    return (time.perf_counter() - inicio) / REPETICIONES * 1000
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'))
+        sistema.cache_eventos.capacidad = 0  # se miden las consultas, no la caché
+        with sistema.pool.conexion() as conn:
+            poblar(conn, n_eventos)
+
+            print(f'{n_eventos} eventos, {LIMITE} resultados por búsqueda\n')
+            print(f'{"búsqueda":<20}{"LIKE (ms)":>12}{"FTS5 (ms)":>12}{"mejora":>10}')
+            for texto in BUSQUEDAS:
+                patron = f'%{texto}%'
+                like = cronometrar(lambda: conn.execute(
+                    LIKE, (patron, patron, patron, LIMITE)).fetchall())
+                fts = cronometrar(lambda: sistema.buscar_eventos(texto, LIMITE))
+                print(f'{texto:<20}{like:>12.3f}{fts:>12.3f}{like / fts:>9.1f}x')
+
+            # Filtro de ubicación de explorar_eventos, que recorre toda la tabla
+            filtro = cronometrar(lambda: sistema.explorar_eventos(ubicacion='Cali'))
+            print(f'\nexplorar_eventos(ubicacion=\'Cali\'): {filtro:.3f} ms')
+        sistema.cerrar()
+
+
+if __name__ == '__main__':
+    main()
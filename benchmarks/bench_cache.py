@@ -0,0 +1,151 @@
+"""Caché de exploración de eventos con una mezcla de consultas con distribución Zipf.
+
+Las consultas (categoría x orden x día de los próximos 30, más la primera
+página por categoría) se eligen con probabilidad Zipf y se intercalan con
+creaciones de eventos. Compara operaciones/s con y sin caché y falla
+(AssertionError) si una lectura devuelve un resultado distinto del de la base
+de datos: justo después de cada escritura, en una muestra de lecturas y, tras
+una fase con hilos lectores y un escritor concurrentes, en todas las entradas
+que quedaron en la caché.
+
+Uso: python -m benchmarks.bench_cache [operaciones] [zipf_s]
+"""
+import contextlib
+import io
+import itertools
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from models.sesion import Sesion
+from models.cache import CacheConsultas
+from models.sistema import Sistema, TAMANO_CACHE_EVENTOS, TTL_CACHE_EVENTOS
+from models.usuario import Usuario
+from benchmarks.datos import CATEGORIAS, poblar
+
+N_EVENTOS = 50_000
+DIAS = 30
+# Fracción de operaciones que crean un evento
+ESCRITURAS = 0.01
+# Fracción de lecturas comparadas con la base de datos
+MUESTRA = 0.02
+HILOS_LECTORES = 4
+
+
+def formas_de_consulta() -> list:
+    hoy = date.today()
+    fechas = [None] + [(hoy + timedelta(days=d)).isoformat() for d in range(DIAS)]
+    formas = [('explorar', categoria, fecha, orden)
+              for categoria, fecha, orden in itertools.product(CATEGORIAS, fechas, ('fecha', 'nombre'))]
+    formas += [('pagina', categoria, None, 'fecha') for categoria in CATEGORIAS + [None]]
+    random.Random(1).shuffle(formas)
+    return formas
+
+
+def leer(sistema: Sistema, forma: tuple, cache: bool = True) -> list:
+    tipo, categoria, fecha, orden = forma
+    if tipo == 'explorar':
+        if cache:
+            return sistema.explorar_eventos(categoria=categoria, fecha=fecha, orden=orden)
+        return list(sistema.iterar_eventos(categoria=categoria, fecha=fecha, orden=orden))
+    if cache:
+        return sistema.explorar_eventos_pagina(categoria=categoria, fecha=fecha, orden=orden)
+    return sistema._explorar_eventos_pagina(categoria, None, fecha, orden, None, None, 20)
+
+
+def comprobar(sistema: Sistema, forma: tuple, eventos: list):
+    esperado = [evento.id for evento in leer(sistema, forma, cache=False)]
+    assert [evento.id for evento in eventos] == esperado, f'lectura desactualizada: {forma}'
+
+
+def escribir(sistema: Sistema, sesion: Sesion, rnd: random.Random, numero: int) -> tuple:
+    categoria = rnd.choice(CATEGORIAS)
+    fecha = (date.today() + timedelta(days=rnd.randrange(DIAS))).isoformat()
+    sistema.crear_evento(f'Evento nuevo {numero}', 'Parque Medellín', fecha, categoria, 100, '', sesion)
+    return categoria, fecha
+
+
+def mezcla(sistema: Sistema, sesion: Sesion, formas: list, pesos: list, operaciones: int, semilla: int,
+           verificar: bool) -> float:
+    """Operaciones por segundo de la mezcla, sin contar el tiempo de las comprobaciones"""
+    rnd = random.Random(semilla)
+    elegidas = rnd.choices(formas, weights=pesos, k=operaciones)
+    total = 0.0
+    for numero, forma in enumerate(elegidas):
+        inicio = time.perf_counter()
+        if rnd.random() < ESCRITURAS:
+            categoria, fecha = escribir(sistema, sesion, rnd, numero)
+            total += time.perf_counter() - inicio
+            if verificar:
+                # Lo recién creado debe verse en las consultas que lo incluyen
+                for forma_afectada in (('explorar', categoria, fecha, 'fecha'), ('explorar', categoria, None, 'nombre'),
+                                       ('pagina', None, None, 'fecha')):
+                    comprobar(sistema, forma_afectada, leer(sistema, forma_afectada))
+            continue
+        eventos = leer(sistema, forma)
+        total += time.perf_counter() - inicio
+        if verificar and rnd.random() < MUESTRA:
+            comprobar(sistema, forma, eventos)
+    return operaciones / total
+
+
+def main():
+    operaciones = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    s = float(sys.argv[2]) if len(sys.argv) > 2 else 1.1
+
+    formas = formas_de_consulta()
+    pesos = [1 / (rango + 1) ** s for rango in range(len(formas))]
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'), tamano_pool=HILOS_LECTORES + 2)
+        with sistema.pool.conexion() as conn:
+            poblar(conn, N_EVENTOS, dias=DIAS * 2)
+        sesion = Sesion()
+        sesion.usuario = Usuario(1, '', '', '')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            sistema.cache_eventos = CacheConsultas(capacidad=0)
+            sin_cache = mezcla(sistema, sesion, formas, pesos, operaciones, 1, verificar=False)
+            sistema.cache_eventos = CacheConsultas(TAMANO_CACHE_EVENTOS, TTL_CACHE_EVENTOS)
+            con_cache = mezcla(sistema, sesion, formas, pesos, operaciones, 2, verificar=True)
+            estadisticas = sistema.estadisticas_cache()
+
+            # Lectores y un escritor concurrentes; al final ninguna entrada puede estar desactualizada
+            detener = threading.Event()
+
+            def lector(semilla):
+                rnd = random.Random(semilla)
+                while not detener.is_set():
+                    leer(sistema, rnd.choices(formas, weights=pesos)[0])
+
+            hilos = [threading.Thread(target=lector, args=(i,)) for i in range(HILOS_LECTORES)]
+            for hilo in hilos:
+                hilo.start()
+            rnd = random.Random(3)
+            for numero in range(200):
+                escribir(sistema, sesion, rnd, operaciones + numero)
+                time.sleep(0.005)
+            detener.set()
+            for hilo in hilos:
+                hilo.join()
+
+            entradas = list(sistema.cache_eventos._entradas.items())
+            for clave, (eventos, *_) in entradas:
+                tipo, filtros, orden = clave[:3]
+                comprobar(sistema, (tipo, filtros.categoria, filtros.fecha, orden), list(eventos))
+        sistema.cerrar()
+
+    print(f'{len(formas)} consultas distintas, Zipf s={s}, {ESCRITURAS:.0%} escrituras, {operaciones} operaciones')
+    print(f'  sin caché: {sin_cache:,.0f} operaciones/s')
+    print(f'  con caché: {con_cache:,.0f} operaciones/s ({con_cache / sin_cache:.1f}x)')
+    print('  ' + ', '.join(f'{nombre} {valor}' for nombre, valor in estadisticas.items()))
+    print(f'  {len(entradas)} entradas comprobadas tras la fase concurrente')
+    print('OK: ninguna lectura desactualizada')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Sondeo de cambios: registro de cambios y vista de próximos por día frente a releer el catálogo.
+
+En cada ronda se hacen `cambios` altas, modificaciones y bajas de eventos y
+luego dos consumidores sondean:
+
+*  "qué hay de nuevo": releer los próximos eventos con explorar_eventos y
+   compararlos con la lectura anterior, frente a pedir cambios_eventos desde
+   el cursor;
+*  panel por día y categoría: contar los próximos eventos con GROUP BY sobre
+   eventos, frente a proximos_por_dia desde el cursor (refresca la vista y
+   devuelve solo los grupos que cambiaron).
+
+Verifica que el registro incluya todo lo que encuentra la comparación, que el
+panel armado con los deltas coincida con el conteo completo y mide además el
+costo de los triggers al insertar eventos. Con EVENTOS_MEJORA eventos o más
+falla (AssertionError) si el sondeo por cursor no es al menos MEJORA_MINIMA
+veces más rápido que releer; con menos, releer es barato y solo se informa la
+relación.
+
+Uso: python -m benchmarks.bench_cambios [n_eventos] [cambios_por_ronda] [rondas]
+"""
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from models.fechas import EPOCA, dia_epoca
+from models.sesion import Sesion
+from models.sistema import Sistema
+from models.usuario import Usuario
+from benchmarks.datos import CATEGORIAS, CIUDADES, poblar
+
+MEJORA_MINIMA = 5
+# Catálogo desde el que se exige MEJORA_MINIMA (el tamaño por defecto)
+EVENTOS_MEJORA = 100_000
+FILAS_INSERCION = 20_000
+CONTEO = 'SELECT dia, categoria, count(*) FROM eventos WHERE dia >= ? GROUP BY dia, categoria'
+
+
+def cambiar(sistema: Sistema, rnd: random.Random, cantidad: int, n_eventos: int):
+    """Mezcla de altas (crear_evento), cambios de fecha o categoría y bajas"""
+    hoy = date.today()
+    sesion = Sesion()
+    sesion.usuario = Usuario(1, '', '', '')
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(cantidad):
+            eleccion = rnd.random()
+            if eleccion < 0.4:
+                sistema.crear_evento('Evento nuevo', f'Parque {rnd.choice(CIUDADES)}',
+                                     (hoy + timedelta(days=rnd.randint(0, 90))).isoformat(),
+                                     rnd.choice(CATEGORIAS), 100, 'Creado por el benchmark', sesion)
+                continue
+            with sistema.pool.conexion() as conn:
+                evento_id = rnd.randint(1, n_eventos)
+                if eleccion < 0.7:
+                    conn.execute('UPDATE eventos SET fecha = ? WHERE id = ?',
+                                 ((hoy + timedelta(days=rnd.randint(0, 90))).isoformat(), evento_id))
+                elif eleccion < 0.9:
+                    conn.execute('UPDATE eventos SET categoria = ? WHERE id = ?', (rnd.choice(CATEGORIAS), evento_id))
+                else:
+                    conn.execute('DELETE FROM eventos WHERE id = ?', (evento_id,))
+                conn.commit()
+
+
+def foto(sistema: Sistema) -> dict:
+    """Próximos eventos tal como los ve quien relee el catálogo"""
+    return {evento.id: evento for evento in sistema.explorar_eventos(desde=date.today())}
+
+
+def valores(evento) -> tuple:
+    return tuple(getattr(evento, atributo) for atributo in evento.__slots__)
+
+
+def diferencias(antes: dict, ahora: dict) -> set:
+    """Ids que aparecieron, desaparecieron o cambiaron entre dos lecturas"""
+    return antes.keys() ^ ahora.keys() | {evento_id for evento_id in antes.keys() & ahora.keys()
+                                          if valores(antes[evento_id]) != valores(ahora[evento_id])}
+
+
+def insercion(directorio: str, base: str, con_triggers: bool) -> float:
+    """Filas por segundo de insertar_eventos con o sin los triggers del registro"""
+    ruta = os.path.join(directorio, f'insercion_{con_triggers}.db')
+    shutil.copy(base, ruta)
+    sistema = Sistema(ruta)
+    with sistema.pool.conexion() as conn:
+        if not con_triggers:
+            for operacion in ('insert', 'update', 'delete'):
+                conn.execute(f'DROP TRIGGER eventos_cambios_{operacion}')
+        conn.commit()
+    hoy = date.today()
+    rnd = random.Random(9)
+    filas = [(f'Importado {i}', f'Plaza {rnd.choice(CIUDADES)}', (hoy + timedelta(days=rnd.randint(0, 365))).isoformat(),
+              rnd.choice(CATEGORIAS), 100, 'Importado por el benchmark', 1, None, None, None)
+             for i in range(FILAS_INSERCION)]
+    inicio = time.perf_counter()
+    sistema.almacen.insertar_eventos(filas)
+    segundos = time.perf_counter() - inicio
+    sistema.cerrar()
+    return FILAS_INSERCION / segundos
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else EVENTOS_MEJORA
+    por_ronda = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rondas = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    rnd = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'bench.db')
+        sistema = Sistema(ruta)
+        sistema.cache_eventos.capacidad = 0  # se miden las consultas, no la caché
+        with sistema.pool.conexion() as conn:
+            poblar(conn, n_eventos, dias=90)
+            conn.execute('ANALYZE')
+        sistema.cerrar()
+        base = os.path.join(directorio, 'base.db')
+        shutil.copy(ruta, base)
+        sistema = Sistema(ruta)
+        sistema.cache_eventos.capacidad = 0
+
+        hoy = dia_epoca(date.today())
+        cursor = sistema.ultimo_cambio()
+        anterior = foto(sistema)
+        grupos, cursor_panel = sistema.proximos_por_dia()
+        panel = {(g.fecha, g.categoria): g.eventos for g in grupos}
+
+        tiempos = {'releer y comparar': 0.0, 'cambios desde el cursor': 0.0,
+                   'GROUP BY sobre eventos': 0.0, 'proximos_por_dia desde el cursor': 0.0}
+        for _ in range(rondas):
+            cambiar(sistema, rnd, por_ronda, n_eventos)
+
+            inicio = time.perf_counter()
+            actual = foto(sistema)
+            cambiados = diferencias(anterior, actual)
+            tiempos['releer y comparar'] += time.perf_counter() - inicio
+            anterior = actual
+
+            inicio = time.perf_counter()
+            vistos = set()
+            while True:
+                lista, cursor = sistema.cambios_eventos(cursor, limite=1000)
+                if not lista:
+                    break
+                vistos.update(cambio.evento_id for cambio in lista)
+            tiempos['cambios desde el cursor'] += time.perf_counter() - inicio
+            assert cambiados <= vistos, f'el registro no incluye {sorted(cambiados - vistos)[:10]}'
+
+            inicio = time.perf_counter()
+            with sistema.pool.conexion() as conn:
+                conteo = conn.execute(CONTEO, (hoy,)).fetchall()
+            tiempos['GROUP BY sobre eventos'] += time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            grupos, cursor_panel = sistema.proximos_por_dia(despues=cursor_panel)
+            tiempos['proximos_por_dia desde el cursor'] += time.perf_counter() - inicio
+            panel.update(((g.fecha, g.categoria), g.eventos) for g in grupos)
+            completo = {(date.fromordinal(EPOCA.toordinal() + dia), categoria): cantidad
+                        for dia, categoria, cantidad in conteo}
+            assert {clave: n for clave, n in panel.items() if n} == completo, 'el panel no coincide con el conteo'
+        sistema.cerrar()
+
+        print(f'{n_eventos:,} eventos, {rondas} rondas de {por_ronda} cambios')
+        print(f'{"sondeo":<36}{"ms por ronda":>14}')
+        for nombre, segundos in tiempos.items():
+            print(f'{nombre:<36}{segundos / rondas * 1000:>14.2f}')
+
+        sin, con = insercion(directorio, base, False), insercion(directorio, base, True)
+        print(f'\ninsertar_eventos ({FILAS_INSERCION:,} filas): {sin:,.0f} filas/s sin registro, '
+              f'{con:,.0f} con registro ({sin / con - 1:+.0%} de tiempo)')
+
+    mejora_feed = tiempos['releer y comparar'] / tiempos['cambios desde el cursor']
+    mejora_panel = tiempos['GROUP BY sobre eventos'] / tiempos['proximos_por_dia desde el cursor']
+    resultado = f'sondear desde el cursor es {mejora_feed:.0f}x (cambios) y {mejora_panel:.0f}x (panel) más rápido'
+    if n_eventos < EVENTOS_MEJORA:
+        print(f'{resultado} (sin exigir {MEJORA_MINIMA}x con menos de {EVENTOS_MEJORA:,} eventos)')
+        return
+    assert mejora_feed >= MEJORA_MINIMA, f'el registro de cambios solo es {mejora_feed:.1f}x más rápido'
+    assert mejora_panel >= MEJORA_MINIMA, f'la vista de próximos solo es {mejora_panel:.1f}x más rápida'
+    print(f'OK: {resultado}')
+
+
+if __name__ == '__main__':
+    main()
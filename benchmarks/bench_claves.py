@@ -0,0 +1,168 @@
+"""Inicios de sesión con scrypt bajo carga mixta (models/claves.py).
+
+Mientras unos hilos exploran eventos a ritmo fijo (TASA_EXPLORACION por
+cliente; la latencia se cuenta desde el momento en que tocaba cada petición,
+así una exploración demorada también atrasa las siguientes), otros lanzan una
+ráfaga de inicios de sesión. Compara tres casos: sin inicios de sesión (referencia), hashes sin
+límite (un hilo de claves por cliente y sin tope de pendientes, como calcular
+el hash en el hilo de cada petición) y el pool acotado de PoolClaves, donde
+los rechazados (ClavesSaturadas, un 503 en la API) reintentan tras REINTENTO.
+Reporta exploraciones/s con su p50/p99 e inicios de sesión/s con su p99.
+
+Antes verifica la migración: migrar_claves envuelve en scrypt los hashes
+SHA-256 antiguos, esos usuarios siguen entrando con su contraseña y el primer
+inicio de sesión deja un hash scrypt directo. Falla (AssertionError) si algo de
+eso no se cumple o si con el pool acotado el p99 de exploración no es menor
+que sin límite.
+
+Uso: python -m benchmarks.bench_claves [clientes_sesion] [clientes_exploracion] [segundos]
+"""
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from models import claves
+from models.claves import ClavesSaturadas, PoolClaves
+from models.sesion import Sesion
+from models.sistema import Sistema
+from benchmarks.datos import CATEGORIAS, poblar
+
+N_EVENTOS = 20_000
+N_USUARIOS = 1000
+N_LEGADOS = 50
+PASSWORD = 'secreto123'
+# Exploraciones por segundo de cada cliente
+TASA_EXPLORACION = 100
+# Segundos que espera un cliente rechazado antes de reintentar
+REINTENTO = 0.05
+# Tope de pendientes del pool acotado
+MAXIMO_PENDIENTES = 8
+
+
+def percentil(valores: list, p: int) -> float:
+    if len(valores) < 2:
+        return valores[0] if valores else float('nan')
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
+
+
+def migracion(sistema: Sistema):
+    with sistema.pool.conexion() as conn:
+        conn.execute('UPDATE usuarios SET password_hash = ? WHERE id <= ?', (claves.sha256_legado(PASSWORD), N_LEGADOS))
+        conn.commit()
+    inicio = time.perf_counter()
+    migrados = sistema.migrar_claves(lote=16)
+    segundos = time.perf_counter() - inicio
+    assert migrados == N_LEGADOS, f'se migraron {migrados} de {N_LEGADOS} hashes'
+    assert not sistema.almacen.hashes_legados(0, 1), 'quedaron hashes SHA-256 sin migrar'
+    print(f'migración: {migrados} hashes SHA-256 envueltos en {claves.ALGORITMO} en {segundos:.1f} s '
+          f'({migrados / segundos:.0f}/s con {sistema.claves.hilos} hilo(s))', file=sys.__stdout__)
+
+    usuario = sistema.almacen.usuario_por_email('usuario0@example.com')
+    assert usuario.password_hash.startswith('sha256+'), usuario.password_hash
+    assert sistema.iniciar_sesion('usuario0@example.com', PASSWORD, Sesion()), 'un usuario migrado no pudo entrar'
+    assert not sistema.iniciar_sesion('usuario0@example.com', 'otra clave', Sesion())
+    nuevo = sistema.almacen.usuario_por_email('usuario0@example.com').password_hash
+    assert not claves.necesita_rehash(nuevo), f'el inicio de sesión no reemplazó el hash: {nuevo}'
+    assert not sistema.iniciar_sesion('nadie@example.com', PASSWORD, Sesion())
+    print(f'inicio de sesión de un usuario migrado: hash reemplazado por {nuevo.split("$")[0]} directo',
+          file=sys.__stdout__)
+
+
+def carga(sistema: Sistema, clientes_sesion: int, clientes_exploracion: int, segundos: float) -> dict:
+    fin = time.perf_counter() + segundos
+    exploraciones, sesiones, rechazos = [], [], []
+
+    def explorar(numero: int):
+        rnd = random.Random(numero)
+        programada = time.perf_counter()
+        while programada < fin:
+            espera = programada - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            sistema.explorar_eventos_pagina(categoria=rnd.choice(CATEGORIAS), tamano=20)
+            exploraciones.append((time.perf_counter() - programada) * 1000)
+            programada += 1 / TASA_EXPLORACION
+
+    def iniciar(numero: int):
+        rnd = random.Random(1000 + numero)
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            try:
+                ok = sistema.iniciar_sesion(f'usuario{rnd.randrange(N_USUARIOS)}@example.com', PASSWORD, Sesion())
+            except ClavesSaturadas:
+                rechazos.append(1)
+                time.sleep(REINTENTO)
+                continue
+            assert ok, 'falló un inicio de sesión válido'
+            sesiones.append((time.perf_counter() - inicio) * 1000)
+
+    hilos = [threading.Thread(target=explorar, args=(i,)) for i in range(clientes_exploracion)]
+    hilos += [threading.Thread(target=iniciar, args=(i,)) for i in range(clientes_sesion)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return {'exploraciones/s': len(exploraciones) / segundos, 'exploración p50': percentil(exploraciones, 50),
+            'exploración p99': percentil(exploraciones, 99), 'sesiones/s': len(sesiones) / segundos,
+            'sesión p99': percentil(sesiones, 99), 'rechazos': len(rechazos)}
+
+
+def main():
+    clientes_sesion = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    clientes_exploracion = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    segundos = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+
+    inicio = time.perf_counter()
+    hash_unico = claves.hashear(PASSWORD)
+    print(f'{claves.ALGORITMO}: {(time.perf_counter() - inicio) * 1000:.0f} ms por hash')
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'))
+        sistema.cache_eventos.capacidad = 0  # se miden las consultas, no la caché
+        with sistema.pool.conexion() as conn:
+            poblar(conn, N_EVENTOS, n_usuarios=N_USUARIOS)
+            conn.execute('UPDATE usuarios SET password_hash = ?', (hash_unico,))
+            conn.commit()
+            conn.execute('ANALYZE')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            migracion(sistema)
+
+        casos = {
+            'sin inicios de sesión': (0, None),
+            'sin límite': (clientes_sesion, PoolClaves(clientes_sesion, maximo_pendientes=10 ** 9)),
+            'pool acotado': (clientes_sesion, PoolClaves(maximo_pendientes=MAXIMO_PENDIENTES)),
+        }
+        columnas = ['exploraciones/s', 'exploración p50', 'exploración p99', 'sesiones/s', 'sesión p99', 'rechazos']
+        print(f'\n{clientes_exploracion} clientes explorando, {clientes_sesion} iniciando sesión, {segundos:g} s '
+              f'(latencias en ms)')
+        print(f'{"caso":<24}' + ''.join(f'{columna:>17}' for columna in columnas))
+        resultados = {}
+        original = sistema.claves
+        with contextlib.redirect_stdout(io.StringIO()):
+            for nombre, (clientes, pool) in casos.items():
+                sistema.claves = pool or original
+                resultados[nombre] = carga(sistema, clientes, clientes_exploracion, segundos)
+                if pool is not None:
+                    pool.cerrar()
+                print(f'{nombre:<24}' + ''.join(f'{resultados[nombre][columna]:>17.1f}' for columna in columnas),
+                      file=sys.__stdout__)
+        sistema.claves = original
+        sistema.cerrar()
+
+    acotado, libre = resultados['pool acotado'], resultados['sin límite']
+    assert acotado['exploración p99'] < libre['exploración p99'], \
+        f'el pool acotado no protege la exploración: p99 {acotado["exploración p99"]:.1f} ms ' \
+        f'contra {libre["exploración p99"]:.1f} ms sin límite'
+    print(f'OK: con el pool acotado el p99 de exploración baja de {libre["exploración p99"]:.1f} ms '
+          f'a {acotado["exploración p99"]:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Usuarios simulados concurrentes contra un mismo Sistema (pool de conexiones + WAL).
+
+Cada usuario inicia sesión con su propia Sesion y ejecuta una mezcla de
+exploración (70%), favoritos (20%) y creación de eventos (10%).
+
+Uso: python -m benchmarks.bench_concurrencia [n_usuarios] [operaciones_por_usuario]
+"""
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from models import claves
+from models.sesion import Sesion
+from models.sistema import Sistema
+from benchmarks.datos import CATEGORIAS, poblar
+
+N_EVENTOS = 50_000
+TAMANOS_POOL = [1, 4, 8]
+
+
+def simular_usuario(sistema: Sistema, numero: int, operaciones: int) -> dict:
+    rnd = random.Random(numero)
+    sesion = Sesion()
+    sistema.iniciar_sesion(f'usuario{numero}@example.com', 'clave123', sesion)
+    latencias = defaultdict(list)
+
+    for i in range(operaciones):
+        eleccion = rnd.random()
+        inicio = time.perf_counter()
+        if eleccion < 0.7:
+            operacion = 'explorar'
+            sistema.explorar_eventos_pagina(categoria=rnd.choice(CATEGORIAS + [None]), tamano=20)
+        elif eleccion < 0.9:
+            operacion = 'favorito'
+            evento_id = rnd.randint(1, N_EVENTOS)
+            if not sistema.agregar_favorito(evento_id, sesion):
+                sistema.eliminar_favorito(evento_id, sesion)
+        else:
+            operacion = 'crear'
+            fecha = (date.today() + timedelta(days=rnd.randint(0, 365))).isoformat()
+            sistema.crear_evento(f'Evento simulado {numero}-{i}', 'Parque Medellín', fecha,
+                                 rnd.choice(CATEGORIAS), 100, 'Creado por el benchmark', sesion)
+        latencias[operacion].append((time.perf_counter() - inicio) * 1000)
+    return latencias
+
+
+def percentil(valores: list, p: float) -> float:
+    return statistics.quantiles(valores, n=100)[int(p) - 1] if len(valores) > 1 else valores[0]
+
+
+def main():
+    n_usuarios = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    operaciones = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    for tamano_pool in TAMANOS_POOL:
+        with tempfile.TemporaryDirectory() as directorio:
+            sistema = Sistema(os.path.join(directorio, 'bench.db'), tamano_pool=tamano_pool)
+            with sistema.pool.conexion() as conn:
+                poblar(conn, N_EVENTOS, n_usuarios=n_usuarios)
+                conn.execute('UPDATE usuarios SET password_hash = ?', (claves.hashear('clave123'),))
+                conn.commit()
+            with contextlib.redirect_stdout(io.StringIO()):
+                inicio = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=n_usuarios) as ejecutor:
+                    resultados = list(ejecutor.map(
+                        lambda numero: simular_usuario(sistema, numero, operaciones), range(n_usuarios)))
+                total = time.perf_counter() - inicio
+            sistema.cerrar()
+
+        latencias = defaultdict(list)
+        for resultado in resultados:
+            for operacion, valores in resultado.items():
+                latencias[operacion].extend(valores)
+
+        print(f'\npool de {tamano_pool} conexión(es), {n_usuarios} usuarios: '
+              f'{n_usuarios * operaciones / total:,.0f} operaciones/s')
+        for operacion, valores in sorted(latencias.items()):
+            print(f'  {operacion:<10} n={len(valores):<7} p50={percentil(valores, 50):7.2f} ms'
+                  f'  p99={percentil(valores, 99):7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Cuenta las consultas SQL al mostrar listados de eventos de distintos tamaños.
+
+Falla (AssertionError) si el número de consultas crece con el tamaño del listado.
+
+Uso: python -m benchmarks.bench_consultas_listado
+"""
+import contextlib
+import io
+import os
+import tempfile
+
+from interfaces.consola import InterfazConsola
+from models.sistema import Sistema
+from models.usuario import Usuario
+from benchmarks.datos import poblar
+
+TAMANOS = [10, 100, 500]
+
+
+class ContadorConsultas:
+    """Cuenta las sentencias ejecutadas en una conexión mediante set_trace_callback"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.total = 0
+
+    def _registrar(self, sentencia):
+        self.total += 1
+
+    def __enter__(self):
+        self.total = 0
+        self.conn.set_trace_callback(self._registrar)
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.set_trace_callback(None)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'))
+        sistema.cache_eventos.capacidad = 0  # se miden las consultas, no la caché
+        # Las llamadas anidadas a Sistema reutilizan esta conexión del pool
+        with sistema.pool.conexion() as conn:
+            poblar(conn, 5000, n_usuarios=2000, n_favoritos=5000)
+            sistema.usuario_actual = Usuario(1, 'Usuario 1', 'usuario1@example.com', '')
+            interfaz = InterfazConsola(sistema)
+            with contextlib.redirect_stdout(io.StringIO()):
+                sistema.agregar_categoria_preferida('Concierto')
+                sistema.agregar_categoria_preferida('Teatro')
+                # Construye el índice de recomendaciones antes de contar
+                sistema.obtener_recomendaciones()
+
+            conteos = []
+            print(f'{"eventos":>8}{"con JOIN":>12}{"sin JOIN":>12}')
+            for tamano in TAMANOS:
+                with ContadorConsultas(conn) as con_join, contextlib.redirect_stdout(io.StringIO()):
+                    eventos = sistema.explorar_eventos_pagina(tamano=tamano)
+                    interfaz.mostrar_lista_eventos(eventos)
+
+                # Listado sin el nombre del organizador: una consulta por organizador no cacheado
+                sistema.invalidar_organizador()
+                for evento in eventos:
+                    evento.organizador_nombre = None
+                with ContadorConsultas(conn) as sin_join, contextlib.redirect_stdout(io.StringIO()):
+                    interfaz.mostrar_lista_eventos(eventos)
+
+                conteos.append(con_join.total)
+                print(f'{len(eventos):>8}{con_join.total:>12}{sin_join.total:>12}')
+
+            for nombre, obtener in [('favoritos', sistema.obtener_favoritos),
+                                    ('recomendaciones', sistema.obtener_recomendaciones)]:
+                with ContadorConsultas(conn) as contador, contextlib.redirect_stdout(io.StringIO()):
+                    interfaz.mostrar_lista_eventos(obtener())
+                print(f'{nombre}: {contador.total} consulta(s)')
+                assert contador.total == 1, nombre
+        sistema.cerrar()
+
+    assert len(set(conteos)) == 1, f'El número de consultas depende del tamaño del listado: {conteos}'
+    print('OK: número de consultas constante')
+
+
+if __name__ == '__main__':
+    main()
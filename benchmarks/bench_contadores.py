@@ -0,0 +1,156 @@
+"""Ráfaga de favoritos sobre un evento caliente: contadores en diferido frente a contar.
+
+Varios clientes agregan a favoritos el mismo evento (cada clic de un usuario
+distinto) mientras otro pide sin pausa el top de su categoría. Compara tres
+casos:
+
+*  sin contadores: el clic solo inserta el favorito y el ranking cuenta con
+   COUNT(*) sobre favoritos;
+*  contador por clic: BufferContadores con intervalo 0, cada clic escribe su
+   contador en su propia transacción (todas sobre la misma fila);
+*  búfer diferido: BufferContadores por defecto, los clics se acumulan y se
+   escriben juntos; el ranking lee el índice (categoria, favoritos).
+
+Reporta clics/s, transacciones de contadores y p50/p99 del ranking. Verifica
+que el contador y el top coincidan con el conteo sobre favoritos. Falla
+(AssertionError) si el ranking con contadores no es al menos MEJORA_MINIMA
+veces más rápido que contar o si el búfer no junta los clics en menos
+transacciones que clics.
+
+Uso: python -m benchmarks.bench_contadores [n_eventos] [clientes] [clics_por_cliente]
+"""
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+from models.contadores import BufferContadores
+from models.sesion import Sesion
+from models.sistema import Sistema
+from models.usuario import Usuario
+from benchmarks.datos import poblar
+
+N_USUARIOS = 20_000
+FAVORITOS_POR_USUARIO = 10
+TOP = 10
+MEJORA_MINIMA = 5
+CONTAR = '''
+    SELECT f.evento_id, count(*) AS favoritos FROM favoritos f JOIN eventos e ON e.id = f.evento_id
+    WHERE e.categoria = ? AND e.fecha >= ?
+    GROUP BY f.evento_id ORDER BY favoritos DESC, f.evento_id LIMIT ?
+'''
+
+
+def percentil(valores: list, p: int) -> float:
+    if len(valores) < 2:
+        return valores[0] if valores else float('nan')
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
+
+
+def contar(sistema: Sistema, categoria: str) -> list:
+    with sistema.pool.conexion() as conn:
+        return conn.execute(CONTAR, (categoria, date.today().isoformat(), TOP)).fetchall()
+
+
+def rafaga(sistema: Sistema, evento_id: int, categoria: str, clientes: int, clics: int, con_contadores: bool) -> dict:
+    """Cada cliente agrega el evento a favoritos con `clics` usuarios distintos mientras
+    un lector consulta el top de la categoría"""
+    fin = threading.Event()
+    latencias = []
+
+    def clicar(numero: int):
+        sesion = Sesion()
+        for usuario_id in range(numero * clics + 1, (numero + 1) * clics + 1):
+            sesion.usuario = Usuario(usuario_id, '', '', '')
+            sistema.agregar_favorito(evento_id, sesion)
+
+    def leer():
+        while not fin.is_set():
+            inicio = time.perf_counter()
+            if con_contadores:
+                sistema.eventos_destacados(categoria, TOP, orden='favoritos')
+            else:
+                contar(sistema, categoria)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    lector = threading.Thread(target=leer)
+    hilos = [threading.Thread(target=clicar, args=(i,)) for i in range(clientes)]
+    lector.start()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+    fin.set()
+    lector.join()
+    return {'clics/s': clientes * clics / segundos, 'ranking p50': percentil(latencias, 50),
+            'ranking p99': percentil(latencias, 99), 'consultas': len(latencias)}
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    clientes = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    clics = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    assert clientes * clics <= N_USUARIOS, f'hacen falta {clientes * clics} usuarios y hay {N_USUARIOS}'
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'), tamano_pool=clientes + 2)
+        with sistema.pool.conexion() as conn:
+            poblar(conn, n_eventos, n_usuarios=N_USUARIOS, n_favoritos=N_USUARIOS * FAVORITOS_POR_USUARIO, dias=60)
+            conn.execute('ANALYZE')
+            evento_id, categoria = conn.execute(
+                'SELECT id, categoria FROM eventos WHERE fecha >= ? ORDER BY id LIMIT 1',
+                (date.today().isoformat(),)).fetchone()
+        # poblar inserta los favoritos directamente, sin pasar por los contadores
+        sistema.recontar_contadores()
+
+        casos = {
+            'sin contadores': None,
+            'contador por clic': BufferContadores(sistema.pool, intervalo=0),
+            'búfer diferido': BufferContadores(sistema.pool),
+        }
+        columnas = ['clics/s', 'transacciones', 'ranking p50', 'ranking p99', 'consultas']
+        print(f'{n_eventos:,} eventos, {N_USUARIOS * FAVORITOS_POR_USUARIO:,} favoritos; {clientes} clientes x '
+              f'{clics} clics sobre el evento {evento_id} (latencias en ms)')
+        print(f'{"caso":<20}' + ''.join(f'{columna:>15}' for columna in columnas))
+        resultados = {}
+        original = sistema.contadores
+        for nombre, buffer in casos.items():
+            with sistema.pool.conexion() as conn:
+                conn.execute('DELETE FROM favoritos WHERE evento_id = ?', (evento_id,))
+                conn.commit()
+            sistema.contadores = original
+            sistema.recontar_contadores()
+            sistema.contadores = buffer
+            with contextlib.redirect_stdout(io.StringIO()):
+                resultado = rafaga(sistema, evento_id, categoria, clientes, clics, buffer is not None)
+            resultado['transacciones'] = buffer.vaciados if buffer is not None else 0
+            resultados[nombre] = resultado
+            print(f'{nombre:<20}' + ''.join(f'{resultado[columna]:>15,.1f}' for columna in columnas))
+
+            if buffer is not None:
+                destacados = sistema.eventos_destacados(categoria, TOP, orden='favoritos')
+                conteo = contar(sistema, categoria)
+                assert [d.favoritos for d in destacados] == [favoritos for _, favoritos in conteo], \
+                    'el top por contadores no coincide con el conteo'
+                assert destacados[0].evento.id == evento_id and destacados[0].favoritos == clientes * clics, \
+                    f'el evento caliente no encabeza el top con {clientes * clics} favoritos: {destacados[0]}'
+        sistema.contadores = original
+        sistema.cerrar()
+
+    diferido, por_clic = resultados['búfer diferido'], resultados['contador por clic']
+    mejora = resultados['sin contadores']['ranking p50'] / diferido['ranking p50']
+    assert mejora >= MEJORA_MINIMA, f'el ranking con contadores solo es {mejora:.1f}x más rápido que contar'
+    assert diferido['transacciones'] < clientes * clics, 'el búfer no juntó los clics'
+    print(f'OK: el ranking es {mejora:.0f}x más rápido que contar y el búfer escribió {clientes * clics:,} clics en '
+          f'{diferido["transacciones"]:,} transacciones ({por_clic["transacciones"]:,} escribiendo por clic)')
+
+
+if __name__ == '__main__':
+    main()
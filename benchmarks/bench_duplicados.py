@@ -0,0 +1,270 @@
+"""Detección de eventos casi duplicados (models/duplicados.py) sobre un catálogo grande.
+
+Genera un catálogo sintético en orden de fecha (EVENTOS_POR_DIA eventos al día
+en 1400 lugares) en el que una fracción de los eventos reaparece como en los
+feeds: otro nombre para el mismo evento (mayúsculas, tildes, puntuación, orden
+de las palabras, errores de tipeo, sufijos como "en vivo"), la ubicación
+escrita de otra forma y otra descripción o ninguna. En el mismo lugar y día
+también hay eventos distintos del mismo tipo, que no deben confundirse.
+
+Mide:
+
+*  la construcción del índice de firmas sobre la primera décima del catálogo y
+   el resto aplicado desde el registro de cambios (eventos/s);
+*  la comprobación de crear_evento (buscar) con la décima y con el catálogo
+   completo: con bloques por día y lugar no depende del tamaño del catálogo;
+*  la reconstrucción completa del índice y el reporte de pares, con su
+   precisión (pares reportados que son el mismo evento) y exhaustividad
+   (pares del mismo evento que quedan en el mismo grupo al encadenar los
+   reportados, como al fusionar) frente a los duplicados inyectados;
+*  crear_evento con y sin la comprobación.
+
+Falla (AssertionError) si la precisión o la exhaustividad quedan bajo
+PRECISION_MINIMA y EXHAUSTIVIDAD_MINIMA, si la comprobación con el catálogo
+completo tarda más de CRECIMIENTO_MAXIMO veces lo que tardaba con la décima o
+si crear_evento detiene un evento nuevo o no avisa de uno repetido.
+
+Uso: python -m benchmarks.bench_duplicados [n_eventos]
+"""
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import unicodedata
+from datetime import date, timedelta
+from itertools import combinations
+
+from models import duplicados
+from models.sesion import Sesion
+from models.sistema import Sistema
+from benchmarks.datos import CIUDADES, LUGARES
+
+EVENTOS_POR_DIA = 1500
+# Fracción de eventos que reaparecen y cuántas veces como máximo
+FRACCION_DUPLICADOS = 0.1
+MAXIMO_VARIANTES = 3
+# Fracción de eventos con otro del mismo tipo el mismo día en el mismo lugar
+FRACCION_VECINOS = 0.05
+CONSULTAS = 1000
+CREACIONES = 500
+PRECISION_MINIMA = 0.95
+EXHAUSTIVIDAD_MINIMA = 0.9
+CRECIMIENTO_MAXIMO = 3
+
+TIPOS = ['Concierto', 'Festival', 'Obra', 'Función', 'Charla', 'Taller', 'Feria', 'Muestra', 'Partido', 'Fiesta']
+NOMBRES_LUGARES = ['Bolívar', 'Santander', 'Nariño', 'Girardot', 'Atanasio', 'Pablo Tobón', 'Colón', 'Jorge Eliécer',
+                   'Camilo Torres', 'Simón Bolívar', 'La Macarena', 'El Campín', 'Pascual Guerrero', 'Metropolitano',
+                   'Municipal', 'Central', 'Universitario', 'del Río', 'Los Fundadores', 'Las Américas']
+FRASES = ['Entrada libre hasta completar aforo', 'Boletas en taquilla', 'Apto para toda la familia',
+          'Mayores de 18 años', 'Abre puertas una hora antes', 'Con invitados especiales', 'Evento al aire libre',
+          'Parqueadero disponible', 'Preventa con descuento', 'Cupos limitados', 'Transmisión en vivo',
+          'Zona de comidas', 'Ingreso con documento', 'Última fecha de la gira', 'Función única']
+SUFIJOS = [' en vivo', ' (oficial)', ' | boletas', ' - gira 2026', ' edición especial']
+SILABAS = ['ka', 'lo', 'mi', 'ta', 're', 'vu', 'san', 'dro', 'mel', 'ni', 'co', 'ra', 'bel', 'tu', 'zo', 'pe',
+           'lia', 'gor', 'fe', 'xi', 'mon', 'da', 'ri', 'ju', 'nes', 'car', 'los', 'vi', 'ves', 'sha']
+
+
+def percentil(valores: list, p: int) -> float:
+    if len(valores) < 2:
+        return valores[0] if valores else float('nan')
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
+
+
+def sin_tildes(texto: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+
+class Catalogo:
+    """Eventos sintéticos con duplicados inyectados; grupo[i] identifica el evento real de la
+    fila i y origen[i] su tipo, artista, lugar y ciudad"""
+
+    def __init__(self, n_eventos: int, semilla: int = 42):
+        self.rnd = random.Random(semilla)
+        self.artistas = [self._artista() for _ in range(max(1000, n_eventos // 20))]
+        self.lugares = [(f'{lugar} {nombre}', ciudad) for lugar in LUGARES for nombre in NOMBRES_LUGARES
+                        for ciudad in CIUDADES]
+        self.filas, self.grupo, self.origen = [], [], []
+        hoy = date.today()
+        while len(self.filas) < n_eventos:
+            fecha = (hoy + timedelta(days=len(self.filas) // EVENTOS_POR_DIA)).isoformat()
+            dia = []
+            for _ in range(EVENTOS_POR_DIA):
+                tipo, artista, (lugar, ciudad) = (self.rnd.choice(TIPOS), self.rnd.choice(self.artistas),
+                                                  self.rnd.choice(self.lugares))
+                origen = (tipo, artista, lugar, ciudad)
+                grupo = len(self.grupo) + len(dia)
+                dia.append((grupo, origen, self.original(*origen, fecha)))
+                if self.rnd.random() < FRACCION_DUPLICADOS:
+                    for _ in range(self.rnd.randint(1, MAXIMO_VARIANTES)):
+                        dia.append((grupo, origen, self.variante(*origen, fecha)))
+                if self.rnd.random() < FRACCION_VECINOS:
+                    vecino = (tipo, self.rnd.choice(self.artistas), lugar, ciudad)
+                    dia.append((grupo + 0.5, vecino, self.original(*vecino, fecha)))
+            # Las reapariciones llegan en cualquier orden dentro del día
+            self.rnd.shuffle(dia)
+            for grupo, origen, fila in dia[:n_eventos - len(self.filas)]:
+                self.grupo.append(grupo)
+                self.origen.append(origen)
+                self.filas.append(fila)
+
+    def _artista(self) -> str:
+        palabras = [''.join(self.rnd.choice(SILABAS) for _ in range(self.rnd.randint(2, 3)))
+                    for _ in range(self.rnd.randint(1, 2))]
+        return ' '.join(palabra.capitalize() for palabra in palabras)
+
+    def original(self, tipo, artista, lugar, ciudad, fecha) -> tuple:
+        return (f'{tipo} {artista}', f'{lugar}, {ciudad}', fecha, 'Concierto', 100,
+                f'{tipo} de {artista} en {lugar}. {self.rnd.choice(FRASES)}.')
+
+    def variante(self, tipo, artista, lugar, ciudad, fecha) -> tuple:
+        rnd = self.rnd
+        nombre = f'{tipo} {artista}'
+        for cambio in rnd.sample(['caja', 'tildes', 'puntuacion', 'orden', 'tipeo', 'sufijo'], rnd.randint(1, 2)):
+            if cambio == 'caja':
+                nombre = rnd.choice([str.upper, str.lower, str.title])(nombre)
+            elif cambio == 'tildes':
+                nombre = sin_tildes(nombre)
+            elif cambio == 'puntuacion':
+                nombre = rnd.choice(['{}!', '¡{}!', '{}.', '"{}"']).format(nombre.replace(' ', rnd.choice([' ', ' - ', ': ']), 1))
+            elif cambio == 'orden':
+                nombre = ' '.join(reversed(nombre.split()))
+            elif cambio == 'tipeo' and len(artista) > 4:
+                i = rnd.randrange(1, len(artista) - 2)
+                errado = artista[:i] + artista[i + 1] + artista[i] + artista[i + 2:] if rnd.random() < 0.5 \
+                    else artista[:i] + artista[i + 1:]
+                nombre = nombre.replace(artista, errado)
+            elif cambio == 'sufijo':
+                nombre += rnd.choice(SUFIJOS)
+        ubicacion = rnd.choice([f'{lugar}, {ciudad}', f'{ciudad} - {lugar}', sin_tildes(f'{lugar} {ciudad}').lower(),
+                                f'{lugar.upper()} ({ciudad})'])
+        descripcion = rnd.choice([f'{tipo} de {artista} en {lugar}. {rnd.choice(FRASES)}.',
+                                  f'{artista} se presenta en {lugar}, {ciudad}.', ''])
+        return nombre, ubicacion, fecha, 'Concierto', rnd.randint(50, 500), descripcion
+
+    def pares_reales(self, hasta: int = None) -> set:
+        por_grupo = {}
+        for evento_id, grupo in enumerate(self.grupo[:hasta], 1):
+            por_grupo.setdefault(grupo, []).append(evento_id)
+        return {par for ids in por_grupo.values() for par in combinations(ids, 2)}
+
+
+def insertar(sistema: Sistema, filas: list) -> float:
+    inicio = time.perf_counter()
+    with sistema.pool.conexion() as conn:
+        for i in range(0, len(filas), 10_000):
+            conn.executemany('''
+                INSERT INTO eventos (nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id)
+                VALUES (?, ?, ?, ?, ?, ?, 1)
+            ''', filas[i:i + 10_000])
+            conn.commit()
+    return time.perf_counter() - inicio
+
+
+def comprobar(sistema: Sistema, catalogo: Catalogo, hasta: int) -> tuple:
+    """Latencias (ms) de buscar una reaparición de eventos del catálogo y cuántas encontró"""
+    rnd = random.Random(7)
+    latencias, encontradas = [], 0
+    with sistema.pool.conexion() as conn:
+        for _ in range(CONSULTAS):
+            evento_id = rnd.randint(1, hasta)
+            fecha = catalogo.filas[evento_id - 1][2]
+            nombre, ubicacion, fecha, _, _, descripcion = catalogo.variante(*catalogo.origen[evento_id - 1], fecha)
+            inicio = time.perf_counter()
+            parecidos = duplicados.buscar(conn, nombre, ubicacion, fecha, descripcion)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            encontradas += any(catalogo.grupo[p.evento_id - 1] == catalogo.grupo[evento_id - 1] for p in parecidos)
+    return latencias, encontradas
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    catalogo = Catalogo(n_eventos)
+    decima = n_eventos // 10
+    dias = len({fila[2] for fila in catalogo.filas})
+    print(f'{n_eventos:,} eventos en {dias} días ({len(set(catalogo.grupo)):,} eventos reales, '
+          f'{n_eventos - len(set(catalogo.grupo)):,} reapariciones)')
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'))
+        sesion = Sesion()
+        with contextlib.redirect_stdout(io.StringIO()):
+            sistema.registrar_usuario('Organizador', 'organizador@example.com', 'clave-segura')
+            sistema.iniciar_sesion('organizador@example.com', 'clave-segura', sesion)
+        print(f'{"etapa":<40}{"eventos":>12}{"segundos":>10}{"eventos/s":>12}')
+
+        def fila(etapa: str, eventos: int, segundos: float):
+            print(f'{etapa:<40}{eventos:>12,}{segundos:>10.2f}{eventos / segundos:>12,.0f}')
+
+        fila('inserción (décima)', decima, insertar(sistema, catalogo.filas[:decima]))
+        with sistema.pool.conexion() as conn:
+            inicio = time.perf_counter()
+            indexados = duplicados.construir(conn)
+            fila('construcción del índice (décima)', indexados, time.perf_counter() - inicio)
+        latencias_decima, encontradas_decima = comprobar(sistema, catalogo, decima)
+
+        fila('inserción (resto)', n_eventos - decima, insertar(sistema, catalogo.filas[decima:]))
+        with sistema.pool.conexion() as conn:
+            inicio = time.perf_counter()
+            duplicados.refrescar(conn)
+            fila('índice desde el registro de cambios', n_eventos - decima, time.perf_counter() - inicio)
+        latencias_total, encontradas_total = comprobar(sistema, catalogo, n_eventos)
+
+        with sistema.pool.conexion() as conn:
+            inicio = time.perf_counter()
+            indexados = duplicados.construir(conn)
+            fila('reconstrucción completa del índice', indexados, time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        pares = sistema.reporte_duplicados()
+        fila('reporte de pares', n_eventos, time.perf_counter() - inicio)
+
+        # crear_evento con y sin la comprobación, con eventos nuevos en lugares y días del catálogo;
+        # luego con eventos del catálogo repetidos, de los que debe avisar sin crearlos
+        rnd = random.Random(11)
+        tiempos, rechazados = {}, 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            for umbral in (None, duplicados.UMBRAL_CREACION):
+                sistema.umbral_duplicados = umbral
+                inicio = time.perf_counter()
+                for _ in range(CREACIONES):
+                    tipo, _, lugar, ciudad = catalogo.origen[rnd.randint(1, n_eventos) - 1]
+                    fecha = catalogo.filas[rnd.randint(1, n_eventos) - 1][2]
+                    artista = f'{catalogo._artista()} {catalogo._artista()}'
+                    assert sistema.crear_evento(*catalogo.original(tipo, artista, lugar, ciudad, fecha), sesion), \
+                        'crear_evento detuvo un evento nuevo'
+                tiempos[umbral] = (time.perf_counter() - inicio) / CREACIONES * 1000
+            for _ in range(CREACIONES):
+                rechazados += not sistema.crear_evento(*catalogo.filas[rnd.randint(1, n_eventos) - 1], sesion)
+        sistema.cerrar()
+
+    reales = catalogo.pares_reales()
+    encontrados = {(par.evento_id, par.duplicado_id) for par in pares}
+    precision = len(encontrados & reales) / len(encontrados) if encontrados else 0.0
+    grupo = {}
+    for primero, otros in duplicados.grupos(pares).items():
+        grupo.update(dict.fromkeys(otros, primero))
+    exhaustividad = sum(grupo.get(a, a) == grupo.get(b, b) for a, b in reales) / len(reales) if reales else 1.0
+    print(f'\nreporte: {len(encontrados):,} pares, {len(reales):,} reales; precisión {precision:.1%}, '
+          f'exhaustividad {exhaustividad:.1%} ({len(encontrados & reales) / len(reales):.1%} reportados directamente)')
+    print(f'comprobación de un evento nuevo (ms): p50 {percentil(latencias_decima, 50):.3f} / '
+          f'p99 {percentil(latencias_decima, 99):.3f} con {decima:,} eventos, '
+          f'p50 {percentil(latencias_total, 50):.3f} / p99 {percentil(latencias_total, 99):.3f} con {n_eventos:,}; '
+          f'encontró la reaparición en {encontradas_decima / CONSULTAS:.1%} y {encontradas_total / CONSULTAS:.1%}')
+    print(f'crear_evento: {tiempos[None]:.2f} ms sin comprobación, {tiempos[duplicados.UMBRAL_CREACION]:.2f} ms con ella; '
+          f'avisó de {rechazados} de {CREACIONES} eventos repetidos')
+
+    assert precision >= PRECISION_MINIMA, f'precisión {precision:.1%}'
+    assert exhaustividad >= EXHAUSTIVIDAD_MINIMA, f'exhaustividad {exhaustividad:.1%}'
+    crecimiento = percentil(latencias_total, 50) / percentil(latencias_decima, 50)
+    assert crecimiento <= CRECIMIENTO_MAXIMO, \
+        f'con 10x eventos la comprobación tarda {crecimiento:.1f}x más'
+    assert rechazados == CREACIONES, f'crear_evento creó sin avisar {CREACIONES - rechazados} eventos repetidos'
+    print(f'OK: precisión {precision:.1%} y exhaustividad {exhaustividad:.1%}; con 10x eventos la comprobación '
+          f'tarda {crecimiento:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
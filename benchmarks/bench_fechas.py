@@ -0,0 +1,119 @@
+"""Filtros por rango de fechas, varias categorías y franja horaria sobre eventos.dia.
+
+Verifica con EXPLAIN QUERY PLAN que los rangos recorran idx_eventos_dia o
+idx_eventos_categoria_dia (búsqueda por el entero, sin ordenar aparte) y compara
+su latencia con la misma consulta sobre el texto de la fecha sin índice. Falla
+(AssertionError) si un plan no usa el índice esperado o si algún resultado
+difiere de filtrar en Python.
+
+Uso: python -m benchmarks.bench_fechas [n_eventos]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from models.fechas import fin_de_semana, proximos_dias
+from models.sistema import ORDENES_EVENTOS, SELECT_EVENTOS, Sistema
+from benchmarks.datos import poblar
+
+REPETICIONES = 20
+
+
+def consultas() -> dict:
+    """nombre -> filtros de explorar_eventos e índices que puede usar su plan"""
+    hoy = date.today()
+    semana = proximos_dias(7)
+    return {
+        'próximos 7 días': (dict(desde=semana[0], hasta=semana[1]), ['idx_eventos_dia']),
+        'fin de semana': (dict(desde=fin_de_semana()[0], hasta=fin_de_semana()[1]), ['idx_eventos_dia']),
+        'próximos 30 días, Cine': (dict(categoria='Cine', desde=hoy, hasta=hoy + timedelta(days=29)),
+                                   ['idx_eventos_categoria_dia']),
+        # Con IN el planificador elige entre recorrer el rango en orden o una búsqueda por categoría y ordenar
+        'próximo mes, 3 categorías': (dict(categoria=['Cine', 'Teatro', 'Concierto'], desde=hoy,
+                                           hasta=hoy + timedelta(days=29)),
+                                      ['idx_eventos_dia', 'idx_eventos_categoria_dia']),
+        'próximos 7 días desde las 18:00': (dict(desde=semana[0], hasta=semana[1], hora_desde='18:00'),
+                                            ['idx_eventos_dia']),
+    }
+
+
+def texto_sin_indice(filtros: dict) -> tuple:
+    """La misma consulta comparando el texto de la fecha, recorriendo la tabla (NOT INDEXED)"""
+    condiciones, params = ['1=1'], []
+    categorias = filtros.get('categoria')
+    if categorias:
+        categorias = [categorias] if isinstance(categorias, str) else categorias
+        condiciones.append('categoria IN ({})'.format(', '.join(['?'] * len(categorias))))
+        params.extend(categorias)
+    condiciones.append('fecha >= ? AND fecha <= ?')
+    params.extend((filtros['desde'].isoformat(), filtros['hasta'].isoformat()))
+    if filtros.get('hora_desde'):
+        condiciones.append('hora >= ?')
+        params.append(filtros['hora_desde'])
+    return ('SELECT * FROM eventos NOT INDEXED WHERE {} ORDER BY fecha, id'.format(' AND '.join(condiciones)),
+            params)
+
+
+def esperado(filas: list, filtros: dict) -> list:
+    categorias = filtros.get('categoria')
+    categorias = {categorias} if isinstance(categorias, str) else set(categorias or ())
+    desde, hasta = filtros['desde'].isoformat(), filtros['hasta'].isoformat()
+    return [evento_id for evento_id, fecha, categoria, hora in filas
+            if desde <= fecha <= hasta and (not categorias or categoria in categorias)
+            and (not filtros.get('hora_desde') or (hora is not None and hora >= filtros['hora_desde']))]
+
+
+def medir(funcion) -> float:
+    funcion()
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        funcion()
+    return (time.perf_counter() - inicio) / REPETICIONES * 1000
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'))
+        sistema.cache_eventos.capacidad = 0  # se miden las consultas, no la caché
+        with sistema.pool.conexion() as conn:
+            poblar(conn, n_eventos)
+            # Hora en cuartos de hora para la franja horaria; un décimo de los eventos sin hora
+            conn.execute("UPDATE eventos SET hora = printf('%02d:%02d', id % 24, id % 4 * 15) WHERE id % 10 <> 0")
+            conn.commit()
+            conn.execute('ANALYZE')
+            filas = conn.execute('SELECT id, fecha, categoria, hora FROM eventos ORDER BY dia, id').fetchall()
+
+            print(f'{"consulta":<34}{"texto (ms)":>12}{"dia (ms)":>12}{"mejora":>10}{"eventos":>10}')
+            for nombre, (filtros, indices) in consultas().items():
+                where, params = sistema._filtros_eventos(**filtros)
+                orden = ', '.join(f'e.{columna}' for columna in ORDENES_EVENTOS['fecha'])
+                plan = ' | '.join(fila[3] for fila in conn.execute(
+                    f'EXPLAIN QUERY PLAN {SELECT_EVENTOS}{where} ORDER BY {orden}', params))
+                assert any(f'USING INDEX {indice} ' in plan for indice in indices) and 'dia>? AND dia<?' in plan, \
+                    f'{nombre}: el rango no usa {" ni ".join(indices)}: {plan}'
+                if isinstance(filtros.get('categoria'), str) or not filtros.get('categoria'):
+                    assert 'TEMP B-TREE' not in plan, f'{nombre}: ordena aparte en lugar de seguir el índice: {plan}'
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    eventos = sistema.explorar_eventos(**filtros)
+                assert [evento.id for evento in eventos] == esperado(filas, filtros), \
+                    f'{nombre}: resultado distinto del filtro en Python'
+
+                sql, params_texto = texto_sin_indice(filtros)
+                texto = medir(lambda: conn.execute(sql, params_texto).fetchall())
+                # Mismas columnas y sin construir Evento, para comparar solo el acceso a las filas
+                dia = medir(lambda: conn.execute(f'SELECT * FROM eventos e{where} ORDER BY {orden}', params).fetchall())
+                print(f'{nombre:<34}{texto:>12.2f}{dia:>12.2f}{texto / dia:>9.1f}x{len(eventos):>10}')
+                print(f'    plan: {plan}')
+        sistema.cerrar()
+
+    print('OK: los rangos usan el índice sobre el entero y coinciden con el filtro en Python')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Búsqueda de eventos cercanos con el índice R*Tree frente a recorrer la tabla.
+
+Consultas por radio (con y sin filtro de categoría) y por rectángulo sobre
+eventos dispersos alrededor de diez ciudades. Falla (AssertionError) si el
+resultado difiere del cálculo por fuerza bruta, si algún evento queda fuera del
+radio (distancia haversine) o si la mediana de una búsqueda por radio pasa de
+MAX_MEDIANA_MS. Al final mide la geocodificación sin conexión de eventos sin
+coordenadas.
+
+Uso: python -m benchmarks.bench_geo [n_eventos] [consultas]
+"""
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from models.geo import LUGARES, caja_radio, distancia_km
+from models.sistema import Sistema
+from benchmarks.datos import CIUDADES, poblar
+
+RADIOS_KM = [1, 2, 5]
+LIMITE = 20
+MAX_MEDIANA_MS = 20
+CONSULTAS_RECORRIDO = 5
+CENTROS = {nombre: (latitud, longitud) for nombre, latitud, longitud in LUGARES}
+
+
+def fuerza_bruta(puntos, latitud, longitud, radio_km, categoria=None) -> list:
+    """Top LIMITE por la misma métrica equirectangular de Sistema, recorriendo todos los puntos"""
+    escala = math.cos(math.radians(latitud)) ** 2
+    maximo = (radio_km / 111.32) ** 2
+    candidatos = []
+    for evento_id, lat, lon, cat in puntos:
+        if categoria and cat != categoria:
+            continue
+        d = (lat - latitud) ** 2 + (lon - longitud) ** 2 * escala
+        if d <= maximo:
+            candidatos.append((d, evento_id))
+    candidatos.sort()
+    return [evento_id for _, evento_id in candidatos[:LIMITE]]
+
+
+def percentiles(valores: list) -> str:
+    cuantiles = statistics.quantiles(valores, n=100)
+    return f'p50={cuantiles[49]:7.2f} ms  p99={cuantiles[98]:7.2f} ms'
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    consultas = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    rnd = random.Random(5)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'))
+        inicio = time.perf_counter()
+        with sistema.pool.conexion() as conn:
+            poblar(conn, n_eventos, coordenadas=True)
+            puntos = conn.execute('SELECT id, latitud, longitud, categoria FROM eventos').fetchall()
+        print(f'{n_eventos:,} eventos con coordenadas en {time.perf_counter() - inicio:.1f} s')
+
+        def centro():
+            latitud, longitud = CENTROS[rnd.choice(CIUDADES).lower()]
+            return rnd.gauss(latitud, 0.05), rnd.gauss(longitud, 0.05)
+
+        with sistema.pool.conexion() as conn:
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT e.id FROM eventos_geo g CROSS JOIN eventos e ON e.id = g.id "
+                                "WHERE e.categoria = 'Cine' AND g.max_lat >= 1 AND g.min_lat <= 2 "
+                                "AND g.max_lon >= 1 AND g.min_lon <= 2").fetchall()
+        print('plan:', '; '.join(fila[3] for fila in plan))
+
+        for radio in RADIOS_KM:
+            for categoria in (None, 'Concierto'):
+                latencias = []
+                for _ in range(consultas):
+                    latitud, longitud = centro()
+                    t = time.perf_counter()
+                    eventos = sistema.eventos_cercanos(latitud, longitud, radio, categoria=categoria, limite=LIMITE)
+                    latencias.append((time.perf_counter() - t) * 1000)
+                    if len(latencias) <= 10:
+                        esperado = fuerza_bruta(puntos, latitud, longitud, radio, categoria)
+                        assert [e.id for e in eventos] == esperado, 'resultado distinto de la fuerza bruta'
+                    for evento in eventos:
+                        assert distancia_km(latitud, longitud, evento.latitud, evento.longitud) <= radio * 1.005, \
+                            'evento fuera del radio'
+                filtro = f'categoría={categoria}' if categoria else 'sin filtro'
+                print(f'  radio {radio} km, {filtro:<20} {percentiles(latencias)}')
+                assert statistics.median(latencias) <= MAX_MEDIANA_MS, f'radio {radio} km demasiado lento'
+
+        latencias = []
+        for _ in range(consultas):
+            lat_min, lon_min, lat_max, lon_max = caja_radio(*centro(), 3)
+            t = time.perf_counter()
+            sistema.eventos_en_area(lat_min, lon_min, lat_max, lon_max, limite=LIMITE)
+            latencias.append((time.perf_counter() - t) * 1000)
+        print(f'  rectángulo de 6 x 6 km{"":11} {percentiles(latencias)}')
+
+        # Referencia: misma consulta recorriendo toda la tabla, sin el índice espacial
+        latitud, longitud = centro()
+        escala = math.cos(math.radians(latitud)) ** 2
+        distancia = '((latitud - ?) * (latitud - ?) + (longitud - ?) * (longitud - ?) * ?)'
+        params = (latitud, latitud, longitud, longitud, escala)
+        with sistema.pool.conexion() as conn:
+            t = time.perf_counter()
+            for _ in range(CONSULTAS_RECORRIDO):
+                conn.execute(f'SELECT id FROM eventos WHERE latitud IS NOT NULL AND {distancia} <= ? '
+                             f'ORDER BY {distancia} LIMIT ?', (*params, (2 / 111.32) ** 2, *params, LIMITE)).fetchall()
+            recorrido = (time.perf_counter() - t) / CONSULTAS_RECORRIDO * 1000
+        t = time.perf_counter()
+        for _ in range(CONSULTAS_RECORRIDO):
+            sistema.eventos_cercanos(latitud, longitud, 2, limite=LIMITE)
+        indice = (time.perf_counter() - t) / CONSULTAS_RECORRIDO * 1000
+        print(f'radio 2 km: recorrido completo {recorrido:.1f} ms, R*Tree {indice:.2f} ms ({recorrido / indice:.0f}x)')
+
+        # Geocodificación de eventos sin coordenadas (p. ej. anteriores a la migración)
+        with sistema.pool.conexion() as conn:
+            conn.execute('UPDATE eventos SET latitud = NULL, longitud = NULL WHERE id % 10 = 0')
+            conn.commit()
+        t = time.perf_counter()
+        ubicados = sistema.geocodificar_eventos()
+        geocodificacion = time.perf_counter() - t
+        print(f'geocodificación de {n_eventos // 10:,} eventos sin coordenadas: {geocodificacion:.1f} s')
+        assert ubicados == n_eventos // 10, f'geocodificados {ubicados} de {n_eventos // 10}'
+        sistema.cerrar()
+
+    print('OK: resultados iguales a la fuerza bruta y dentro del radio')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Filas por segundo de la importación masiva frente a crear_evento fila por fila.
+
+Uso: python -m benchmarks.bench_importacion [n_filas]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from models.sistema import Sistema
+from models.usuario import Usuario
+from benchmarks.datos import CATEGORIAS, CIUDADES, LUGARES
+
+FILAS_POR_FILA = 2000
+
+
+def generar_filas(n: int, semilla: int = 7) -> list:
+    """Filas de un feed: ~5% repetidas y ~1% con fecha inválida"""
+    rnd = random.Random(semilla)
+    hoy = date.today()
+    filas = []
+    for i in range(n):
+        if filas and rnd.random() < 0.05:
+            filas.append(dict(rnd.choice(filas)))
+            continue
+        fecha = (hoy + timedelta(days=rnd.randint(0, 365))).isoformat()
+        if rnd.random() < 0.01:
+            fecha = fecha.replace('-', '/')
+        filas.append({
+            'nombre': f'Evento {i}',
+            'ubicacion': f'{rnd.choice(LUGARES)} {rnd.choice(CIUDADES)}',
+            'fecha': fecha,
+            'categoria': rnd.choice(CATEGORIAS),
+            'capacidad': str(rnd.randint(10, 5000)),
+            'descripcion': f'Descripción del evento {i}',
+        })
+    return filas
+
+
+def main():
+    n_filas = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    filas = generar_filas(n_filas)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'fila.db'))
+        sistema.usuario_actual = Usuario(1, 'Organizador', 'org@example.com', '')
+        muestra = filas[:FILAS_POR_FILA]
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for fila in muestra:
+                sistema.crear_evento(fila['nombre'], fila['ubicacion'], fila['fecha'], fila['categoria'],
+                                     int(fila['capacidad']), fila['descripcion'])
+        por_fila = len(muestra) / (time.perf_counter() - inicio)
+        sistema.cerrar()
+
+        sistema = Sistema(os.path.join(directorio, 'lotes.db'))
+        inicio = time.perf_counter()
+        resumen = sistema.importar_eventos(filas, organizador_id=1)
+        masiva = resumen.leidas / (time.perf_counter() - inicio)
+        sistema.cerrar()
+
+    print(resumen)
+    print(f'\ncrear_evento ({len(muestra)} filas): {por_fila:>12,.0f} filas/s')
+    print(f'importar_eventos ({n_filas} filas): {masiva:>12,.0f} filas/s ({masiva / por_fila:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Compara el plan y la latencia de las consultas de Sistema con y sin índices.
+
+Uso: python -m benchmarks.bench_indices [n_eventos]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+from models.fechas import dia_epoca
+from models.recordatorios import PENDIENTES_EVENTO
+from models.sistema import Sistema
+from models.usuario import Usuario
+from benchmarks.datos import poblar
+
+REPETICIONES = 20
+
+
+def consultas(sistema: Sistema, conn):
+    hoy = date.today().isoformat()
+    return {
+        'explorar categoria+fecha': (
+            'SELECT * FROM eventos WHERE 1=1 AND categoria = ? ORDER BY dia, id',
+            ['Concierto'],
+            lambda: sistema.explorar_eventos(categoria='Concierto'),
+        ),
+        'explorar fecha exacta': (
+            'SELECT * FROM eventos WHERE 1=1 AND dia = ? ORDER BY dia, id',
+            [dia_epoca(hoy)],
+            lambda: sistema.explorar_eventos(fecha=hoy),
+        ),
+        'recordatorios (favoritos de un evento)': (
+            PENDIENTES_EVENTO,
+            [1, 0, 1000],
+            lambda: conn.execute(PENDIENTES_EVENTO, (1, 0, 1000)).fetchall(),
+        ),
+        'recomendaciones': (
+            # El top sale de MotorRecomendaciones; la consulta solo trae los eventos
+            'SELECT e.* FROM eventos e WHERE e.id IN (?, ?, ?, ?, ?)',
+            [1, 2, 3, 4, 5],
+            sistema.obtener_recomendaciones,
+        ),
+        'usuarios que guardaron un evento': (
+            'SELECT usuario_id FROM favoritos WHERE evento_id = ?',
+            [1],
+            lambda: conn.execute(
+                'SELECT usuario_id FROM favoritos WHERE evento_id = ?', (1,)).fetchall(),
+        ),
+    }
+
+
+def medir(sistema: Sistema, conn, mostrar_plan: bool) -> dict:
+    resultados = {}
+    for nombre, (sql, params, funcion) in consultas(sistema, conn).items():
+        if mostrar_plan:
+            print(f'\n{nombre}:')
+            for fila in conn.execute('EXPLAIN QUERY PLAN ' + sql, params):
+                print(f'    {fila[3]}')
+        with contextlib.redirect_stdout(io.StringIO()):
+            funcion()
+            inicio = time.perf_counter()
+            for _ in range(REPETICIONES):
+                funcion()
+            resultados[nombre] = (time.perf_counter() - inicio) / REPETICIONES * 1000
+    return resultados
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'))
+        sistema.cache_eventos.capacidad = 0  # se miden las consultas, no la caché
+        sistema.usuario_actual = Usuario(1, 'Usuario 1', 'usuario1@example.com', '')
+        sistema.usuario_actual.categorias_preferidas = {'Concierto', 'Teatro'}
+        with sistema.pool.conexion() as conn:
+            poblar(conn, n_eventos, n_favoritos=n_eventos)
+            conn.execute('ANALYZE')
+
+            print(f'=== Con índices ({n_eventos} eventos) ===')
+            con_indices = medir(sistema, conn, mostrar_plan=True)
+
+            indices = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'").fetchall()
+            for (nombre,) in indices:
+                conn.execute(f'DROP INDEX {nombre}')
+            conn.execute('ANALYZE')
+
+            print('\n=== Sin índices ===')
+            sin_indices = medir(sistema, conn, mostrar_plan=True)
+        sistema.cerrar()
+
+    print(f'\n{"consulta":<36}{"sin (ms)":>12}{"con (ms)":>12}{"mejora":>10}')
+    for nombre in con_indices:
+        antes, despues = sin_indices[nombre], con_indices[nombre]
+        print(f'{nombre:<36}{antes:>12.3f}{despues:>12.3f}{antes / despues:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Barridos por lotes de todos los usuarios repartidos entre procesos (models/lotes.py).
+
+Ejecuta el barrido de resúmenes diarios (recomendaciones de MotorRecomendaciones
+y favoritos próximos de cada usuario) con 1, 2, 4... procesos y reporta
+usuarios/s, la aceleración y la eficiencia frente a un proceso, además del
+costo fijo de cada proceso (armar su índice de recomendaciones). Verifica que
+la salida combinada sea idéntica con cualquier número de procesos.
+
+Luego lanza el barrido en un proceso aparte, lo mata (SIGKILL, con sus procesos
+de trabajo) cuando ya guardó puntos de control y lo reanuda: la salida tiene
+que coincidir con la de un barrido sin cortes. Por último compara el barrido de
+recordatorios con el planificador de un solo proceso.
+
+Falla (AssertionError) si alguna salida difiere o, con al menos 2 núcleos, si
+la eficiencia con min(núcleos, 4) procesos (potencia de 2) queda bajo EFICIENCIA_MINIMA.
+
+Uso: python -m benchmarks.bench_lotes [n_usuarios] [procesos_max]
+"""
+import contextlib
+import io
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from models import lotes
+from models.sistema import Sistema
+from benchmarks.datos import poblar
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+N_EVENTOS = 20_000
+FAVORITOS_POR_USUARIO = 10
+EFICIENCIA_MINIMA = 0.6
+BLOQUE_CORTE = 100
+
+BARRIDO = '''
+import sys
+from models import lotes
+lotes.barrer(sys.argv[1], 'resumenes', sys.argv[2], procesos=2, bloque={bloque})
+'''
+
+
+def contenido(ruta: str) -> bytes:
+    with open(ruta, 'rb') as archivo:
+        return archivo.read()
+
+
+def costo_fijo(ruta_db: str) -> float:
+    """Segundos que tarda un proceso en preparar la tarea de resúmenes"""
+    conn = lotes.conectar_lectura(ruta_db)
+    inicio = time.perf_counter()
+    lotes.Resumenes(conn, {})
+    segundos = time.perf_counter() - inicio
+    conn.close()
+    return segundos
+
+
+def cortar_y_reanudar(ruta_db: str, directorio: str) -> lotes.ResumenBarrido:
+    """Mata el barrido cuando hay puntos de control a medio tramo y lo reanuda aquí"""
+    proceso = subprocess.Popen([sys.executable, '-c', BARRIDO.format(bloque=BLOQUE_CORTE), ruta_db, directorio],
+                               cwd=RAIZ, start_new_session=True)
+    try:
+        while proceso.poll() is None:
+            puntos = [nombre for nombre in os.listdir(directorio)
+                      if nombre.startswith('parte-') and nombre.endswith('.json')]
+            if len(puntos) >= 2:
+                break
+            time.sleep(0.05)
+    finally:
+        # La sesión propia agrupa al barrido con sus procesos de trabajo
+        os.killpg(proceso.pid, signal.SIGKILL)
+        proceso.wait()
+    assert proceso.returncode == -signal.SIGKILL, 'el barrido terminó antes de poder cortarlo'
+    return lotes.barrer(ruta_db, 'resumenes', directorio, procesos=2, bloque=BLOQUE_CORTE)
+
+
+def main():
+    n_usuarios = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    procesos_max = int(sys.argv[2]) if len(sys.argv) > 2 else max(4, os.cpu_count() or 1)
+    nucleos = os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'bench.db')
+        sistema = Sistema(ruta)
+        with sistema.pool.conexion() as conn:
+            poblar(conn, N_EVENTOS, n_usuarios=n_usuarios, n_favoritos=n_usuarios * FAVORITOS_POR_USUARIO, dias=60)
+            conn.execute('ANALYZE')
+
+        print(f'{n_usuarios:,} usuarios, {N_EVENTOS:,} eventos, {nucleos} núcleo(s); '
+              f'costo fijo por proceso: {costo_fijo(ruta):.2f} s')
+        print(f'{"procesos":>9}{"tramos":>8}{"segundos":>10}{"usuarios/s":>12}{"aceleración":>13}{"eficiencia":>12}')
+        referencia, base, resultados = None, None, {}
+        procesos = 1
+        while procesos <= procesos_max:
+            resumen = lotes.barrer(ruta, 'resumenes', os.path.join(directorio, f'resumenes-{procesos}'),
+                                   procesos=procesos)
+            salida = contenido(resumen.salida)
+            referencia = referencia if referencia is not None else salida
+            assert salida == referencia, f'la salida con {procesos} procesos difiere de la de 1 proceso'
+            assert resumen.usuarios == n_usuarios, f'se recorrieron {resumen.usuarios} de {n_usuarios} usuarios'
+            base = base or resumen.segundos
+            resultados[procesos] = base / resumen.segundos
+            print(f'{procesos:>9}{resumen.tramos:>8}{resumen.segundos:>10.2f}{n_usuarios / resumen.segundos:>12,.0f}'
+                  f'{resultados[procesos]:>12.2f}x{resultados[procesos] / procesos:>12.0%}')
+            procesos *= 2
+
+        cortado = os.path.join(directorio, 'cortado')
+        os.makedirs(cortado)
+        resumen = cortar_y_reanudar(ruta, cortado)
+        assert resumen.reanudados, 'el barrido reanudado no partió de ningún punto de control'
+        assert contenido(resumen.salida) == referencia, 'la salida del barrido reanudado difiere'
+        print(f'\nbarrido cortado con SIGKILL y reanudado: {resumen.reanudados} de {resumen.tramos} tramos '
+              f'siguieron desde su punto de control; salida idéntica')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            enviadas = sistema.enviar_recordatorios_lote(os.path.join(directorio, 'recordatorios'))
+            segundos = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            repetidas = sistema.recordatorios.ejecutar_pendientes(presupuesto=float('inf'))
+            planificador = time.perf_counter() - inicio
+        sistema.cerrar()
+        assert enviadas and not repetidas, f'el planificador encontró {repetidas} recordatorios que el barrido no envió'
+        print(f'recordatorios: {enviadas:,} enviados por el barrido en {segundos:.2f} s; el planificador de un '
+              f'proceso no encontró pendientes ({planificador:.2f} s)')
+
+    objetivo = max((p for p in resultados if p <= min(nucleos, 4)), default=1)
+    if objetivo < 2:
+        print(f'OK: salidas idénticas y reanudación correcta (con {nucleos} núcleo no se puede medir la escala)')
+        return
+    eficiencia = resultados[objetivo] / objetivo
+    assert eficiencia >= EFICIENCIA_MINIMA, f'con {objetivo} procesos la eficiencia es {eficiencia:.0%}'
+    print(f'OK: con {objetivo} procesos el barrido es {eficiencia * objetivo:.1f}x más rápido '
+          f'({eficiencia:.0%} de eficiencia) y las salidas coinciden')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Costo de medir cada consulta y acción (models/metricas.py).
+
+Compara el mismo trabajo con las métricas activas y apagadas: sentencias sueltas
+sobre una conexión del pool (búsqueda por clave, página de 20 filas, INSERT) y
+operaciones de Sistema (evento por id, página de exploración, favoritos).
+Las métricas están activas por defecto: este es el costo de dejarlas así.
+Verifica que los contadores coincidan con el trabajo hecho, que una consulta
+lenta quede registrada con su plan y que el volcado Prometheus sea coherente.
+Falla (AssertionError) si el costo por sentencia supera MAXIMO_US o el de una
+operación de Sistema supera MAXIMO_US por sentencia más MAXIMO_ACCION_US (con
+un margen RUIDO para la variación entre mediciones). El costo es la mediana de
+las diferencias entre rondas alternadas, no la diferencia de dos mínimos, para
+que una ronda con ruido no decida el resultado.
+
+Uso: python -m benchmarks.bench_metricas [n_eventos] [repeticiones]
+"""
+import contextlib
+import functools
+import io
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+from models.fechas import dia_epoca
+from models.metricas import Metricas
+from models.sesion import Sesion
+from models.sistema import SELECT_EVENTOS, Sistema
+from models.usuario import Usuario
+from benchmarks.datos import poblar
+
+# Costo tolerado por sentencia medida y por acción (µs): menos que la propia sentencia más simple
+MAXIMO_US = 3.0
+MAXIMO_ACCION_US = 2.0
+# Variación entre mediciones del mismo trabajo, tolerada además del costo
+RUIDO = 0.05
+RONDAS = 41
+
+
+def medir(funciones: dict, repeticiones: int) -> dict:
+    """µs por repetición de 'apagadas' y 'activas' (medianas) y 'costo', la mediana de la
+    diferencia en cada ronda; las rondas alternan entre ambas para que el ruido de la
+    máquina las afecte por igual"""
+    tiempos = {nombre: [] for nombre in funciones}
+    for funcion in funciones.values():
+        funcion()
+    for _ in range(RONDAS):
+        for nombre, funcion in funciones.items():
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                funcion()
+            tiempos[nombre].append((time.perf_counter() - inicio) / repeticiones * 1e6)
+    resultado = {nombre: statistics.median(valores) for nombre, valores in tiempos.items()}
+    resultado['costo'] = statistics.median(b - a for a, b in zip(tiempos['apagadas'], tiempos['activas']))
+    return resultado
+
+
+def sentencias(conn, n_eventos: int) -> dict:
+    rnd = random.Random(3)
+    hoy = dia_epoca(date.today())
+    return {
+        'SELECT por clave (fetchone)': lambda: conn.execute(
+            'SELECT nombre, fecha FROM eventos WHERE id = ?', (rnd.randint(1, n_eventos),)).fetchone(),
+        'página de 20 filas (fetchall)': lambda: conn.execute(
+            SELECT_EVENTOS + ' WHERE e.dia >= ? ORDER BY e.dia, e.id LIMIT 20', (rnd.randint(hoy, hoy + 300),)).fetchall(),
+        'INSERT OR IGNORE y commit': lambda: (conn.execute(
+            'INSERT OR IGNORE INTO favoritos (usuario_id, evento_id) VALUES (?, ?)',
+            (rnd.randint(1, 1000), rnd.randint(1, n_eventos))), conn.commit()),
+    }
+
+
+# Sentencias que ejecuta cada operación (agregar_favorito: INSERT y commit)
+CONSULTAS = {'obtener_evento_por_id': 1, 'explorar_eventos_pagina': 1, 'obtener_favoritos': 1, 'agregar_favorito': 2}
+
+
+def operaciones(n_eventos: int) -> dict:
+    rnd = random.Random(5)
+    sesion = Sesion()
+    sesion.usuario = Usuario(1, '', '', '')
+    return {
+        'obtener_evento_por_id': lambda s: s.obtener_evento_por_id(rnd.randint(1, n_eventos)),
+        'explorar_eventos_pagina': lambda s: s.explorar_eventos_pagina(categoria='Cine', orden='nombre'),
+        'obtener_favoritos': lambda s: s.obtener_favoritos(sesion),
+        'agregar_favorito': lambda s: s.agregar_favorito(rnd.randint(1, n_eventos), sesion),
+    }
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    with tempfile.TemporaryDirectory() as directorio:
+        # Una copia de la base de datos para cada uno: las escrituras de uno no cambian el trabajo del otro
+        base = Sistema(os.path.join(directorio, 'base.db'))
+        with base.pool.conexion() as conn:
+            poblar(conn, n_eventos, n_favoritos=n_eventos)
+            conn.execute('ANALYZE')
+        base.cerrar()
+        for copia in ('apagadas.db', 'activas.db'):
+            shutil.copy(os.path.join(directorio, 'base.db'), os.path.join(directorio, copia))
+        metricas = Metricas()
+        sistemas = {'apagadas': Sistema(os.path.join(directorio, 'apagadas.db'), metricas=Metricas(activa=False)),
+                    'activas': Sistema(os.path.join(directorio, 'activas.db'), metricas=metricas)}
+        for sistema in sistemas.values():
+            sistema.cache_eventos.capacidad = 0  # se miden las consultas, no la caché
+
+        print(f'{"sentencia":<34}{"apagadas (µs)":>15}{"activas (µs)":>14}{"costo (µs)":>12}')
+        with sistemas['apagadas'].pool.conexion() as apagada, sistemas['activas'].pool.conexion() as activa:
+            for nombre in sentencias(None, n_eventos):
+                tiempos = medir({'apagadas': sentencias(apagada, n_eventos)[nombre],
+                                 'activas': sentencias(activa, n_eventos)[nombre]}, repeticiones)
+                costo = tiempos['costo']
+                print(f'{nombre:<34}{tiempos["apagadas"]:>15.2f}{tiempos["activas"]:>14.2f}{costo:>12.2f}')
+                assert costo < MAXIMO_US + RUIDO * tiempos['apagadas'], f'{nombre}: medir cuesta {costo:.1f} µs'
+
+        print(f'\n{"operación de Sistema":<34}{"apagadas (µs)":>15}{"activas (µs)":>14}{"costo (µs)":>12}{"":>9}')
+        with contextlib.redirect_stdout(io.StringIO()):
+            for nombre in operaciones(n_eventos):
+                funciones = {}
+                for estado, sistema in sistemas.items():
+                    operacion = operaciones(n_eventos)[nombre]
+                    funciones[estado] = functools.partial(operacion, sistema)
+                tiempos = medir(funciones, repeticiones // 4)
+                costo = tiempos['costo']
+                print(f'{nombre:<34}{tiempos["apagadas"]:>15.2f}{tiempos["activas"]:>14.2f}{costo:>12.2f}'
+                      f'{costo / tiempos["apagadas"]:>+9.1%}', file=sys.__stdout__)
+                assert costo < MAXIMO_US * CONSULTAS[nombre] + MAXIMO_ACCION_US + RUIDO * tiempos['apagadas'], \
+                    f'{nombre}: medir cuesta {costo:.1f} µs'
+
+        # Los contadores reflejan el trabajo hecho
+        metricas.reiniciar()
+        activas = sistemas['activas']
+        for evento_id in range(1, 101):
+            activas.obtener_evento_por_id(evento_id)
+        instantanea = activas.estadisticas_consultas()
+        accion = instantanea['acciones']['obtener_evento_por_id']
+        assert accion['cantidad'] == 100 and accion['consultas'] == 100, f'conteo por acción incorrecto: {accion}'
+        consulta, = instantanea['consultas'].values()
+        assert consulta['cantidad'] == 100 and consulta['filas'] == 100, f'conteo por consulta incorrecto: {consulta}'
+
+        # Una consulta sobre el umbral queda registrada con su plan
+        metricas.umbral_lenta = 0.0
+        activas.explorar_eventos_pagina(ubicacion='Cali')
+        lenta = metricas.lentas[-1]
+        assert lenta['accion'] == 'explorar_eventos_pagina' and lenta['plan'], f'consulta lenta sin plan: {lenta}'
+        print(f'\nconsulta lenta registrada ({lenta["ms"]} ms), plan: {" | ".join(lenta["plan"])}')
+
+        archivo = os.path.join(directorio, 'metricas.prom')
+        metricas.volcar_prometheus(archivo)
+        with open(archivo, encoding='utf-8') as texto:
+            prometheus = texto.read()
+        conteos = re.findall(r'^quehay_accion_segundos_count\{accion="(\w+)"\} (\d+)$', prometheus, re.MULTILINE)
+        assert dict(conteos) == {nombre: str(a['cantidad'])
+                                 for nombre, a in metricas.instantanea()['acciones'].items()}, 'volcado incoherente'
+        print(f'volcado Prometheus: {prometheus.count(chr(10))} líneas')
+        for sistema in sistemas.values():
+            sistema.cerrar()
+
+    print('OK: el costo de medir es bajo y los contadores coinciden con el trabajo hecho')
+
+
+if __name__ == '__main__':
+    main()
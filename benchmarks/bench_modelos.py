@@ -0,0 +1,94 @@
+"""Memoria y velocidad de materializar eventos: Evento con __slots__ y row_factory
+frente a la representación anterior (__dict__ por instancia y copia manual de tuplas).
+
+Uso: python -m benchmarks.bench_modelos [n_eventos]
+"""
+import sqlite3
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from models.evento import Evento
+from models.sistema import Sistema, SELECT_EVENTOS
+from benchmarks.datos import poblar
+
+
+class EventoAnterior:
+    """Representación anterior: atributos en __dict__ y fecha como texto"""
+
+    def __init__(self, id, nombre, ubicacion, fecha, categoria, capacidad,
+                 descripcion, organizador_id, organizador_nombre=None):
+        self.id = id
+        self.nombre = nombre
+        self.ubicacion = ubicacion
+        self.fecha = fecha
+        self.categoria = categoria
+        self.capacidad = capacidad
+        self.descripcion = descripcion
+        self.organizador_id = organizador_id
+        self.organizador_nombre = organizador_nombre
+
+    def es_proximo(self) -> bool:
+        try:
+            fecha_evento = datetime.strptime(self.fecha, '%Y-%m-%d').date()
+            return 0 <= (fecha_evento - datetime.now().date()).days <= 3
+        except ValueError:
+            return False
+
+
+def cargar_anterior(conn: sqlite3.Connection) -> list:
+    cursor = conn.cursor()
+    cursor.execute(SELECT_EVENTOS)
+    return [
+        EventoAnterior(
+            id=row[0],
+            nombre=row[1],
+            ubicacion=row[2],
+            fecha=row[3],
+            categoria=row[4],
+            capacidad=row[5],
+            descripcion=row[6],
+            organizador_id=row[7],
+            organizador_nombre=row[8]
+        ) for row in cursor.fetchall()
+    ]
+
+
+def cargar_nuevo(conn: sqlite3.Connection) -> list:
+    cursor = conn.cursor()
+    cursor.row_factory = Evento.desde_fila
+    cursor.execute(SELECT_EVENTOS)
+    return cursor.fetchall()
+
+
+def medir(nombre: str, cargar, conn: sqlite3.Connection):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    eventos = cargar(conn)
+    carga = time.perf_counter() - inicio
+    memoria = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+
+    inicio = time.perf_counter()
+    proximos = sum(1 for evento in eventos if evento.es_proximo())
+    filtro = time.perf_counter() - inicio
+
+    print(f'{nombre:<12}{len(eventos) / carga:>14,.0f}{memoria:>12.1f}'
+          f'{len(eventos) / filtro:>16,.0f}{proximos:>10}')
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    sistema = Sistema(':memory:')
+    with sistema.pool.conexion() as conn:
+        poblar(conn, n_eventos)
+
+        print(f'{n_eventos} eventos')
+        print(f'{"modelo":<12}{"eventos/s":>14}{"MiB":>12}{"es_proximo/s":>16}{"próximos":>10}')
+        medir('anterior', cargar_anterior, conn)
+        medir('slots', cargar_nuevo, conn)
+
+
+if __name__ == '__main__':
+    main()
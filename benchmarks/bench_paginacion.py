@@ -0,0 +1,79 @@
+"""Memoria y latencia de explorar_eventos frente al iterador por lotes y la paginación por clave.
+
+Uso: python -m benchmarks.bench_paginacion [n_eventos]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from models.sistema import Sistema
+from benchmarks.datos import poblar
+
+TAMANO = 20
+
+
+def pico_memoria(funcion) -> tuple:
+    """Ejecuta la función y devuelve (segundos, pico de memoria en MiB)"""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    funcion()
+    segundos = time.perf_counter() - inicio
+    pico = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return segundos, pico
+
+
+def recorrer_todo(sistema: Sistema):
+    for _ in sistema.iterar_eventos():
+        pass
+
+
+def recorrer_paginas(sistema: Sistema):
+    pagina = sistema.explorar_eventos_pagina(tamano=TAMANO)
+    while pagina:
+        pagina = sistema.explorar_eventos_pagina(
+            tamano=TAMANO, despues=Sistema.clave_pagina(pagina[-1]))
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'))
+        sistema.cache_eventos.capacidad = 0  # se miden las consultas, no la caché
+        with sistema.pool.conexion() as conn:
+            poblar(conn, n_eventos)
+
+            print(f'Recorrido completo de {n_eventos} eventos:')
+            for nombre, funcion in [
+                ('explorar_eventos (fetchall)', lambda: len(sistema.explorar_eventos())),
+                ('iterar_eventos (fetchmany)', lambda: recorrer_todo(sistema)),
+                (f'páginas de {TAMANO} por clave', lambda: recorrer_paginas(sistema)),
+            ]:
+                segundos, pico = pico_memoria(funcion)
+                print(f'  {nombre:<32}{segundos:>8.2f} s{pico:>10.1f} MiB pico')
+
+            # Una página profunda: OFFSET descarta todas las filas anteriores,
+            # la búsqueda por clave salta directo en el índice (dia, id)
+            print(f'\nPágina de {TAMANO} eventos a distintas profundidades (ms):')
+            print(f'  {"posición":>10}{"OFFSET":>12}{"clave":>12}')
+            for posicion in (0, n_eventos // 10, n_eventos // 2, n_eventos - TAMANO):
+                anterior = conn.execute(
+                    'SELECT dia, id FROM eventos ORDER BY dia, id LIMIT 1 OFFSET ?',
+                    (posicion - 1,)).fetchone() if posicion else None
+
+                inicio = time.perf_counter()
+                conn.execute('SELECT * FROM eventos ORDER BY dia, id LIMIT ? OFFSET ?',
+                                     (TAMANO, posicion)).fetchall()
+                offset = (time.perf_counter() - inicio) * 1000
+
+                inicio = time.perf_counter()
+                sistema.explorar_eventos_pagina(tamano=TAMANO, despues=anterior)
+                clave = (time.perf_counter() - inicio) * 1000
+                print(f'  {posicion:>10}{offset:>12.3f}{clave:>12.3f}')
+        sistema.cerrar()
+
+
+if __name__ == '__main__':
+    main()
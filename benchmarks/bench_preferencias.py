@@ -0,0 +1,101 @@
+"""Preferencias normalizadas (usuario_categorias) frente a la columna separada por comas.
+
+Crea una base de datos con el esquema anterior (preferencias en
+usuarios.categorias_preferidas, aplicando solo las migraciones previas a
+PREFERENCIAS), la migra con la primera conexión de Sistema y compara
+"usuarios que prefieren la categoría X" con recorrido + split frente a la
+búsqueda en el índice. Falla (AssertionError) si la migración pierde o
+inventa preferencias.
+
+Uso: python -m benchmarks.bench_preferencias [n_usuarios]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from models.sistema import Sistema, MIGRACIONES, PREFERENCIAS
+from benchmarks.datos import CATEGORIAS
+
+REPETICIONES = 20
+
+
+def por_columna(conn, categoria: str) -> list:
+    return [usuario_id for usuario_id, texto in conn.execute(
+        "SELECT id, categorias_preferidas FROM usuarios WHERE categorias_preferidas <> ''")
+        if categoria in texto.split(',')]
+
+
+def medir(funcion, *args) -> float:
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        funcion(*args)
+    return (time.perf_counter() - inicio) / REPETICIONES * 1000
+
+
+def main():
+    n_usuarios = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rnd = random.Random(3)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'bench.db')
+        # Base de datos nueva en la versión anterior a PREFERENCIAS (Sistema no la abre al construirse)
+        version = MIGRACIONES.index(PREFERENCIAS)
+        conn = sqlite3.connect(ruta)
+        Sistema(ruta)._crear_tablas(conn)
+        for sentencias in MIGRACIONES[:version]:
+            for sentencia in sentencias:
+                conn.execute(sentencia)
+        conn.execute(f'PRAGMA user_version = {version}')
+        with conn:
+            esperado = {}
+            filas = []
+            for i in range(n_usuarios):
+                categorias = rnd.sample(CATEGORIAS, rnd.randint(0, 4))
+                esperado[i + 1] = set(categorias)
+                filas.append((f'Usuario {i}', f'usuario{i}@example.com', 'x' * 64, ','.join(categorias)))
+            conn.executemany('INSERT INTO usuarios (nombre, email, password_hash, categorias_preferidas) '
+                             'VALUES (?, ?, ?, ?)', filas)
+        conn.close()
+
+        # La migración corre al abrir la primera conexión
+        sistema = Sistema(ruta)
+        inicio = time.perf_counter()
+        with sistema.pool.conexion() as conn:
+            migracion = time.perf_counter() - inicio
+
+            migrado = {usuario_id: set() for usuario_id in esperado}
+            for usuario_id, categoria in conn.execute('SELECT usuario_id, categoria FROM usuario_categorias'):
+                migrado[usuario_id].add(categoria)
+            assert migrado == esperado, 'La migración no conserva las preferencias'
+
+            plan = conn.execute('EXPLAIN QUERY PLAN SELECT usuario_id FROM usuario_categorias WHERE categoria = ?',
+                                ('Teatro',)).fetchall()
+            assert sorted(por_columna(conn, 'Teatro')) == sorted(sistema.usuarios_por_categoria('Teatro'))
+            antes = medir(por_columna, conn, 'Teatro')
+            despues = medir(sistema.usuarios_por_categoria, 'Teatro')
+        sistema.cerrar()
+
+    favoritos = list(range(500))
+    conjunto = set(favoritos)
+    consultas = [rnd.randrange(1000) for _ in range(10_000)]
+    inicio = time.perf_counter()
+    sum(evento_id in favoritos for evento_id in consultas)
+    en_lista = (time.perf_counter() - inicio) / len(consultas) * 1e6
+    inicio = time.perf_counter()
+    sum(evento_id in conjunto for evento_id in consultas)
+    en_conjunto = (time.perf_counter() - inicio) / len(consultas) * 1e6
+
+    print(f'{n_usuarios} usuarios; migración desde la versión {version} (backfill y migraciones siguientes) '
+          f'en {migracion:.2f} s')
+    print(f'plan: {plan[0][3]}')
+    print(f'usuarios que prefieren una categoría: recorrido+split {antes:.2f} ms, índice {despues:.2f} ms '
+          f'({antes / despues:.1f}x)')
+    print(f'"evento in favoritos" con 500 favoritos: lista {en_lista:.2f} µs, conjunto {en_conjunto:.3f} µs')
+    print('OK: la migración conserva las preferencias')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Costo de mantener fresco el índice de recomendaciones y latencia de servirlo.
+
+Mide la construcción inicial de MotorRecomendaciones, el costo de cada
+actualización incremental (favorito agregado/eliminado, evento creado) y la
+latencia de obtener_recomendaciones con el top precalculado y recién
+invalidado, frente a la consulta SQL anterior (categoria IN + ORDER BY fecha).
+
+Falla (AssertionError) si tras las actualizaciones incrementales el índice no
+coincide con uno reconstruido desde cero, también después de que un usuario
+pase MAX_FAVORITOS_COOCURRENCIA favoritos y vuelva a bajar de ese límite.
+
+Uso: python -m benchmarks.bench_recomendaciones [n_eventos] [n_usuarios] [n_favoritos]
+"""
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from models.recomendaciones import MAX_FAVORITOS_COOCURRENCIA, MotorRecomendaciones
+from models.sesion import Sesion
+from models.sistema import Sistema
+from models.usuario import Usuario
+from benchmarks.datos import CATEGORIAS, poblar
+
+OPERACIONES = 2000
+CONSULTA_ANTERIOR = '''
+    SELECT e.id FROM eventos e
+    WHERE e.categoria IN ({}) AND e.fecha >= ?
+    AND e.id NOT IN (SELECT evento_id FROM favoritos WHERE usuario_id = ?)
+    ORDER BY e.fecha LIMIT 5
+'''
+
+
+def resumen(valores: list) -> str:
+    percentiles = statistics.quantiles(valores, n=100)
+    return f'p50={percentiles[49] * 1000:8.1f} µs  p99={percentiles[98] * 1000:8.1f} µs'
+
+
+def cronometrar(funcion, *args) -> float:
+    inicio = time.perf_counter()
+    funcion(*args)
+    return (time.perf_counter() - inicio) * 1000
+
+
+def coocurrencia(motor: MotorRecomendaciones) -> dict:
+    return {evento_id: dict(conteos) for evento_id, conteos in motor.coocurrencia.items() if conteos}
+
+
+def main():
+    n_eventos = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    n_usuarios = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    n_favoritos = int(sys.argv[3]) if len(sys.argv) > 3 else 200_000
+    rnd = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'))
+        with sistema.pool.conexion() as conn, contextlib.redirect_stdout(io.StringIO()):
+            poblar(conn, n_eventos, n_usuarios=n_usuarios, n_favoritos=n_favoritos)
+            conn.execute('ANALYZE')
+
+            inicio = time.perf_counter()
+            sistema.recomendador.construir(conn)
+            construccion = time.perf_counter() - inicio
+
+            sesiones = {}
+            for (usuario_id,) in conn.execute('SELECT id FROM usuarios'):
+                sesion = sesiones[usuario_id] = Sesion()
+                sesion.usuario = Usuario(usuario_id, '', '', '')
+            for usuario_id, categoria in conn.execute('SELECT usuario_id, categoria FROM usuario_categorias'):
+                sesiones[usuario_id].usuario.categorias_preferidas.add(categoria)
+            sesiones = list(sesiones.values())
+
+            # Frescura: costo de cada cambio, con la escritura SQL incluida
+            frescura = {'favorito +': [], 'favorito -': [], 'evento nuevo': []}
+            for i in range(OPERACIONES):
+                sesion = rnd.choice(sesiones)
+                evento_id = rnd.randint(1, n_eventos)
+                frescura['favorito +'].append(cronometrar(sistema.agregar_favorito, evento_id, sesion))
+                if i % 2:
+                    frescura['favorito -'].append(cronometrar(sistema.eliminar_favorito, evento_id, sesion))
+                if i % 10 == 0:
+                    fecha = (date.today() + timedelta(days=rnd.randint(0, 365))).isoformat()
+                    frescura['evento nuevo'].append(cronometrar(
+                        sistema.crear_evento, f'Nuevo {i}', 'Parque Medellín', fecha,
+                        rnd.choice(CATEGORIAS), 100, 'Evento del benchmark', sesion))
+
+            # Servir: primero recalculando (top invalidado), luego con el top precalculado
+            muestra = rnd.sample(sesiones, min(2000, len(sesiones)))
+            sistema.recomendador.top.clear()
+            frio = [cronometrar(sistema.obtener_recomendaciones, sesion) for sesion in muestra]
+            caliente = [cronometrar(sistema.obtener_recomendaciones, sesion) for sesion in muestra]
+
+            hoy = date.today().isoformat()
+            anterior = []
+            for sesion in muestra:
+                categorias = list(sesion.usuario.categorias_preferidas)
+                if categorias:
+                    sql = CONSULTA_ANTERIOR.format(','.join('?' * len(categorias)))
+                    anterior.append(cronometrar(
+                        lambda: conn.execute(sql, categorias + [hoy, sesion.usuario.id]).fetchall()))
+
+            # Un usuario pasa el límite de co-ocurrencia (sus pares se quitan) y
+            # vuelve a bajar de él (se suman otra vez)
+            pesado = rnd.choice(muestra)
+            favoritos = sistema.recomendador.favoritos[pesado.usuario.id]
+            eventos = list(range(1, n_eventos + 1))
+            rnd.shuffle(eventos)
+            for evento_id in eventos:
+                if len(favoritos) > MAX_FAVORITOS_COOCURRENCIA:
+                    break
+                sistema.agregar_favorito(evento_id, pesado)
+            if len(favoritos) > MAX_FAVORITOS_COOCURRENCIA:
+                reconstruido = MotorRecomendaciones()
+                reconstruido.construir(conn)
+                assert coocurrencia(sistema.recomendador) == coocurrencia(reconstruido), \
+                    'Co-ocurrencia desactualizada al pasar el límite de favoritos'
+                sistema.eliminar_favorito(next(iter(favoritos)), pesado)
+
+            # El índice mantenido debe coincidir con uno construido desde cero
+            reconstruido = MotorRecomendaciones()
+            reconstruido.construir(conn)
+            assert coocurrencia(sistema.recomendador) == coocurrencia(reconstruido), \
+                'Co-ocurrencia desactualizada'
+            for sesion in muestra:
+                usuario_id = sesion.usuario.id
+                assert sistema.recomendador.recomendar(usuario_id, 20) == reconstruido.recomendar(usuario_id, 20), \
+                    f'Índice desactualizado para el usuario {usuario_id}'
+        sistema.cerrar()
+
+    print(f'{n_eventos} eventos, {n_usuarios} usuarios, {n_favoritos} favoritos')
+    print(f'construcción inicial del índice: {construccion:.2f} s')
+    print('\nfrescura (operación completa, SQL incluido):')
+    for operacion, valores in frescura.items():
+        print(f'  {operacion:<14} {resumen(valores)}')
+    print('\nservir top-5:')
+    print(f'  {"recalculado":<14} {resumen(frio)}')
+    print(f'  {"precalculado":<14} {resumen(caliente)}')
+    print(f'  {"SQL anterior":<14} {resumen(anterior)}')
+    print('OK: el índice incremental coincide con uno reconstruido')
+
+
+if __name__ == '__main__':
+    main()
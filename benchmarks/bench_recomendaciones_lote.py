@@ -0,0 +1,88 @@
+"""Usuarios por segundo y memoria pico del cálculo por lotes de recomendaciones.
+
+Cada tamaño de bloque se mide en un subproceso para que el pico de memoria
+(ru_maxrss) sea solo el del cálculo. Compara con recorrer los usuarios uno a
+uno con MotorRecomendaciones y falla (AssertionError) si el top guardado no
+coincide con el del motor para una muestra de usuarios.
+
+Uso: python -m benchmarks.bench_recomendaciones_lote [n_usuarios] [n_eventos] [n_favoritos]
+"""
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from models.recomendaciones import MotorRecomendaciones
+from models.recomendaciones_lote import calcular_recomendaciones
+from models.sistema import Sistema
+from benchmarks.datos import poblar
+
+BLOQUES = [500, 2000, 10_000]
+TOP = 5
+MUESTRA_MOTOR = 2000
+
+
+def medir(ruta: str, bloque: int):
+    """Se ejecuta en el subproceso: calcula todo e imprime las medidas en JSON"""
+    conn = sqlite3.connect(ruta)
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    usuarios = calcular_recomendaciones(conn, TOP, bloque)
+    segundos = time.perf_counter() - inicio
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'usuarios': usuarios, 'segundos': segundos, 'pico_kb': pico, 'base_kb': base}))
+
+
+def main():
+    n_usuarios = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_eventos = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    n_favoritos = int(sys.argv[3]) if len(sys.argv) > 3 else 1_000_000
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'bench.db')
+        sistema = Sistema(ruta)
+        with sistema.pool.conexion() as conn:
+            poblar(conn, n_eventos, n_usuarios=n_usuarios, n_favoritos=n_favoritos)
+        sistema.cerrar()
+        print(f'{n_usuarios} usuarios, {n_eventos} eventos, {n_favoritos} favoritos, top-{TOP}')
+
+        print(f'\n{"bloque":>8}{"usuarios/s":>14}{"segundos":>10}{"RSS pico (MB)":>16}')
+        for bloque in BLOQUES:
+            salida = subprocess.run([sys.executable, '-m', 'benchmarks.bench_recomendaciones_lote',
+                                     '--medir', ruta, str(bloque)], capture_output=True, text=True, check=True)
+            datos = json.loads(salida.stdout)
+            print(f'{bloque:>8}{datos["usuarios"] / datos["segundos"]:>14,.0f}{datos["segundos"]:>10.2f}'
+                  f'{datos["pico_kb"] / 1024:>16.1f}')
+        print(f'(RSS del intérprete con sqlite3 y NumPy antes de calcular: {datos["base_kb"] / 1024:.1f} MB)')
+
+        # Uno a uno con el motor en memoria, sobre una muestra
+        conn = sqlite3.connect(ruta)
+        motor = MotorRecomendaciones()
+        inicio = time.perf_counter()
+        motor.construir(conn)
+        construccion = time.perf_counter() - inicio
+        muestra = random.Random(1).sample(range(1, n_usuarios + 1), min(MUESTRA_MOTOR, n_usuarios))
+        inicio = time.perf_counter()
+        tops = {usuario_id: motor.recomendar(usuario_id, TOP) for usuario_id in muestra}
+        por_usuario = (time.perf_counter() - inicio) / len(muestra)
+        print(f'\nuno a uno (MotorRecomendaciones): construcción {construccion:.2f} s + '
+              f'{1 / por_usuario:,.0f} usuarios/s')
+
+        for usuario_id, top in tops.items():
+            guardado = [evento_id for (evento_id,) in conn.execute(
+                'SELECT evento_id FROM recomendaciones WHERE usuario_id = ? ORDER BY posicion', (usuario_id,))]
+            assert guardado == top, f'usuario {usuario_id}: lote {guardado} != motor {top}'
+        conn.close()
+    print('OK: el cálculo por lotes coincide con el motor')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--medir':
+        medir(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,102 @@
+"""Barridos del planificador de recordatorios sobre un millón de favoritos en su ventana de aviso.
+
+Todos los eventos ocurren en los próximos 3 días, así cada favorito genera un
+recordatorio. Mide cada barrido (acotado por el presupuesto de tiempo), el
+total hasta vaciar la cola, un barrido sin trabajo y la latencia de un
+favorito nuevo. Falla (AssertionError) si algún recordatorio falta, se repite
+o un barrido excede el presupuesto en más de una página.
+
+Uso: python -m benchmarks.bench_recordatorios [n_favoritos] [presupuesto_s]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from models.notificaciones import Salida, SalidaArchivo
+from models.sesion import Sesion
+from models.sistema import Sistema
+from models.usuario import Usuario
+from benchmarks.datos import poblar
+
+N_EVENTOS = 50_000
+N_USUARIOS = 100_000
+# Margen sobre el presupuesto: el barrido revisa el tiempo entre páginas
+HOLGURA = 0.5
+
+
+class SalidaContador(Salida):
+    def __init__(self):
+        self.vistas = set()
+        self.repetidas = 0
+
+    def enviar(self, notificaciones):
+        for n in notificaciones:
+            clave = (n.usuario_id, n.evento_id)
+            self.repetidas += clave in self.vistas
+            self.vistas.add(clave)
+
+
+def main():
+    n_favoritos = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    presupuesto = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'))
+        with sistema.pool.conexion() as conn:
+            poblar(conn, N_EVENTOS, n_usuarios=N_USUARIOS, n_favoritos=n_favoritos)
+            conn.execute("UPDATE eventos SET fecha = date('now', 'localtime', '+' || (id % 4) || ' days')")
+            conn.commit()
+            esperados = conn.execute('SELECT count(*) FROM favoritos').fetchone()[0]
+
+        contador = SalidaContador()
+        planificador = sistema.recordatorios
+        planificador.bandeja.salidas = [contador, SalidaArchivo(os.path.join(directorio, 'recordatorios.jsonl'))]
+
+        barridos = []
+        inicio = time.perf_counter()
+        while True:
+            t = time.perf_counter()
+            planificador.ejecutar_pendientes(presupuesto)
+            barridos.append(time.perf_counter() - t)
+            if not planificador.pendiente:
+                break
+        total = time.perf_counter() - inicio
+
+        # Un barrido completo más: todo está registrado en notificaciones, no se envía nada
+        planificador.recargar()
+        t = time.perf_counter()
+        while True:
+            repetidos = planificador.ejecutar_pendientes(presupuesto)
+            assert repetidos == 0, f'{repetidos} recordatorios reenviados'
+            if not planificador.pendiente:
+                break
+        sin_trabajo = time.perf_counter() - t
+
+        # Favorito nuevo en un evento que ya está en su ventana
+        sesion = Sesion()
+        sesion.usuario = Usuario(1, '', '', '')
+        with sistema.pool.conexion() as conn:
+            evento_id = conn.execute('SELECT id FROM eventos WHERE id NOT IN '
+                                     '(SELECT evento_id FROM favoritos WHERE usuario_id = 1) LIMIT 1').fetchone()[0]
+        sistema.agregar_favorito(evento_id, sesion)
+        t = time.perf_counter()
+        nuevos = planificador.ejecutar_pendientes(presupuesto)
+        latencia_nuevo = time.perf_counter() - t
+        sistema.cerrar()
+
+    print(f'{esperados:,} favoritos en la ventana de aviso, presupuesto por barrido {presupuesto} s')
+    print(f'  barridos hasta vaciar: {len(barridos)}, el más largo {max(barridos):.2f} s')
+    print(f'  total: {total:.1f} s ({esperados / total:,.0f} recordatorios/s)')
+    print(f'  barrido completo sin recordatorios nuevos: {sin_trabajo:.1f} s')
+    print(f'  favorito nuevo en un evento activo: {latencia_nuevo * 1000:.2f} ms')
+
+    assert len(contador.vistas) == esperados + 1, f'enviados {len(contador.vistas)} de {esperados + 1}'
+    assert contador.repetidas == 0, f'{contador.repetidas} recordatorios repetidos'
+    assert nuevos == 1, 'el favorito nuevo no generó su recordatorio'
+    assert max(barridos) <= presupuesto + HOLGURA, 'un barrido excedió el presupuesto'
+    print('OK: cada recordatorio se envió exactamente una vez')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""Suite de benchmarks de la API de Sistema con comparación contra una línea base.
+
+Genera datos sintéticos reproducibles (usuarios, eventos con coordenadas,
+favoritos y categorías con sesgo Zipf, todos con la misma semilla) y mide cada
+escenario con repeticiones de calentamiento sin medir, reportando media, p50,
+p90, p99 y máximo en milisegundos. Con --json guarda los resultados; con
+--base compara contra un JSON guardado antes y termina con error si la métrica
+elegida de algún escenario empeora más que el umbral (y más que --minimo ms,
+para no fallar por ruido en operaciones de microsegundos). Con --motor memoria
+los mismos datos se copian a AlmacenamientoMemoria y se omiten los escenarios
+que solo tiene SQLite.
+
+Uso: python -m benchmarks.bench_sistema [--eventos N] [--usuarios N] [--favoritos N] [--sesgo S]
+         [--semilla N] [--repeticiones N] [--calentamiento N] [--solo ESCENARIO ...] [--motor memoria]
+         [--json ARCHIVO] [--base ARCHIVO] [--umbral 0.25] [--metrica p50] [--minimo 0.05]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, NamedTuple, Optional
+
+from models.geo import LUGARES
+from models.sesion import Sesion
+from models.sistema import MOTORES, ORDENES_EVENTOS, Sistema
+from models.usuario import Usuario
+from benchmarks.datos import CATEGORIAS, CIUDADES, poblar
+
+PASSWORD = 'secreto123'
+METRICAS = ('media', 'p50', 'p90', 'p99', 'max')
+
+
+class Escenario(NamedTuple):
+    """Operación medida; `preparar` corre antes de cada repetición, fuera de la medición"""
+    medir: Callable[[Sistema, random.Random], object]
+    preparar: Optional[Callable[[Sistema], None]] = None
+    # Necesita funciones que el motor en memoria no tiene
+    solo_sqlite: bool = False
+
+
+def sesion_de(usuario_id: int) -> Sesion:
+    sesion = Sesion()
+    sesion.usuario = Usuario(usuario_id, '', '', '')
+    return sesion
+
+
+def reiniciar_recordatorios(sistema: Sistema):
+    """Olvida los recordatorios enviados para que el barrido vuelva a tener trabajo"""
+    with sistema.pool.conexion() as conn:
+        conn.execute('DELETE FROM notificaciones')
+        conn.commit()
+    sistema.recordatorios.recargar()
+
+
+def barrer_recordatorios(sistema: Sistema) -> int:
+    enviados = 0
+    while True:
+        enviados += sistema.recordatorios.ejecutar_pendientes()
+        if not sistema.recordatorios.pendiente:
+            return enviados
+
+
+def copiar_a_memoria(conn: sqlite3.Connection) -> Sistema:
+    """Sistema con motor en memoria cargado con los datos de la base de datos"""
+    sistema = Sistema(motor='memoria')
+    almacen = sistema.almacen
+    for usuario in conn.execute('SELECT nombre, email, password_hash FROM usuarios ORDER BY id'):
+        almacen.crear_usuario(*usuario)
+    almacen.insertar_eventos(conn.execute(
+        'SELECT nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id, '
+        'latitud, longitud, hora FROM eventos ORDER BY id'))
+    for usuario_id, evento_id in conn.execute('SELECT usuario_id, evento_id FROM favoritos'):
+        almacen.agregar_favorito(usuario_id, evento_id)
+    for usuario_id, categoria in conn.execute('SELECT usuario_id, categoria FROM usuario_categorias'):
+        almacen.agregar_categoria(usuario_id, categoria)
+    return sistema
+
+
+def escenarios(args) -> Dict[str, Escenario]:
+    hoy = date.today()
+    centros = [(latitud, longitud) for _, latitud, longitud in LUGARES]
+    return {
+        'explorar_eventos_pagina': Escenario(lambda s, rnd: s.explorar_eventos_pagina(
+            categoria=rnd.choice([None, *CATEGORIAS]), orden=rnd.choice(list(ORDENES_EVENTOS)))),
+        'explorar_eventos (30 días)': Escenario(lambda s, rnd: s.explorar_eventos(
+            categoria=rnd.choice(CATEGORIAS), desde=hoy, hasta=hoy + timedelta(days=29))),
+        'buscar_eventos': Escenario(lambda s, rnd: s.buscar_eventos(rnd.choice(CIUDADES)), solo_sqlite=True),
+        'eventos_cercanos': Escenario(lambda s, rnd: s.eventos_cercanos(
+            *rnd.choice(centros), radio_km=5), solo_sqlite=True),
+        'obtener_evento_por_id': Escenario(lambda s, rnd: s.obtener_evento_por_id(rnd.randint(1, args.eventos))),
+        'iniciar_sesion': Escenario(lambda s, rnd: s.iniciar_sesion(
+            f'usuario{rnd.randrange(args.usuarios)}@example.com', PASSWORD, Sesion())),
+        'obtener_favoritos': Escenario(lambda s, rnd: s.obtener_favoritos(
+            sesion_de(rnd.randint(1, args.usuarios)))),
+        'agregar_favorito': Escenario(lambda s, rnd: s.agregar_favorito(
+            rnd.randint(1, args.eventos), sesion_de(rnd.randint(1, args.usuarios)))),
+        'obtener_recomendaciones': Escenario(lambda s, rnd: s.obtener_recomendaciones(
+            sesion_de(rnd.randint(1, args.usuarios)))),
+        'confirmar_asistencia': Escenario(lambda s, rnd: s.confirmar_asistencia(
+            rnd.randint(1, args.eventos), sesion_de(rnd.randint(1, args.usuarios)))),
+        'recordatorios (barrido completo)': Escenario(lambda s, rnd: barrer_recordatorios(s),
+                                                      reiniciar_recordatorios, solo_sqlite=True),
+        'crear_evento': Escenario(lambda s, rnd: s.crear_evento(
+            'Evento nuevo', f'Parque {rnd.choice(CIUDADES)}', (hoy + timedelta(days=rnd.randint(0, 60))).isoformat(),
+            rnd.choice(CATEGORIAS), 100, 'Descripción', sesion_de(rnd.randint(1, args.usuarios)))),
+    }
+
+
+def resumir(tiempos: list) -> dict:
+    percentiles = statistics.quantiles(tiempos, n=100, method='inclusive')
+    return {'n': len(tiempos), 'media': statistics.fmean(tiempos), 'p50': percentiles[49],
+            'p90': percentiles[89], 'p99': percentiles[98], 'max': max(tiempos)}
+
+
+def ejecutar(sistema: Sistema, escenario: Escenario, args) -> dict:
+    # Cada escenario arranca con la misma semilla: la secuencia de operaciones es reproducible
+    rnd = random.Random(args.semilla)
+    tiempos = []
+    for repeticion in range(args.calentamiento + args.repeticiones):
+        if escenario.preparar:
+            escenario.preparar(sistema)
+        inicio = time.perf_counter()
+        escenario.medir(sistema, rnd)
+        if repeticion >= args.calentamiento:
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    return resumir(tiempos)
+
+
+def parametros(args) -> dict:
+    """Lo que determina los datos y la medición: dos corridas solo son comparables si coinciden"""
+    return {'eventos': args.eventos, 'usuarios': args.usuarios, 'favoritos': args.favoritos,
+            'sesgo': args.sesgo, 'semilla': args.semilla, 'motor': args.motor}
+
+
+def comparar(resultados: dict, base: dict, args) -> list:
+    """Escenarios cuya métrica empeoró más que el umbral respecto de la línea base"""
+    # Las líneas base anteriores a --motor se midieron con SQLite
+    anteriores = {'motor': 'sqlite', **base['parametros']}
+    if anteriores != parametros(args):
+        sys.exit(f"La línea base se midió con otros datos: {anteriores} (ahora {parametros(args)})")
+    regresiones = []
+    print(f'\ncomparación con la línea base ({args.metrica}, umbral {args.umbral:.0%}):')
+    for nombre, actual in resultados.items():
+        anterior = base['resultados'].get(nombre)
+        if anterior is None:
+            print(f'  {nombre:<34} sin línea base')
+            continue
+        antes, ahora = anterior[args.metrica], actual[args.metrica]
+        cambio = ahora / antes - 1 if antes else 0.0
+        regresion = cambio > args.umbral and ahora - antes > args.minimo
+        print(f'  {nombre:<34}{antes:>10.3f} ->{ahora:>10.3f} ms {cambio:>+8.1%}{"  REGRESIÓN" if regresion else ""}')
+        if regresion:
+            regresiones.append(nombre)
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--eventos', type=int, default=100_000)
+    parser.add_argument('--usuarios', type=int, default=10_000)
+    parser.add_argument('--favoritos', type=int, default=100_000)
+    parser.add_argument('--sesgo', type=float, default=1.0, help='exponente Zipf de categorías y favoritos')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--repeticiones', type=int, default=50)
+    parser.add_argument('--calentamiento', type=int, default=5)
+    parser.add_argument('--solo', nargs='+', metavar='ESCENARIO', help='escenarios a medir (por defecto todos)')
+    parser.add_argument('--json', help='archivo donde guardar los resultados')
+    parser.add_argument('--base', help='resultados guardados con --json contra los que comparar')
+    parser.add_argument('--umbral', type=float, default=0.25, help='empeoramiento relativo tolerado')
+    parser.add_argument('--metrica', choices=METRICAS, default='p50')
+    parser.add_argument('--minimo', type=float, default=0.05, help='empeoramiento absoluto tolerado (ms)')
+    parser.add_argument('--motor', choices=MOTORES, default='sqlite', help='almacenamiento de Sistema')
+    args = parser.parse_args()
+    if args.repeticiones < 2:
+        parser.error('--repeticiones debe ser al menos 2 para calcular percentiles')
+
+    base = None
+    if args.base:
+        with open(args.base, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+
+    todos = escenarios(args)
+    elegidos = args.solo or list(todos)
+    desconocidos = [nombre for nombre in elegidos if nombre not in todos]
+    if desconocidos:
+        parser.error(f"escenarios desconocidos: {', '.join(desconocidos)} (disponibles: {', '.join(todos)})")
+    if args.motor != 'sqlite':
+        omitidos = [nombre for nombre in elegidos if todos[nombre].solo_sqlite]
+        if omitidos:
+            print(f"omitidos con el motor {args.motor}: {', '.join(omitidos)}")
+        elegidos = [nombre for nombre in elegidos if not todos[nombre].solo_sqlite]
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        sistema = Sistema(os.path.join(directorio, 'bench.db'))
+        inicio = time.perf_counter()
+        with sistema.pool.conexion() as conn:
+            poblar(conn, args.eventos, n_usuarios=args.usuarios, n_favoritos=args.favoritos, semilla=args.semilla,
+                   coordenadas=True, sesgo=args.sesgo, password=PASSWORD)
+            conn.execute('ANALYZE')
+            if args.motor == 'memoria':
+                memoria = copiar_a_memoria(conn)
+        if args.motor == 'memoria':
+            sistema.cerrar()
+            sistema = memoria
+        sistema.cache_eventos.capacidad = 0  # se miden las consultas, no la caché
+        print(f'datos: {args.eventos:,} eventos, {args.usuarios:,} usuarios, {args.favoritos:,} favoritos, '
+              f'sesgo {args.sesgo}, motor {args.motor} ({time.perf_counter() - inicio:.1f} s)')
+
+        print(f'\n{"escenario":<34}' + ''.join(f'{metrica + " (ms)":>12}' for metrica in METRICAS))
+        for nombre in elegidos:
+            with contextlib.redirect_stdout(io.StringIO()):
+                resultados[nombre] = ejecutar(sistema, todos[nombre], args)
+            print(f'{nombre:<34}' + ''.join(f'{resultados[nombre][metrica]:>12.3f}' for metrica in METRICAS))
+        sistema.cerrar()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump({'parametros': parametros(args), 'repeticiones': args.repeticiones,
+                       'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                       'resultados': resultados}, archivo, ensure_ascii=False, indent=2)
+        print(f'\nresultados guardados en {args.json}')
+
+    if base is not None:
+        regresiones = comparar(resultados, base, args)
+        if regresiones:
+            sys.exit(f"REGRESIÓN en {len(regresiones)} escenario(s): {', '.join(regresiones)}")
+    print('OK: sin regresiones' if base is not None else 'OK')
+
+
+if __name__ == '__main__':
+    main()
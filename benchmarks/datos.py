@@ -0,0 +1,92 @@
+import random
+import sqlite3
+from datetime import date, timedelta
+
+from models import claves
+from models.geo import LUGARES as LUGARES_CONOCIDOS
+
+CATEGORIAS = ['Concierto', 'Deporte', 'Conferencia', 'Teatro', 'Cine',
+              'Gastronomía', 'Feria', 'Taller', 'Exposición', 'Fiesta']
+CIUDADES = ['Medellín', 'Bogotá', 'Cali', 'Barranquilla', 'Cartagena',
+            'Bucaramanga', 'Pereira', 'Manizales', 'Santa Marta', 'Envigado']
+LUGARES = ['Estadio', 'Teatro', 'Parque', 'Plaza', 'Coliseo', 'Auditorio', 'Centro de Convenciones']
+
+
+def pesos_zipf(n: int, sesgo: float) -> list:
+    """Pesos acumulados de una distribución Zipf de exponente `sesgo` sobre n elementos"""
+    acumulado, pesos = 0.0, []
+    for k in range(1, n + 1):
+        acumulado += 1 / k ** sesgo
+        pesos.append(acumulado)
+    return pesos
+
+
+def poblar(conn: sqlite3.Connection, n_eventos: int, n_usuarios: int = 1000,
+           n_favoritos: int = 0, semilla: int = 42, dias: int = 365, coordenadas: bool = False,
+           sesgo: float = 0.0, password: str = None):
+    """Inserta usuarios, eventos y favoritos sintéticos de forma reproducible.
+
+    Con coordenadas=True cada evento recibe latitud y longitud dispersas
+    alrededor de su ciudad (desviación de ~10 km). Con sesgo > 0 las categorías
+    de los eventos y los eventos guardados como favoritos siguen una
+    distribución Zipf de ese exponente (las primeras de CATEGORIAS y los
+    primeros eventos son los más frecuentes); con sesgo 0 son uniformes y los
+    datos no cambian respecto de versiones anteriores. Con `password` todos los
+    usuarios pueden iniciar sesión con esa contraseña (comparten un mismo hash
+    scrypt, que se calcula una sola vez).
+    """
+    rnd = random.Random(semilla)
+    hoy = date.today()
+    cursor = conn.cursor()
+    password_hash = claves.hashear(password) if password else 'x' * 64
+    pesos_categorias = pesos_zipf(len(CATEGORIAS), sesgo) if sesgo else None
+
+    def categoria() -> str:
+        if pesos_categorias is None:
+            return rnd.choice(CATEGORIAS)
+        return rnd.choices(CATEGORIAS, cum_weights=pesos_categorias)[0]
+
+    preferencias = [rnd.sample(CATEGORIAS, rnd.randint(0, 3)) for _ in range(n_usuarios)]
+    cursor.executemany(
+        'INSERT INTO usuarios (nombre, email, password_hash) VALUES (?, ?, ?)',
+        ((f'Usuario {i}', f'usuario{i}@example.com', password_hash) for i in range(n_usuarios))
+    )
+    cursor.executemany(
+        'INSERT INTO usuario_categorias (usuario_id, categoria) SELECT id, ? FROM usuarios WHERE email = ?',
+        ((categoria, f'usuario{i}@example.com') for i, categorias in enumerate(preferencias) for categoria in categorias)
+    )
+
+    # Generador aparte para las coordenadas: no alteran los datos de los demás benchmarks
+    rnd_geo = random.Random(semilla)
+    centros = {nombre: (latitud, longitud) for nombre, latitud, longitud in LUGARES_CONOCIDOS}
+
+    def eventos():
+        for i in range(n_eventos):
+            ciudad = rnd.choice(CIUDADES)
+            fecha = hoy + timedelta(days=rnd.randint(-30, dias))
+            latitud = longitud = None
+            if coordenadas:
+                centro_lat, centro_lon = centros[ciudad.lower()]
+                latitud, longitud = rnd_geo.gauss(centro_lat, 0.09), rnd_geo.gauss(centro_lon, 0.09)
+            yield (f'Evento {i}', f'{rnd.choice(LUGARES)} {ciudad}', fecha.isoformat(),
+                   categoria(), rnd.randint(10, 5000),
+                   f'Descripción del evento {i} en {ciudad}', rnd.randint(1, n_usuarios), latitud, longitud)
+
+    cursor.executemany('''
+        INSERT INTO eventos (nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id,
+                             latitud, longitud)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', eventos())
+
+    pesos_eventos = pesos_zipf(n_eventos, sesgo) if sesgo and n_favoritos else None
+
+    def evento_favorito() -> int:
+        if pesos_eventos is None:
+            return rnd.randint(1, n_eventos)
+        return rnd.choices(range(1, n_eventos + 1), cum_weights=pesos_eventos)[0]
+
+    cursor.executemany(
+        'INSERT OR IGNORE INTO favoritos (usuario_id, evento_id) VALUES (?, ?)',
+        ((rnd.randint(1, n_usuarios), evento_favorito()) for _ in range(n_favoritos))
+    )
+    conn.commit()
@@ -0,0 +1,144 @@
+"""Operaciones no interactivas sobre la base de datos de eventos.
+
+    python cli.py importar eventos.csv --organizador 1
+    python cli.py exportar eventos.jsonl --categoria Concierto
+    python cli.py recomendar --top 10
+    python cli.py migrar-claves
+    python cli.py barrer resumenes lotes/ --procesos 4
+    python cli.py duplicados --umbral 0.7 --fusionar
+"""
+import argparse
+import sys
+
+from models.claves import ALGORITMO
+from models.duplicados import UMBRAL, grupos
+from models.importacion import leer_csv, leer_jsonl
+from models.lotes import BLOQUE_USUARIOS, TAREAS
+from models.notificaciones import SalidaArchivo, SalidaConsola
+from models.recordatorios import DIAS_AVISO
+from models.sistema import Sistema
+
+
+def _formato(ruta: str, formato: str) -> str:
+    if formato:
+        return formato
+    return 'csv' if ruta.endswith('.csv') else 'jsonl'
+
+
+def importar(sistema: Sistema, args) -> int:
+    formato = _formato(args.archivo, args.formato)
+    archivo = sys.stdin if args.archivo == '-' else open(args.archivo, encoding='utf-8', newline='')
+    with archivo:
+        filas = leer_csv(archivo) if formato == 'csv' else leer_jsonl(archivo)
+        resumen = sistema.importar_eventos(filas, args.organizador, args.lote)
+
+    print(resumen)
+    for numero, motivo in resumen.errores[:args.max_errores]:
+        print(f"  fila {numero}: {motivo}", file=sys.stderr)
+    return 1 if resumen.errores and args.estricto else 0
+
+
+def exportar(sistema: Sistema, args) -> int:
+    formato = _formato(args.archivo, args.formato)
+    archivo = sys.stdout if args.archivo == '-' else open(args.archivo, 'w', encoding='utf-8', newline='')
+    with archivo:
+        total = sistema.exportar_eventos(archivo, formato, args.categoria, args.ubicacion, args.fecha)
+    print(f"Eventos exportados: {total}", file=sys.stderr)
+    return 0
+
+
+def recomendar(sistema: Sistema, args) -> int:
+    total = sistema.calcular_recomendaciones(args.top, args.bloque)
+    print(f"Recomendaciones calculadas para {total} usuarios", file=sys.stderr)
+    return 0
+
+
+def migrar_claves(sistema: Sistema, args) -> int:
+    total = sistema.migrar_claves(args.lote)
+    print(f"Contraseñas migradas a {ALGORITMO}: {total}", file=sys.stderr)
+    return 0
+
+
+def barrer(sistema: Sistema, args) -> int:
+    if args.tarea == 'recordatorios':
+        sistema.recordatorios.bandeja.salidas = [SalidaArchivo(args.salida) if args.salida else SalidaConsola()]
+        total = sistema.enviar_recordatorios_lote(args.directorio, args.procesos, args.bloque)
+        print(f"Recordatorios enviados: {total}", file=sys.stderr)
+        return 0
+    resumen = sistema.barrer_usuarios(args.tarea, args.directorio, args.procesos, args.bloque, k=args.top, dias=args.dias)
+    print(f"Resúmenes de {resumen.registros} usuarios ({resumen.usuarios} recorridos en {resumen.segundos:.1f} s) "
+          f"en {resumen.salida}", file=sys.stderr)
+    return 0
+
+
+def duplicados(sistema: Sistema, args) -> int:
+    pares = sistema.reporte_duplicados(args.umbral)
+    for par in pares[:args.limite]:
+        print(f"{par.evento_id}\t{par.duplicado_id}\t{par.similitud:.2f}")
+    print(f"Pares casi duplicados: {len(pares)}", file=sys.stderr)
+    if args.fusionar:
+        fusionados = 0
+        # Cada grupo se fusiona en su evento más antiguo
+        for conservar_id, otros in grupos(pares).items():
+            for duplicado_id in otros:
+                fusionados += sistema.fusionar_eventos(conservar_id, duplicado_id)
+        print(f"Eventos fusionados: {fusionados}", file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Operaciones por lotes sobre la base de datos de QuéHayPaHacer")
+    parser.add_argument('--db', default='database/quehaypahacer.db', help="ruta de la base de datos")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    p_importar = comandos.add_parser('importar', help="importar eventos desde CSV o JSONL")
+    p_importar.add_argument('archivo', help="archivo .csv o .jsonl ('-' para la entrada estándar)")
+    p_importar.add_argument('--formato', choices=['csv', 'jsonl'])
+    p_importar.add_argument('--organizador', type=int, help="organizador_id para filas que no lo traen")
+    p_importar.add_argument('--lote', type=int, default=5000, help="filas por transacción")
+    p_importar.add_argument('--max-errores', type=int, default=20, help="errores a mostrar")
+    p_importar.add_argument('--estricto', action='store_true', help="terminar con código 1 si hubo filas inválidas")
+    p_importar.set_defaults(funcion=importar)
+
+    p_exportar = comandos.add_parser('exportar', help="exportar eventos a CSV o JSONL")
+    p_exportar.add_argument('archivo', help="archivo .csv o .jsonl ('-' para la salida estándar)")
+    p_exportar.add_argument('--formato', choices=['csv', 'jsonl'])
+    p_exportar.add_argument('--categoria')
+    p_exportar.add_argument('--ubicacion')
+    p_exportar.add_argument('--fecha')
+    p_exportar.set_defaults(funcion=exportar)
+
+    p_recomendar = comandos.add_parser('recomendar', help="calcular el top de recomendaciones de todos los usuarios")
+    p_recomendar.add_argument('--top', type=int, default=5, help="recomendaciones por usuario")
+    p_recomendar.add_argument('--bloque', type=int, default=500, help="usuarios por bloque (acota la memoria)")
+    p_recomendar.set_defaults(funcion=recomendar)
+
+    p_migrar = comandos.add_parser('migrar-claves',
+                                   help="proteger con scrypt los hashes SHA-256 antiguos sin esperar a cada inicio de sesión")
+    p_migrar.add_argument('--lote', type=int, default=500, help="usuarios por transacción")
+    p_migrar.set_defaults(funcion=migrar_claves)
+
+    p_barrer = comandos.add_parser('barrer', help="recorrer todos los usuarios en varios procesos (reanudable)")
+    p_barrer.add_argument('tarea', choices=list(TAREAS))
+    p_barrer.add_argument('directorio', help="carpeta de puntos de control y de la salida combinada")
+    p_barrer.add_argument('--procesos', type=int, help="procesos de trabajo (por defecto, uno por núcleo)")
+    p_barrer.add_argument('--bloque', type=int, default=BLOQUE_USUARIOS, help="usuarios por punto de control")
+    p_barrer.add_argument('--top', type=int, default=5, help="recomendaciones por resumen")
+    p_barrer.add_argument('--dias', type=int, default=DIAS_AVISO, help="días de favoritos próximos en cada resumen")
+    p_barrer.add_argument('--salida', help="archivo JSONL para los recordatorios (por defecto, la consola)")
+    p_barrer.set_defaults(funcion=barrer)
+
+    p_duplicados = comandos.add_parser('duplicados', help="reportar (y fusionar) eventos casi duplicados")
+    p_duplicados.add_argument('--umbral', type=float, default=UMBRAL, help="similitud mínima entre 0 y 1")
+    p_duplicados.add_argument('--limite', type=int, default=50, help="pares a mostrar")
+    p_duplicados.add_argument('--fusionar', action='store_true',
+                              help="fusionar cada grupo en su evento más antiguo (menor id)")
+    p_duplicados.set_defaults(funcion=duplicados)
+
+    args = parser.parse_args(argv)
+    sistema = Sistema(args.db)
+    return args.funcion(sistema, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,524 @@
+"""Servicio HTTP/JSON sobre asyncio que expone las operaciones de Sistema.
+
+    python -m interfaces.api --db database/quehaypahacer.db --puerto 8080
+
+Las llamadas a Sistema (bloqueantes) se ejecutan en un pool de hilos fuera del
+bucle de eventos. Cada conexión admite keep-alive y pipelining: las lecturas
+encoladas se atienden en paralelo, las escrituras (POST, DELETE, ...) de una en
+una y en orden respecto de las demás peticiones, y las respuestas se escriben
+en orden.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import re
+import secrets
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http import HTTPStatus
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from models.cambios import CursorVencido
+from models.claves import HILOS_CLAVES, MAXIMO_PENDIENTES, ClavesSaturadas, PoolClaves
+from models.duplicados import UMBRAL, IndiceNoConstruido
+from models.evento import Evento
+from models.fechas import fin_de_semana, proximos_dias
+from models.metricas import UMBRAL_LENTA, Metricas
+from models.notificaciones import SalidaArchivo
+from models.sesion import Sesion
+from models.sistema import MOTORES, Sistema
+
+# Peticiones de una misma conexión que se procesan a la vez
+MAX_EN_VUELO = 32
+# Métodos sin efectos: los únicos que se atienden en paralelo dentro de una conexión
+METODOS_LECTURA = frozenset({'GET', 'HEAD'})
+MAX_CUERPO = 1 << 20
+# Segundos entre volcados de las métricas en formato Prometheus (--metricas)
+INTERVALO_METRICAS = 15.0
+# Días que puede abarcar una consulta de GET /duplicados
+MAX_DIAS_DUPLICADOS = 31
+# Segundos sin usar el token tras los que la sesión vence
+DURACION_SESION = 24 * 3600.0
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado: HTTPStatus, mensaje: str):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.mensaje = mensaje
+
+
+def evento_a_dict(evento: Evento) -> Dict:
+    fecha = evento.fecha.isoformat() if isinstance(evento.fecha, date) else evento.fecha
+    return {
+        'id': evento.id,
+        'nombre': evento.nombre,
+        'ubicacion': evento.ubicacion,
+        'fecha': fecha,
+        'categoria': evento.categoria,
+        'capacidad': evento.capacidad,
+        'descripcion': evento.descripcion,
+        'organizador_id': evento.organizador_id,
+        'organizador': evento.organizador_nombre,
+        'latitud': evento.latitud,
+        'longitud': evento.longitud,
+        'hora': evento.hora,
+    }
+
+
+def filtros_consulta(consulta: Dict[str, str]) -> Dict:
+    """Filtros de exploración de la query string: ?categoria=Cine,Teatro, ?fecha=,
+    ?desde=&hasta=, ?dias=N (próximos N días), ?finde=1 y ?hora_desde=&hora_hasta="""
+    categorias = [c.strip() for c in consulta.get('categoria', '').split(',') if c.strip()]
+    desde, hasta = consulta.get('desde'), consulta.get('hasta')
+    if consulta.get('finde'):
+        desde, hasta = fin_de_semana()
+    elif consulta.get('dias'):
+        desde, hasta = proximos_dias(int(consulta['dias']))
+    return dict(categoria=categorias, ubicacion=consulta.get('ubicacion'), fecha=consulta.get('fecha'),
+                desde=desde, hasta=hasta)
+
+
+class InterfazAPI:
+    def __init__(self, sistema: Sistema, hilos: Optional[int] = None, archivo_metricas: Optional[str] = None,
+                 duracion_sesion: float = DURACION_SESION):
+        self.sistema = sistema
+        self.archivo_metricas = archivo_metricas
+        self.ejecutor = ThreadPoolExecutor(max_workers=hilos or (sistema.pool.tamano if sistema.pool else 1) * 2)
+        # token -> (sesión, vencimiento); cada uso la renueva y la pasa al final, así las
+        # vencidas quedan al principio y se descartan al crear sesiones nuevas
+        self.sesiones: OrderedDict = OrderedDict()
+        self.duracion_sesion = duracion_sesion
+        self.rutas = [
+            ('POST', re.compile(r'/usuarios'), self.registrar_usuario),
+            ('POST', re.compile(r'/sesiones'), self.iniciar_sesion),
+            ('DELETE', re.compile(r'/sesiones'), self.cerrar_sesion),
+            ('GET', re.compile(r'/eventos'), self.explorar_eventos),
+            ('POST', re.compile(r'/eventos'), self.crear_evento),
+            ('GET', re.compile(r'/eventos/(\d+)'), self.obtener_evento),
+            ('GET', re.compile(r'/favoritos'), self.obtener_favoritos),
+            ('POST', re.compile(r'/favoritos'), self.agregar_favorito),
+            ('DELETE', re.compile(r'/favoritos/(\d+)'), self.eliminar_favorito),
+            ('GET', re.compile(r'/recomendaciones'), self.obtener_recomendaciones),
+            ('GET', re.compile(r'/eventos/(\d+)/asistencia'), self.obtener_asistencia),
+            ('POST', re.compile(r'/asistencias'), self.confirmar_asistencia),
+            ('DELETE', re.compile(r'/asistencias/(\d+)'), self.cancelar_asistencia),
+            ('GET', re.compile(r'/cambios'), self.obtener_cambios),
+            ('GET', re.compile(r'/proximos'), self.obtener_proximos),
+            ('GET', re.compile(r'/destacados'), self.obtener_destacados),
+            ('GET', re.compile(r'/duplicados'), self.obtener_duplicados),
+            ('GET', re.compile(r'/metricas'), self.obtener_metricas),
+        ]
+
+    async def _ejecutar(self, funcion, *args):
+        """Ejecuta una llamada bloqueante a Sistema en el pool de hilos"""
+        return await asyncio.get_running_loop().run_in_executor(self.ejecutor, funcion, *args)
+
+    @staticmethod
+    def _token(cabeceras: Dict[str, str]) -> str:
+        autorizacion = cabeceras.get('authorization', '')
+        return autorizacion[7:] if autorizacion.startswith('Bearer ') else ''
+
+    def _sesion(self, cabeceras: Dict[str, str]) -> Sesion:
+        token = self._token(cabeceras)
+        sesion, vence = self.sesiones.get(token, (None, 0.0))
+        ahora = time.monotonic()
+        if sesion is None or vence <= ahora:
+            self.sesiones.pop(token, None)
+            raise ErrorHTTP(HTTPStatus.UNAUTHORIZED, "Debes iniciar sesión")
+        self.sesiones[token] = (sesion, ahora + self.duracion_sesion)
+        self.sesiones.move_to_end(token)
+        return sesion
+
+    def _descartar_vencidas(self):
+        ahora = time.monotonic()
+        while self.sesiones:
+            token, (_, vence) = next(iter(self.sesiones.items()))
+            if vence > ahora:
+                break
+            del self.sesiones[token]
+
+    # Operaciones
+    async def registrar_usuario(self, cuerpo, consulta, cabeceras):
+        ok = await self.sistema.registrar_usuario_async(str(cuerpo.get('nombre', '')), str(cuerpo.get('email', '')),
+                                                        str(cuerpo.get('password', '')), ejecutor=self.ejecutor)
+        if not ok:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "No se pudo registrar el usuario")
+        return HTTPStatus.CREATED, {'ok': True}
+
+    async def iniciar_sesion(self, cuerpo, consulta, cabeceras):
+        sesion = Sesion()
+        ok = await self.sistema.iniciar_sesion_async(str(cuerpo.get('email', '')), str(cuerpo.get('password', '')),
+                                                     sesion, ejecutor=self.ejecutor)
+        if not ok:
+            raise ErrorHTTP(HTTPStatus.UNAUTHORIZED, "Email o contraseña incorrectos")
+        self._descartar_vencidas()
+        token = secrets.token_urlsafe(24)
+        self.sesiones[token] = (sesion, time.monotonic() + self.duracion_sesion)
+        return HTTPStatus.CREATED, {'token': token, 'usuario_id': sesion.usuario.id,
+                                    'nombre': sesion.usuario.nombre}
+
+    async def cerrar_sesion(self, cuerpo, consulta, cabeceras):
+        self._sesion(cabeceras)
+        del self.sesiones[self._token(cabeceras)]
+        return HTTPStatus.OK, {'ok': True}
+
+    async def explorar_eventos(self, cuerpo, consulta, cabeceras):
+        if consulta.get('q'):
+            eventos = await self._ejecutar(self.sistema.buscar_eventos, consulta['q'],
+                                           int(consulta.get('tamano', 20)))
+            return HTTPStatus.OK, {'eventos': [evento_a_dict(e) for e in eventos]}
+
+        if consulta.get('lat') or consulta.get('caja'):
+            return await self._eventos_cercanos(consulta)
+
+        orden = consulta.get('orden', 'fecha')
+        despues = json.loads(consulta['despues']) if consulta.get('despues') else None
+        antes = json.loads(consulta['antes']) if consulta.get('antes') else None
+        filtros = filtros_consulta(consulta)
+        eventos = await self._ejecutar(
+            lambda: self.sistema.explorar_eventos_pagina(
+                **filtros, orden=orden, despues=despues, antes=antes,
+                tamano=min(int(consulta.get('tamano', 20)), 100),
+                hora_desde=consulta.get('hora_desde'), hora_hasta=consulta.get('hora_hasta')))
+        respuesta = {'eventos': [evento_a_dict(e) for e in eventos]}
+        if eventos:
+            # Cursores para pedir la página siguiente o anterior (?despues=... / ?antes=...)
+            respuesta['siguiente'] = json.dumps(Sistema.clave_pagina(eventos[-1], orden))
+            respuesta['anterior'] = json.dumps(Sistema.clave_pagina(eventos[0], orden))
+        return HTTPStatus.OK, respuesta
+
+    async def _eventos_cercanos(self, consulta):
+        """?lat=&lon=&radio= (km) o ?caja=lat_min,lon_min,lat_max,lon_max, ordenados por distancia"""
+        filtros = dict(filtros_consulta(consulta), limite=min(int(consulta.get('tamano', 20)), 100))
+        if consulta.get('caja'):
+            caja = [float(valor) for valor in consulta['caja'].split(',')]
+            if len(caja) != 4:
+                raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "caja debe ser lat_min,lon_min,lat_max,lon_max")
+            eventos = await self._ejecutar(lambda: self.sistema.eventos_en_area(*caja, **filtros))
+        else:
+            latitud, longitud = float(consulta['lat']), float(consulta['lon'])
+            radio = min(float(consulta.get('radio', 5)), 100)
+            eventos = await self._ejecutar(
+                lambda: self.sistema.eventos_cercanos(latitud, longitud, radio, **filtros))
+        return HTTPStatus.OK, {'eventos': [evento_a_dict(e) for e in eventos]}
+
+    async def obtener_evento(self, cuerpo, consulta, cabeceras, evento_id):
+        evento = await self._ejecutar(self.sistema.obtener_evento_por_id, int(evento_id))
+        if evento is None:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "El evento no existe")
+        return HTTPStatus.OK, evento_a_dict(evento)
+
+    async def crear_evento(self, cuerpo, consulta, cabeceras):
+        sesion = self._sesion(cabeceras)
+        try:
+            capacidad = int(cuerpo.get('capacidad', 0))
+        except (TypeError, ValueError):
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "La capacidad debe ser un número")
+        try:
+            latitud, longitud = (None if cuerpo.get(clave) is None else float(cuerpo[clave])
+                                 for clave in ('latitud', 'longitud'))
+        except (TypeError, ValueError):
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "latitud y longitud deben ser números")
+        nombre, ubicacion, fecha, descripcion = (str(cuerpo.get(clave, ''))
+                                                 for clave in ('nombre', 'ubicacion', 'fecha', 'descripcion'))
+        if not cuerpo.get('forzar'):
+            # Un evento casi idéntico ese día en ese lugar se devuelve para que el cliente confirme con forzar
+            parecido = await self._ejecutar(self.sistema.evento_parecido, nombre, ubicacion, fecha, descripcion)
+            if parecido is not None:
+                return HTTPStatus.CONFLICT, {'error': "Ya existe un evento muy parecido; envíe forzar para crearlo",
+                                             'parecido': {'evento_id': parecido.evento_id,
+                                                          'similitud': round(parecido.similitud, 4)}}
+        ok = await self._ejecutar(
+            self.sistema.crear_evento, nombre, ubicacion, fecha, str(cuerpo.get('categoria', '')), capacidad,
+            descripcion, sesion, latitud, longitud, cuerpo.get('hora'), True)
+        if not ok:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Datos del evento inválidos")
+        return HTTPStatus.CREATED, {'ok': True}
+
+    async def obtener_favoritos(self, cuerpo, consulta, cabeceras):
+        sesion = self._sesion(cabeceras)
+        eventos = await self._ejecutar(self.sistema.obtener_favoritos, sesion)
+        return HTTPStatus.OK, {'eventos': [evento_a_dict(e) for e in eventos]}
+
+    async def agregar_favorito(self, cuerpo, consulta, cabeceras):
+        sesion = self._sesion(cabeceras)
+        try:
+            evento_id = int(cuerpo.get('evento_id'))
+        except (TypeError, ValueError):
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "evento_id debe ser un número")
+        ok = await self._ejecutar(self.sistema.agregar_favorito, evento_id, sesion)
+        if not ok:
+            raise ErrorHTTP(HTTPStatus.CONFLICT, "El evento no existe o ya está en favoritos")
+        return HTTPStatus.CREATED, {'ok': True}
+
+    async def eliminar_favorito(self, cuerpo, consulta, cabeceras, evento_id):
+        sesion = self._sesion(cabeceras)
+        ok = await self._ejecutar(self.sistema.eliminar_favorito, int(evento_id), sesion)
+        if not ok:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "El evento no estaba en favoritos")
+        return HTTPStatus.OK, {'ok': True}
+
+    async def obtener_recomendaciones(self, cuerpo, consulta, cabeceras):
+        sesion = self._sesion(cabeceras)
+        eventos = await self._ejecutar(self.sistema.obtener_recomendaciones, sesion)
+        return HTTPStatus.OK, {'eventos': [evento_a_dict(e) for e in eventos]}
+
+    async def obtener_asistencia(self, cuerpo, consulta, cabeceras, evento_id):
+        asistencia = await self._ejecutar(self.sistema.obtener_asistencia, int(evento_id))
+        if asistencia is None:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "El evento no existe")
+        return HTTPStatus.OK, {**asistencia._asdict(), 'cupos': asistencia.cupos}
+
+    async def confirmar_asistencia(self, cuerpo, consulta, cabeceras):
+        sesion = self._sesion(cabeceras)
+        try:
+            evento_id = int(cuerpo.get('evento_id'))
+        except (TypeError, ValueError):
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "evento_id debe ser un número")
+        estado = await self._ejecutar(self.sistema.confirmar_asistencia, evento_id, sesion)
+        if estado is None:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "El evento no existe")
+        return HTTPStatus.CREATED, {'estado': estado}
+
+    async def cancelar_asistencia(self, cuerpo, consulta, cabeceras, evento_id):
+        sesion = self._sesion(cabeceras)
+        ok = await self._ejecutar(self.sistema.cancelar_asistencia, int(evento_id), sesion)
+        if not ok:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "No estabas inscrito en el evento")
+        return HTTPStatus.OK, {'ok': True}
+
+    # Cambios
+    async def obtener_cambios(self, cuerpo, consulta, cabeceras):
+        if 'despues' not in consulta:
+            # Sin cursor: el cursor actual, para leer el catálogo y luego sondear desde él
+            return HTTPStatus.OK, {'cambios': [], 'cursor': await self._ejecutar(self.sistema.ultimo_cambio)}
+        try:
+            lista, cursor = await self._ejecutar(self.sistema.cambios_eventos, int(consulta['despues']),
+                                                 min(int(consulta.get('limite', 100)), 1000))
+        except CursorVencido as error:
+            raise ErrorHTTP(HTTPStatus.GONE, str(error))
+        return HTTPStatus.OK, {'cambios': [{'secuencia': c.secuencia, 'evento_id': c.evento_id,
+                                            'operacion': c.operacion,
+                                            'evento': evento_a_dict(c.evento) if c.evento else None}
+                                           for c in lista], 'cursor': cursor}
+
+    async def obtener_proximos(self, cuerpo, consulta, cabeceras):
+        categorias = consulta['categoria'].split(',') if consulta.get('categoria') else None
+        dias = int(consulta['dias']) if consulta.get('dias') else None
+        grupos, cursor = await self._ejecutar(self.sistema.proximos_por_dia, int(consulta.get('despues', 0)),
+                                              dias, categorias)
+        return HTTPStatus.OK, {'grupos': [{'fecha': g.fecha.isoformat(), 'categoria': g.categoria,
+                                           'eventos': g.eventos, 'secuencia': g.secuencia} for g in grupos],
+                               'cursor': cursor}
+
+    async def obtener_destacados(self, cuerpo, consulta, cabeceras):
+        if not consulta.get('categoria'):
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Falta la categoría")
+        destacados = await self._ejecutar(self.sistema.eventos_destacados, consulta['categoria'],
+                                          int(consulta.get('n', 10)), consulta.get('orden', 'tendencia'))
+        return HTTPStatus.OK, {'eventos': [{**evento_a_dict(d.evento), 'favoritos': d.favoritos,
+                                            'tendencia': round(d.tendencia, 4)} for d in destacados]}
+
+    async def obtener_duplicados(self, cuerpo, consulta, cabeceras):
+        self._sesion(cabeceras)
+        # Solo lee las firmas guardadas de una ventana de días acotada; construir y refrescar el
+        # índice es trabajo por lotes (cli.py duplicados, importaciones)
+        desde = date.fromisoformat(consulta['desde']) if consulta.get('desde') else date.today()
+        dias = max(1, min(int(consulta.get('dias', 7)), MAX_DIAS_DUPLICADOS))
+        umbral = float(consulta['umbral']) if consulta.get('umbral') else UMBRAL
+        try:
+            pares = await self._ejecutar(self.sistema.reporte_duplicados, umbral, 0,
+                                         min(int(consulta.get('limite', 100)), 1000),
+                                         desde, desde + timedelta(days=dias - 1), False)
+        except IndiceNoConstruido as error:
+            raise ErrorHTTP(HTTPStatus.SERVICE_UNAVAILABLE, str(error))
+        return HTTPStatus.OK, {'pares': [{'evento_id': p.evento_id, 'duplicado_id': p.duplicado_id,
+                                          'similitud': round(p.similitud, 4)} for p in pares]}
+
+    async def obtener_metricas(self, cuerpo, consulta, cabeceras):
+        return HTTPStatus.OK, self.sistema.estadisticas_consultas()
+
+    async def _volcar_metricas(self):
+        while True:
+            await asyncio.sleep(INTERVALO_METRICAS)
+            await self._ejecutar(self.sistema.metricas.volcar_prometheus, self.archivo_metricas)
+
+    async def _atender(self, metodo: str, destino: str, cabeceras: Dict[str, str], datos: bytes) -> bytes:
+        url = urlsplit(destino)
+        consulta = {clave: valores[-1] for clave, valores in parse_qs(url.query).items()}
+        try:
+            cuerpo = json.loads(datos) if datos else {}
+            if not isinstance(cuerpo, dict):
+                raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "El cuerpo debe ser un objeto JSON")
+
+            ruta_existe = False
+            for metodo_ruta, patron, manejador in self.rutas:
+                coincidencia = patron.fullmatch(url.path)
+                if coincidencia:
+                    ruta_existe = True
+                    if metodo_ruta == metodo:
+                        estado, respuesta = await manejador(cuerpo, consulta, cabeceras, *coincidencia.groups())
+                        break
+            else:
+                if ruta_existe:
+                    raise ErrorHTTP(HTTPStatus.METHOD_NOT_ALLOWED, "Método no permitido")
+                raise ErrorHTTP(HTTPStatus.NOT_FOUND, "Ruta no encontrada")
+        except ErrorHTTP as error:
+            estado, respuesta = error.estado, {'error': error.mensaje}
+        except (ValueError, TypeError, IndexError):
+            estado, respuesta = HTTPStatus.BAD_REQUEST, {'error': "Petición inválida"}
+        except NotImplementedError as error:
+            estado, respuesta = HTTPStatus.NOT_IMPLEMENTED, {'error': str(error)}
+        except ClavesSaturadas as error:
+            estado, respuesta = HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(error)}
+        except Exception:
+            estado, respuesta = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "Error interno"}
+
+        return self._respuesta(estado, respuesta)
+
+    @staticmethod
+    def _respuesta(estado: HTTPStatus, respuesta: Dict, cerrar: bool = False) -> bytes:
+        contenido = json.dumps(respuesta, ensure_ascii=False).encode()
+        conexion = 'Connection: close\r\n' if cerrar else ''
+        return (f'HTTP/1.1 {estado.value} {estado.phrase}\r\n'
+                f'Content-Type: application/json; charset=utf-8\r\n{conexion}'
+                f'Content-Length: {len(contenido)}\r\n\r\n').encode() + contenido
+
+    async def _rechazar(self, estado: HTTPStatus, mensaje: str) -> bytes:
+        # Respuesta a una petición que no se puede leer; después se cierra la conexión
+        return self._respuesta(estado, {'error': mensaje}, cerrar=True)
+
+    async def _escribir_respuestas(self, pendientes: asyncio.Queue, writer: asyncio.StreamWriter):
+        while True:
+            tarea = await pendientes.get()
+            if tarea is None:
+                break
+            writer.write(await tarea)
+            await writer.drain()
+
+    async def manejar_conexion(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Las respuestas salen en el orden en que llegaron las peticiones (pipelining)
+        pendientes: asyncio.Queue = asyncio.Queue(maxsize=MAX_EN_VUELO)
+        escritor = asyncio.create_task(self._escribir_respuestas(pendientes, writer))
+        # Lecturas en curso; una escritura espera a que terminen y las peticiones
+        # siguientes esperan a la escritura
+        lecturas = []
+        try:
+            while True:
+                try:
+                    encabezado = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lineas = encabezado.decode('latin-1').split('\r\n')
+                try:
+                    metodo, destino, _ = lineas[0].split(' ', 2)
+                except ValueError:
+                    break
+                cabeceras = {}
+                for linea in lineas[1:]:
+                    if ':' in linea:
+                        clave, valor = linea.split(':', 1)
+                        cabeceras[clave.strip().lower()] = valor.strip()
+
+                try:
+                    longitud = int(cabeceras.get('content-length') or 0)
+                except ValueError:
+                    longitud = -1
+                if longitud < 0:
+                    await pendientes.put(asyncio.create_task(
+                        self._rechazar(HTTPStatus.BAD_REQUEST, "Content-Length inválido")))
+                    break
+                if longitud > MAX_CUERPO:
+                    await pendientes.put(asyncio.create_task(
+                        self._rechazar(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Cuerpo demasiado grande")))
+                    break
+                datos = await reader.readexactly(longitud) if longitud else b''
+                if metodo in METODOS_LECTURA:
+                    lecturas = [tarea for tarea in lecturas if not tarea.done()]
+                    tarea = asyncio.create_task(self._atender(metodo, destino, cabeceras, datos))
+                    lecturas.append(tarea)
+                    await pendientes.put(tarea)
+                else:
+                    if lecturas:
+                        await asyncio.wait(lecturas)
+                        lecturas.clear()
+                    tarea = asyncio.create_task(self._atender(metodo, destino, cabeceras, datos))
+                    await pendientes.put(tarea)
+                    await asyncio.wait((tarea,))
+
+                if cabeceras.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            await pendientes.put(None)
+            with contextlib.suppress(ConnectionError):
+                await escritor
+            writer.close()
+
+    async def servir(self, host: str = '127.0.0.1', puerto: int = 8080):
+        servidor = await asyncio.start_server(self.manejar_conexion, host, puerto)
+        direccion = servidor.sockets[0].getsockname()
+        print(f"Sirviendo QuéHayPaHacer? en http://{direccion[0]}:{direccion[1]}", file=sys.stderr, flush=True)
+        if self.archivo_metricas:
+            # Se guarda la referencia: el bucle solo guarda referencias débiles a las tareas
+            self._volcado = asyncio.create_task(self._volcar_metricas())
+        async with servidor:
+            await servidor.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP/JSON de QuéHayPaHacer")
+    parser.add_argument('--db', default='database/quehaypahacer.db')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8080)
+    parser.add_argument('--pool', type=int, default=4, help="conexiones a la base de datos")
+    parser.add_argument('--motor', choices=MOTORES, default='sqlite',
+                        help="almacenamiento: base de datos SQLite en --db o en memoria (se pierde al salir)")
+    parser.add_argument('--hilos', type=int, help="hilos para las llamadas a Sistema")
+    parser.add_argument('--hilos-claves', type=int, default=HILOS_CLAVES,
+                        help="hilos que calculan hashes de contraseñas (inicios de sesión y registros)")
+    parser.add_argument('--maximo-claves', type=int, default=MAXIMO_PENDIENTES, metavar='N',
+                        help="hashes pendientes desde los que se responde 503 en lugar de encolar")
+    parser.add_argument('--duracion-sesion', type=float, default=DURACION_SESION / 3600, metavar='HORAS',
+                        help="horas sin usar el token tras las que la sesión vence")
+    parser.add_argument('--verboso', action='store_true', help="mostrar los mensajes de Sistema")
+    parser.add_argument('--recordatorios', metavar='ARCHIVO', help="enviar recordatorios a este archivo JSONL")
+    parser.add_argument('--metricas', metavar='ARCHIVO',
+                        help=f"volcar las métricas en formato Prometheus a este archivo cada {INTERVALO_METRICAS:g} s")
+    parser.add_argument('--consultas-lentas', metavar='ARCHIVO', help="agregar las consultas lentas a este archivo JSONL")
+    parser.add_argument('--umbral-lentas', type=float, default=UMBRAL_LENTA * 1000, metavar='MS',
+                        help="duración desde la que una consulta se considera lenta")
+    parser.add_argument('--sin-metricas', action='store_true', help="no medir las consultas ni las acciones")
+    args = parser.parse_args()
+
+    metricas = Metricas(activa=not args.sin_metricas, umbral_lenta=args.umbral_lentas / 1000,
+                        archivo_lentas=args.consultas_lentas)
+    sistema = Sistema(args.db, tamano_pool=args.pool, motor=args.motor, metricas=metricas,
+                      claves=PoolClaves(args.hilos_claves, args.maximo_claves))
+    if args.recordatorios:
+        sistema.iniciar_recordatorios([SalidaArchivo(args.recordatorios)])
+    api = InterfazAPI(sistema, hilos=args.hilos, archivo_metricas=args.metricas,
+                      duracion_sesion=args.duracion_sesion * 3600)
+    if not args.verboso:
+        # Sistema informa con print(); el servicio responde en JSON y descarta esa salida
+        sys.stdout = open(os.devnull, 'w')
+    try:
+        asyncio.run(api.servir(args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.metricas:
+            metricas.volcar_prometheus(args.metricas)
+        sistema.cerrar()
+
+
+if __name__ == '__main__':
+    main()
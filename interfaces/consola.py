@@ -1,8 +1,12 @@
-from getpass import getpass
-from typing import List
+from typing import List, Optional
+from models.asistencia import CONFIRMADO
 from models.evento import Evento
+from models.fechas import fin_de_semana, proximos_dias
 from models.sistema import Sistema
 
+# Eventos por página al explorar
+TAMANO_PAGINA = 10
+
 class InterfazConsola:
     def __init__(self, sistema: Sistema):
         self.sistema = sistema
@@ -78,11 +82,38 @@ class InterfazConsola:
 
     def explorar_eventos(self):
         print("\n--- Explorar Eventos ---")
+        print("1. Buscar por texto (nombre, descripción o ubicación)")
+        print("2. Filtrar por categoría, ubicación y fecha")
+        modo = input("Seleccione una opción (1-2): ")
+
+        if modo == "1":
+            texto = input("Buscar: ")
+            eventos = self.sistema.buscar_eventos(texto)
+            if not eventos:
+                print("No se encontraron eventos para la búsqueda.")
+                return
+            self.mostrar_lista_eventos(eventos, mostrar_opciones=True)
+            return
+
         print("Filtros disponibles (deje en blanco para omitir):")
 
-        categoria = input("Categoría: ")
+        categoria = input("Categoría (varias separadas por comas): ")
         ubicacion = input("Ubicación: ")
         fecha = input("Fecha (YYYY-MM-DD): ")
+        rango = input("Rango de fechas ('finde', número de días próximos o desde,hasta): ").strip().lower()
+        hora = input("Desde la hora (HH:MM): ").strip()
+
+        desde = hasta = None
+        try:
+            if rango == 'finde':
+                desde, hasta = fin_de_semana()
+            elif rango.isdigit():
+                desde, hasta = proximos_dias(int(rango))
+            elif rango:
+                desde, hasta = (valor.strip() or None for valor in rango.split(','))
+        except ValueError:
+            print("Rango de fechas inválido.")
+            return
 
         print("\nOpciones de ordenamiento:")
         print("1. Por fecha (predeterminado)")
@@ -96,26 +127,53 @@ class InterfazConsola:
         elif orden_opcion == "3":
             orden = 'categoria'
 
-        eventos = self.sistema.explorar_eventos(
-            categoria=categoria if categoria else None,
+        filtros = dict(
+            categoria=[c.strip() for c in categoria.split(',')],
             ubicacion=ubicacion if ubicacion else None,
             fecha=fecha if fecha else None,
-            orden=orden
+            orden=orden,
+            tamano=TAMANO_PAGINA,
+            desde=desde,
+            hasta=hasta,
+            hora_desde=hora or None
         )
+        try:
+            eventos = self.sistema.explorar_eventos_pagina(**filtros)
+        except ValueError as error:
+            print(f"Filtro inválido: {error}")
+            return
 
         if not eventos:
             print("No se encontraron eventos con los filtros seleccionados.")
             return
 
-        self.mostrar_lista_eventos(eventos, mostrar_opciones=True)
+        while True:
+            accion = self.mostrar_lista_eventos(eventos, mostrar_opciones=True, paginacion=True)
+
+            if accion == "siguiente":
+                pagina = self.sistema.explorar_eventos_pagina(
+                    **filtros, despues=Sistema.clave_pagina(eventos[-1], orden))
+            elif accion == "anterior":
+                pagina = self.sistema.explorar_eventos_pagina(
+                    **filtros, antes=Sistema.clave_pagina(eventos[0], orden))
+            else:
+                break
+
+            if pagina:
+                eventos = pagina
+            else:
+                print("No hay más eventos en esa dirección.")
 
-    def mostrar_lista_eventos(self, eventos: List[Evento], mostrar_opciones: bool = False):
+    def mostrar_lista_eventos(self, eventos: List[Evento], mostrar_opciones: bool = False,
+                              paginacion: bool = False) -> Optional[str]:
+        """Muestra los eventos y sus opciones; con paginacion devuelve "siguiente" o "anterior" si se pide otra página"""
         for i, evento in enumerate(eventos, 1):
             print(f"\n[{i}] {evento.nombre}")
             print(f"  📍 {evento.ubicacion} | 📅 {evento.fecha} | 🏷️ {evento.categoria}")
             print(f"  🧑‍🤝‍🧑 Capacidad: {evento.capacidad}")
             print(f"  📝 {evento.descripcion}")
-            print(f"  👤 Organizador: {self.sistema.obtener_organizador_nombre(evento.organizador_id)}")
+            organizador = evento.organizador_nombre or self.sistema.obtener_organizador_nombre(evento.organizador_id)
+            print(f"  👤 Organizador: {organizador}")
 
             if self.sistema.usuario_actual:
                 es_favorito = evento.id in self.sistema.usuario_actual.favoritos
@@ -128,10 +186,17 @@ class InterfazConsola:
                 print("2. Agregar a favoritos")
                 print("3. Eliminar de favoritos")
                 print("4. Volver")
+                if paginacion:
+                    print("5. Página siguiente")
+                    print("6. Página anterior")
 
-                opcion = input("Seleccione una opción (1-4): ")
+                opcion = input("Seleccione una opción ({}): ".format("1-6" if paginacion else "1-4"))
 
-                if opcion == "1":
+                if paginacion and opcion == "5":
+                    return "siguiente"
+                elif paginacion and opcion == "6":
+                    return "anterior"
+                elif opcion == "1":
                     num = input("Ingrese el número del evento a ver: ")
                     try:
                         num = int(num)
@@ -155,20 +220,42 @@ class InterfazConsola:
                             self.sistema.eliminar_favorito(eventos[num - 1].id)
                     except ValueError:
                         print("Número inválido.")
+            elif paginacion:
+                print("1. Página siguiente")
+                print("2. Página anterior")
+                print("3. Volver")
+
+                opcion = input("Seleccione una opción (1-3): ")
+
+                if opcion == "1":
+                    return "siguiente"
+                elif opcion == "2":
+                    return "anterior"
             else:
                 input("\nPresione Enter para continuar...")
+        return None
 
     def mostrar_detalle_evento(self, evento: Evento):
         print("\n--- Detalles del Evento ---")
         print(evento)
 
         if self.sistema.usuario_actual:
+            asistencia = self.sistema.obtener_asistencia(evento.id)
+            if asistencia:
+                print(f"Inscritos: {asistencia.inscritos}/{asistencia.capacidad}"
+                      f" (en espera: {asistencia.en_espera})")
+            estado = self.sistema.estado_asistencia(evento.id)
+
             print("\nOpciones:")
             if evento.id in self.sistema.usuario_actual.favoritos:
                 print("1. Eliminar de favoritos")
             else:
                 print("1. Agregar a favoritos")
-            print("2. Volver")
+            if estado:
+                print("2. Cancelar asistencia" if estado == CONFIRMADO else "2. Salir de la lista de espera")
+            else:
+                print("2. Confirmar asistencia")
+            print("3. Volver")
 
             opcion = input("Seleccione una opción: ")
 
@@ -178,6 +265,11 @@ class InterfazConsola:
                 else:
                     self.sistema.agregar_favorito(evento.id)
             elif opcion == "2":
+                if estado:
+                    self.sistema.cancelar_asistencia(evento.id)
+                else:
+                    self.sistema.confirmar_asistencia(evento.id)
+            elif opcion == "3":
                 return
 
     def mostrar_favoritos(self):
@@ -203,9 +295,11 @@ class InterfazConsola:
         nombre = input("Nombre del evento: ")
         ubicacion = input("Ubicación: ")
         fecha = input("Fecha (YYYY-MM-DD): ")
+        hora = input("Hora (HH:MM, opcional): ").strip()
         categoria = input("Categoría: ")
         capacidad = input("Capacidad: ")
         descripcion = input("Descripción: ")
+        coordenadas = input("Latitud,longitud (opcional, Enter para ubicarlo por nombre): ").strip()
 
         try:
             capacidad = int(capacidad)
@@ -215,7 +309,25 @@ class InterfazConsola:
             print("La capacidad debe ser un número positivo.")
             return
 
-        self.sistema.crear_evento(nombre, ubicacion, fecha, categoria, capacidad, descripcion)
+        latitud = longitud = None
+        if coordenadas:
+            try:
+                latitud, longitud = (float(valor) for valor in coordenadas.split(','))
+            except ValueError:
+                print("Las coordenadas deben tener la forma latitud,longitud.")
+                return
+
+        forzar = False
+        parecido = self.sistema.evento_parecido(nombre, ubicacion, fecha, descripcion)
+        if parecido is not None:
+            print(f"Ya existe un evento muy parecido ese día en ese lugar (ID: {parecido.evento_id}, "
+                  f"similitud {parecido.similitud:.0%}).")
+            if input("¿Crearlo de todos modos? (s/n): ").strip().lower() != 's':
+                return
+            forzar = True
+
+        self.sistema.crear_evento(nombre, ubicacion, fecha, categoria, capacidad, descripcion,
+                                  latitud=latitud, longitud=longitud, hora=hora or None, forzar=forzar)
 
     def mostrar_recomendaciones(self):
         if not self.sistema.usuario_actual:
@@ -238,7 +350,7 @@ class InterfazConsola:
 
         print("\n--- Mis Preferencias ---")
         print(
-            f"Categorías preferidas actuales: {', '.join(self.sistema.usuario_actual.categorias_preferidas) or 'Ninguna'}")
+            f"Categorías preferidas actuales: {', '.join(sorted(self.sistema.usuario_actual.categorias_preferidas)) or 'Ninguna'}")
 
         print("\n1. Agregar categoría")
         print("2. Eliminar categoría")
@@ -256,24 +368,16 @@ class InterfazConsola:
                 print("No hay categorías para eliminar.")
                 return
 
+            categorias = sorted(self.sistema.usuario_actual.categorias_preferidas)
             print("Seleccione la categoría a eliminar:")
-            for i, cat in enumerate(self.sistema.usuario_actual.categorias_preferidas, 1):
+            for i, cat in enumerate(categorias, 1):
                 print(f"{i}. {cat}")
 
             try:
                 num = int(input("Número: "))
-                if 1 <= num <= len(self.sistema.usuario_actual.categorias_preferidas):
-                    cat_eliminar = self.sistema.usuario_actual.categorias_preferidas[num - 1]
-                    self.sistema.usuario_actual.categorias_preferidas.remove(cat_eliminar)
-
-                    categorias_str = ','.join(self.sistema.usuario_actual.categorias_preferidas)
-                    cursor = self.sistema.conn.cursor()
-                    cursor.execute('''
-                        UPDATE usuarios 
-                        SET categorias_preferidas = ?
-                        WHERE id = ?
-                    ''', (categorias_str, self.sistema.usuario_actual.id))
-                    self.sistema.conn.commit()
+                if 1 <= num <= len(categorias):
+                    cat_eliminar = categorias[num - 1]
+                    self.sistema.eliminar_categoria_preferida(cat_eliminar)
 
                     print("Categoría eliminada!")
             except ValueError:
@@ -4,7 +4,10 @@ from models.sistema import Sistema
 def main():
     sistema = Sistema()
     interfaz = InterfazConsola(sistema)
-    interfaz.mostrar_menu_principal()
+    try:
+        interfaz.mostrar_menu_principal()
+    finally:
+        sistema.cerrar()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
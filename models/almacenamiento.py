@@ -0,0 +1,466 @@
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+from . import asistencia
+from .asistencia import Asistencia
+from .conexiones import PoolConexiones
+from .evento import Evento
+from .fechas import dia_epoca, hora_valida
+from .geo import GEOCODIFICAR
+from .recomendaciones import MotorRecomendaciones
+from .usuario import Usuario
+
+# Columnas de ordenamiento de la exploración de eventos. Terminan en id para que
+# el orden sea total y sirvan como clave de paginación; coinciden con los índices.
+ORDENES_EVENTOS = {
+    'fecha': ('dia', 'id'),
+    'nombre': ('nombre', 'id'),
+    'categoria': ('categoria', 'dia', 'id'),
+}
+
+# Columnas de un evento en el orden del constructor de Evento, más el nombre
+# del organizador obtenido en la misma consulta
+COLUMNAS_EVENTOS = '''
+    e.id, e.nombre, e.ubicacion, e.fecha, e.categoria, e.capacidad,
+    e.descripcion, e.organizador_id, u.nombre, e.latitud, e.longitud, e.hora
+'''
+SELECT_EVENTOS = f'''
+    SELECT {COLUMNAS_EVENTOS}
+    FROM eventos e
+    LEFT JOIN usuarios u ON u.id = e.organizador_id
+'''
+
+# Filtro de categoría (una o varias) y extremo de un rango de fechas (YYYY-MM-DD o date)
+Categorias = Union[str, Sequence[str], None]
+FechaFiltro = Union[str, date, None]
+
+# Columnas de una fila de insertar_eventos, en orden
+Fila = Tuple[str, str, str, str, int, str, int, Optional[float], Optional[float], Optional[str]]
+
+
+class FiltrosEventos(NamedTuple):
+    """Filtros de exploración normalizados; sirven también como clave de caché.
+
+    `categoria` es una, una tupla ordenada de varias o None; `dia`, `desde` y
+    `hasta` son días desde 1970-01-01 (`dia` es None si `fecha` no es una fecha).
+    """
+    categoria: Union[str, tuple, None] = None
+    ubicacion: Optional[str] = None
+    fecha: Optional[str] = None
+    dia: Optional[int] = None
+    desde: Optional[int] = None
+    hasta: Optional[int] = None
+    hora_desde: Optional[str] = None
+    hora_hasta: Optional[str] = None
+
+    @property
+    def una_categoria(self) -> Optional[str]:
+        """Categoría fija de la consulta; con varias, None (la afecta cualquiera)"""
+        return self.categoria if isinstance(self.categoria, str) else None
+
+
+def normalizar_categoria(categoria: Categorias) -> Union[str, tuple, None]:
+    """Una categoría, varias como tupla ordenada y sin repetir, o None"""
+    if not categoria or isinstance(categoria, str):
+        return categoria or None
+    categorias = tuple(sorted({c for c in categoria if c}))
+    if len(categorias) <= 1:
+        return categorias[0] if categorias else None
+    return categorias
+
+
+def filtros_eventos(categoria: Categorias = None, ubicacion: str = None, fecha: str = None,
+                    desde: FechaFiltro = None, hasta: FechaFiltro = None,
+                    hora_desde: str = None, hora_hasta: str = None) -> FiltrosEventos:
+    """Valida y normaliza los filtros; lanza ValueError si una fecha u hora no es válida.
+
+    `desde` y `hasta` son un rango de fechas inclusivo y `hora_desde`/`hora_hasta`
+    una franja horaria (HH:MM), que deja fuera a los eventos sin hora.
+    """
+    dia = None
+    if fecha:
+        try:
+            dia = dia_epoca(fecha)
+        except ValueError:
+            pass  # Se compara como texto y no coincide con ninguna fecha válida
+    for hora in (hora_desde, hora_hasta):
+        if hora and not hora_valida(hora):
+            raise ValueError(f'hora inválida: {hora!r}, use HH:MM')
+    return FiltrosEventos(normalizar_categoria(categoria), ubicacion or None, fecha or None, dia,
+                          dia_epoca(desde) if desde else None, dia_epoca(hasta) if hasta else None,
+                          hora_desde or None, hora_hasta or None)
+
+
+def filtros_sql(filtros: FiltrosEventos) -> Tuple[str, list]:
+    """Cláusula WHERE (sobre eventos e) y parámetros de los filtros"""
+    query = ' WHERE 1=1'
+    params = []
+
+    if isinstance(filtros.categoria, tuple):
+        query += ' AND e.categoria IN ({})'.format(', '.join(['?'] * len(filtros.categoria)))
+        params.extend(filtros.categoria)
+    elif filtros.categoria:
+        query += ' AND e.categoria = ?'
+        params.append(filtros.categoria)
+
+    if filtros.ubicacion:
+        query += ' AND e.ubicacion LIKE ?'
+        params.append(f'%{filtros.ubicacion}%')
+
+    if filtros.dia is not None:
+        # Una fecha válida se compara con el entero indexado; otro texto, tal cual
+        query += ' AND e.dia = ?'
+        params.append(filtros.dia)
+    elif filtros.fecha:
+        query += ' AND e.fecha = ?'
+        params.append(filtros.fecha)
+
+    for valor, condicion in ((filtros.desde, 'e.dia >= ?'), (filtros.hasta, 'e.dia <= ?'),
+                             (filtros.hora_desde, 'e.hora >= ?'), (filtros.hora_hasta, 'e.hora <= ?')):
+        if valor is not None:
+            query += ' AND ' + condicion
+            params.append(valor)
+
+    return query, params
+
+
+class Almacenamiento(ABC):
+    """Usuarios, eventos, favoritos, preferencias y asistencia que usa Sistema.
+
+    Los eventos se exploran con FiltrosEventos en uno de los ORDENES_EVENTOS;
+    `despues` y `antes` son claves de Sistema.clave_pagina. Los Evento
+    devueltos son nuevos en cada llamada. La asistencia sigue las reglas de
+    models/asistencia.py: cupo por capacidad y lista de espera por orden de
+    llegada.
+    """
+
+    motor = ''
+
+    @abstractmethod
+    def crear_usuario(self, nombre: str, email: str, password_hash: str) -> Optional[int]:
+        """Id del usuario nuevo, o None si el email ya está registrado"""
+
+    @abstractmethod
+    def usuario_por_email(self, email: str) -> Optional[Usuario]:
+        ...
+
+    @abstractmethod
+    def datos_usuario(self, usuario_id: int) -> Tuple[Set[int], Set[str]]:
+        """Favoritos y categorías preferidas del usuario"""
+
+    @abstractmethod
+    def actualizar_passwords(self, cambios: Iterable[Tuple[int, str, str]]) -> int:
+        """Aplica (usuario_id, hash_anterior, hash_nuevo) solo si el hash sigue siendo el anterior;
+        devuelve cuántos se cambiaron"""
+
+    @abstractmethod
+    def hashes_legados(self, despues_de: int, limite: int) -> List[Tuple[int, str]]:
+        """(id, password_hash) de los usuarios con hash SHA-256 antiguo y id mayor que despues_de, por id"""
+
+    @abstractmethod
+    def nombre_usuario(self, usuario_id: int) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def crear_evento(self, nombre: str, ubicacion: str, fecha: str, categoria: str, capacidad: int,
+                     descripcion: str, organizador_id: int, latitud: Optional[float] = None,
+                     longitud: Optional[float] = None, hora: Optional[str] = None) -> int:
+        ...
+
+    @abstractmethod
+    def insertar_eventos(self, filas: Iterable[Fila]) -> int:
+        """Inserción masiva de filas ya validadas; devuelve cuántas se insertaron"""
+
+    @abstractmethod
+    def obtener_evento(self, evento_id: int) -> Optional[Evento]:
+        ...
+
+    @abstractmethod
+    def eventos_por_ids(self, ids: Sequence[int]) -> List[Evento]:
+        """Los eventos en el orden de `ids`, omitiendo los que no existen"""
+
+    @abstractmethod
+    def listar_eventos(self, filtros: FiltrosEventos, orden: str, despues: Optional[tuple] = None,
+                       antes: Optional[tuple] = None, limite: int = 20) -> List[Evento]:
+        """Hasta `limite` eventos en el orden dado, después o antes de una clave"""
+
+    @abstractmethod
+    def iterar_eventos(self, filtros: FiltrosEventos, orden: Optional[str], lote: int = 500) -> Iterator[Evento]:
+        """Todos los eventos filtrados; sin orden conocido, en el que resulte más barato"""
+
+    @abstractmethod
+    def agregar_favorito(self, usuario_id: int, evento_id: int) -> Optional[bool]:
+        """True si se agregó, False si ya estaba, None si el evento no existe"""
+
+    @abstractmethod
+    def eliminar_favorito(self, usuario_id: int, evento_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    def eventos_favoritos(self, usuario_id: int) -> List[Evento]:
+        ...
+
+    @abstractmethod
+    def agregar_categoria(self, usuario_id: int, categoria: str) -> bool:
+        ...
+
+    @abstractmethod
+    def eliminar_categoria(self, usuario_id: int, categoria: str) -> bool:
+        ...
+
+    @abstractmethod
+    def usuarios_por_categoria(self, categoria: str) -> List[int]:
+        ...
+
+    @abstractmethod
+    def construir_recomendaciones(self, motor: MotorRecomendaciones):
+        """Carga en el motor los eventos próximos, las preferencias y los favoritos"""
+
+    @abstractmethod
+    def inscribir(self, usuario_id: int, evento_id: int) -> Tuple[Optional[str], bool]:
+        """(estado, nuevo) como asistencia.inscribir; estado es None si el evento no existe"""
+
+    @abstractmethod
+    def cancelar_asistencia(self, usuario_id: int, evento_id: int) -> Tuple[bool, Optional[int]]:
+        """(cancelado, promovido) como asistencia.cancelar"""
+
+    @abstractmethod
+    def estado_asistencia(self, usuario_id: int, evento_id: int) -> Optional[str]:
+        """asistencia.CONFIRMADO, asistencia.EN_ESPERA o None"""
+
+    @abstractmethod
+    def consultar_asistencia(self, evento_id: int) -> Optional[Asistencia]:
+        ...
+
+    def cerrar(self):
+        pass
+
+
+class AlmacenamientoSQLite(Almacenamiento):
+    """Motor sobre el pool de conexiones; el esquema lo crea y migra Sistema"""
+
+    motor = 'sqlite'
+
+    def __init__(self, pool: PoolConexiones):
+        self.pool = pool
+
+    @staticmethod
+    def _cursor_eventos(conn: sqlite3.Connection) -> sqlite3.Cursor:
+        """Cursor que construye un Evento por cada fila con las columnas de SELECT_EVENTOS"""
+        cursor = conn.cursor()
+        cursor.row_factory = Evento.desde_fila
+        return cursor
+
+    def crear_usuario(self, nombre: str, email: str, password_hash: str) -> Optional[int]:
+        try:
+            with self.pool.conexion() as conn:
+                cursor = conn.execute('''
+                    INSERT INTO usuarios (nombre, email, password_hash)
+                    VALUES (?, ?, ?)
+                ''', (nombre, email, password_hash))
+                conn.commit()
+            return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            return None
+
+    def usuario_por_email(self, email: str) -> Optional[Usuario]:
+        with self.pool.conexion() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = Usuario.desde_fila
+            cursor.execute('SELECT id, nombre, email, password_hash FROM usuarios WHERE email = ?', (email,))
+            return cursor.fetchone()
+
+    def datos_usuario(self, usuario_id: int) -> Tuple[Set[int], Set[str]]:
+        with self.pool.conexion() as conn:
+            favoritos = {row[0] for row in conn.execute(
+                'SELECT evento_id FROM favoritos WHERE usuario_id = ?', (usuario_id,))}
+            categorias = {row[0] for row in conn.execute(
+                'SELECT categoria FROM usuario_categorias WHERE usuario_id = ?', (usuario_id,))}
+        return favoritos, categorias
+
+    def actualizar_passwords(self, cambios: Iterable[Tuple[int, str, str]]) -> int:
+        with self.pool.conexion() as conn:
+            antes = conn.total_changes
+            conn.executemany('UPDATE usuarios SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                             ((nuevo, usuario_id, anterior) for usuario_id, anterior, nuevo in cambios))
+            conn.commit()
+            return conn.total_changes - antes
+
+    def hashes_legados(self, despues_de: int, limite: int) -> List[Tuple[int, str]]:
+        with self.pool.conexion() as conn:
+            return conn.execute(
+                "SELECT id, password_hash FROM usuarios WHERE id > ? AND instr(password_hash, '$') = 0 "
+                "ORDER BY id LIMIT ?", (despues_de, limite)).fetchall()
+
+    def nombre_usuario(self, usuario_id: int) -> Optional[str]:
+        with self.pool.conexion() as conn:
+            row = conn.execute('SELECT nombre FROM usuarios WHERE id = ?', (usuario_id,)).fetchone()
+        return row[0] if row else None
+
+    def crear_evento(self, nombre: str, ubicacion: str, fecha: str, categoria: str, capacidad: int,
+                     descripcion: str, organizador_id: int, latitud: Optional[float] = None,
+                     longitud: Optional[float] = None, hora: Optional[str] = None) -> int:
+        """Sin latitud y longitud, las coordenadas se buscan por la ubicación en la tabla lugares"""
+        with self.pool.conexion() as conn:
+            cursor = conn.execute('''
+                INSERT INTO eventos (nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id,
+                                     latitud, longitud, hora)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id, latitud, longitud,
+                  hora))
+            if latitud is None:
+                conn.execute(GEOCODIFICAR.format('?'), (cursor.lastrowid,))
+            conn.commit()
+        return cursor.lastrowid
+
+    def insertar_eventos(self, filas: Iterable[Fila]) -> int:
+        with self.pool.conexion() as conn:
+            cursor = conn.executemany('''
+                INSERT INTO eventos (nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id,
+                                     latitud, longitud, hora)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', filas)
+            conn.commit()
+        return cursor.rowcount
+
+    def obtener_evento(self, evento_id: int) -> Optional[Evento]:
+        with self.pool.conexion() as conn:
+            cursor = self._cursor_eventos(conn)
+            cursor.execute(SELECT_EVENTOS + ' WHERE e.id = ?', (evento_id,))
+            return cursor.fetchone()
+
+    def eventos_por_ids(self, ids: Sequence[int]) -> List[Evento]:
+        if not ids:
+            return []
+        with self.pool.conexion() as conn:
+            cursor = self._cursor_eventos(conn)
+            cursor.execute(SELECT_EVENTOS + ' WHERE e.id IN ({})'.format(','.join('?' * len(ids))), ids)
+            eventos = {evento.id: evento for evento in cursor.fetchall()}
+        return [eventos[evento_id] for evento_id in ids if evento_id in eventos]
+
+    def listar_eventos(self, filtros: FiltrosEventos, orden: str, despues: Optional[tuple] = None,
+                       antes: Optional[tuple] = None, limite: int = 20) -> List[Evento]:
+        columnas = ORDENES_EVENTOS[orden]
+        where, params = filtros_sql(filtros)
+
+        # Las columnas fijadas por un filtro de igualdad no participan en la clave;
+        # así la comparación de tuplas puede recorrer el índice como un rango.
+        # Con varias categorías o un rango de fechas la columna sigue libre.
+        fijas = {'categoria': filtros.una_categoria, 'dia': filtros.fecha}
+        libres = [i for i, columna in enumerate(columnas) if not fijas.get(columna)]
+        columnas = [columnas[i] for i in libres]
+        tupla = '({})'.format(', '.join(f'e.{columna}' for columna in columnas))
+        marcadores = '({})'.format(', '.join(['?'] * len(columnas)))
+
+        direccion = 'ASC'
+        if despues is not None:
+            where += f' AND {tupla} > {marcadores}'
+            params.extend(despues[i] for i in libres)
+        elif antes is not None:
+            where += f' AND {tupla} < {marcadores}'
+            params.extend(antes[i] for i in libres)
+            direccion = 'DESC'
+
+        query = '{}{} ORDER BY {} LIMIT ?'.format(
+            SELECT_EVENTOS, where, ', '.join(f'e.{columna} {direccion}' for columna in columnas))
+        params.append(limite)
+
+        with self.pool.conexion() as conn:
+            cursor = self._cursor_eventos(conn)
+            cursor.execute(query, params)
+            eventos = cursor.fetchall()
+        if direccion == 'DESC':
+            eventos.reverse()
+        return eventos
+
+    def iterar_eventos(self, filtros: FiltrosEventos, orden: Optional[str], lote: int = 500) -> Iterator[Evento]:
+        where, params = filtros_sql(filtros)
+        query = SELECT_EVENTOS + where
+        if orden in ORDENES_EVENTOS:
+            query += ' ORDER BY ' + ', '.join(f'e.{columna}' for columna in ORDENES_EVENTOS[orden])
+
+        with self.pool.conexion() as conn:
+            cursor = self._cursor_eventos(conn)
+            cursor.execute(query, params)
+
+            while True:
+                eventos = cursor.fetchmany(lote)
+                if not eventos:
+                    break
+                yield from eventos
+
+    def agregar_favorito(self, usuario_id: int, evento_id: int) -> Optional[bool]:
+        with self.pool.conexion() as conn:
+            # Una sola sentencia en el caso común: solo inserta si el evento existe
+            agregado = conn.execute('''
+                INSERT OR IGNORE INTO favoritos (usuario_id, evento_id)
+                SELECT ?, id FROM eventos WHERE id = ?
+            ''', (usuario_id, evento_id)).rowcount
+            conn.commit()
+            if agregado:
+                return True
+            # Ya estaba o el evento no existe
+            return False if conn.execute('SELECT 1 FROM eventos WHERE id = ?', (evento_id,)).fetchone() else None
+
+    def eliminar_favorito(self, usuario_id: int, evento_id: int) -> bool:
+        with self.pool.conexion() as conn:
+            cursor = conn.execute('''
+                DELETE FROM favoritos
+                WHERE usuario_id = ? AND evento_id = ?
+            ''', (usuario_id, evento_id))
+            conn.commit()
+        return cursor.rowcount > 0
+
+    def eventos_favoritos(self, usuario_id: int) -> List[Evento]:
+        with self.pool.conexion() as conn:
+            cursor = self._cursor_eventos(conn)
+            cursor.execute(SELECT_EVENTOS + '''
+                JOIN favoritos f ON e.id = f.evento_id
+                WHERE f.usuario_id = ?
+                ORDER BY e.id
+            ''', (usuario_id,))
+            return cursor.fetchall()
+
+    def agregar_categoria(self, usuario_id: int, categoria: str) -> bool:
+        with self.pool.conexion() as conn:
+            cursor = conn.execute('INSERT OR IGNORE INTO usuario_categorias (usuario_id, categoria) VALUES (?, ?)',
+                                  (usuario_id, categoria))
+            conn.commit()
+        return cursor.rowcount > 0
+
+    def eliminar_categoria(self, usuario_id: int, categoria: str) -> bool:
+        with self.pool.conexion() as conn:
+            cursor = conn.execute('DELETE FROM usuario_categorias WHERE usuario_id = ? AND categoria = ?',
+                                  (usuario_id, categoria))
+            conn.commit()
+        return cursor.rowcount > 0
+
+    def usuarios_por_categoria(self, categoria: str) -> List[int]:
+        """Búsqueda en idx_usuario_categorias_categoria"""
+        with self.pool.conexion() as conn:
+            cursor = conn.execute('SELECT usuario_id FROM usuario_categorias WHERE categoria = ?', (categoria,))
+            return [row[0] for row in cursor.fetchall()]
+
+    def construir_recomendaciones(self, motor: MotorRecomendaciones):
+        with self.pool.conexion() as conn:
+            motor.construir(conn)
+
+    def inscribir(self, usuario_id: int, evento_id: int) -> Tuple[Optional[str], bool]:
+        with self.pool.conexion() as conn:
+            return asistencia.inscribir(conn, usuario_id, evento_id)
+
+    def cancelar_asistencia(self, usuario_id: int, evento_id: int) -> Tuple[bool, Optional[int]]:
+        with self.pool.conexion() as conn:
+            return asistencia.cancelar(conn, usuario_id, evento_id)
+
+    def estado_asistencia(self, usuario_id: int, evento_id: int) -> Optional[str]:
+        with self.pool.conexion() as conn:
+            return asistencia.estado(conn, usuario_id, evento_id)
+
+    def consultar_asistencia(self, evento_id: int) -> Optional[Asistencia]:
+        with self.pool.conexion() as conn:
+            return asistencia.consultar(conn, evento_id)
+
+    def cerrar(self):
+        self.pool.cerrar()
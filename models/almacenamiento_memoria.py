@@ -0,0 +1,366 @@
+import re
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import date
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from .almacenamiento import Almacenamiento, FiltrosEventos, Fila
+from .asistencia import CONFIRMADO, EN_ESPERA, Asistencia
+from .evento import Evento
+from .fechas import dia_epoca
+from .recomendaciones import MotorRecomendaciones
+from .usuario import Usuario
+
+
+def _patron_like(filtro: str) -> Callable[[str], Optional[re.Match]]:
+    """Equivalente de `LIKE '%filtro%'` de SQLite: comodines % y _, mayúsculas ignoradas solo en ASCII"""
+    partes = ('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in filtro)
+    return re.compile('.*{}.*'.format(''.join(partes)), re.ASCII | re.IGNORECASE | re.DOTALL).fullmatch
+
+
+def _tramo(indice: list, bajo: Optional[tuple], alto: Optional[tuple],
+           despues: Optional[tuple], antes: Optional[tuple], hacia_atras: bool = False) -> Iterator[int]:
+    """Ids de una lista ordenada de claves (..., id) desde el prefijo `bajo` hasta
+    antes del prefijo `alto`, a continuación de `despues` o, hacia atrás, de `antes`
+    (con hacia_atras, desde el final aunque no haya `antes`)"""
+    i = 0 if bajo is None else bisect_left(indice, bajo)
+    j = len(indice) if alto is None else bisect_left(indice, alto)
+    if despues is not None:
+        i = max(i, bisect_right(indice, despues))
+    if antes is not None:
+        j = min(j, bisect_left(indice, antes))
+    if antes is not None or hacia_atras:
+        return (indice[k][-1] for k in range(j - 1, i - 1, -1))
+    return (indice[k][-1] for k in range(i, j))
+
+
+class AlmacenamientoMemoria(Almacenamiento):
+    """Motor en memoria: diccionarios por id e índices ordenados (listas con bisect).
+
+    Mantiene los mismos órdenes que los índices de SQLite: (dia, id),
+    (nombre, id) y por categoría (dia, id), así una página se obtiene con una
+    búsqueda binaria y un recorrido corto. Los datos se pierden al cerrar; sirve
+    para pruebas y para comparar con el motor SQLite. Las fechas de los eventos
+    deben ser válidas (YYYY-MM-DD).
+    """
+
+    motor = 'memoria'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._usuarios: Dict[int, Tuple[str, str, str]] = {}  # id -> (nombre, email, password_hash)
+        self._por_email: Dict[str, int] = {}
+        # id -> (id, nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id,
+        #        latitud, longitud, hora)
+        self._eventos: Dict[int, tuple] = {}
+        self._dias: Dict[int, int] = {}
+        self._por_dia: List[Tuple[int, int]] = []
+        self._por_nombre: List[Tuple[str, int]] = []
+        self._por_categoria: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._favoritos: Dict[int, Set[int]] = defaultdict(set)
+        self._categorias: Dict[int, Set[str]] = defaultdict(set)
+        self._usuarios_categoria: Dict[str, Set[int]] = defaultdict(set)
+        self._asistentes: Dict[int, Set[int]] = defaultdict(set)
+        # evento_id -> usuarios en espera, en orden de llegada (un dict conserva el orden de inserción)
+        self._espera: Dict[int, Dict[int, None]] = defaultdict(dict)
+
+    def crear_usuario(self, nombre: str, email: str, password_hash: str) -> Optional[int]:
+        with self._lock:
+            if email in self._por_email:
+                return None
+            usuario_id = len(self._usuarios) + 1
+            self._usuarios[usuario_id] = (nombre, email, password_hash)
+            self._por_email[email] = usuario_id
+        return usuario_id
+
+    def usuario_por_email(self, email: str) -> Optional[Usuario]:
+        with self._lock:
+            usuario_id = self._por_email.get(email)
+            if usuario_id is None:
+                return None
+            return Usuario(usuario_id, *self._usuarios[usuario_id])
+
+    def datos_usuario(self, usuario_id: int) -> Tuple[Set[int], Set[str]]:
+        with self._lock:
+            return set(self._favoritos.get(usuario_id, ())), set(self._categorias.get(usuario_id, ()))
+
+    def actualizar_passwords(self, cambios: Iterable[Tuple[int, str, str]]) -> int:
+        cambiados = 0
+        with self._lock:
+            for usuario_id, anterior, nuevo in cambios:
+                nombre, email, actual = self._usuarios[usuario_id]
+                if actual == anterior:
+                    self._usuarios[usuario_id] = (nombre, email, nuevo)
+                    cambiados += 1
+        return cambiados
+
+    def hashes_legados(self, despues_de: int, limite: int) -> List[Tuple[int, str]]:
+        with self._lock:
+            # Los ids de usuario son consecutivos desde 1 y no se borran
+            legados = []
+            for usuario_id in range(despues_de + 1, len(self._usuarios) + 1):
+                password_hash = self._usuarios[usuario_id][2]
+                if '$' not in password_hash:
+                    legados.append((usuario_id, password_hash))
+                    if len(legados) == limite:
+                        break
+            return legados
+
+    def nombre_usuario(self, usuario_id: int) -> Optional[str]:
+        usuario = self._usuarios.get(usuario_id)
+        return usuario[0] if usuario else None
+
+    def crear_evento(self, nombre: str, ubicacion: str, fecha: str, categoria: str, capacidad: int,
+                     descripcion: str, organizador_id: int, latitud: Optional[float] = None,
+                     longitud: Optional[float] = None, hora: Optional[str] = None) -> int:
+        dia = dia_epoca(fecha)
+        with self._lock:
+            evento_id = len(self._eventos) + 1
+            self._eventos[evento_id] = (evento_id, nombre, ubicacion, fecha, categoria, capacidad, descripcion,
+                                        organizador_id, latitud, longitud, hora)
+            self._dias[evento_id] = dia
+            insort(self._por_dia, (dia, evento_id))
+            insort(self._por_nombre, (nombre, evento_id))
+            insort(self._por_categoria[categoria], (dia, evento_id))
+        return evento_id
+
+    def insertar_eventos(self, filas: Iterable[Fila]) -> int:
+        # Se agregan al final y se ordena una sola vez: insort por fila sería cuadrático
+        with self._lock:
+            antes = len(self._eventos)
+            for fila in filas:
+                evento_id = len(self._eventos) + 1
+                dia = dia_epoca(fila[2])
+                self._eventos[evento_id] = (evento_id, *fila)
+                self._dias[evento_id] = dia
+                self._por_dia.append((dia, evento_id))
+                self._por_nombre.append((fila[0], evento_id))
+                self._por_categoria[fila[3]].append((dia, evento_id))
+            self._por_dia.sort()
+            self._por_nombre.sort()
+            for indice in self._por_categoria.values():
+                indice.sort()
+            return len(self._eventos) - antes
+
+    def _evento(self, evento_id: int) -> Evento:
+        fila = self._eventos[evento_id]
+        return Evento(*fila[:8], self.nombre_usuario(fila[7]), *fila[8:])
+
+    def obtener_evento(self, evento_id: int) -> Optional[Evento]:
+        with self._lock:
+            return self._evento(evento_id) if evento_id in self._eventos else None
+
+    def eventos_por_ids(self, ids: Sequence[int]) -> List[Evento]:
+        with self._lock:
+            return [self._evento(evento_id) for evento_id in ids if evento_id in self._eventos]
+
+    def _rango_dias(self, filtros: FiltrosEventos) -> Tuple[Optional[int], Optional[int]]:
+        """Días mínimo y máximo (inclusivos) que permiten la fecha y el rango"""
+        bajo, alto = filtros.desde, filtros.hasta
+        if filtros.dia is not None:
+            bajo = filtros.dia if bajo is None else max(bajo, filtros.dia)
+            alto = filtros.dia if alto is None else min(alto, filtros.dia)
+        return bajo, alto
+
+    def _condicion(self, filtros: FiltrosEventos) -> Callable[[int], bool]:
+        """Predicado sobre el id para los filtros que el índice recorrido no resuelve"""
+        categorias = ({filtros.categoria} if isinstance(filtros.categoria, str)
+                      else set(filtros.categoria) if filtros.categoria else None)
+        como = _patron_like(filtros.ubicacion) if filtros.ubicacion else None
+        bajo, alto = self._rango_dias(filtros)
+        eventos, dias = self._eventos, self._dias
+
+        def cumple(evento_id: int) -> bool:
+            fila = eventos[evento_id]
+            if categorias is not None and fila[4] not in categorias:
+                return False
+            if como is not None and not como(fila[2]):
+                return False
+            dia = dias[evento_id]
+            if (bajo is not None and dia < bajo) or (alto is not None and dia > alto):
+                return False
+            hora = fila[10]
+            if filtros.hora_desde and (hora is None or hora < filtros.hora_desde):
+                return False
+            if filtros.hora_hasta and (hora is None or hora > filtros.hora_hasta):
+                return False
+            return True
+
+        return cumple
+
+    def _candidatos(self, filtros: FiltrosEventos, orden: Optional[str], despues: Optional[tuple],
+                    antes: Optional[tuple]) -> Iterator[int]:
+        """Ids en el orden pedido (hacia atrás con `antes`), acotados por el índice que corresponda"""
+        bajo, alto = self._rango_dias(filtros)
+        prefijo_bajo = None if bajo is None else (bajo,)
+        prefijo_alto = None if alto is None else (alto + 1,)
+        por_dia = (self._por_categoria.get(filtros.categoria, []) if isinstance(filtros.categoria, str)
+                   else self._por_dia)
+
+        if orden == 'nombre':
+            i = 0 if prefijo_bajo is None else bisect_left(por_dia, prefijo_bajo)
+            j = len(por_dia) if prefijo_alto is None else bisect_left(por_dia, prefijo_alto)
+            if (j - i) * 8 < len(self._por_nombre):
+                # Pocos eventos en la categoría y el rango de fechas: se ordenan por
+                # nombre en lugar de recorrer todo el índice por nombre
+                claves = sorted((self._eventos[evento_id][1], evento_id) for _, evento_id in por_dia[i:j])
+                return _tramo(claves, None, None, despues, antes)
+            return _tramo(self._por_nombre, None, None, despues, antes)
+
+        if orden == 'categoria':
+            categorias = (sorted(self._por_categoria) if filtros.categoria is None
+                          else [filtros.categoria] if isinstance(filtros.categoria, str)
+                          else list(filtros.categoria))
+            cursor = despues if despues is not None else antes
+            if antes is not None:
+                categorias.reverse()
+
+            def recorrer():
+                for categoria in categorias:
+                    if cursor is not None:
+                        if (categoria < cursor[0]) if antes is None else (categoria > cursor[0]):
+                            continue
+                    resto = cursor[1:] if cursor is not None and categoria == cursor[0] else None
+                    # Hacia atrás todas las categorías se recorren desde su final, no solo la del cursor
+                    yield from _tramo(self._por_categoria.get(categoria, []), prefijo_bajo, prefijo_alto,
+                                      resto if antes is None else None, resto if antes is not None else None,
+                                      hacia_atras=antes is not None)
+            return recorrer()
+
+        # Por fecha, o sin orden pedido: el índice por día acota la categoría y el rango
+        return _tramo(por_dia, prefijo_bajo, prefijo_alto, despues, antes)
+
+    def listar_eventos(self, filtros: FiltrosEventos, orden: str, despues: Optional[tuple] = None,
+                       antes: Optional[tuple] = None, limite: int = 20) -> List[Evento]:
+        if filtros.fecha and filtros.dia is None:
+            return []
+        with self._lock:
+            cumple = self._condicion(filtros)
+            eventos = []
+            for evento_id in self._candidatos(filtros, orden, despues, antes):
+                if len(eventos) >= limite:
+                    break
+                if cumple(evento_id):
+                    eventos.append(self._evento(evento_id))
+        if antes is not None:
+            eventos.reverse()
+        return eventos
+
+    def iterar_eventos(self, filtros: FiltrosEventos, orden: Optional[str], lote: int = 500) -> Iterator[Evento]:
+        if filtros.fecha and filtros.dia is None:
+            return
+        # Los ids se eligen de una vez (como una lectura de SQLite, no ven eventos posteriores);
+        # los Evento se construyen de a `lote`
+        with self._lock:
+            cumple = self._condicion(filtros)
+            ids = [evento_id for evento_id in self._candidatos(filtros, orden, None, None) if cumple(evento_id)]
+        for inicio in range(0, len(ids), lote):
+            with self._lock:
+                eventos = [self._evento(evento_id) for evento_id in ids[inicio:inicio + lote]]
+            yield from eventos
+
+    def agregar_favorito(self, usuario_id: int, evento_id: int) -> Optional[bool]:
+        with self._lock:
+            if evento_id not in self._eventos:
+                return None
+            favoritos = self._favoritos[usuario_id]
+            if evento_id in favoritos:
+                return False
+            favoritos.add(evento_id)
+        return True
+
+    def eliminar_favorito(self, usuario_id: int, evento_id: int) -> bool:
+        with self._lock:
+            favoritos = self._favoritos.get(usuario_id)
+            if not favoritos or evento_id not in favoritos:
+                return False
+            favoritos.discard(evento_id)
+        return True
+
+    def eventos_favoritos(self, usuario_id: int) -> List[Evento]:
+        with self._lock:
+            return [self._evento(evento_id) for evento_id in sorted(self._favoritos.get(usuario_id, ()))]
+
+    def agregar_categoria(self, usuario_id: int, categoria: str) -> bool:
+        with self._lock:
+            if categoria in self._categorias[usuario_id]:
+                return False
+            self._categorias[usuario_id].add(categoria)
+            self._usuarios_categoria[categoria].add(usuario_id)
+        return True
+
+    def eliminar_categoria(self, usuario_id: int, categoria: str) -> bool:
+        with self._lock:
+            categorias = self._categorias.get(usuario_id)
+            if not categorias or categoria not in categorias:
+                return False
+            categorias.discard(categoria)
+            self._usuarios_categoria[categoria].discard(usuario_id)
+        return True
+
+    def usuarios_por_categoria(self, categoria: str) -> List[int]:
+        with self._lock:
+            return sorted(self._usuarios_categoria.get(categoria, ()))
+
+    def construir_recomendaciones(self, motor: MotorRecomendaciones):
+        with self._lock:
+            eventos = self._eventos
+            proximos = self._por_dia[bisect_left(self._por_dia, (dia_epoca(date.today()),)):]
+            motor.cargar(((evento_id, eventos[evento_id][3], eventos[evento_id][4]) for _, evento_id in proximos),
+                         ((usuario_id, categoria) for usuario_id, categorias in self._categorias.items()
+                          for categoria in categorias),
+                         ((usuario_id, evento_id) for usuario_id, favoritos in self._favoritos.items()
+                          for evento_id in favoritos))
+
+    # Asistencia: inscritos por evento y lista de espera
+    def _estado(self, usuario_id: int, evento_id: int) -> Optional[str]:
+        if usuario_id in self._asistentes.get(evento_id, ()):
+            return CONFIRMADO
+        if usuario_id in self._espera.get(evento_id, ()):
+            return EN_ESPERA
+        return None
+
+    def inscribir(self, usuario_id: int, evento_id: int) -> Tuple[Optional[str], bool]:
+        with self._lock:
+            actual = self._estado(usuario_id, evento_id)
+            if actual:
+                return actual, False
+            fila = self._eventos.get(evento_id)
+            if fila is None:
+                return None, False
+            asistentes = self._asistentes[evento_id]
+            if len(asistentes) < fila[5]:
+                asistentes.add(usuario_id)
+                return CONFIRMADO, True
+            self._espera[evento_id][usuario_id] = None
+            return EN_ESPERA, True
+
+    def cancelar_asistencia(self, usuario_id: int, evento_id: int) -> Tuple[bool, Optional[int]]:
+        with self._lock:
+            asistentes = self._asistentes.get(evento_id)
+            if asistentes and usuario_id in asistentes:
+                asistentes.discard(usuario_id)
+                espera = self._espera.get(evento_id)
+                if not espera or len(asistentes) >= self._eventos[evento_id][5]:
+                    return True, None
+                # El cupo pasa al primero de la lista de espera
+                promovido = next(iter(espera))
+                del espera[promovido]
+                asistentes.add(promovido)
+                return True, promovido
+            espera = self._espera.get(evento_id)
+            if espera and usuario_id in espera:
+                del espera[usuario_id]
+                return True, None
+            return False, None
+
+    def estado_asistencia(self, usuario_id: int, evento_id: int) -> Optional[str]:
+        with self._lock:
+            return self._estado(usuario_id, evento_id)
+
+    def consultar_asistencia(self, evento_id: int) -> Optional[Asistencia]:
+        with self._lock:
+            fila = self._eventos.get(evento_id)
+            if fila is None:
+                return None
+            return Asistencia(fila[5], len(self._asistentes.get(evento_id, ())), len(self._espera.get(evento_id, ())))
@@ -0,0 +1,104 @@
+import sqlite3
+from typing import NamedTuple, Optional, Tuple
+
+# Estados de una inscripción
+CONFIRMADO = 'confirmado'
+EN_ESPERA = 'en_espera'
+
+
+class Asistencia(NamedTuple):
+    capacidad: int
+    inscritos: int
+    en_espera: int
+
+    @property
+    def cupos(self) -> int:
+        return max(self.capacidad - self.inscritos, 0)
+
+
+def estado(conn: sqlite3.Connection, usuario_id: int, evento_id: int) -> Optional[str]:
+    if conn.execute('SELECT 1 FROM asistentes WHERE evento_id = ? AND usuario_id = ?',
+                    (evento_id, usuario_id)).fetchone():
+        return CONFIRMADO
+    if conn.execute('SELECT 1 FROM lista_espera WHERE evento_id = ? AND usuario_id = ?',
+                    (evento_id, usuario_id)).fetchone():
+        return EN_ESPERA
+    return None
+
+
+def _promover(conn: sqlite3.Connection, evento_id: int) -> Optional[int]:
+    """Pasa a asistentes al primero de la lista de espera si hay cupo; devuelve su usuario_id"""
+    fila = conn.execute('SELECT id, usuario_id FROM lista_espera WHERE evento_id = ? ORDER BY id LIMIT 1',
+                        (evento_id,)).fetchone()
+    if not fila:
+        return None
+    if not conn.execute('UPDATE eventos SET inscritos = inscritos + 1 WHERE id = ? AND inscritos < capacidad',
+                        (evento_id,)).rowcount:
+        return None
+    conn.execute('DELETE FROM lista_espera WHERE id = ?', (fila[0],))
+    conn.execute('INSERT INTO asistentes (usuario_id, evento_id) VALUES (?, ?)', (fila[1], evento_id))
+    return fila[1]
+
+
+def inscribir(conn: sqlite3.Connection, usuario_id: int, evento_id: int) -> Tuple[Optional[str], bool]:
+    """Inscribe al usuario si queda cupo o lo pone en la lista de espera.
+
+    Devuelve (estado, nuevo); estado es None si el evento no existe. Todo ocurre
+    en una transacción BEGIN IMMEDIATE: el bloqueo de escritura se toma antes de
+    leer, así dos inscripciones simultáneas no pueden ver el mismo cupo libre, y
+    el cupo se descuenta del contador eventos.inscritos sin contar asistentes.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        actual = estado(conn, usuario_id, evento_id)
+        if actual:
+            conn.rollback()
+            return actual, False
+
+        if conn.execute('UPDATE eventos SET inscritos = inscritos + 1 WHERE id = ? AND inscritos < capacidad',
+                        (evento_id,)).rowcount:
+            conn.execute('INSERT INTO asistentes (usuario_id, evento_id) VALUES (?, ?)', (usuario_id, evento_id))
+            actual = CONFIRMADO
+        elif conn.execute('SELECT 1 FROM eventos WHERE id = ?', (evento_id,)).fetchone():
+            conn.execute('INSERT INTO lista_espera (evento_id, usuario_id) VALUES (?, ?)', (evento_id, usuario_id))
+            actual = EN_ESPERA
+        else:
+            conn.rollback()
+            return None, False
+        conn.commit()
+        return actual, True
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def cancelar(conn: sqlite3.Connection, usuario_id: int, evento_id: int) -> Tuple[bool, Optional[int]]:
+    """Cancela la inscripción o el lugar en la lista de espera.
+
+    Devuelve (cancelado, promovido): si se liberó un cupo, el primero de la
+    lista de espera lo ocupa en la misma transacción.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        promovido = None
+        if conn.execute('DELETE FROM asistentes WHERE usuario_id = ? AND evento_id = ?',
+                        (usuario_id, evento_id)).rowcount:
+            conn.execute('UPDATE eventos SET inscritos = inscritos - 1 WHERE id = ?', (evento_id,))
+            promovido = _promover(conn, evento_id)
+        elif not conn.execute('DELETE FROM lista_espera WHERE evento_id = ? AND usuario_id = ?',
+                              (evento_id, usuario_id)).rowcount:
+            conn.rollback()
+            return False, None
+        conn.commit()
+        return True, promovido
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def consultar(conn: sqlite3.Connection, evento_id: int) -> Optional[Asistencia]:
+    fila = conn.execute('''
+        SELECT capacidad, inscritos, (SELECT count(*) FROM lista_espera WHERE evento_id = e.id)
+        FROM eventos e WHERE id = ?
+    ''', (evento_id,)).fetchone()
+    return Asistencia(*fila) if fila else None
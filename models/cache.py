@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+# Etiqueta de una consulta sin filtro de categoría o de fecha: la afecta cualquier evento
+TODAS = '*'
+
+
+def _puede_coincidir(filtro: str, ubicacion: str) -> bool:
+    """Si `ubicacion LIKE '%filtro%'` podría ser cierto (ambos en minúsculas).
+
+    Es más amplio que LIKE, que solo ignora mayúsculas en ASCII, y trata como
+    coincidencia cualquier filtro con comodines: nunca deja una entrada afectada.
+    """
+    return '%' in filtro or '_' in filtro or filtro in ubicacion
+
+
+class CacheConsultas:
+    """Caché de resultados de consultas de eventos, LRU con tiempo de vida.
+
+    Cada resultado se guarda con su categoría y fecha filtradas (o TODAS), y un
+    evento nuevo o modificado invalida solo las entradas de su categoría y su
+    fecha: las 4 combinaciones (categoria, fecha), (categoria, TODAS),
+    (TODAS, fecha) y (TODAS, TODAS). Las consultas con filtro de ubicación solo
+    se invalidan si la ubicación del evento puede coincidir.
+
+    Para no guardar un resultado leído antes de una escritura que lo invalida,
+    cada combinación con consultas en curso lleva un contador de versión: si
+    cambió mientras se calculaba el resultado, este se devuelve pero no se
+    guarda. El contador se descarta cuando termina la última de esas consultas,
+    así solo hay tantos como combinaciones calculándose a la vez.
+    """
+
+    def __init__(self, capacidad: int = 256, ttl: float = 60.0):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._entradas: OrderedDict = OrderedDict()  # clave -> (valor, vence, etiqueta, ubicacion)
+        self._por_etiqueta: Dict[Tuple[str, str], Set[Hashable]] = defaultdict(set)
+        self._versiones: Dict[Tuple[str, str], List[int]] = {}  # etiqueta -> [consultas en curso, versión]
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.expiradas = 0
+        self.invalidadas = 0
+
+    def obtener(self, clave: Hashable, calcular: Callable[[], Any], categoria: Optional[str] = None,
+                fecha: Optional[str] = None, ubicacion: Optional[str] = None) -> Any:
+        """Devuelve el resultado guardado para la clave o lo calcula y lo guarda"""
+        etiqueta = (categoria or TODAS, fecha or TODAS)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada[1] > time.monotonic():
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return entrada[0]
+                self._quitar(clave)
+                self.expiradas += 1
+            self.fallos += 1
+            en_curso = self._versiones.setdefault(etiqueta, [0, 0])
+            en_curso[0] += 1
+            version = en_curso[1]
+
+        try:
+            valor = calcular()
+        except BaseException:
+            with self._lock:
+                self._terminar(etiqueta, en_curso)
+            raise
+
+        with self._lock:
+            self._terminar(etiqueta, en_curso)
+            if self.capacidad <= 0 or en_curso[1] != version:
+                return valor
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (valor, time.monotonic() + self.ttl, etiqueta, ubicacion and ubicacion.lower())
+            self._por_etiqueta[etiqueta].add(clave)
+            while len(self._entradas) > self.capacidad:
+                self._quitar(next(iter(self._entradas)))
+                self.expulsiones += 1
+        return valor
+
+    def invalidar(self, categoria: str, fecha: str, ubicacion: Optional[str] = None):
+        """Descarta las consultas que podrían incluir un evento con esta categoría, fecha y ubicación"""
+        ubicacion = ubicacion.lower() if ubicacion else None
+        with self._lock:
+            for etiqueta in ((categoria, fecha), (categoria, TODAS), (TODAS, fecha), (TODAS, TODAS)):
+                if etiqueta in self._versiones:
+                    self._versiones[etiqueta][1] += 1
+                for clave in list(self._por_etiqueta.get(etiqueta, ())):
+                    filtro = self._entradas[clave][3]
+                    if filtro and ubicacion is not None and not _puede_coincidir(filtro, ubicacion):
+                        continue
+                    self._quitar(clave)
+                    self.invalidadas += 1
+
+    def limpiar(self):
+        with self._lock:
+            # Las consultas en curso tampoco deben guardarse
+            for en_curso in self._versiones.values():
+                en_curso[1] += 1
+            self._entradas.clear()
+            self._por_etiqueta.clear()
+
+    def estadisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entradas': len(self._entradas), 'aciertos': self.aciertos, 'fallos': self.fallos,
+                    'expulsiones': self.expulsiones, 'expiradas': self.expiradas,
+                    'invalidadas': self.invalidadas}
+
+    def _terminar(self, etiqueta: Tuple[str, str], en_curso: List[int]):
+        en_curso[0] -= 1
+        if not en_curso[0]:
+            del self._versiones[etiqueta]
+
+    def _quitar(self, clave: Hashable):
+        etiqueta = self._entradas.pop(clave)[2]
+        claves = self._por_etiqueta[etiqueta]
+        claves.discard(clave)
+        if not claves:
+            del self._por_etiqueta[etiqueta]
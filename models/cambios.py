@@ -0,0 +1,153 @@
+"""Registro de cambios de eventos y vista materializada de próximos eventos por día y categoría.
+
+Los triggers de la migración CAMBIOS agregan una fila a cambios_eventos por cada
+alta, modificación o baja de un evento, con una secuencia creciente (AUTOINCREMENT
+no reutiliza valores y SQLite tiene un solo escritor, así que las secuencias se
+confirman en orden). Completar las coordenadas desde la ubicación no cuenta como
+modificación (migración CAMBIOS_COORDENADAS). Un consumidor guarda la última secuencia que leyó y pide
+solo lo posterior: el costo depende de los cambios, no del tamaño del catálogo.
+
+proximos_por_dia cuenta los eventos de cada día y categoría y recuerda la
+secuencia del último cambio que tocó cada grupo. Se refresca aplicando los
+cambios posteriores a su cursor (en cursores_cambios), así que refrescarla y
+pedir los grupos que cambiaron también cuesta O(cambios).
+"""
+import sqlite3
+from collections import Counter
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .almacenamiento import COLUMNAS_EVENTOS
+from .evento import Evento
+from .fechas import EPOCA
+
+# Operaciones registradas en cambios_eventos
+ALTA = 'alta'
+MODIFICACION = 'modificacion'
+BAJA = 'baja'
+
+# Cambios aplicados a la vista por transacción al refrescarla
+LOTE_REFRESCO = 10_000
+
+
+class Cambio(NamedTuple):
+    secuencia: int
+    evento_id: int
+    operacion: str
+    # Estado actual del evento (no el del momento del cambio); None si ya no existe
+    evento: Optional[Evento]
+
+
+class GrupoProximos(NamedTuple):
+    fecha: date
+    categoria: str
+    eventos: int
+    # Secuencia del último cambio que alteró el grupo (eventos puede haber vuelto a 0)
+    secuencia: int
+
+
+class CursorVencido(ValueError):
+    """El cursor es anterior a los cambios conservados: hay que releer el catálogo"""
+
+
+def _cursor(conn: sqlite3.Connection, nombre: str) -> int:
+    return conn.execute('SELECT secuencia FROM cursores_cambios WHERE nombre = ?', (nombre,)).fetchone()[0]
+
+
+def ultimo(conn: sqlite3.Connection) -> int:
+    """Secuencia del último cambio registrado (0 si no hubo ninguno)"""
+    fila = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cambios_eventos'").fetchone()
+    return fila[0] if fila else 0
+
+
+def leer(conn: sqlite3.Connection, despues: int, limite: int) -> Tuple[List[Cambio], int]:
+    """Cambios con secuencia mayor que `despues`, en orden, y el cursor para la próxima lectura"""
+    if despues < _cursor(conn, 'podado'):
+        raise CursorVencido(f"Los cambios hasta la secuencia {_cursor(conn, 'podado')} ya se descartaron")
+    filas = conn.execute(f'''
+        SELECT c.secuencia, c.evento_id, c.operacion, {COLUMNAS_EVENTOS}
+        FROM cambios_eventos c
+        LEFT JOIN eventos e ON e.id = c.evento_id
+        LEFT JOIN usuarios u ON u.id = e.organizador_id
+        WHERE c.secuencia > ?
+        ORDER BY c.secuencia
+        LIMIT ?
+    ''', (despues, limite)).fetchall()
+    cambios = [Cambio(secuencia, evento_id, operacion, Evento(*evento) if evento[0] is not None else None)
+               for secuencia, evento_id, operacion, *evento in filas]
+    return cambios, cambios[-1].secuencia if cambios else despues
+
+
+def refrescar(conn: sqlite3.Connection, hoy: int) -> int:
+    """Aplica a proximos_por_dia los cambios posteriores a su cursor y descarta los días
+    anteriores a `hoy` (días desde EPOCA); devuelve cuántos cambios aplicó"""
+    aplicados = 0
+    while True:
+        # BEGIN IMMEDIATE: dos refrescos simultáneos no pueden aplicar los mismos cambios
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            desde = _cursor(conn, 'proximos_por_dia')
+            filas = conn.execute('''
+                SELECT secuencia, dia_anterior, categoria_anterior, dia, categoria FROM cambios_eventos
+                WHERE secuencia > ? ORDER BY secuencia LIMIT ?
+            ''', (desde, LOTE_REFRESCO)).fetchall()
+            if not filas:
+                conn.rollback()
+                return aplicados
+            deltas: Dict[Tuple[int, str], int] = Counter()
+            tocados: Dict[Tuple[int, str], int] = {}
+            for secuencia, dia_anterior, categoria_anterior, dia, categoria in filas:
+                # Los días pasados ya no están en la vista; una modificación que no cambia
+                # el grupo suma 0 pero lo marca como cambiado
+                if dia_anterior is not None and dia_anterior >= hoy:
+                    deltas[dia_anterior, categoria_anterior] -= 1
+                    tocados[dia_anterior, categoria_anterior] = secuencia
+                if dia is not None and dia >= hoy:
+                    deltas[dia, categoria] += 1
+                    tocados[dia, categoria] = secuencia
+            conn.executemany('''
+                INSERT INTO proximos_por_dia (dia, categoria, eventos, secuencia) VALUES (?, ?, ?, ?)
+                ON CONFLICT (dia, categoria) DO UPDATE SET
+                    eventos = eventos + excluded.eventos, secuencia = excluded.secuencia
+            ''', ((dia, categoria, deltas[dia, categoria], secuencia)
+                  for (dia, categoria), secuencia in tocados.items()))
+            conn.execute('DELETE FROM proximos_por_dia WHERE dia < ?', (hoy,))
+            conn.execute("UPDATE cursores_cambios SET secuencia = ? WHERE nombre = 'proximos_por_dia'",
+                         (filas[-1][0],))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        aplicados += len(filas)
+
+
+def proximos(conn: sqlite3.Connection, hoy: int, despues: int = 0, dias: Optional[int] = None,
+             categorias: Sequence[str] = ()) -> Tuple[List[GrupoProximos], int]:
+    """Grupos (día, categoría) desde `hoy` que cambiaron después de la secuencia `despues`
+    (todos con 0) y el cursor para la próxima lectura. Supone la vista ya refrescada."""
+    condiciones, params = ['dia >= ?', 'secuencia > ?'], [hoy, despues]
+    if dias is not None:
+        condiciones.append('dia < ?')
+        params.append(hoy + dias)
+    if categorias:
+        condiciones.append('categoria IN ({})'.format(','.join('?' * len(categorias))))
+        params.extend(categorias)
+    filas = conn.execute('SELECT dia, categoria, eventos, secuencia FROM proximos_por_dia WHERE {} '
+                         'ORDER BY dia, categoria'.format(' AND '.join(condiciones)), params).fetchall()
+    grupos = [GrupoProximos(date.fromordinal(EPOCA.toordinal() + dia), categoria, eventos, secuencia)
+              for dia, categoria, eventos, secuencia in filas]
+    return grupos, _cursor(conn, 'proximos_por_dia')
+
+
+def podar(conn: sqlite3.Connection, hasta: int) -> int:
+    """Descarta los cambios con secuencia hasta `hasta` que la vista y los demás consumidores
+    con cursor en cursores_cambios ya aplicaron (un cursor negativo es un consumidor sin
+    construir, que no retiene nada); los consumidores con un cursor anterior recibirán
+    CursorVencido. Devuelve cuántos borró."""
+    aplicado = conn.execute(
+        "SELECT min(secuencia) FROM cursores_cambios WHERE nombre != 'podado' AND secuencia >= 0").fetchone()[0]
+    hasta = min(hasta, aplicado if aplicado is not None else hasta)
+    borrados = conn.execute('DELETE FROM cambios_eventos WHERE secuencia <= ?', (hasta,)).rowcount
+    conn.execute("UPDATE cursores_cambios SET secuencia = max(secuencia, ?) WHERE nombre = 'podado'", (hasta,))
+    conn.commit()
+    return borrados
@@ -0,0 +1,168 @@
+import base64
+import functools
+import hashlib
+import hmac
+import os
+import threading
+from typing import Callable, Iterable, List, Optional
+
+# scrypt (memoria 128 * n * r = 16 MiB por hash); PBKDF2 si OpenSSL no trae scrypt
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERACIONES = 600_000
+ALGORITMO = 'scrypt' if hasattr(hashlib, 'scrypt') else 'pbkdf2_sha256'
+LARGO_SAL = 16
+LARGO_CLAVE = 32
+# Hashes que PoolClaves calcula a la vez; los demás esperan en la cola hasta MAXIMO_PENDIENTES
+HILOS_CLAVES = max(1, (os.cpu_count() or 2) // 2)
+MAXIMO_PENDIENTES = 64
+
+
+class ClavesSaturadas(RuntimeError):
+    """Hay demasiados hashes de contraseña pendientes: la petición se rechaza sin esperar"""
+
+
+def _b64(datos: bytes) -> str:
+    return base64.b64encode(datos).decode().rstrip('=')
+
+
+def _desde_b64(texto: str) -> bytes:
+    return base64.b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def _scrypt(secreto: bytes, sal: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(secreto, salt=sal, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=LARGO_CLAVE)
+
+
+def _derivar(secreto: bytes, sal: bytes) -> str:
+    if ALGORITMO == 'scrypt':
+        return f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(sal)}${_b64(_scrypt(secreto, sal, SCRYPT_N, SCRYPT_R, SCRYPT_P))}'
+    clave = hashlib.pbkdf2_hmac('sha256', secreto, sal, PBKDF2_ITERACIONES, LARGO_CLAVE)
+    return f'pbkdf2_sha256${PBKDF2_ITERACIONES}${_b64(sal)}${_b64(clave)}'
+
+
+def hashear(password: str) -> str:
+    """Hash con sal aleatoria: 'scrypt$n$r$p$sal$clave' o 'pbkdf2_sha256$iteraciones$sal$clave' (base64)"""
+    return _derivar(password.encode(), os.urandom(LARGO_SAL))
+
+
+def sha256_legado(password: str) -> str:
+    """El hash anterior: SHA-256 sin sal, en hexadecimal"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def envolver_legado(hash_legado: str) -> str:
+    """Protege un hash SHA-256 antiguo sin conocer la contraseña: el resultado es el hash
+    moderno del hash antiguo, marcado con 'sha256+' para aplicar SHA-256 antes al verificar"""
+    return 'sha256+' + _derivar(hash_legado.encode(), os.urandom(LARGO_SAL))
+
+
+def es_legado(guardado: str) -> bool:
+    return '$' not in guardado
+
+
+def verificar(password: str, guardado: str) -> bool:
+    """Compara en tiempo constante; acepta los hashes modernos, los envueltos y los SHA-256 antiguos"""
+    if es_legado(guardado):
+        return hmac.compare_digest(sha256_legado(password), guardado)
+    secreto = password.encode()
+    if guardado.startswith('sha256+'):
+        guardado = guardado[len('sha256+'):]
+        secreto = sha256_legado(password).encode()
+    partes = guardado.split('$')
+    try:
+        if partes[0] == 'scrypt' and len(partes) == 6:
+            n, r, p = int(partes[1]), int(partes[2]), int(partes[3])
+            calculada = _scrypt(secreto, _desde_b64(partes[4]), n, r, p)
+            esperada = _desde_b64(partes[5])
+        elif partes[0] == 'pbkdf2_sha256' and len(partes) == 4:
+            esperada = _desde_b64(partes[3])
+            calculada = hashlib.pbkdf2_hmac('sha256', secreto, _desde_b64(partes[2]), int(partes[1]), len(esperada))
+        else:
+            return False
+    except ValueError:
+        return False
+    return hmac.compare_digest(calculada, esperada)
+
+
+def necesita_rehash(guardado: str) -> bool:
+    """Si el hash es antiguo, envuelto o con parámetros distintos de los actuales"""
+    if es_legado(guardado) or guardado.startswith('sha256+'):
+        return True
+    partes = guardado.split('$')
+    if ALGORITMO == 'scrypt':
+        return partes[:4] != ['scrypt', str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+    return partes[:2] != ['pbkdf2_sha256', str(PBKDF2_ITERACIONES)]
+
+
+@functools.lru_cache(maxsize=None)
+def hash_ficticio() -> str:
+    """Se verifica contra este hash cuando el email no existe: la respuesta tarda lo mismo"""
+    return hashear('contraseña inexistente')
+
+
+class PoolClaves:
+    """Hilos dedicados a calcular hashes de contraseñas, con control de admisión.
+
+    scrypt y PBKDF2 liberan el GIL, así que un pool de hilos reparte los hashes
+    entre núcleos sin procesos aparte. A lo sumo `hilos` hashes corren a la vez
+    (el resto de los hilos del servicio sigue atendiendo consultas) y a lo sumo
+    `maximo_pendientes` esperan o corren: los siguientes se rechazan enseguida
+    con ClavesSaturadas en lugar de acumular una cola que nadie va a esperar.
+    Los hilos (y concurrent.futures) se crean con el primer hash, no al arrancar.
+    """
+
+    def __init__(self, hilos: int = HILOS_CLAVES, maximo_pendientes: int = MAXIMO_PENDIENTES):
+        self.hilos = hilos
+        self.maximo_pendientes = maximo_pendientes
+        self._ejecutor = None
+        self._lock = threading.Lock()
+        self.pendientes = 0
+        self.rechazados = 0
+
+    def _hilos(self):
+        if self._ejecutor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            with self._lock:
+                if self._ejecutor is None:
+                    self._ejecutor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='claves')
+        return self._ejecutor
+
+    def _enviar(self, funcion: Callable, *args):
+        ejecutor = self._hilos()
+        with self._lock:
+            if self.pendientes >= self.maximo_pendientes:
+                self.rechazados += 1
+                raise ClavesSaturadas("Demasiados inicios de sesión simultáneos, intenta de nuevo en unos segundos")
+            self.pendientes += 1
+        futuro = ejecutor.submit(funcion, *args)
+        futuro.add_done_callback(self._terminado)
+        return futuro
+
+    def _terminado(self, futuro):
+        with self._lock:
+            self.pendientes -= 1
+
+    def hashear(self, password: str) -> str:
+        return self._enviar(hashear, password).result()
+
+    def verificar(self, password: str, guardado: Optional[str]) -> bool:
+        return self._enviar(verificar, password, guardado or hash_ficticio()).result() and guardado is not None
+
+    def envolver_legados(self, hashes: Iterable[str]) -> List[str]:
+        """Para la migración por lotes: usa todos los hilos y no pasa por el control de admisión"""
+        return list(self._hilos().map(envolver_legado, hashes))
+
+    async def hashear_async(self, password: str) -> str:
+        import asyncio
+        return await asyncio.wrap_future(self._enviar(hashear, password))
+
+    async def verificar_async(self, password: str, guardado: Optional[str]) -> bool:
+        import asyncio
+        ok = await asyncio.wrap_future(self._enviar(verificar, password, guardado or hash_ficticio()))
+        return ok and guardado is not None
+
+    def cerrar(self):
+        if self._ejecutor is not None:
+            self._ejecutor.shutdown(wait=True)
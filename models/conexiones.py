@@ -0,0 +1,109 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+from .metricas import ConexionMedida, Metricas
+
+# Pragmas aplicados a cada conexión nueva del pool
+PRAGMAS = [
+    'PRAGMA journal_mode = WAL',      # lectores y un escritor concurrentes
+    'PRAGMA synchronous = NORMAL',    # seguro con WAL y sin fsync por commit
+    'PRAGMA cache_size = -16000',     # 16 MiB de caché de páginas por conexión
+    'PRAGMA mmap_size = 268435456',   # lecturas mapeadas en memoria (256 MiB)
+    'PRAGMA temp_store = MEMORY',
+]
+
+
+class PoolConexiones:
+    """Pool de conexiones SQLite compartido entre hilos.
+
+    Un hilo que ya tiene una conexión del pool recibe la misma en las llamadas
+    anidadas, así un método de Sistema puede usar otro sin agotar el pool.
+    Con metricas (activas) las conexiones registran cada sentencia en ellas.
+    Las conexiones se abren al pedirlas; `preparar` corre una sola vez sobre la
+    primera (p. ej. para migrar el esquema) antes de que nadie la use.
+    """
+
+    def __init__(self, ruta_db: str, tamano: int = 4, espera: float = 5.0, metricas: Optional[Metricas] = None,
+                 preparar: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.ruta_db = ruta_db
+        self.metricas = metricas if metricas is not None and metricas.activa else None
+        # sqlite3 no crea la carpeta: la ruta por defecto es relativa al directorio actual
+        directorio = os.path.dirname(ruta_db)
+        if ruta_db != ':memory:' and directorio:
+            os.makedirs(directorio, exist_ok=True)
+        # Cada conexión a ':memory:' sería una base de datos distinta
+        self.tamano = 1 if ruta_db == ':memory:' else tamano
+        # Segundos que se espera por una conexión libre o por un bloqueo de escritura
+        self.espera = espera
+        self._libres: queue.LifoQueue = queue.LifoQueue()
+        self._todas: List[sqlite3.Connection] = []
+        self._preparar = preparar
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _abrir(self) -> sqlite3.Connection:
+        if self.metricas is None:
+            conn = sqlite3.connect(self.ruta_db, timeout=self.espera, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.ruta_db, timeout=self.espera, check_same_thread=False,
+                                   factory=ConexionMedida)
+            conn.metricas, conn.ruta_db = self.metricas, self.ruta_db
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _obtener(self) -> sqlite3.Connection:
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            crear = len(self._todas) < self.tamano
+            if crear:
+                conn = self._abrir()
+                if self._preparar is not None:
+                    # Los demás hilos esperan en el lock: ninguno ve la base de datos sin preparar
+                    try:
+                        self._preparar(conn)
+                    except BaseException:
+                        conn.close()
+                        raise
+                    self._preparar = None
+                self._todas.append(conn)
+        if crear:
+            return conn
+
+        try:
+            return self._libres.get(timeout=self.espera)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"No hay conexiones libres después de {self.espera} s (pool de {self.tamano})")
+
+    @contextmanager
+    def conexion(self) -> Iterator[sqlite3.Connection]:
+        propia = getattr(self._local, 'conn', None)
+        if propia is not None:
+            yield propia
+            return
+
+        conn = self._obtener()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            # No devolver al pool una transacción abierta por un error
+            if conn.in_transaction:
+                conn.rollback()
+            self._libres.put(conn)
+
+    def cerrar(self):
+        with self._lock:
+            for conn in self._todas:
+                conn.close()
+            self._todas.clear()
+            self._libres = queue.LifoQueue()
@@ -0,0 +1,217 @@
+"""Contadores de favoritos por evento y ranking de tendencia, escritos en diferido.
+
+contadores_eventos guarda por evento cuántos usuarios lo tienen en favoritos y
+un puntaje de tendencia que decae con el tiempo: cada favorito o inscripción
+suma su peso, que pierde la mitad cada VIDA_MEDIA segundos. Para no reescribir
+todas las filas a medida que decaen, el puntaje se guarda con decaimiento hacia
+adelante: cada aporte se multiplica por 2 ** ((t - base) / VIDA_MEDIA), con la
+base en tendencia_base, así el orden entre eventos no cambia con el paso del
+tiempo y el puntaje actual es el guardado por 2 ** ((base - ahora) / VIDA_MEDIA).
+Cuando la base queda muy atrás, un vaciado la adelanta y reescala todas las
+filas (una vez cada REBASE vidas medias).
+
+Los clics no escriben los contadores: BufferContadores acumula en memoria los
+incrementos por evento (mil clics sobre un evento son una sola fila) y los
+aplica en una transacción cuando se juntan `maximo` eventos, antes de cada
+consulta del ranking y, desde un hilo de fondo, cuando pasan `intervalo`
+segundos desde el vaciado anterior: ningún incremento queda pendiente más de
+un intervalo aunque no lleguen más clics. Si el proceso muere se pierden a lo
+sumo los incrementos de un intervalo; recontar() corrige los favoritos desde
+la tabla favoritos.
+
+Los índices (categoria, tendencia) y (categoria, favoritos) dan el top-N de
+una categoría leyendo N filas (más las de eventos ya pasados que se salten).
+"""
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple
+
+from .almacenamiento import COLUMNAS_EVENTOS
+from .conexiones import PoolConexiones
+from .evento import Evento
+
+# Segundos en que el aporte de un clic al puntaje de tendencia cae a la mitad
+VIDA_MEDIA = 12 * 3600.0
+# Vidas medias tras las que se adelanta la base (2 ** 64 está lejos de desbordar un REAL)
+REBASE = 64
+# Peso de cada acción en la tendencia
+PESO_FAVORITO = 1.0
+PESO_ASISTENCIA = 2.0
+# Vaciado del búfer: cada INTERVALO segundos o al juntar MAXIMO_PENDIENTES eventos
+INTERVALO = 1.0
+MAXIMO_PENDIENTES = 1000
+
+SUMAR = '''
+    INSERT INTO contadores_eventos (evento_id, categoria, favoritos, tendencia)
+    SELECT id, categoria, ?, ? FROM eventos WHERE id = ?
+    ON CONFLICT (evento_id) DO UPDATE SET
+        favoritos = favoritos + excluded.favoritos, tendencia = tendencia + excluded.tendencia
+'''
+
+
+class Destacado(NamedTuple):
+    evento: Evento
+    favoritos: int
+    # Puntaje de tendencia al momento de la consulta
+    tendencia: float
+
+
+class BufferContadores:
+    """Acumula en memoria los incrementos de contadores_eventos y los escribe por lotes.
+
+    Los incrementos pendientes de tendencia se guardan con su propia base (la
+    hora del último vaciado) y se pasan a la de la base de datos al escribirlos.
+    El hilo que vacía el búfer cada `intervalo` segundos arranca con el primer
+    incremento y se detiene con cerrar().
+    """
+
+    def __init__(self, pool: PoolConexiones, intervalo: float = INTERVALO, maximo: int = MAXIMO_PENDIENTES,
+                 vida_media: float = VIDA_MEDIA):
+        self.pool = pool
+        self.intervalo = intervalo
+        self.maximo = maximo
+        self.vida_media = vida_media
+        self._lock = threading.Lock()
+        # Un solo vaciado a la vez; los demás hilos siguen sumando mientras tanto
+        self._lock_vaciado = threading.Lock()
+        self._pendientes: Dict[int, List[float]] = {}  # evento_id -> [favoritos, tendencia]
+        self._base = time.time()
+        self._ultimo_vaciado = time.monotonic()
+        self._hilo = None
+        self._detener = threading.Event()
+        self.sumados = 0
+        self.escritos = 0
+        self.vaciados = 0
+
+    def sumar(self, evento_id: int, favoritos: int = 0, peso: float = 0.0):
+        """Registra un cambio de `favoritos` y un aporte de `peso` a la tendencia del evento"""
+        with self._lock:
+            pendiente = self._pendientes.get(evento_id)
+            if pendiente is None:
+                pendiente = self._pendientes[evento_id] = [0, 0.0]
+            pendiente[0] += favoritos
+            if peso:
+                pendiente[1] += peso * 2 ** ((time.time() - self._base) / self.vida_media)
+            self.sumados += 1
+            vaciar = (len(self._pendientes) >= self.maximo
+                      or time.monotonic() - self._ultimo_vaciado >= self.intervalo)
+            if self._hilo is None and not self._detener.is_set():
+                self._hilo = threading.Thread(target=self._ciclo, name='contadores', daemon=True)
+                self._hilo.start()
+        if vaciar:
+            self.vaciar()
+
+    # Hilo de fondo
+    def _ciclo(self):
+        espera = self.intervalo
+        while not self._detener.wait(espera):
+            # Despierta `intervalo` segundos después del último vaciado, lo haya hecho quien sea
+            espera = self._ultimo_vaciado + self.intervalo - time.monotonic()
+            if espera > 0:
+                continue
+            espera = self.intervalo
+            if self._pendientes:
+                try:
+                    self.vaciar()
+                except Exception as error:
+                    print(f"Error escribiendo contadores: {error}")
+
+    def cerrar(self):
+        """Detiene el hilo de fondo y escribe lo pendiente"""
+        with self._lock:
+            self._detener.set()
+            hilo, self._hilo = self._hilo, None
+        if hilo is not None:
+            hilo.join()
+        self.vaciar()
+
+    @property
+    def pendientes(self) -> int:
+        return len(self._pendientes)
+
+    def vaciar(self) -> int:
+        """Escribe los incrementos pendientes en una transacción; devuelve cuántos eventos tocó"""
+        with self._lock_vaciado:
+            with self._lock:
+                pendientes, self._pendientes = self._pendientes, {}
+                base_pendientes, self._base = self._base, time.time()
+                self._ultimo_vaciado = time.monotonic()
+            if not pendientes:
+                return 0
+            try:
+                with self.pool.conexion() as conn:
+                    conn.execute('BEGIN IMMEDIATE')
+                    try:
+                        base = self._adelantar_base(conn)
+                        escala = 2 ** ((base_pendientes - base) / self.vida_media)
+                        # En orden de evento_id las escrituras tocan menos páginas
+                        conn.executemany(SUMAR, ((favoritos, tendencia * escala, evento_id)
+                                                 for evento_id, (favoritos, tendencia) in sorted(pendientes.items())))
+                        conn.commit()
+                    except BaseException:
+                        conn.rollback()
+                        raise
+            except BaseException:
+                # Los incrementos vuelven al búfer, pasados a su base actual
+                with self._lock:
+                    escala = 2 ** ((base_pendientes - self._base) / self.vida_media)
+                    for evento_id, (favoritos, tendencia) in pendientes.items():
+                        pendiente = self._pendientes.setdefault(evento_id, [0, 0.0])
+                        pendiente[0] += favoritos
+                        pendiente[1] += tendencia * escala
+                raise
+            self.escritos += len(pendientes)
+            self.vaciados += 1
+            return len(pendientes)
+
+    def _adelantar_base(self, conn: sqlite3.Connection) -> float:
+        base = conn.execute('SELECT base FROM tendencia_base').fetchone()[0]
+        ahora = time.time()
+        if ahora - base > REBASE * self.vida_media:
+            conn.execute('UPDATE contadores_eventos SET tendencia = tendencia * ?',
+                         (2 ** ((base - ahora) / self.vida_media),))
+            conn.execute('UPDATE tendencia_base SET base = ?', (ahora,))
+            base = ahora
+        return base
+
+
+def destacados(conn: sqlite3.Connection, categoria: str, n: int, hoy: int, orden: str = 'tendencia',
+               vida_media: float = VIDA_MEDIA) -> List[Destacado]:
+    """Los n eventos desde `hoy` (días desde EPOCA) de la categoría con mayor tendencia o
+    más favoritos, por el índice (categoria, orden): lee n filas más las de eventos pasados"""
+    if orden not in ('tendencia', 'favoritos'):
+        raise ValueError(f"Orden desconocido: {orden!r} (disponibles: tendencia, favoritos)")
+    base = conn.execute('SELECT base FROM tendencia_base').fetchone()[0]
+    factor = 2 ** ((base - time.time()) / vida_media)
+    filas = conn.execute(f'''
+        SELECT c.favoritos, c.tendencia, {COLUMNAS_EVENTOS}
+        FROM contadores_eventos c INDEXED BY idx_contadores_{orden}
+        JOIN eventos e ON e.id = c.evento_id
+        LEFT JOIN usuarios u ON u.id = e.organizador_id
+        WHERE c.categoria = ? AND c.{orden} > 0 AND e.dia >= ?
+        ORDER BY c.{orden} DESC LIMIT ?
+    ''', (categoria, hoy, n)).fetchall()
+    return [Destacado(Evento(*evento), favoritos, tendencia * factor) for favoritos, tendencia, *evento in filas]
+
+
+def recontar(conn: sqlite3.Connection) -> int:
+    """Recalcula los favoritos de cada evento desde la tabla favoritos (p. ej. tras perder
+    incrementos sin escribir); la tendencia no se puede reconstruir y se conserva.
+    Devuelve cuántos contadores corrigió."""
+    with conn:
+        antes = conn.total_changes
+        conn.execute('''
+            INSERT INTO contadores_eventos (evento_id, categoria, favoritos, tendencia)
+            SELECT e.id, e.categoria, f.cantidad, 0
+            FROM (SELECT evento_id, count(*) AS cantidad FROM favoritos GROUP BY evento_id) f
+            JOIN eventos e ON e.id = f.evento_id
+            WHERE true
+            ON CONFLICT (evento_id) DO UPDATE SET favoritos = excluded.favoritos
+            WHERE favoritos != excluded.favoritos
+        ''')
+        conn.execute('''
+            UPDATE contadores_eventos SET favoritos = 0
+            WHERE favoritos != 0 AND evento_id NOT IN (SELECT evento_id FROM favoritos)
+        ''')
+        return conn.total_changes - antes
@@ -0,0 +1,372 @@
+"""Detección de eventos duplicados o casi duplicados (p. ej. el mismo concierto en varios feeds).
+
+Dos eventos son candidatos solo si caen en el mismo bloque: el mismo día y la
+misma ubicación normalizada (sin tildes, mayúsculas, puntuación ni palabras
+vacías y con las palabras ordenadas, así "Teatro Metropolitano, Medellín" y
+"medellin teatro metropolitano" coinciden). Dentro del bloque se compara una
+firma MinHash de cada texto: el nombre como trigramas de caracteres (tolera
+errores de tipeo y el orden de las palabras) y la descripción como conjunto de
+palabras. Se usa MinHash de una sola función (bottom-k: los K menores hashes
+del conjunto), que estima la similitud de Jaccard con una firma de tamaño fijo;
+para textos con menos de K trigramas la firma es el conjunto entero y la
+estimación es exacta.
+
+firmas_eventos guarda la firma y el bloque de cada evento con un índice por
+bloque, así comprobar un evento nuevo lee solo su bloque. Se mantiene al día
+aplicando el registro de cambios (cambios_eventos) desde su cursor, como
+proximos_por_dia; el cursor -1 indica que aún no se construyó sobre los eventos
+existentes (eso lo hace construir(), por lotes y sin bloquear a los escritores).
+
+Firmar el registro pendiente puede tomar segundos tras una importación, así que
+refrescar() solo corre en trabajos por lotes (la importación y el reporte de
+cli.py duplicados). Al crear un evento se compara contra las firmas guardadas,
+sin escribir, y luego se guarda la firma del evento nuevo (guardar()).
+"""
+import sqlite3
+import unicodedata
+import zlib
+from array import array
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from . import cambios
+from .fechas import dia_epoca
+
+# Tamaño de la firma MinHash (hashes de 32 bits por texto)
+K = 32
+# Peso del nombre frente a la descripción en la similitud (si ambos eventos tienen descripción)
+PESO_NOMBRE = 0.7
+# Similitud desde la que dos eventos del mismo bloque se consideran el mismo (ajustada con
+# benchmarks/bench_duplicados.py: sobre los pares del mismo bloque acierta en más del 99%)
+UMBRAL = 0.5
+# Similitud desde la que crear_evento avisa antes de crear el evento: solo los casi idénticos
+# (mayúsculas, tildes, puntuación u orden de las palabras); el resto queda para el reporte
+UMBRAL_CREACION = 0.85
+# Eventos leídos por lote al construir el índice y cambios aplicados por transacción al refrescarlo
+LOTE = 5000
+
+PALABRAS_VACIAS = frozenset('''
+    a al con de del el en la las lo los para por su sus un una unos unas y e o u
+    the of at in and
+'''.split())
+
+
+def _sin_tildes(texto: str) -> str:
+    texto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c if c.isalnum() else ' ' for c in texto if not unicodedata.combining(c))
+
+
+# Latín (hasta U+024F) ya sin tildes y con la puntuación como espacio, para normalizar con translate
+_LATIN = {i: _sin_tildes(chr(i)) for i in range(0x250) if _sin_tildes(chr(i)) != chr(i)}
+
+
+class IndiceNoConstruido(RuntimeError):
+    """firmas_eventos aún no cubre los eventos existentes: hay que ejecutar construir()"""
+
+
+class Parecido(NamedTuple):
+    evento_id: int
+    similitud: float
+
+
+class ParDuplicado(NamedTuple):
+    # El evento más antiguo (menor id), el que se conserva al fusionar
+    evento_id: int
+    duplicado_id: int
+    similitud: float
+
+
+class Firma(NamedTuple):
+    nombre: Tuple[int, ...]
+    descripcion: Tuple[int, ...]
+
+
+def normalizar(texto: str) -> List[str]:
+    """Palabras en minúsculas, sin tildes ni puntuación y sin palabras vacías"""
+    texto = texto.lower().translate(_LATIN)
+    if not texto.isascii():
+        texto = _sin_tildes(texto)
+    return [palabra for palabra in texto.split() if palabra not in PALABRAS_VACIAS]
+
+
+def clave_lugar(ubicacion: str) -> str:
+    return ' '.join(sorted(set(normalizar(ubicacion))))
+
+
+def _minhash(elementos: Iterable[str]) -> Tuple[int, ...]:
+    return tuple(sorted(set(map(zlib.crc32, map(str.encode, elementos))))[:K])
+
+
+def firma(nombre: str, descripcion: Optional[str]) -> Firma:
+    texto = f" {' '.join(sorted(normalizar(nombre)))} "
+    return Firma(_minhash(texto[i:i + 3] for i in range(len(texto) - 2)),
+                 _minhash(normalizar(descripcion or '')))
+
+
+def jaccard(a: Sequence[int], b: Sequence[int]) -> float:
+    """Estimación bottom-k: de los K menores hashes de la unión, la fracción que está en ambos"""
+    if not a or not b:
+        return 0.0
+    comunes = set(a).intersection(b)
+    if not comunes:
+        return 0.0
+    union = sorted(set(a).union(b))[:K]
+    return sum(1 for h in union if h in comunes) / len(union)
+
+
+def similitud(a: Firma, b: Firma) -> float:
+    nombre = jaccard(a.nombre, b.nombre)
+    if not a.descripcion or not b.descripcion:
+        return nombre
+    return PESO_NOMBRE * nombre + (1 - PESO_NOMBRE) * jaccard(a.descripcion, b.descripcion)
+
+
+def _empaquetar(hashes: Tuple[int, ...]) -> bytes:
+    return array('I', hashes).tobytes()
+
+
+def _desempaquetar(datos: bytes) -> Tuple[int, ...]:
+    hashes = array('I')
+    hashes.frombytes(datos)
+    return tuple(hashes)
+
+
+def _fila(evento_id: int, nombre: str, ubicacion: str, dia: int, descripcion: Optional[str]) -> tuple:
+    calculada = firma(nombre, descripcion)
+    return evento_id, dia, clave_lugar(ubicacion), _empaquetar(calculada.nombre), _empaquetar(calculada.descripcion)
+
+
+GUARDAR = '''
+    INSERT OR REPLACE INTO firmas_eventos (evento_id, dia, lugar, nombre, descripcion) VALUES (?, ?, ?, ?, ?)
+'''
+
+
+def _cursor(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT secuencia FROM cursores_cambios WHERE nombre = 'duplicados'").fetchone()[0]
+
+
+def construido(conn: sqlite3.Connection) -> bool:
+    return _cursor(conn) >= 0
+
+
+def guardar(conn: sqlite3.Connection, evento_id: int, nombre: str, ubicacion: str, fecha: Union[str, date],
+            descripcion: Optional[str]):
+    """Guarda la firma de un evento recién creado para que las siguientes comprobaciones lo vean
+    sin esperar a refrescar(); el cambio del registro la reescribirá igual al aplicarse"""
+    with conn:
+        conn.execute(GUARDAR, _fila(evento_id, nombre, ubicacion, dia_epoca(fecha), descripcion))
+
+
+def construir(conn: sqlite3.Connection, lote: int = LOTE) -> int:
+    """Calcula las firmas de todos los eventos, un lote por transacción; devuelve cuántos indexó.
+
+    Los cambios hechos mientras tanto quedan en el registro con secuencia posterior a
+    la de inicio y los aplica el siguiente refrescar(), así no hace falta bloquear
+    a los escritores durante toda la construcción.
+    """
+    while True:
+        desde = cambios.ultimo(conn)
+        with conn:
+            conn.execute('DELETE FROM firmas_eventos')
+        indexados = ultimo = 0
+        while True:
+            filas = conn.execute('''
+                SELECT id, nombre, ubicacion, dia, descripcion FROM eventos
+                WHERE id > ? AND dia IS NOT NULL ORDER BY id LIMIT ?
+            ''', (ultimo, lote)).fetchall()
+            if not filas:
+                break
+            with conn:
+                conn.executemany(GUARDAR, [_fila(*fila) for fila in filas])
+            indexados += len(filas)
+            ultimo = filas[-1][0]
+        # Mientras el cursor es -1 la poda no lo espera: si descartó cambios posteriores
+        # a `desde` ya no se pueden aplicar y hay que empezar de nuevo
+        conn.execute('BEGIN IMMEDIATE')
+        with conn:
+            if conn.execute("SELECT secuencia FROM cursores_cambios WHERE nombre = 'podado'").fetchone()[0] <= desde:
+                conn.execute("UPDATE cursores_cambios SET secuencia = ? WHERE nombre = 'duplicados'", (desde,))
+                return indexados
+
+
+def refrescar(conn: sqlite3.Connection) -> int:
+    """Aplica a firmas_eventos los cambios posteriores a su cursor (nada si el índice no
+    está construido); devuelve cuántos cambios aplicó"""
+    aplicados = 0
+    while True:
+        # Sin cambios pendientes no se toma el bloqueo de escritura
+        desde = _cursor(conn)
+        if desde < 0 or cambios.ultimo(conn) <= desde:
+            return aplicados
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            desde = _cursor(conn)
+            filas = conn.execute('''
+                SELECT c.secuencia, c.evento_id, e.nombre, e.ubicacion, e.dia, e.descripcion
+                FROM cambios_eventos c
+                LEFT JOIN eventos e ON e.id = c.evento_id
+                WHERE c.secuencia > ? ORDER BY c.secuencia LIMIT ?
+            ''', (desde, LOTE)).fetchall()
+            if not filas:
+                conn.rollback()
+                return aplicados
+            # El estado leído es el actual: basta con aplicar una vez cada evento
+            actuales: Dict[int, tuple] = {evento_id: evento for _, evento_id, *evento in filas}
+            conn.executemany('DELETE FROM firmas_eventos WHERE evento_id = ?',
+                             [(evento_id,) for evento_id, evento in actuales.items() if evento[2] is None])
+            conn.executemany(GUARDAR, [_fila(evento_id, *evento) for evento_id, evento in actuales.items()
+                                       if evento[2] is not None])
+            conn.execute("UPDATE cursores_cambios SET secuencia = ? WHERE nombre = 'duplicados'", (filas[-1][0],))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        aplicados += len(filas)
+
+
+def _bloque(conn: sqlite3.Connection, dia: int, lugar: str) -> List[Tuple[int, Firma]]:
+    return [(evento_id, Firma(_desempaquetar(nombre), _desempaquetar(descripcion)))
+            for evento_id, nombre, descripcion in conn.execute(
+                'SELECT evento_id, nombre, descripcion FROM firmas_eventos WHERE dia = ? AND lugar = ?', (dia, lugar))]
+
+
+def buscar(conn: sqlite3.Connection, nombre: str, ubicacion: str, fecha: Union[str, date],
+           descripcion: Optional[str] = None, umbral: float = UMBRAL) -> List[Parecido]:
+    """Eventos indexados del mismo bloque con similitud >= umbral, del más parecido al menos.
+    Solo lee las firmas guardadas (no ve los cambios que refrescar() aún no aplicó)."""
+    try:
+        dia = dia_epoca(fecha)
+    except ValueError:
+        return []
+    nueva = firma(nombre, descripcion)
+    parecidos = [Parecido(evento_id, similitud(nueva, otra))
+                 for evento_id, otra in _bloque(conn, dia, clave_lugar(ubicacion))]
+    return sorted((p for p in parecidos if p.similitud >= umbral), key=lambda p: (-p.similitud, p.evento_id))
+
+
+def pares(conn: sqlite3.Connection, umbral: float = UMBRAL, desde_id: int = 0, limite: Optional[int] = None,
+          desde_dia: Optional[int] = None, hasta_dia: Optional[int] = None) -> List[ParDuplicado]:
+    """Pares de eventos del mismo bloque con similitud >= umbral, en orden de día y lugar. Con
+    desde_id solo los pares en los que al menos un evento tiene id >= desde_id (p. ej. los recién
+    importados); con desde_dia/hasta_dia (días desde EPOCA) solo lee los bloques de esos días y
+    con limite deja de leer al juntar ese número de pares."""
+    condiciones, parametros = ['evento_id >= ?'], [desde_id]
+    if desde_dia is not None:
+        condiciones.append('dia >= ?')
+        parametros.append(desde_dia)
+    if hasta_dia is not None:
+        condiciones.append('dia <= ?')
+        parametros.append(hasta_dia)
+    resultado = []
+    if desde_id:
+        bloques = conn.execute(f'''
+            SELECT DISTINCT dia, lugar FROM firmas_eventos WHERE {' AND '.join(condiciones)} ORDER BY dia, lugar
+        ''', parametros).fetchall()
+        grupos = ((bloque, _bloque(conn, *bloque)) for bloque in bloques)
+    else:
+        grupos = _recorrer_bloques(conn, ' AND '.join(condiciones[1:]) or 'true', parametros[1:])
+    for _, miembros in grupos:
+        miembros.sort()
+        for i, (evento_id, firma_evento) in enumerate(miembros):
+            for otro_id, firma_otro in miembros[i + 1:]:
+                if otro_id < desde_id:
+                    continue
+                valor = similitud(firma_evento, firma_otro)
+                if valor >= umbral:
+                    resultado.append(ParDuplicado(evento_id, otro_id, valor))
+        if limite is not None and len(resultado) >= limite:
+            return resultado[:limite]
+    return resultado
+
+
+def _recorrer_bloques(conn: sqlite3.Connection, condicion: str, parametros: list):
+    """Los bloques con más de un evento que cumplen la condición sobre dia, leyendo el índice
+    (dia, lugar) en orden"""
+    actual, miembros = None, []
+    for evento_id, dia, lugar, nombre, descripcion in conn.execute(f'''
+            SELECT evento_id, dia, lugar, nombre, descripcion FROM firmas_eventos
+            WHERE {condicion} ORDER BY dia, lugar
+    ''', parametros):
+        if (dia, lugar) != actual:
+            if len(miembros) > 1:
+                yield actual, miembros
+            actual, miembros = (dia, lugar), []
+        miembros.append((evento_id, Firma(_desempaquetar(nombre), _desempaquetar(descripcion))))
+    if len(miembros) > 1:
+        yield actual, miembros
+
+
+def grupos(pares_duplicados: Iterable[ParDuplicado]) -> Dict[int, List[int]]:
+    """Agrupa los pares encadenados (A~B y B~C son un grupo): menor id del grupo -> los demás"""
+    raiz: Dict[int, int] = {}
+
+    def buscar_raiz(evento_id: int) -> int:
+        while raiz.setdefault(evento_id, evento_id) != evento_id:
+            raiz[evento_id] = raiz[raiz[evento_id]]
+            evento_id = raiz[evento_id]
+        return evento_id
+
+    for par in pares_duplicados:
+        a, b = buscar_raiz(par.evento_id), buscar_raiz(par.duplicado_id)
+        if a != b:
+            raiz[max(a, b)] = min(a, b)
+    resultado: Dict[int, List[int]] = {}
+    for evento_id in sorted(raiz):
+        primero = buscar_raiz(evento_id)
+        if primero != evento_id:
+            resultado.setdefault(primero, []).append(evento_id)
+    return resultado
+
+
+def fusionar(conn: sqlite3.Connection, conservar_id: int, duplicado_id: int) -> bool:
+    """Pasa al evento conservado los favoritos, inscripciones, lista de espera, notificaciones y
+    contadores del duplicado y borra el duplicado, en una transacción. El conservado queda con
+    la mayor de las dos capacidades. False si alguno de los dos no existe."""
+    if conservar_id == duplicado_id:
+        return False
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if conn.execute('SELECT count(*) FROM eventos WHERE id IN (?, ?)', (conservar_id, duplicado_id)).fetchone()[0] < 2:
+            conn.rollback()
+            return False
+        par = (conservar_id, duplicado_id)
+        conn.execute('INSERT OR IGNORE INTO favoritos (usuario_id, evento_id) '
+                     'SELECT usuario_id, ? FROM favoritos WHERE evento_id = ?', par)
+        conn.execute('INSERT OR IGNORE INTO asistentes (usuario_id, evento_id) '
+                     'SELECT usuario_id, ? FROM asistentes WHERE evento_id = ?', par)
+        # En espera solo quienes no quedaron inscritos, en el orden en que llegaron
+        conn.execute('''
+            INSERT OR IGNORE INTO lista_espera (evento_id, usuario_id)
+            SELECT ?, usuario_id FROM lista_espera
+            WHERE evento_id = ? AND usuario_id NOT IN (SELECT usuario_id FROM asistentes WHERE evento_id = ?)
+            ORDER BY id
+        ''', (*par, conservar_id))
+        conn.execute('DELETE FROM lista_espera WHERE evento_id = ? AND usuario_id IN '
+                     '(SELECT usuario_id FROM asistentes WHERE evento_id = ?)', (conservar_id, conservar_id))
+        # Quien ya recibió el recordatorio del duplicado no lo recibe de nuevo
+        conn.execute('INSERT OR IGNORE INTO notificaciones (usuario_id, evento_id, tipo, enviada) '
+                     'SELECT usuario_id, ?, tipo, enviada FROM notificaciones WHERE evento_id = ?', par)
+        conn.execute('''
+            UPDATE eventos SET
+                capacidad = max(capacidad, (SELECT capacidad FROM eventos WHERE id = ?)),
+                inscritos = (SELECT count(*) FROM asistentes WHERE evento_id = ?)
+            WHERE id = ?
+        ''', (duplicado_id, conservar_id, conservar_id))
+        conn.execute('''
+            INSERT INTO contadores_eventos (evento_id, categoria, favoritos, tendencia)
+            SELECT id, categoria, (SELECT count(*) FROM favoritos WHERE evento_id = ?),
+                   coalesce((SELECT tendencia FROM contadores_eventos WHERE evento_id = ?), 0)
+            FROM eventos WHERE id = ?
+            ON CONFLICT (evento_id) DO UPDATE SET
+                favoritos = excluded.favoritos, tendencia = tendencia + excluded.tendencia
+        ''', (conservar_id, duplicado_id, conservar_id))
+        for tabla in ('favoritos', 'asistentes', 'lista_espera', 'notificaciones', 'recomendaciones'):
+            conn.execute(f'DELETE FROM {tabla} WHERE evento_id = ?', (duplicado_id,))
+        # Los triggers registran la baja y limpian la búsqueda, la geografía y los contadores
+        conn.execute('DELETE FROM eventos WHERE id = ?', (duplicado_id,))
+        conn.execute('DELETE FROM firmas_eventos WHERE evento_id = ?', (duplicado_id,))
+        conn.commit()
+        return True
+    except BaseException:
+        conn.rollback()
+        raise
@@ -1,8 +1,23 @@
-from datetime import datetime
+from datetime import date
+from typing import Optional, Union
+from .fechas import EPOCA
 
 class Evento:
-    def __init__(self, id: int, nombre: str, ubicacion: str, fecha: str, 
-                 categoria: str, capacidad: int, descripcion: str, organizador_id: int):
+    # Sin __dict__ por instancia: los listados pueden materializar muchos eventos
+    __slots__ = ('id', 'nombre', 'ubicacion', 'fecha', 'categoria', 'capacidad',
+                 'descripcion', 'organizador_id', 'organizador_nombre', 'latitud', 'longitud', 'hora')
+
+    def __init__(self, id: int, nombre: str, ubicacion: str, fecha: Union[str, date],
+                 categoria: str, capacidad: int, descripcion: str, organizador_id: int,
+                 organizador_nombre: Optional[str] = None, latitud: Optional[float] = None,
+                 longitud: Optional[float] = None, hora: Optional[str] = None):
+        # La fecha se convierte una sola vez; si no es válida se conserva el texto
+        if isinstance(fecha, str):
+            try:
+                fecha = date.fromisoformat(fecha)
+            except ValueError:
+                pass
+
         self.id = id
         self.nombre = nombre
         self.ubicacion = ubicacion
@@ -11,21 +26,34 @@ class Evento:
         self.capacidad = capacidad
         self.descripcion = descripcion
         self.organizador_id = organizador_id
+        self.organizador_nombre = organizador_nombre
+        self.latitud = latitud
+        self.longitud = longitud
+        self.hora = hora
+
+    @classmethod
+    def desde_fila(cls, cursor, row) -> 'Evento':
+        """row_factory de sqlite3 para filas con las columnas de SELECT_EVENTOS"""
+        return cls(*row)
+
+    @property
+    def dia(self) -> Optional[int]:
+        """Fecha como días desde EPOCA, igual que la columna eventos.dia"""
+        if not isinstance(self.fecha, date):
+            return None
+        return self.fecha.toordinal() - EPOCA.toordinal()
 
     def __str__(self):
         return (f"Evento: {self.nombre}\n"
                 f"Ubicación: {self.ubicacion}\n"
-                f"Fecha: {self.fecha}\n"
+                f"Fecha: {self.fecha}{' ' + self.hora if self.hora else ''}\n"
                 f"Categoría: {self.categoria}\n"
                 f"Capacidad: {self.capacidad}\n"
                 f"Descripción: {self.descripcion[:50]}...\n"
-                f"Organizador ID: {self.organizador_id}")
+                f"Organizador: {self.organizador_nombre or self.organizador_id}")
 
     def es_proximo(self) -> bool:
         """Determina si el evento está próximo (en los próximos 3 días)"""
-        try:
-            fecha_evento = datetime.strptime(self.fecha, '%Y-%m-%d').date()
-            hoy = datetime.now().date()
-            return 0 <= (fecha_evento - hoy).days <= 3
-        except ValueError:
-            return False
\ No newline at end of file
+        if not isinstance(self.fecha, date):
+            return False
+        return 0 <= (self.fecha - date.today()).days <= 3
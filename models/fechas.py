@@ -0,0 +1,45 @@
+import re
+from datetime import date, timedelta
+from typing import Optional, Tuple, Union
+
+# Las fechas de los eventos se guardan como texto YYYY-MM-DD; la columna generada
+# eventos.dia las expone como días desde EPOCA (julianday(fecha) - 2440587.5),
+# un entero indexado que ordena igual que la fecha
+EPOCA = date(1970, 1, 1)
+
+FORMATO_FECHA = re.compile(r'\d{4}-\d{2}-\d{2}')
+# Hora opcional del evento, HH:MM en 24 horas: como texto ordena igual que la hora
+FORMATO_HORA = re.compile(r'(?:[01]\d|2[0-3]):[0-5]\d')
+
+
+def leer_fecha(valor: Union[str, date]) -> date:
+    """Convierte una fecha YYYY-MM-DD (o un date); lanza ValueError si no es válida"""
+    if isinstance(valor, date):
+        return valor
+    if not isinstance(valor, str) or not FORMATO_FECHA.fullmatch(valor):
+        raise ValueError(f'fecha inválida: {valor!r}, use YYYY-MM-DD')
+    return date.fromisoformat(valor)
+
+
+def dia_epoca(valor: Union[str, date]) -> int:
+    """Valor de eventos.dia para una fecha"""
+    return leer_fecha(valor).toordinal() - EPOCA.toordinal()
+
+
+def hora_valida(hora: Optional[str]) -> bool:
+    return hora is None or (isinstance(hora, str) and bool(FORMATO_HORA.fullmatch(hora)))
+
+
+def proximos_dias(n: int, hoy: Optional[date] = None) -> Tuple[date, date]:
+    """Rango (desde, hasta) de los próximos n días, contando hoy"""
+    if n < 1:
+        raise ValueError('el número de días debe ser positivo')
+    hoy = hoy or date.today()
+    return hoy, hoy + timedelta(days=n - 1)
+
+
+def fin_de_semana(hoy: Optional[date] = None) -> Tuple[date, date]:
+    """Sábado y domingo de este fin de semana; si ya es fin de semana, desde hoy"""
+    hoy = hoy or date.today()
+    domingo = hoy + timedelta(days=6 - hoy.weekday())
+    return max(hoy, domingo - timedelta(days=1)), domingo
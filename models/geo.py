@@ -0,0 +1,72 @@
+import math
+from typing import Optional, Tuple
+
+# Kilómetros por grado de latitud (y de longitud en el ecuador)
+KM_POR_GRADO = 111.32
+RADIO_TIERRA_KM = 6371.0
+
+# Geocodificación sin conexión: lugares y ciudades conocidos, en minúsculas.
+# Un evento toma las coordenadas del nombre más largo contenido en su ubicación,
+# así "Teatro Metropolitano Medellín" prefiere el teatro a la ciudad.
+LUGARES = [
+    # Ciudades
+    ('medellín', 6.2442, -75.5812),
+    ('bogotá', 4.7110, -74.0721),
+    ('cali', 3.4516, -76.5320),
+    ('barranquilla', 10.9685, -74.7813),
+    ('cartagena', 10.3910, -75.4794),
+    ('bucaramanga', 7.1193, -73.1227),
+    ('pereira', 4.8087, -75.6906),
+    ('manizales', 5.0703, -75.5138),
+    ('santa marta', 11.2408, -74.1990),
+    ('envigado', 6.1759, -75.5917),
+    # Escenarios
+    ('estadio atanasio girardot', 6.2568, -75.5901),
+    ('teatro metropolitano', 6.2435, -75.5769),
+    ('plaza mayor', 6.2443, -75.5750),
+    ('parque explora', 6.2708, -75.5656),
+    ('teatro pablo tobón uribe', 6.2466, -75.5597),
+    ('movistar arena', 4.6486, -74.0775),
+    ('estadio el campín', 4.6460, -74.0773),
+    ('parque simón bolívar', 4.6584, -74.0937),
+    ('teatro colón', 4.5966, -74.0746),
+    ('corferias', 4.6299, -74.0898),
+    ('estadio pascual guerrero', 3.4298, -76.5410),
+    ('teatro municipal de cali', 3.4509, -76.5330),
+    ('estadio metropolitano roberto meléndez', 10.9272, -74.8000),
+    ('centro de convenciones cartagena de indias', 10.4196, -75.5486),
+]
+
+# Completa latitud y longitud de los eventos sin coordenadas desde la tabla lugares
+GEOCODIFICAR = '''
+    UPDATE eventos SET (latitud, longitud) = (
+        SELECT l.latitud, l.longitud FROM lugares l
+        WHERE instr(lower(eventos.ubicacion), l.nombre) > 0
+        ORDER BY length(l.nombre) DESC LIMIT 1
+    )
+    WHERE latitud IS NULL AND id >= {}
+'''
+
+
+def coordenadas_validas(latitud: Optional[float], longitud: Optional[float]) -> bool:
+    """Ambas o ninguna; si vienen, dentro de los rangos de latitud y longitud"""
+    if latitud is None and longitud is None:
+        return True
+    if latitud is None or longitud is None:
+        return False
+    return -90 <= latitud <= 90 and -180 <= longitud <= 180
+
+
+def caja_radio(latitud: float, longitud: float, radio_km: float) -> Tuple[float, float, float, float]:
+    """Caja (lat_min, lon_min, lat_max, lon_max) que contiene el círculo del radio dado"""
+    dlat = radio_km / KM_POR_GRADO
+    dlon = radio_km / (KM_POR_GRADO * max(math.cos(math.radians(latitud)), 1e-6))
+    return latitud - dlat, longitud - dlon, latitud + dlat, longitud + dlon
+
+
+def distancia_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia de gran círculo (haversine)"""
+    fi1, fi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((fi2 - fi1) / 2) ** 2
+         + math.cos(fi1) * math.cos(fi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
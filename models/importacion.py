@@ -0,0 +1,147 @@
+import csv
+import json
+import sqlite3
+from datetime import date
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Tuple
+from .fechas import FORMATO_FECHA
+
+# Columnas de un evento en los archivos de importación y exportación
+COLUMNAS = ['id', 'nombre', 'ubicacion', 'fecha', 'categoria', 'capacidad', 'descripcion', 'organizador_id']
+
+# Un evento se considera duplicado si ya existe otro con el mismo nombre, fecha y ubicación
+INSERTAR_SI_NUEVO = '''
+    INSERT INTO eventos (nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id)
+    SELECT ?, ?, ?, ?, ?, ?, ?
+    WHERE NOT EXISTS (
+        SELECT 1 FROM eventos WHERE fecha = ? AND ubicacion = ? AND nombre = ?
+    )
+'''
+
+
+class ResumenImportacion:
+    def __init__(self):
+        self.leidas = 0
+        self.insertadas = 0
+        self.duplicadas = 0
+        self.errores: List[Tuple[int, str]] = []
+        # Pares (evento existente o importado, evento importado, similitud) casi duplicados
+        self.parecidas: List[Tuple[int, int, float]] = []
+
+    def __str__(self):
+        return (f"Filas leídas: {self.leidas}\n"
+                f"Insertadas: {self.insertadas}\n"
+                f"Duplicadas: {self.duplicadas}\n"
+                f"Casi duplicadas: {len(self.parecidas)}\n"
+                f"Con errores: {len(self.errores)}")
+
+
+def leer_csv(archivo: IO[str]) -> Iterator[Dict]:
+    return csv.DictReader(archivo)
+
+
+def leer_jsonl(archivo: IO[str]) -> Iterator[Dict]:
+    for linea in archivo:
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            yield json.loads(linea)
+        except json.JSONDecodeError:
+            # Se reporta como fila inválida en lugar de abortar la importación
+            yield {}
+
+
+def _fechas_validas(fechas: List[str]) -> List[bool]:
+    """Valida un lote de fechas YYYY-MM-DD; cada fecha distinta se convierte una sola vez"""
+    validas = {}
+    for fecha in set(fechas):
+        try:
+            validas[fecha] = bool(FORMATO_FECHA.fullmatch(fecha)) and bool(date.fromisoformat(fecha))
+        except (TypeError, ValueError):
+            validas[fecha] = False
+    return [validas[fecha] for fecha in fechas]
+
+
+def _validar_lote(lote: List[Tuple[int, Dict]], organizador_id: Optional[int],
+                  resumen: ResumenImportacion) -> List[tuple]:
+    fechas = [str(fila.get('fecha') or '').strip() for _, fila in lote]
+    validas = _fechas_validas(fechas)
+
+    parametros = []
+    for (numero, fila), fecha, fecha_valida in zip(lote, fechas, validas):
+        nombre = str(fila.get('nombre') or '').strip()
+        ubicacion = str(fila.get('ubicacion') or '').strip()
+        categoria = str(fila.get('categoria') or '').strip()
+        if not nombre or not ubicacion or not categoria:
+            resumen.errores.append((numero, 'nombre, ubicacion y categoria son obligatorios'))
+            continue
+        if not fecha_valida:
+            resumen.errores.append((numero, f'fecha inválida: {fecha!r}'))
+            continue
+        try:
+            capacidad = int(fila.get('capacidad'))
+            organizador = int(fila.get('organizador_id') or organizador_id)
+        except (TypeError, ValueError):
+            resumen.errores.append((numero, 'capacidad u organizador_id no son números'))
+            continue
+        if capacidad <= 0:
+            resumen.errores.append((numero, 'la capacidad debe ser positiva'))
+            continue
+
+        descripcion = fila.get('descripcion') or ''
+        parametros.append((nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador,
+                           fecha, ubicacion, nombre))
+    return parametros
+
+
+def importar_eventos(conn: sqlite3.Connection, filas: Iterable[Dict],
+                     organizador_id: Optional[int] = None, lote: int = 5000) -> ResumenImportacion:
+    """Inserta eventos por lotes, una transacción por lote, omitiendo duplicados y filas inválidas.
+
+    `organizador_id` se usa para las filas que no traen su propio organizador_id.
+    """
+    resumen = ResumenImportacion()
+    pendientes: List[Tuple[int, Dict]] = []
+
+    def guardar():
+        parametros = _validar_lote(pendientes, organizador_id, resumen)
+        with conn:
+            cursor = conn.executemany(INSERTAR_SI_NUEVO, parametros)
+        resumen.insertadas += cursor.rowcount
+        resumen.duplicadas += len(parametros) - cursor.rowcount
+        pendientes.clear()
+
+    for numero, fila in enumerate(filas, 1):
+        resumen.leidas += 1
+        pendientes.append((numero, fila))
+        if len(pendientes) >= lote:
+            guardar()
+    if pendientes:
+        guardar()
+    return resumen
+
+
+def exportar_eventos(conn: sqlite3.Connection, destino: IO[str], formato: str = 'jsonl',
+                     filtros: str = '', params: Iterable = (), lote: int = 5000) -> int:
+    """Escribe los eventos en CSV o JSONL leyendo de a `lote` filas; devuelve cuántos escribió"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT {} FROM eventos e{} ORDER BY e.id'.format(
+        ', '.join(f'e.{columna}' for columna in COLUMNAS), filtros), list(params))
+
+    if formato == 'csv':
+        escritor = csv.writer(destino)
+        escritor.writerow(COLUMNAS)
+        escribir = escritor.writerows
+    else:
+        def escribir(filas):
+            destino.writelines(
+                json.dumps(dict(zip(COLUMNAS, fila)), ensure_ascii=False) + '\n' for fila in filas)
+
+    total = 0
+    while True:
+        filas = cursor.fetchmany(lote)
+        if not filas:
+            break
+        escribir(filas)
+        total += len(filas)
+    return total
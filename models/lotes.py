@@ -0,0 +1,305 @@
+"""Barridos por lotes sobre todos los usuarios, repartidos entre procesos.
+
+Los ids de usuario se parten en tramos (desde, hasta] con el mismo número de
+usuarios, TRAMOS_POR_PROCESO por proceso para que un tramo lento no deje a los
+demás procesos sin trabajo. Cada proceso abre su propia conexión de solo
+lectura (no usa Sistema, su pool ni su sesión) y recorre sus tramos en bloques
+de `bloque` usuarios. Tras cada bloque agrega las salidas a parte-N.jsonl y
+guarda en parte-N.json el último usuario procesado y el largo del archivo: un
+barrido interrumpido se reanuda desde ahí, descartando lo escrito después del
+último punto de control. Cuando todos los tramos terminan, las partes se
+concatenan en orden de usuario en salida.jsonl.
+
+Las tareas solo leen. Lo que haya que escribir con el resultado (p. ej.
+registrar y enviar recordatorios) lo hace quien lee la salida, en un proceso.
+"""
+import json
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .conexiones import PRAGMAS
+from .recomendaciones import MotorRecomendaciones
+from .recordatorios import DIAS_AVISO
+
+# Usuarios por bloque: cada bloque es un punto de control
+BLOQUE_USUARIOS = 500
+TRAMOS_POR_PROCESO = 4
+PLAN = 'plan.json'
+SALIDA = 'salida.jsonl'
+
+
+class ResumenBarrido(NamedTuple):
+    tarea: str
+    usuarios: int
+    registros: int
+    tramos: int
+    # Tramos que continuaron desde un punto de control de un barrido interrumpido
+    reanudados: int
+    segundos: float
+    salida: str
+
+
+def _ventana(parametros: Dict) -> Tuple[str, str]:
+    """Fechas de `hoy` (por defecto, la actual) a `dias` (DIAS_AVISO) días después"""
+    hoy = date.fromisoformat(parametros['hoy']) if 'hoy' in parametros else date.today()
+    return hoy.isoformat(), (hoy + timedelta(days=parametros.get('dias', DIAS_AVISO))).isoformat()
+
+
+class Tarea:
+    """Trabajo por usuario de un barrido. Se crea una vez por proceso con la conexión
+    de solo lectura y los parámetros del barrido (valores JSON)."""
+
+    def __init__(self, conn: sqlite3.Connection, parametros: Dict):
+        self.parametros = parametros
+
+    def procesar(self, conn: sqlite3.Connection, usuarios: Sequence[int]) -> Iterable[list]:
+        """Registros (listas JSON) de un bloque de ids de usuario consecutivos, en orden"""
+        raise NotImplementedError
+
+
+class Recordatorios(Tarea):
+    """Favoritos cuyo evento ocurre entre `hoy` y `dias` días después y que aún no
+    recibieron su recordatorio; cada registro son los campos de una Notificacion"""
+
+    CONSULTA = '''
+        SELECT f.usuario_id, u.email, e.id, e.nombre, e.fecha
+        FROM favoritos f
+        JOIN eventos e ON e.id = f.evento_id
+        JOIN usuarios u ON u.id = f.usuario_id
+        WHERE f.usuario_id BETWEEN ? AND ? AND e.fecha BETWEEN ? AND ?
+        AND NOT EXISTS (
+            SELECT 1 FROM notificaciones n
+            WHERE n.usuario_id = f.usuario_id AND n.evento_id = f.evento_id AND n.tipo = 'recordatorio'
+        )
+        ORDER BY f.usuario_id, e.id
+    '''
+
+    def __init__(self, conn: sqlite3.Connection, parametros: Dict):
+        super().__init__(conn, parametros)
+        self.ventana = _ventana(parametros)
+
+    def procesar(self, conn: sqlite3.Connection, usuarios: Sequence[int]) -> Iterable[list]:
+        return conn.execute(self.CONSULTA, (usuarios[0], usuarios[-1], *self.ventana))
+
+
+class Resumenes(Tarea):
+    """Resumen diario de cada usuario: sus k recomendaciones (MotorRecomendaciones) y
+    sus favoritos de los próximos `dias` días. Se omiten los usuarios sin ninguno."""
+
+    FAVORITOS = '''
+        SELECT f.usuario_id, e.id
+        FROM favoritos f
+        JOIN eventos e ON e.id = f.evento_id
+        WHERE f.usuario_id BETWEEN ? AND ? AND e.fecha BETWEEN ? AND ?
+        ORDER BY f.usuario_id, e.fecha, e.id
+    '''
+
+    def __init__(self, conn: sqlite3.Connection, parametros: Dict):
+        super().__init__(conn, parametros)
+        self.ventana = _ventana(parametros)
+        self.k = parametros.get('k', 5)
+        # Cada proceso arma su propio índice: no hay memoria compartida entre procesos
+        self.motor = MotorRecomendaciones()
+        self.motor.construir(conn)
+
+    def procesar(self, conn: sqlite3.Connection, usuarios: Sequence[int]) -> Iterable[list]:
+        proximos: Dict[int, List[int]] = {}
+        for usuario_id, evento_id in conn.execute(self.FAVORITOS, (usuarios[0], usuarios[-1], *self.ventana)):
+            proximos.setdefault(usuario_id, []).append(evento_id)
+        for usuario_id in usuarios:
+            recomendados = self.motor.recomendar(usuario_id, self.k)
+            # El top precalculado no se vuelve a pedir en este barrido
+            self.motor.top.pop(usuario_id, None)
+            if recomendados or usuario_id in proximos:
+                yield [usuario_id, recomendados, proximos.get(usuario_id, [])]
+
+
+TAREAS = {'recordatorios': Recordatorios, 'resumenes': Resumenes}
+
+
+def conectar_lectura(ruta_db: str) -> sqlite3.Connection:
+    """Conexión de solo lectura (URI mode=ro) con los pragmas del pool salvo journal_mode,
+    que fija quien escribe"""
+    ruta = os.path.abspath(ruta_db).replace('%', '%25').replace('?', '%3f').replace('#', '%23')
+    conn = sqlite3.connect(f'file:{ruta}?mode=ro', uri=True)
+    for pragma in PRAGMAS:
+        if not pragma.startswith('PRAGMA journal_mode'):
+            conn.execute(pragma)
+    return conn
+
+
+def tramos_usuarios(conn: sqlite3.Connection, cantidad: int) -> List[Tuple[int, int]]:
+    """Parte los ids de usuario en hasta `cantidad` tramos (desde, hasta] con el mismo número de usuarios"""
+    total = conn.execute('SELECT count(*) FROM usuarios').fetchone()[0]
+    if not total:
+        return []
+    cantidad = max(1, min(cantidad, total))
+    desde = conn.execute('SELECT min(id) FROM usuarios').fetchone()[0] - 1
+    tramos = []
+    for numero in range(1, cantidad + 1):
+        # Último id del tramo: el usuario en la posición numero * total / cantidad (por id)
+        hasta = conn.execute('SELECT id FROM usuarios ORDER BY id LIMIT 1 OFFSET ?',
+                             (numero * total // cantidad - 1,)).fetchone()[0]
+        tramos.append((desde, hasta))
+        desde = hasta
+    return tramos
+
+
+# Estado de cada proceso del barrido (se llena en _iniciar_proceso)
+_proceso: Dict = {}
+
+
+def _iniciar_proceso(ruta_db: str, tarea: str, parametros: Dict):
+    conn = conectar_lectura(ruta_db)
+    _proceso['conn'] = conn
+    _proceso['tarea'] = TAREAS[tarea](conn, parametros)
+
+
+def _ruta(directorio: str, nombre: str) -> str:
+    return os.path.join(directorio, nombre)
+
+
+def _guardar_json(ruta: str, datos: Dict):
+    """Escribe en un temporal y lo renombra: un corte deja el archivo anterior o el nuevo, nunca uno a medias"""
+    with open(ruta + '.tmp', 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo)
+    os.replace(ruta + '.tmp', ruta)
+
+
+def _leer_json(ruta: str) -> Optional[Dict]:
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return None
+
+
+def _punto_control(directorio: str, numero: int, desde: int) -> Dict:
+    return (_leer_json(_ruta(directorio, f'parte-{numero}.json'))
+            or {'ultimo': desde, 'bytes': 0, 'usuarios': 0, 'registros': 0, 'terminado': False})
+
+
+def _barrer_tramo(directorio: str, numero: int, desde: int, hasta: int, bloque: int) -> Dict:
+    """Recorre el tramo (desde, hasta] desde su último punto de control; devuelve el punto final"""
+    conn, tarea = _proceso['conn'], _proceso['tarea']
+    punto = _punto_control(directorio, numero, desde)
+    codificar = json.JSONEncoder(ensure_ascii=False).encode
+    with open(_ruta(directorio, f'parte-{numero}.jsonl'), 'ab') as archivo:
+        # Lo escrito después del último punto de control se vuelve a calcular
+        archivo.truncate(punto['bytes'])
+        while True:
+            usuarios = [fila[0] for fila in conn.execute(
+                'SELECT id FROM usuarios WHERE id > ? AND id <= ? ORDER BY id LIMIT ?', (punto['ultimo'], hasta, bloque))]
+            if not usuarios:
+                break
+            registros = [codificar(list(registro)) + '\n' for registro in tarea.procesar(conn, usuarios)]
+            archivo.write(''.join(registros).encode('utf-8'))
+            # Basta con vaciar el búfer: lo que está en el sistema operativo sobrevive a que el proceso muera
+            archivo.flush()
+            punto.update(ultimo=usuarios[-1], bytes=archivo.tell(), usuarios=punto['usuarios'] + len(usuarios),
+                         registros=punto['registros'] + len(registros))
+            _guardar_json(_ruta(directorio, f'parte-{numero}.json'), punto)
+    punto['terminado'] = True
+    _guardar_json(_ruta(directorio, f'parte-{numero}.json'), punto)
+    return punto
+
+
+def _unir(directorio: str, tramos: int):
+    """Concatena las partes en salida.jsonl; se escribe en un temporal y se renombra al final"""
+    ruta = _ruta(directorio, SALIDA)
+    with open(ruta + '.tmp', 'wb') as salida:
+        for numero in range(tramos):
+            with open(_ruta(directorio, f'parte-{numero}.jsonl'), 'rb') as parte:
+                while True:
+                    datos = parte.read(1 << 20)
+                    if not datos:
+                        break
+                    salida.write(datos)
+    os.replace(ruta + '.tmp', ruta)
+
+
+def _limpiar(directorio: str, tramos: int):
+    for numero in range(tramos):
+        for extension in ('jsonl', 'json'):
+            try:
+                os.remove(_ruta(directorio, f'parte-{numero}.{extension}'))
+            except FileNotFoundError:
+                pass
+
+
+def barrer(ruta_db: str, tarea: str, directorio: str, parametros: Optional[Dict] = None,
+           procesos: Optional[int] = None, bloque: int = BLOQUE_USUARIOS) -> ResumenBarrido:
+    """Ejecuta la tarea sobre todos los usuarios con `procesos` procesos (por defecto, uno
+    por núcleo) y deja la salida combinada en directorio/salida.jsonl.
+
+    Si el directorio tiene un barrido sin terminar de la misma tarea, se reanuda con
+    sus tramos y parámetros originales (los recibidos se ignoran). Con procesos=1
+    el barrido corre en este proceso.
+    """
+    if tarea not in TAREAS:
+        raise ValueError(f"Tarea desconocida: {tarea!r} (disponibles: {', '.join(TAREAS)})")
+    procesos = procesos or os.cpu_count() or 1
+    if procesos < 1 or bloque < 1:
+        raise ValueError("procesos y bloque deben ser mayores que cero")
+    os.makedirs(directorio, exist_ok=True)
+    inicio = time.perf_counter()
+
+    plan = _leer_json(_ruta(directorio, PLAN))
+    if plan is not None and not plan['terminado']:
+        if plan['tarea'] != tarea:
+            raise ValueError(f"El directorio tiene un barrido de '{plan['tarea']}' sin terminar")
+    else:
+        if plan is not None:
+            _limpiar(directorio, len(plan['tramos']))
+        conn = conectar_lectura(ruta_db)
+        try:
+            tramos = tramos_usuarios(conn, procesos * TRAMOS_POR_PROCESO)
+        finally:
+            conn.close()
+        plan = {'tarea': tarea, 'parametros': parametros or {}, 'tramos': tramos, 'terminado': False}
+        _guardar_json(_ruta(directorio, PLAN), plan)
+
+    tramos = [tuple(tramo) for tramo in plan['tramos']]
+    puntos = [_punto_control(directorio, numero, desde) for numero, (desde, _) in enumerate(tramos)]
+    pendientes = [numero for numero, punto in enumerate(puntos) if not punto['terminado']]
+    reanudados = sum(1 for numero in pendientes if puntos[numero]['ultimo'] != tramos[numero][0])
+    argumentos = (ruta_db, tarea, plan['parametros'])
+
+    if pendientes and (procesos == 1 or len(pendientes) == 1):
+        _iniciar_proceso(*argumentos)
+        try:
+            for numero in pendientes:
+                puntos[numero] = _barrer_tramo(directorio, numero, *tramos[numero], bloque)
+        finally:
+            _proceso.pop('conn').close()
+            _proceso.clear()
+    elif pendientes:
+        # multiprocessing se importa solo para barrer; 'spawn' evita heredar conexiones
+        # SQLite e hilos del proceso padre
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(procesos, len(pendientes)),
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_iniciar_proceso, initargs=argumentos) as ejecutor:
+            futuros = {numero: ejecutor.submit(_barrer_tramo, directorio, numero, *tramos[numero], bloque)
+                       for numero in pendientes}
+            for numero, futuro in futuros.items():
+                puntos[numero] = futuro.result()
+
+    _unir(directorio, len(tramos))
+    plan['terminado'] = True
+    _guardar_json(_ruta(directorio, PLAN), plan)
+    _limpiar(directorio, len(tramos))
+    return ResumenBarrido(tarea, sum(punto['usuarios'] for punto in puntos),
+                          sum(punto['registros'] for punto in puntos), len(tramos), reanudados,
+                          time.perf_counter() - inicio, _ruta(directorio, SALIDA))
+
+
+def leer_salida(ruta: str) -> Iterator[list]:
+    """Registros de la salida combinada de un barrido, en orden de usuario"""
+    with open(ruta, encoding='utf-8') as archivo:
+        for linea in archivo:
+            yield json.loads(linea)
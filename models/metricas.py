@@ -0,0 +1,512 @@
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter
+from typing import Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Límites superiores (segundos) de los cubos de latencia, como los histogramas de Prometheus
+CUBOS_SEGUNDOS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                  0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Límites de los cubos de consultas por acción
+CUBOS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+# Cubo de cada cantidad de consultas hasta el último límite (una indexación en lugar de bisect)
+_CUBO_CONSULTAS = [bisect_left(CUBOS_CONSULTAS, n) for n in range(CUBOS_CONSULTAS[-1] + 1)]
+UMBRAL_LENTA = 0.1
+MAXIMO_LENTAS = 100
+# Las consultas con listas de parámetros de largo variable (IN (?, ?, ...)) comparten clave
+_LISTA_PARAMETROS = re.compile(r'\?(?:\s*,\s*\?)+')
+_ESPACIOS = re.compile(r'\s+')
+# Sentencias que tienen plan de consulta (no PRAGMA, BEGIN, CREATE...)
+_CON_PLAN = re.compile(r'\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+MAXIMO_CLAVES = 4096
+
+
+def clave_consulta(sql: str) -> str:
+    """SQL en una línea y con las listas de parámetros abreviadas: agrupa ejecuciones de la misma consulta"""
+    return _LISTA_PARAMETROS.sub('?, ...', _ESPACIOS.sub(' ', sql).strip())
+
+
+class Histograma:
+    """Conteos por cubo (no acumulados), suma y total de las observaciones"""
+    __slots__ = ('limites', 'cubos', 'suma', 'cantidad')
+
+    def __init__(self, limites: Sequence[float]):
+        self.limites = limites
+        self.cubos = [0] * (len(limites) + 1)  # el último es +Inf
+        self.suma = 0.0
+        self.cantidad = 0
+
+    def observar(self, valor: float):
+        self.cubos[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.cantidad += 1
+
+    def sumar(self, otro: 'Histograma'):
+        self.cubos = [a + b for a, b in zip(self.cubos, otro.cubos)]
+        self.suma += otro.suma
+        self.cantidad += otro.cantidad
+
+    def percentil(self, q: float) -> float:
+        """Límite superior del cubo donde cae el percentil q (0-1); +Inf si cae en el último"""
+        objetivo, acumulado = q * self.cantidad, 0
+        for limite, conteo in zip(self.limites, self.cubos):
+            acumulado += conteo
+            if acumulado >= objetivo and acumulado:
+                return limite
+        return float('inf')
+
+
+class EstadisticaConsulta:
+    __slots__ = ('clave', 'latencia', 'filas', 'errores')
+
+    def __init__(self, clave: str):
+        self.clave = clave
+        self.latencia = Histograma(CUBOS_SEGUNDOS)
+        self.filas = 0
+        self.errores = 0
+
+    def sumar(self, otra: 'EstadisticaConsulta'):
+        self.latencia.sumar(otra.latencia)
+        self.filas += otra.filas
+        self.errores += otra.errores
+
+
+class EstadisticaAccion:
+    __slots__ = ('latencia', 'consultas', 'errores')
+
+    def __init__(self):
+        self.latencia = Histograma(CUBOS_SEGUNDOS)
+        self.consultas = Histograma(CUBOS_CONSULTAS)
+        self.errores = 0
+
+    def sumar(self, otra: 'EstadisticaAccion'):
+        self.latencia.sumar(otra.latencia)
+        self.consultas.sumar(otra.consultas)
+        self.errores += otra.errores
+
+
+class Registro:
+    """Métricas de un hilo. Solo ese hilo las escribe, así registrar no toma ningún lock;
+    instantanea() y prometheus() suman las de todos los hilos."""
+    __slots__ = ('consultas', 'por_sql', 'acciones', 'sentencias', 'accion')
+
+    def __init__(self):
+        self.consultas: Dict[str, EstadisticaConsulta] = {}
+        # Texto exacto del SQL -> estadística; varios textos pueden compartir clave
+        self.por_sql: Dict[str, EstadisticaConsulta] = {}
+        self.acciones: Dict[str, EstadisticaAccion] = {}
+        self.sentencias = 0  # total ejecutadas por el hilo: una acción cuenta la diferencia
+        self.accion: Optional[str] = None  # acción en curso en el hilo
+
+    def limpiar(self):
+        self.consultas.clear()
+        self.por_sql.clear()
+        self.acciones.clear()
+
+
+class Metricas:
+    """Latencias, filas y errores por consulta SQL y por acción de usuario, y registro de consultas lentas.
+
+    Las conexiones de un PoolConexiones creado con metricas registran cada
+    sentencia (ver ConexionMedida). Una acción (método de Sistema marcado con
+    @medido) cuenta las consultas que ejecuta su hilo mientras dura; las
+    acciones anidadas se cuentan en la exterior. Una consulta que tarda
+    umbral_lenta segundos o más se guarda (las últimas MAXIMO_LENTAS) con su
+    plan de EXPLAIN QUERY PLAN y, si se indica archivo_lentas, se agrega como
+    una línea JSON a ese archivo.
+
+    Está pensado para dejarlo activo: cada hilo escribe en su propio Registro
+    sin locks, y medir una sentencia o una acción cuesta uno o dos µs
+    (ver benchmarks/bench_metricas.py).
+    """
+
+    def __init__(self, activa: bool = True, umbral_lenta: float = UMBRAL_LENTA,
+                 archivo_lentas: Optional[str] = None):
+        self.activa = activa
+        self.umbral_lenta = umbral_lenta
+        self.archivo_lentas = archivo_lentas
+        self._registros: List[Registro] = []  # uno por hilo que registró algo
+        # Texto exacto del SQL -> clave, compartido por los hilos (calcularla usa expresiones regulares)
+        self._claves: Dict[str, str] = {}
+        self.lentas: Deque[dict] = deque(maxlen=MAXIMO_LENTAS)
+        self.total_lentas = 0
+        self._lock = threading.Lock()
+        self._lock_lentas = threading.Lock()
+        self._local = threading.local()
+
+    def registro(self) -> Registro:
+        """El Registro del hilo actual"""
+        try:
+            return self._local.registro
+        except AttributeError:
+            registro = self._local.registro = Registro()
+            with self._lock:
+                self._registros.append(registro)
+            return registro
+
+    def _estadistica(self, registro: Registro, sql: str) -> EstadisticaConsulta:
+        clave = self._claves.get(sql)
+        if clave is None:
+            clave = clave_consulta(sql)
+            with self._lock:
+                if len(self._claves) >= MAXIMO_CLAVES:
+                    self._claves.clear()
+                self._claves[sql] = clave
+        estadistica = registro.consultas.get(clave)
+        if estadistica is None:
+            estadistica = registro.consultas[clave] = EstadisticaConsulta(clave)
+        if len(registro.por_sql) >= MAXIMO_CLAVES:
+            registro.por_sql.clear()
+        registro.por_sql[sql] = estadistica
+        return estadistica
+
+    def registrar(self, sql: str, segundos: float, filas: int, error: bool = False,
+                  parametros=(), ruta_db: Optional[str] = None) -> EstadisticaConsulta:
+        """Una ejecución de una sentencia; devuelve su estadística para sumarle las filas leídas después"""
+        # Camino caliente: el registro del hilo, una búsqueda por el texto exacto del SQL
+        # y el histograma sin llamadas ni locks
+        try:
+            registro = self._local.registro
+        except AttributeError:
+            registro = self.registro()
+        estadistica = registro.por_sql.get(sql)
+        if estadistica is None:
+            estadistica = self._estadistica(registro, sql)
+        latencia = estadistica.latencia
+        latencia.cubos[bisect_left(CUBOS_SEGUNDOS, segundos)] += 1
+        latencia.suma += segundos
+        latencia.cantidad += 1
+        if filas > 0:
+            estadistica.filas += filas
+        if error:
+            estadistica.errores += 1
+        registro.sentencias += 1
+        if segundos >= self.umbral_lenta:
+            self._registrar_lenta(registro, estadistica.clave, sql, parametros, segundos, filas, ruta_db)
+        return estadistica
+
+    def _registrar_lenta(self, registro: Registro, clave: str, sql: str, parametros, segundos: float, filas: int,
+                         ruta_db: Optional[str]):
+        entrada = {'momento': datetime.now().isoformat(timespec='milliseconds'), 'consulta': clave,
+                   'ms': round(segundos * 1000, 3), 'filas': filas, 'accion': registro.accion,
+                   'parametros': [p if isinstance(p, (int, float, str)) or p is None else repr(p)
+                                  for p in (parametros.values() if isinstance(parametros, dict) else parametros)],
+                   'plan': self._plan(sql, parametros, ruta_db)}
+        with self._lock_lentas:
+            self.lentas.append(entrada)
+            self.total_lentas += 1
+            if self.archivo_lentas:
+                with open(self.archivo_lentas, 'a', encoding='utf-8') as archivo:
+                    archivo.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+
+    @staticmethod
+    def _plan(sql: str, parametros, ruta_db: Optional[str]) -> Optional[List[str]]:
+        """EXPLAIN QUERY PLAN en una conexión propia de solo lectura (no toca la del pool, quizá en uso)"""
+        if (not ruta_db or ruta_db == ':memory:' or not os.path.exists(ruta_db)
+                or not _CON_PLAN.match(sql)):
+            return None
+        from urllib.request import pathname2url  # importa http y email: solo cuando hay una consulta lenta
+        try:
+            # Sin esperar bloqueos: el plan es secundario y no debe demorar más a quien ya esperó
+            conn = sqlite3.connect(f'file:{pathname2url(os.path.abspath(ruta_db))}?mode=ro', uri=True, timeout=0)
+            try:
+                return [fila[3] for fila in conn.execute('EXPLAIN QUERY PLAN ' + sql, parametros)]
+            finally:
+                conn.close()
+        except sqlite3.Error as error:
+            return [f'sin plan: {error}']
+
+    @contextmanager
+    def accion(self, nombre: str) -> Iterator[None]:
+        if not self.activa:
+            yield
+            return
+        registro = self.registro()
+        if registro.accion is not None:
+            yield
+            return
+        registro.accion = nombre
+        sentencias = registro.sentencias
+        inicio = time.perf_counter()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            segundos = time.perf_counter() - inicio
+            registro.accion = None
+            _registrar_accion(registro, nombre, segundos, registro.sentencias - sentencias, error)
+
+    def _combinar(self) -> Tuple[Dict[str, EstadisticaConsulta], Dict[str, EstadisticaAccion]]:
+        """Suma de los registros de todos los hilos (copias: los hilos siguen escribiendo en los suyos)"""
+        consultas: Dict[str, EstadisticaConsulta] = {}
+        acciones: Dict[str, EstadisticaAccion] = {}
+        with self._lock:
+            registros = list(self._registros)
+        for registro in registros:
+            # list() de un dict es atómico con el GIL aunque su hilo siga agregando claves
+            for clave, estadistica in list(registro.consultas.items()):
+                if clave not in consultas:
+                    consultas[clave] = EstadisticaConsulta(clave)
+                consultas[clave].sumar(estadistica)
+            for nombre, estadistica in list(registro.acciones.items()):
+                if nombre not in acciones:
+                    acciones[nombre] = EstadisticaAccion()
+                acciones[nombre].sumar(estadistica)
+        return consultas, acciones
+
+    def instantanea(self) -> dict:
+        """Copia de las métricas: totales, latencia media y percentiles aproximados en ms (el límite
+        superior de su cubo; None si pasa el último)"""
+        def finito(valor: float, escala: float = 1) -> Optional[float]:
+            return None if valor == float('inf') else valor * escala
+
+        def latencia(histograma: Histograma) -> dict:
+            return {'cantidad': histograma.cantidad, 'total_ms': round(histograma.suma * 1000, 3),
+                    'media_ms': round(histograma.suma / histograma.cantidad * 1000, 3) if histograma.cantidad else 0.0,
+                    'p50_ms': finito(histograma.percentil(0.5), 1000),
+                    'p99_ms': finito(histograma.percentil(0.99), 1000)}
+
+        combinadas, por_accion = self._combinar()
+        consultas = {clave: {**latencia(e.latencia), 'filas': e.filas, 'errores': e.errores}
+                     for clave, e in combinadas.items()}
+        acciones = {nombre: {**latencia(e.latencia), 'errores': e.errores,
+                             'consultas': int(e.consultas.suma),
+                             'max_consultas': finito(e.consultas.percentil(1.0))}
+                    for nombre, e in por_accion.items()}
+        with self._lock_lentas:
+            lentas = list(self.lentas)
+        return {'consultas': consultas, 'acciones': acciones, 'total_lentas': self.total_lentas, 'lentas': lentas}
+
+    def prometheus(self) -> str:
+        """Métricas en el formato de texto de Prometheus"""
+        lineas = []
+
+        def histograma(nombre: str, etiqueta: str, valores: Dict[str, Histograma]):
+            for valor, h in valores.items():
+                etiquetas = f'{etiqueta}="{_escapar(valor)}"'
+                acumulado = 0
+                for limite, conteo in zip((*h.limites, '+Inf'), h.cubos):
+                    acumulado += conteo
+                    lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+                lineas.append(f'{nombre}_sum{{{etiquetas}}} {h.suma!r}')
+                lineas.append(f'{nombre}_count{{{etiquetas}}} {h.cantidad}')
+
+        def contador(nombre: str, etiqueta: str, valores: Dict[str, int]):
+            for valor, cantidad in valores.items():
+                lineas.append(f'{nombre}{{{etiqueta}="{_escapar(valor)}"}} {cantidad}')
+
+        consultas, acciones = self._combinar()
+        for titulo, tipo, nombre, etiqueta, escribir, valores in (
+            ('Latencia de las sentencias SQL', 'histogram', 'quehay_consulta_segundos', 'consulta',
+             histograma, {c: e.latencia for c, e in consultas.items()}),
+            ('Filas leídas o modificadas por las sentencias SQL', 'counter', 'quehay_consulta_filas_total',
+             'consulta', contador, {c: e.filas for c, e in consultas.items()}),
+            ('Sentencias SQL que fallaron', 'counter', 'quehay_consulta_errores_total', 'consulta',
+             contador, {c: e.errores for c, e in consultas.items()}),
+            ('Latencia de las acciones de usuario', 'histogram', 'quehay_accion_segundos', 'accion',
+             histograma, {a: e.latencia for a, e in acciones.items()}),
+            ('Consultas SQL por acción de usuario', 'histogram', 'quehay_accion_consultas', 'accion',
+             histograma, {a: e.consultas for a, e in acciones.items()}),
+            ('Acciones de usuario que lanzaron una excepción', 'counter', 'quehay_accion_errores_total',
+             'accion', contador, {a: e.errores for a, e in acciones.items()}),
+        ):
+            lineas.append(f'# HELP {nombre} {titulo}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            escribir(nombre, etiqueta, valores)
+        lineas.append('# HELP quehay_consultas_lentas_total Sentencias SQL que superaron el umbral de lentitud')
+        lineas.append('# TYPE quehay_consultas_lentas_total counter')
+        lineas.append(f'quehay_consultas_lentas_total {self.total_lentas}')
+        return '\n'.join(lineas) + '\n'
+
+    def volcar_prometheus(self, ruta: str):
+        """Escribe prometheus() en ruta de forma atómica (para el recolector de archivos de node_exporter)"""
+        temporal = ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            archivo.write(self.prometheus())
+        os.replace(temporal, ruta)
+
+    def reiniciar(self):
+        """Descarta lo registrado; lo que otro hilo registre a la vez puede conservarse o perderse"""
+        with self._lock, self._lock_lentas:
+            for registro in self._registros:
+                registro.limpiar()
+            self.lentas.clear()
+            self.total_lentas = 0
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _registrar_accion(registro: Registro, nombre: str, segundos: float, consultas: int, error: bool):
+    estadistica = registro.acciones.get(nombre)
+    if estadistica is None:
+        estadistica = registro.acciones[nombre] = EstadisticaAccion()
+    latencia = estadistica.latencia
+    latencia.cubos[bisect_left(CUBOS_SEGUNDOS, segundos)] += 1
+    latencia.suma += segundos
+    latencia.cantidad += 1
+    estadistica.consultas.cubos[_CUBO_CONSULTAS[consultas] if consultas < len(_CUBO_CONSULTAS)
+                                else len(CUBOS_CONSULTAS)] += 1
+    estadistica.consultas.suma += consultas
+    estadistica.consultas.cantidad += 1
+    if error:
+        estadistica.errores += 1
+
+
+def medido(metodo):
+    """Registra el método de Sistema como una acción de usuario en sistema.metricas"""
+    nombre = metodo.__name__
+
+    # Equivale a `with self.metricas.accion(nombre)`, sin el costo del generador en cada llamada
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        metricas = self.metricas
+        if not metricas.activa:
+            return metodo(self, *args, **kwargs)
+        try:
+            registro = metricas._local.registro
+        except AttributeError:
+            registro = metricas.registro()
+        if registro.accion is not None:
+            return metodo(self, *args, **kwargs)
+        registro.accion = nombre
+        sentencias = registro.sentencias
+        inicio = perf_counter()
+        error = True
+        try:
+            resultado = metodo(self, *args, **kwargs)
+            error = False
+            return resultado
+        finally:
+            segundos = perf_counter() - inicio
+            registro.accion = None
+            _registrar_accion(registro, nombre, segundos, registro.sentencias - sentencias, error)
+    return envoltura
+
+
+def medido_async(metodo):
+    """medido para corutinas de Sistema: solo la latencia, porque las consultas corren
+    en otros hilos y no se atribuyen a la acción"""
+    nombre = metodo.__name__
+
+    @functools.wraps(metodo)
+    async def envoltura(self, *args, **kwargs):
+        metricas = self.metricas
+        if not metricas.activa:
+            return await metodo(self, *args, **kwargs)
+        inicio = perf_counter()
+        error = True
+        try:
+            resultado = await metodo(self, *args, **kwargs)
+            error = False
+            return resultado
+        finally:
+            _registrar_accion(metricas.registro(), nombre, perf_counter() - inicio, 0, error)
+    return envoltura
+
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que mide cada sentencia: el tiempo de execute, que en SQLite incluye
+    producir la primera fila (y ordenar o agrupar, si la consulta lo necesita).
+
+    La sentencia se registra al terminar execute, sin esperar a que se lean sus
+    filas: así no hace falta un finalizador por cursor ni cronometrar cada
+    fetch. Las filas leídas después con fetchone, fetchmany o fetchall se suman
+    a su estadística; las recorridas iterando el cursor no se cuentan, porque
+    sobrescribir __next__ casi duplicaría el costo por fila.
+    """
+
+    _estadistica: Optional[EstadisticaConsulta] = None
+
+    def execute(self, sql: str, parametros=()):
+        conn = self.connection
+        inicio = perf_counter()
+        try:
+            _execute(self, sql, parametros)
+        except sqlite3.Error:
+            conn.metricas.registrar(sql, perf_counter() - inicio, 0, True)
+            raise
+        # rowcount: filas modificadas por INSERT/UPDATE/DELETE, -1 en las consultas
+        self._estadistica = conn.metricas.registrar(sql, perf_counter() - inicio, self.rowcount, False,
+                                                    parametros, conn.ruta_db)
+        return self
+
+    def executemany(self, sql: str, secuencia):
+        conn = self.connection
+        inicio = perf_counter()
+        try:
+            super().executemany(sql, secuencia)
+        except sqlite3.Error:
+            conn.metricas.registrar(sql, perf_counter() - inicio, 0, True)
+            raise
+        self._estadistica = None
+        conn.metricas.registrar(sql, perf_counter() - inicio, self.rowcount)
+        return self
+
+    def fetchone(self):
+        fila = _fetchone(self)
+        if fila is not None and self._estadistica is not None:
+            self._estadistica.filas += 1
+        return fila
+
+    def fetchmany(self, size: int = None):
+        filas = _fetchmany(self, self.arraysize if size is None else size)
+        if self._estadistica is not None:
+            self._estadistica.filas += len(filas)
+        return filas
+
+    def fetchall(self):
+        filas = _fetchall(self)
+        if self._estadistica is not None:
+            self._estadistica.filas += len(filas)
+        return filas
+
+
+# Métodos de sqlite3 sin pasar por super() en el camino caliente
+_cursor = sqlite3.Connection.cursor
+_execute = sqlite3.Cursor.execute
+_fetchone = sqlite3.Cursor.fetchone
+_fetchmany = sqlite3.Cursor.fetchmany
+_fetchall = sqlite3.Cursor.fetchall
+
+
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión cuyos cursores (también los de conn.execute) son CursorMedido.
+
+    sqlite3 crea los cursores de conn.execute sin pasar por cursor(), por eso
+    se redefinen execute y executemany. executescript (esquema y migraciones)
+    no se mide.
+    """
+
+    metricas: Metricas
+    ruta_db: Optional[str] = None
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parametros=()):
+        # Lo mismo que CursorMedido.execute, sin la llamada intermedia
+        cursor = _cursor(self, CursorMedido)
+        inicio = perf_counter()
+        try:
+            _execute(cursor, sql, parametros)
+        except sqlite3.Error:
+            self.metricas.registrar(sql, perf_counter() - inicio, 0, True)
+            raise
+        cursor._estadistica = self.metricas.registrar(sql, perf_counter() - inicio, cursor.rowcount, False,
+                                                      parametros, self.ruta_db)
+        return cursor
+
+    def executemany(self, sql: str, secuencia):
+        return CursorMedido(self).executemany(sql, secuencia)
@@ -0,0 +1,153 @@
+import json
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from typing import IO, Dict, List, NamedTuple, Sequence
+
+# Notificaciones que se entregan juntas a las salidas, en una transacción
+TAMANO_LOTE = 1000
+REMITENTE = 'recordatorios@quehaypahacer.local'
+INSERTAR = 'INSERT OR IGNORE INTO notificaciones (usuario_id, evento_id, tipo, enviada) VALUES (?, ?, ?, ?)'
+
+
+class Notificacion(NamedTuple):
+    usuario_id: int
+    email: str
+    evento_id: int
+    nombre: str
+    fecha: str
+    tipo: str = 'recordatorio'
+
+    def texto(self) -> str:
+        return f"¡No olvides el evento '{self.nombre}' el {self.fecha}!"
+
+
+class Salida:
+    """Destino de las notificaciones. Recibe lotes; si lanza una excepción el lote
+    no se marca como entregado y se vuelve a intentar."""
+
+    def enviar(self, notificaciones: Sequence[Notificacion]):
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+
+class SalidaConsola(Salida):
+    def __init__(self, destino: IO[str] = None):
+        self.destino = destino
+
+    def enviar(self, notificaciones: Sequence[Notificacion]):
+        destino = self.destino or sys.stdout
+        for notificacion in notificaciones:
+            print(f"\n[Recordatorio para {notificacion.email}] {notificacion.texto()}", file=destino)
+        destino.flush()
+
+
+class SalidaLista(Salida):
+    """Guarda las notificaciones en una lista, para que quien las pidió las muestre"""
+
+    def __init__(self):
+        self.notificaciones: List[Notificacion] = []
+
+    def enviar(self, notificaciones: Sequence[Notificacion]):
+        self.notificaciones.extend(notificaciones)
+
+
+class SalidaArchivo(Salida):
+    """Agrega cada notificación como una línea JSON al archivo"""
+
+    def __init__(self, ruta: str):
+        self.archivo = open(ruta, 'a', encoding='utf-8')
+        self._codificar = json.JSONEncoder(ensure_ascii=False).encode
+
+    def enviar(self, notificaciones: Sequence[Notificacion]):
+        codificar = self._codificar
+        self.archivo.write(''.join([codificar(n._asdict()) + '\n' for n in notificaciones]))
+        self.archivo.flush()
+
+    def cerrar(self):
+        self.archivo.close()
+
+
+class SalidaSMTP(Salida):
+    """Envía un correo por notificación a un servidor SMTP local (p. ej.
+    `python -m aiosmtpd -n -l localhost:1025`), una conexión por lote"""
+
+    def __init__(self, host: str = 'localhost', puerto: int = 1025, remitente: str = REMITENTE):
+        self.host = host
+        self.puerto = puerto
+        self.remitente = remitente
+
+    def enviar(self, notificaciones: Sequence[Notificacion]):
+        import smtplib
+        from email.message import EmailMessage
+        with smtplib.SMTP(self.host, self.puerto) as smtp:
+            for notificacion in notificaciones:
+                mensaje = EmailMessage()
+                mensaje['From'] = self.remitente
+                mensaje['To'] = notificacion.email
+                mensaje['Subject'] = f"Recordatorio: {notificacion.nombre}"
+                mensaje.set_content(notificacion.texto())
+                smtp.send_message(mensaje)
+
+
+class Bandeja:
+    """Bandeja de salida: acumula notificaciones y las entrega por lotes.
+
+    Cada lote se registra en la tabla notificaciones y se entrega a las salidas
+    dentro de la misma transacción: las ya registradas se descartan, así cada
+    notificación se envía una sola vez, y si una salida falla el lote se
+    deshace para reintentarlo más tarde.
+    """
+
+    def __init__(self, salidas: Sequence[Salida] = (), lote: int = TAMANO_LOTE):
+        self.salidas: List[Salida] = list(salidas)
+        self.lote = lote
+        self.pendientes: Dict[tuple, Notificacion] = {}
+        self.enviadas = 0
+        self._lock = threading.Lock()
+
+    def agregar(self, conn: sqlite3.Connection, notificacion: Notificacion):
+        # Bajo el mismo lock con que vaciar intercambia el diccionario, para no perderla
+        with self._lock:
+            self.pendientes.setdefault((notificacion.usuario_id, notificacion.evento_id, notificacion.tipo),
+                                       notificacion)
+            lleno = len(self.pendientes) >= self.lote
+        if lleno:
+            self.vaciar(conn)
+
+    def vaciar(self, conn: sqlite3.Connection) -> int:
+        """Entrega lo pendiente; devuelve cuántas notificaciones eran nuevas"""
+        with self._lock:
+            pendientes, self.pendientes = self.pendientes, {}
+            if not pendientes:
+                return 0
+            # En orden de clave primaria las inserciones tocan menos páginas
+            claves = sorted(pendientes)
+            ahora = datetime.now().isoformat(timespec='seconds')
+            try:
+                with conn:
+                    antes = conn.total_changes
+                    conn.executemany(INSERTAR, ((*clave, ahora) for clave in claves))
+                    if conn.total_changes - antes == len(claves):
+                        nuevas = [pendientes[clave] for clave in claves]
+                    else:
+                        # Otro proceso registró parte del lote: se decide fila por fila
+                        conn.rollback()
+                        nuevas = [pendientes[clave] for clave in claves
+                                  if conn.execute(INSERTAR, (*clave, ahora)).rowcount]
+                    if nuevas:
+                        for salida in self.salidas:
+                            salida.enviar(nuevas)
+            except Exception:
+                pendientes.update(self.pendientes)
+                self.pendientes = pendientes
+                raise
+            self.enviadas += len(nuevas)
+            return len(nuevas)
+
+    def cerrar(self):
+        for salida in self.salidas:
+            salida.cerrar()
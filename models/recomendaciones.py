@@ -0,0 +1,238 @@
+import heapq
+import math
+import sqlite3
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Pesos de cada componente del puntaje de un evento para un usuario
+PESO_CATEGORIA = 1.0
+PESO_COOCURRENCIA = 0.75
+PESO_RECENCIA = 0.5
+# Días en los que la recencia de un evento cae a 1/e
+ESCALA_RECENCIA = 30.0
+
+# Recomendaciones precalculadas por usuario (el máximo que se puede pedir)
+TAMANO_TOP = 20
+# Próximos eventos de cada categoría preferida considerados como candidatos
+CANDIDATOS_POR_CATEGORIA = 50
+# Usuarios con más favoritos no aportan a la co-ocurrencia (cada favorito
+# nuevo costaría una actualización por cada uno de los anteriores). Al cruzar
+# el límite se quitan o se vuelven a sumar todos sus pares.
+MAX_FAVORITOS_COOCURRENCIA = 500
+
+
+class MotorRecomendaciones:
+    """Índice en memoria de recomendaciones, mantenido de forma incremental.
+
+    El puntaje de un evento próximo para un usuario combina:
+      * si su categoría está entre las preferidas del usuario,
+      * la co-ocurrencia con los favoritos del usuario (cuántos usuarios
+        guardaron ambos eventos), y
+      * la recencia: los eventos más cercanos puntúan más.
+
+    Las co-ocurrencias se actualizan con cada favorito agregado o eliminado.
+    El top de cada usuario (sus TAMANO_TOP mejores eventos) se guarda
+    precalculado y solo se recalcula cuando un cambio lo afecta, así servir un
+    usuario sin cambios cuesta O(k).
+
+    Las actualizaciones comprueban `construido` bajo el lock: una que llega
+    mientras se construye el índice espera a que termine y se aplica después
+    (si la carga ya la incluía, no cambia nada).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.construido = False
+        self._limpiar()
+
+    def _limpiar(self):
+        self.favoritos: Dict[int, Set[int]] = defaultdict(set)
+        self.usuarios_evento: Dict[int, Set[int]] = defaultdict(set)
+        self.coocurrencia: Dict[int, Counter] = defaultdict(Counter)
+        self.preferencias: Dict[int, Set[str]] = defaultdict(set)
+        self.usuarios_categoria: Dict[str, Set[int]] = defaultdict(set)
+        # Eventos próximos: id -> (fecha, categoria) y por categoría ordenados por (fecha, id)
+        self.eventos: Dict[int, Tuple[str, str]] = {}
+        self.por_categoria: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+        self.top: Dict[int, List[int]] = {}
+        self.dia = date.today()
+
+    def construir(self, conn: sqlite3.Connection):
+        """Carga el índice completo desde la base de datos"""
+        # Las consultas corren con el lock tomado, como toda la carga (ver la docstring de la clase)
+        with self._lock:
+            hoy = date.today().isoformat()
+            self.cargar(
+                conn.execute('SELECT id, fecha, categoria FROM eventos WHERE fecha >= ? ORDER BY fecha, id', (hoy,)),
+                conn.execute('SELECT usuario_id, categoria FROM usuario_categorias'),
+                conn.execute('SELECT usuario_id, evento_id FROM favoritos ORDER BY usuario_id'))
+
+    def cargar(self, eventos: Iterable[Tuple[int, str, str]], preferencias: Iterable[Tuple[int, str]],
+               favoritos: Iterable[Tuple[int, int]]):
+        """Carga el índice completo desde (id, fecha, categoria) de los eventos en orden de
+        (fecha, id), (usuario_id, categoria) y (usuario_id, evento_id); se descartan los
+        eventos pasados"""
+        with self._lock:
+            self._limpiar()
+            hoy = self.dia.isoformat()
+            for evento_id, fecha, categoria in eventos:
+                if fecha >= hoy:
+                    self.eventos[evento_id] = (fecha, categoria)
+                    self.por_categoria[categoria].append((fecha, evento_id))
+
+            for usuario_id, categoria in preferencias:
+                self.preferencias[usuario_id].add(categoria)
+                self.usuarios_categoria[categoria].add(usuario_id)
+
+            for usuario_id, evento_id in favoritos:
+                self.favoritos[usuario_id].add(evento_id)
+                self.usuarios_evento[evento_id].add(usuario_id)
+
+            for favoritos_usuario in self.favoritos.values():
+                if len(favoritos_usuario) > MAX_FAVORITOS_COOCURRENCIA:
+                    continue
+                for evento_id in favoritos_usuario:
+                    fila = self.coocurrencia[evento_id]
+                    for otro in favoritos_usuario:
+                        if otro != evento_id:
+                            fila[otro] += 1
+            self.construido = True
+
+    def reiniciar(self):
+        """Descarta el índice; se reconstruye en el próximo uso (p. ej. tras una importación masiva)"""
+        with self._lock:
+            self.construido = False
+            self._limpiar()
+
+    # Actualizaciones incrementales
+    def _invalidar(self, usuarios: Iterable[int]):
+        for usuario_id in usuarios:
+            self.top.pop(usuario_id, None)
+
+    def _sumar_pares(self, favoritos: Set[int], delta: int):
+        """Suma delta a la co-ocurrencia de cada par de favoritos de un usuario"""
+        for evento_id in favoritos:
+            conteos = self.coocurrencia[evento_id]
+            for otro in favoritos:
+                if otro != evento_id:
+                    conteos[otro] += delta
+                    if conteos[otro] <= 0:
+                        del conteos[otro]
+            if not conteos:
+                del self.coocurrencia[evento_id]
+            self._invalidar(self.usuarios_evento[evento_id])
+
+    def agregar_favorito(self, usuario_id: int, evento_id: int):
+        with self._lock:
+            if not self.construido:
+                return
+            favoritos = self.favoritos[usuario_id]
+            if evento_id in favoritos:
+                return
+            if len(favoritos) == MAX_FAVORITOS_COOCURRENCIA:
+                # Pasa el límite: deja de aportar a la co-ocurrencia
+                self._sumar_pares(favoritos, -1)
+            elif len(favoritos) < MAX_FAVORITOS_COOCURRENCIA:
+                fila = self.coocurrencia[evento_id]
+                for otro in favoritos:
+                    fila[otro] += 1
+                    self.coocurrencia[otro][evento_id] += 1
+                    # Cambió el puntaje de evento_id para quien guardó `otro` y viceversa
+                    self._invalidar(self.usuarios_evento[otro])
+                self._invalidar(self.usuarios_evento[evento_id])
+            favoritos.add(evento_id)
+            self.usuarios_evento[evento_id].add(usuario_id)
+            self._invalidar((usuario_id,))
+
+    def eliminar_favorito(self, usuario_id: int, evento_id: int):
+        with self._lock:
+            if not self.construido:
+                return
+            favoritos = self.favoritos[usuario_id]
+            if evento_id not in favoritos:
+                return
+            favoritos.discard(evento_id)
+            self.usuarios_evento[evento_id].discard(usuario_id)
+            if len(favoritos) == MAX_FAVORITOS_COOCURRENCIA:
+                # Vuelve al límite: sus favoritos restantes aportan de nuevo
+                self._sumar_pares(favoritos, 1)
+            elif len(favoritos) < MAX_FAVORITOS_COOCURRENCIA:
+                fila = self.coocurrencia[evento_id]
+                for otro in favoritos:
+                    for a, b in ((evento_id, otro), (otro, evento_id)):
+                        conteos = self.coocurrencia[a]
+                        conteos[b] -= 1
+                        if conteos[b] <= 0:
+                            del conteos[b]
+                    self._invalidar(self.usuarios_evento[otro])
+                if not fila:
+                    del self.coocurrencia[evento_id]
+                self._invalidar(self.usuarios_evento[evento_id])
+            self._invalidar((usuario_id,))
+
+    def agregar_evento(self, evento_id: int, fecha: str, categoria: str):
+        with self._lock:
+            if not self.construido or fecha < self.dia.isoformat() or evento_id in self.eventos:
+                return
+            self.eventos[evento_id] = (fecha, categoria)
+            insort(self.por_categoria[categoria], (fecha, evento_id))
+            self._invalidar(self.usuarios_categoria[categoria])
+
+    def cambiar_preferencias(self, usuario_id: int, categorias: Iterable[str]):
+        with self._lock:
+            if not self.construido:
+                return
+            for categoria in self.preferencias.pop(usuario_id, ()):
+                self.usuarios_categoria[categoria].discard(usuario_id)
+            for categoria in categorias:
+                self.preferencias[usuario_id].add(categoria)
+                self.usuarios_categoria[categoria].add(usuario_id)
+            self._invalidar((usuario_id,))
+
+    # Consulta
+    def _puntajes(self, usuario_id: int, hoy: str) -> Dict[int, float]:
+        favoritos = self.favoritos.get(usuario_id, ())
+        puntajes: Dict[int, float] = defaultdict(float)
+
+        for categoria in self.preferencias.get(usuario_id, ()):
+            eventos = self.por_categoria.get(categoria, [])
+            inicio = bisect_left(eventos, (hoy, 0))
+            for _, evento_id in eventos[inicio:inicio + CANDIDATOS_POR_CATEGORIA]:
+                puntajes[evento_id] += PESO_CATEGORIA
+
+        coocurrencias = Counter()
+        for favorito in favoritos:
+            coocurrencias.update(self.coocurrencia.get(favorito, {}))
+        for evento_id, conteo in coocurrencias.items():
+            puntajes[evento_id] += PESO_COOCURRENCIA * math.log1p(conteo)
+
+        dia = date.fromisoformat(hoy)
+        for evento_id in list(puntajes):
+            datos = self.eventos.get(evento_id)
+            if datos is None or datos[0] < hoy or evento_id in favoritos:
+                del puntajes[evento_id]
+                continue
+            dias = (date.fromisoformat(datos[0]) - dia).days
+            puntajes[evento_id] += PESO_RECENCIA * math.exp(-dias / ESCALA_RECENCIA)
+        return puntajes
+
+    def recomendar(self, usuario_id: int, k: int = 5) -> List[int]:
+        """Ids de los k eventos con mayor puntaje para el usuario, en orden.
+        Solo se precalculan TAMANO_TOP: un k mayor lanza ValueError."""
+        if k > TAMANO_TOP:
+            raise ValueError(f"Se pueden pedir hasta {TAMANO_TOP} recomendaciones")
+        with self._lock:
+            if self.dia != date.today():
+                # La recencia y los eventos pasados cambian con el día
+                self.dia = date.today()
+                self.top.clear()
+
+            top = self.top.get(usuario_id)
+            if top is None:
+                puntajes = self._puntajes(usuario_id, self.dia.isoformat())
+                mejores = heapq.nlargest(TAMANO_TOP, puntajes.items(), key=lambda par: (par[1], -par[0]))
+                top = self.top[usuario_id] = [evento_id for evento_id, _ in mejores]
+            return top[:k]
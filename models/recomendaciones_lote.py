@@ -0,0 +1,205 @@
+"""Cálculo por lotes (vectorizado con NumPy) de las recomendaciones de todos los usuarios.
+
+Usa el mismo puntaje que MotorRecomendaciones, pero en lugar de recorrer los
+usuarios uno a uno trabaja sobre arreglos: los favoritos se guardan como listas
+de adyacencia (estilo CSR) por usuario y por evento, y la co-ocurrencia de un
+bloque de usuarios se obtiene expandiendo usuario -> favorito -> otros usuarios
+que lo guardaron -> sus eventos próximos. La memoria está acotada por el tamaño
+del bloque, no por el número total de usuarios.
+
+NumPy es opcional: solo se importa al calcular.
+"""
+import sqlite3
+from datetime import date
+from itertools import chain
+from typing import Tuple
+
+from .recomendaciones import (PESO_CATEGORIA, PESO_COOCURRENCIA, PESO_RECENCIA, ESCALA_RECENCIA,
+                              CANDIDATOS_POR_CATEGORIA, MAX_FAVORITOS_COOCURRENCIA)
+
+USUARIOS_POR_BLOQUE = 500
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("El cálculo por lotes de recomendaciones requiere NumPy (pip install numpy)") from None
+    return numpy
+
+
+def _adyacencia(np, origen, destino, n_origen: int) -> Tuple:
+    """Listas de adyacencia origen -> destino: los destinos de o están en destino[inicio[o]:inicio[o + 1]]"""
+    orden = np.argsort(origen, kind='stable')
+    inicio = np.zeros(n_origen + 1, dtype=np.int64)
+    np.cumsum(np.bincount(origen, minlength=n_origen), out=inicio[1:])
+    return inicio, destino[orden]
+
+
+def _rangos(np, desde, cuenta) -> Tuple:
+    """Expande los rangos [desde, desde + cuenta): devuelve el índice del rango del
+    que sale cada posición y la posición misma"""
+    origen = np.repeat(np.arange(len(cuenta)), cuenta)
+    return origen, np.repeat(desde - (np.cumsum(cuenta) - cuenta), cuenta) + np.arange(int(cuenta.sum()))
+
+
+def _expandir(np, inicio, claves) -> Tuple:
+    """_rangos sobre las listas de adyacencia de cada clave"""
+    desde = inicio[claves]
+    return _rangos(np, desde, inicio[claves + 1] - desde)
+
+
+def _top_k(np, filas, puntajes, k: int):
+    """Índices de los k mayores puntajes de cada fila, fila por fila y en orden.
+
+    `filas` viene ordenado y, dentro de cada fila, los elementos van por id de
+    evento, así el primer máximo de una fila es el de menor id. Con k pequeño,
+    k pasadas lineales son más baratas que ordenar todos los candidatos.
+    """
+    n = len(filas)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    inicios = np.flatnonzero(np.concatenate(([True], filas[1:] != filas[:-1])))
+    grupo = np.repeat(np.arange(len(inicios)), np.diff(np.append(inicios, n)))
+    restantes = puntajes.copy()
+    elegidos = np.full((len(inicios), k), -1, dtype=np.int64)
+    for rango in range(k):
+        maximo = np.maximum.reduceat(restantes, inicios)
+        # Posiciones que empatan con el máximo de su fila; la primera de cada fila gana
+        empates = np.flatnonzero((restantes == maximo[grupo]) & (restantes > -np.inf))
+        grupos = grupo[empates]
+        primeros = np.concatenate(([True], grupos[1:] != grupos[:-1])) if len(empates) else []
+        elegidos[grupos[primeros], rango] = empates[primeros]
+        restantes[empates[primeros]] = -np.inf
+    elegidos = elegidos.ravel()
+    return elegidos[elegidos >= 0]
+
+
+def calcular_recomendaciones(conn: sqlite3.Connection, k: int = 5,
+                             usuarios_por_bloque: int = USUARIOS_POR_BLOQUE) -> int:
+    """Calcula el top-k de todos los usuarios y lo guarda en la tabla recomendaciones.
+
+    Cada bloque de usuarios se escribe en su propia transacción. Devuelve el
+    número de usuarios procesados.
+    """
+    np = _numpy()
+    hoy = date.today()
+
+    # Eventos próximos; la columna de un evento es su posición por id
+    categorias = {}
+    ids, codigos, dias = [], [], []
+    for evento_id, fecha, categoria in conn.execute(
+            'SELECT id, fecha, categoria FROM eventos WHERE fecha >= ? ORDER BY id', (hoy.isoformat(),)):
+        ids.append(evento_id)
+        codigos.append(categorias.setdefault(categoria, len(categorias)))
+        dias.append((date.fromisoformat(fecha) - hoy).days)
+    if not ids:
+        with conn:
+            conn.execute('DELETE FROM recomendaciones')
+        return 0
+    ids_eventos = np.array(ids, dtype=np.int64)
+    dias = np.array(dias, dtype=np.int64)
+    codigos = np.array(codigos, dtype=np.int64)
+    recencia = PESO_RECENCIA * np.exp(-dias / ESCALA_RECENCIA)
+    n_eventos = len(ids_eventos)
+    del ids
+
+    # Candidatos por categoría: los primeros próximos eventos de cada una en orden (fecha, id)
+    por_fecha = np.argsort(dias, kind='stable')
+    candidatos = np.zeros((len(categorias), CANDIDATOS_POR_CATEGORIA), dtype=np.int64)
+    n_candidatos = np.zeros(len(categorias), dtype=np.int64)
+    for codigo in range(len(categorias)):
+        columnas = por_fecha[codigos[por_fecha] == codigo][:CANDIDATOS_POR_CATEGORIA]
+        candidatos[codigo, :len(columnas)] = columnas
+        n_candidatos[codigo] = len(columnas)
+    candidatos = candidatos.ravel()
+    del dias, codigos, por_fecha
+
+    # Usuarios y sus categorías preferidas como matriz booleana usuarios x categorías
+    ids_usuarios = np.fromiter(chain.from_iterable(conn.execute('SELECT id FROM usuarios ORDER BY id')),
+                               dtype=np.int64)
+    preferencias = [(usuario_id, categorias[categoria]) for usuario_id, categoria in
+                    conn.execute('SELECT usuario_id, categoria FROM usuario_categorias')
+                    if categoria in categorias]
+    matriz_preferencias = np.zeros((len(ids_usuarios), len(categorias)), dtype=bool)
+    if preferencias:
+        usuarios, cods = np.array(preferencias, dtype=np.int64).T
+        matriz_preferencias[np.searchsorted(ids_usuarios, usuarios), cods] = True
+    del preferencias
+
+    # Favoritos leídos sin pasar por tuplas de Python
+    pares = np.fromiter(chain.from_iterable(conn.execute('SELECT usuario_id, evento_id FROM favoritos')),
+                        dtype=np.int64)
+    fav_usuario, fav_evento = pares[0::2].copy(), pares[1::2].copy()
+    del pares
+    n_ids_usuario = int(max(ids_usuarios.max(initial=0), fav_usuario.max(initial=0))) + 1
+    n_ids_evento = int(max(ids_eventos.max(), fav_evento.max(initial=0))) + 1
+    columna_de = np.full(n_ids_evento, -1, dtype=np.int64)
+    columna_de[ids_eventos] = np.arange(n_eventos)
+    fav_columna = columna_de[fav_evento]
+
+    # Listas de adyacencia. Solo aportan a la co-ocurrencia los usuarios con hasta
+    # MAX_FAVORITOS_COOCURRENCIA favoritos, igual que en MotorRecomendaciones.
+    inicio_favoritos, favoritos = _adyacencia(np, fav_usuario, fav_evento, n_ids_usuario)
+    _, columnas_favoritas = _adyacencia(np, fav_usuario, fav_columna, n_ids_usuario)
+    aporta = np.diff(inicio_favoritos)[fav_usuario] <= MAX_FAVORITOS_COOCURRENCIA
+    inicio_guardaron, guardaron = _adyacencia(np, fav_evento[aporta], fav_usuario[aporta], n_ids_evento)
+    proximo = aporta & (fav_columna >= 0)
+    inicio_proximos, proximos = _adyacencia(np, fav_usuario[proximo], fav_columna[proximo], n_ids_usuario)
+    del fav_usuario, fav_evento, fav_columna, aporta, proximo
+
+    procesados = 0
+    for inicio in range(0, len(ids_usuarios), usuarios_por_bloque):
+        bloque = ids_usuarios[inicio:inicio + usuarios_por_bloque]
+
+        # Co-ocurrencia: usuario -> favorito -> otro usuario que lo guardó -> evento próximo del otro
+        fila, posicion = _expandir(np, inicio_favoritos, bloque)
+        origen, posicion = _expandir(np, inicio_guardaron, favoritos[posicion])
+        fila, otros = fila[origen], guardaron[posicion]
+        origen, posicion = _expandir(np, inicio_proximos, otros)
+        claves_co = (fila[origen] * n_eventos + proximos[posicion]) * 2
+        del otros, origen, posicion
+
+        # Categorías preferidas: los candidatos de cada una. Las claves impares marcan
+        # la categoría y quedan al final de su grupo al ordenar.
+        fila, cods = np.nonzero(matriz_preferencias[inicio:inicio + len(bloque)])
+        origen, posicion = _rangos(np, cods * CANDIDATOS_POR_CATEGORIA, n_candidatos[cods])
+        claves_categoria = (fila[origen] * n_eventos + candidatos[posicion]) * 2 + 1
+
+        claves = np.sort(np.concatenate([claves_co, claves_categoria]))
+        del claves_co, claves_categoria
+        base = claves >> 1
+        primeros = np.flatnonzero(np.concatenate(([True], base[1:] != base[:-1])))
+        ultimos = np.append(primeros[1:], len(claves)) - 1
+        categoria = (claves[ultimos] & 1).astype(bool)
+        coocurrencia = ultimos - primeros + 1 - categoria
+        base = base[primeros]
+
+        # Fuera los eventos que el usuario ya guardó (base está ordenada)
+        fila, posicion = _expandir(np, inicio_favoritos, bloque)
+        columnas = columnas_favoritas[posicion]
+        guardadas = fila[columnas >= 0] * n_eventos + columnas[columnas >= 0]
+        encontradas = np.minimum(np.searchsorted(base, guardadas), len(base) - 1)
+        conservar = np.ones(len(base), dtype=bool)
+        if len(base):
+            conservar[encontradas[base[encontradas] == guardadas]] = False
+        base, categoria, coocurrencia = base[conservar], categoria[conservar], coocurrencia[conservar]
+
+        filas, columnas = base // n_eventos, base % n_eventos
+        puntajes = (np.where(categoria, PESO_CATEGORIA, 0.0) + PESO_COOCURRENCIA * np.log1p(coocurrencia)
+                    + recencia[columnas])
+
+        # Top-k por usuario: mayor puntaje y, a igualdad, menor id
+        elegidos = _top_k(np, filas, puntajes, k)
+        filas = filas[elegidos]
+        posiciones = np.arange(len(filas)) - np.searchsorted(filas, filas, 'left')
+
+        with conn:
+            conn.execute('DELETE FROM recomendaciones WHERE usuario_id BETWEEN ? AND ?',
+                         (int(bloque[0]), int(bloque[-1])))
+            conn.executemany(
+                'INSERT INTO recomendaciones (usuario_id, posicion, evento_id, puntaje) VALUES (?, ?, ?, ?)',
+                zip(bloque[filas].tolist(), posiciones.tolist(),
+                    ids_eventos[columnas[elegidos]].tolist(), puntajes[elegidos].tolist()))
+        procesados += len(bloque)
+    return procesados
@@ -0,0 +1,203 @@
+import heapq
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from .conexiones import PoolConexiones
+from .notificaciones import Bandeja, Notificacion, Salida, TAMANO_LOTE
+
+# Se recuerda un evento guardado en favoritos desde DIAS_AVISO días antes
+DIAS_AVISO = 3
+# Tiempo máximo de cada barrido; lo que no alcance queda para el siguiente
+PRESUPUESTO = 1.0
+# Espera máxima del hilo entre barridos sin trabajo pendiente
+INTERVALO = 60.0
+
+# Favoritos de un evento que aún no recibieron su recordatorio, por páginas de usuario_id
+# (idx_favoritos_evento) y descartando los registrados en notificaciones (clave primaria)
+PENDIENTES = '''
+    SELECT f.usuario_id, u.email, e.id, e.nombre, e.fecha
+    FROM favoritos f
+    JOIN eventos e ON e.id = f.evento_id
+    JOIN usuarios u ON u.id = f.usuario_id
+    WHERE f.evento_id = ? AND f.usuario_id {} ?
+    AND NOT EXISTS (
+        SELECT 1 FROM notificaciones n
+        WHERE n.usuario_id = f.usuario_id AND n.evento_id = f.evento_id AND n.tipo = 'recordatorio'
+    )
+'''
+PENDIENTES_EVENTO = PENDIENTES.format('>') + ' ORDER BY f.usuario_id LIMIT ?'
+PENDIENTE_FAVORITO = PENDIENTES.format('=')
+# Favoritos de un usuario (clave primaria de favoritos) cuyo evento está en su ventana de aviso
+PENDIENTES_USUARIO = '''
+    SELECT f.usuario_id, u.email, e.id, e.nombre, e.fecha
+    FROM favoritos f
+    JOIN eventos e ON e.id = f.evento_id
+    JOIN usuarios u ON u.id = f.usuario_id
+    WHERE f.usuario_id = ? AND e.fecha BETWEEN ? AND date(?, ?)
+    AND NOT EXISTS (
+        SELECT 1 FROM notificaciones n
+        WHERE n.usuario_id = f.usuario_id AND n.evento_id = f.evento_id AND n.tipo = 'recordatorio'
+    )
+'''
+
+
+class PlanificadorRecordatorios:
+    """Envía un recordatorio por cada favorito cuyo evento ocurre en los próximos DIAS_AVISO días.
+
+    Los eventos próximos esperan en una cola de prioridad ordenada por el día en
+    que empiezan a recordarse. Cada barrido saca los que ya vencieron y recorre
+    sus favoritos aún no notificados (tabla notificaciones) por páginas de
+    usuario_id, dentro de un presupuesto de tiempo. Los favoritos agregados a un
+    evento que ya está en su ventana se notifican en el siguiente barrido sin
+    volver a recorrer el evento. Las notificaciones salen por una Bandeja hacia
+    las salidas configuradas.
+
+    Se puede usar de forma síncrona (ejecutar_pendientes) o en un hilo (iniciar).
+    """
+
+    def __init__(self, pool: PoolConexiones, salidas: Sequence[Salida] = (), dias: int = DIAS_AVISO,
+                 presupuesto: float = PRESUPUESTO, intervalo: float = INTERVALO, lote: int = TAMANO_LOTE):
+        self.pool = pool
+        self.bandeja = Bandeja(salidas, lote)
+        self.dias = dias
+        self.presupuesto = presupuesto
+        self.intervalo = intervalo
+        self.lote = lote
+        self._lock = threading.Lock()
+        self._cargado = False
+        self._cola: List[Tuple[str, int, str]] = []  # (día de aviso, evento_id, fecha)
+        self._por_barrer: Deque[Tuple[int, int]] = deque()  # (evento_id, último usuario_id visto)
+        self._activos: Dict[int, str] = {}  # eventos en su ventana de aviso -> fecha
+        self._dia = ''
+        self._favoritos_nuevos: List[Tuple[int, int]] = []
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    # Avisos desde Sistema
+    def evento_creado(self, evento_id: int, fecha: str):
+        if not self._cargado:
+            return
+        with self._lock:
+            self._programar(evento_id, fecha)
+        self._despertar.set()
+
+    def favorito_agregado(self, usuario_id: int, evento_id: int):
+        if not self._cargado:
+            return
+        with self._lock:
+            if evento_id in self._activos:
+                self._favoritos_nuevos.append((usuario_id, evento_id))
+                self._despertar.set()
+
+    def recargar(self):
+        """Vuelve a leer los eventos en el próximo barrido (p. ej. tras una importación masiva)"""
+        self._cargado = False
+        self._despertar.set()
+
+    # Cola de eventos
+    def _programar(self, evento_id: int, fecha: str):
+        try:
+            aviso = (date.fromisoformat(fecha) - timedelta(days=self.dias)).isoformat()
+        except ValueError:
+            return
+        heapq.heappush(self._cola, (aviso, evento_id, fecha))
+
+    def _cargar(self, conn):
+        with self._lock:
+            self._cola = []
+            self._por_barrer.clear()
+            self._activos.clear()
+            self._favoritos_nuevos.clear()
+            for evento_id, fecha in conn.execute('SELECT id, fecha FROM eventos WHERE fecha >= ?',
+                                                 (date.today().isoformat(),)):
+                self._programar(evento_id, fecha)
+            self._cargado = True
+
+    def _vencidos(self):
+        """Mueve a _por_barrer los eventos cuyo día de aviso ya llegó"""
+        hoy = date.today().isoformat()
+        with self._lock:
+            if hoy != self._dia:
+                self._dia = hoy
+                self._activos = {evento_id: fecha for evento_id, fecha in self._activos.items() if fecha >= hoy}
+            while self._cola and self._cola[0][0] <= hoy:
+                _, evento_id, fecha = heapq.heappop(self._cola)
+                if fecha >= hoy:
+                    self._activos[evento_id] = fecha
+                    self._por_barrer.append((evento_id, 0))
+
+    # Barrido
+    def ejecutar_pendientes(self, presupuesto: Optional[float] = None) -> int:
+        """Un barrido: devuelve el número de notificaciones nuevas enviadas"""
+        limite = time.perf_counter() + (self.presupuesto if presupuesto is None else presupuesto)
+        enviadas = self.bandeja.enviadas
+        with self.pool.conexion() as conn:
+            if not self._cargado:
+                self._cargar(conn)
+            self._vencidos()
+
+            with self._lock:
+                nuevos, self._favoritos_nuevos = self._favoritos_nuevos, []
+            for usuario_id, evento_id in nuevos:
+                for fila in conn.execute(PENDIENTE_FAVORITO, (evento_id, usuario_id)):
+                    self.bandeja.agregar(conn, Notificacion(*fila))
+
+            while self._por_barrer and time.perf_counter() < limite:
+                evento_id, ultimo = self._por_barrer.popleft()
+                filas = conn.execute(PENDIENTES_EVENTO, (evento_id, ultimo, self.lote)).fetchall()
+                for fila in filas:
+                    self.bandeja.agregar(conn, Notificacion(*fila))
+                if len(filas) == self.lote:
+                    # Quedan favoritos del evento: se sigue desde el último usuario visto
+                    self._por_barrer.appendleft((evento_id, filas[-1][0]))
+            self.bandeja.vaciar(conn)
+        return self.bandeja.enviadas - enviadas
+
+    def del_usuario(self, usuario_id: int, salidas: Sequence[Salida]) -> int:
+        """Entrega a las salidas dadas los recordatorios vencidos y aún no enviados de un usuario
+        (p. ej. al mostrar su menú); quedan registrados y el barrido general ya no los repite"""
+        hoy = date.today().isoformat()
+        bandeja = Bandeja(salidas, self.lote)
+        with self.pool.conexion() as conn:
+            for fila in conn.execute(PENDIENTES_USUARIO, (usuario_id, hoy, hoy, f'+{self.dias} days')).fetchall():
+                bandeja.agregar(conn, Notificacion(*fila))
+            return bandeja.vaciar(conn)
+
+    @property
+    def pendiente(self) -> bool:
+        return bool(self._por_barrer or self._favoritos_nuevos)
+
+    # Hilo de fondo
+    def _espera(self) -> float:
+        if self.pendiente:
+            return 0
+        manana = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+        return min(self.intervalo, (manana - datetime.now()).total_seconds())
+
+    def _ciclo(self):
+        while not self._detener.is_set():
+            self._despertar.clear()
+            try:
+                self.ejecutar_pendientes()
+            except Exception as error:
+                print(f"Error enviando recordatorios: {error}")
+                self._detener.wait(self.intervalo)
+            self._despertar.wait(self._espera())
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._ciclo, name='recordatorios', daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        if self._hilo is not None:
+            self._detener.set()
+            self._despertar.set()
+            self._hilo.join()
+            self._hilo = None
+        self.bandeja.cerrar()
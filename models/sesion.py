@@ -0,0 +1,9 @@
+from typing import Optional
+from .usuario import Usuario
+
+class Sesion:
+    """Estado de un cliente de Sistema: el usuario que inició sesión, si hay uno"""
+    __slots__ = ('usuario',)
+
+    def __init__(self, usuario: Optional[Usuario] = None):
+        self.usuario = usuario
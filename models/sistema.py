@@ -1,19 +1,433 @@
+import math
 import sqlite3
-from datetime import datetime
-from typing import List, Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import List, Optional, Dict, Any, Iterator, Iterable, IO, Tuple
 from .usuario import Usuario
 from .evento import Evento
-import getpass
-import hashlib
+from .sesion import Sesion
+from .conexiones import PoolConexiones
+from .almacenamiento import (Almacenamiento, AlmacenamientoSQLite, Categorias, FechaFiltro, COLUMNAS_EVENTOS,
+                             ORDENES_EVENTOS, SELECT_EVENTOS, filtros_eventos, filtros_sql)
+from .almacenamiento_memoria import AlmacenamientoMemoria
+from .importacion import ResumenImportacion, importar_eventos, exportar_eventos
+from .recomendaciones import MotorRecomendaciones
+from .recomendaciones_lote import calcular_recomendaciones
+from .recordatorios import PlanificadorRecordatorios
+from .notificaciones import Notificacion, Salida, SalidaLista
+from . import asistencia, cambios, contadores, duplicados, lotes
+from .asistencia import Asistencia
+from .cambios import Cambio, GrupoProximos
+from .contadores import BufferContadores, Destacado, PESO_ASISTENCIA, PESO_FAVORITO
+from .duplicados import ParDuplicado, Parecido
+from .lotes import BLOQUE_USUARIOS, ResumenBarrido
+from .cache import CacheConsultas
+from .metricas import Metricas, medido, medido_async
+from .claves import PoolClaves, necesita_rehash
+from .geo import GEOCODIFICAR, KM_POR_GRADO, LUGARES, caja_radio, coordenadas_validas
+from .fechas import dia_epoca, hora_valida, leer_fecha
+# Índices para los patrones de consulta de eventos, favoritos y recordatorios
+INDICES = [
+    # explorar_eventos(orden='fecha') y la carga de eventos próximos (fecha >=)
+    'CREATE INDEX IF NOT EXISTS idx_eventos_fecha ON eventos (fecha, id)',
+    # filtro por categoría + ORDER BY fecha
+    'CREATE INDEX IF NOT EXISTS idx_eventos_categoria_fecha ON eventos (categoria, fecha, id)',
+    # explorar_eventos(orden='nombre')
+    'CREATE INDEX IF NOT EXISTS idx_eventos_nombre ON eventos (nombre, id)',
+    # Índice inverso (cubriente) de favoritos: usuarios que guardaron un evento
+    'CREATE INDEX IF NOT EXISTS idx_favoritos_evento ON favoritos (evento_id, usuario_id)',
+    'CREATE INDEX IF NOT EXISTS idx_asistentes_evento ON asistentes (evento_id, usuario_id)',
+]
+
+# Índice de texto completo sobre nombre, descripción y ubicación. Las tildes se
+# ignoran (remove_diacritics) y los prefijos cortos se indexan para búsquedas "medell*".
+BUSQUEDA = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS eventos_fts USING fts5(
+        nombre, descripcion, ubicacion,
+        content='eventos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_fts_insert AFTER INSERT ON eventos BEGIN
+        INSERT INTO eventos_fts (rowid, nombre, descripcion, ubicacion)
+        VALUES (new.id, new.nombre, new.descripcion, new.ubicacion);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_fts_delete AFTER DELETE ON eventos BEGIN
+        INSERT INTO eventos_fts (eventos_fts, rowid, nombre, descripcion, ubicacion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion, old.ubicacion);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_fts_update AFTER UPDATE OF nombre, descripcion, ubicacion ON eventos BEGIN
+        INSERT INTO eventos_fts (eventos_fts, rowid, nombre, descripcion, ubicacion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion, old.ubicacion);
+        INSERT INTO eventos_fts (rowid, nombre, descripcion, ubicacion)
+        VALUES (new.id, new.nombre, new.descripcion, new.ubicacion);
+    END
+    ''',
+    # Indexar los eventos que ya existían antes de crear la tabla
+    "INSERT INTO eventos_fts (eventos_fts) VALUES ('rebuild')",
+]
+
+# Clave natural de un evento, usada por la importación para descartar duplicados
+CLAVE_NATURAL = [
+    'CREATE INDEX IF NOT EXISTS idx_eventos_clave ON eventos (fecha, ubicacion, nombre)',
+]
+
+# Top-k de cada usuario calculado por lotes (recomendaciones_lote), para resúmenes diarios
+RECOMENDACIONES = [
+    '''
+    CREATE TABLE IF NOT EXISTS recomendaciones (
+        usuario_id INTEGER NOT NULL,
+        posicion INTEGER NOT NULL,
+        evento_id INTEGER NOT NULL,
+        puntaje REAL NOT NULL,
+        PRIMARY KEY (usuario_id, posicion)
+    ) WITHOUT ROWID
+    ''',
+]
+
+# Categorías preferidas normalizadas: una fila por usuario y categoría, con un
+# índice inverso para "usuarios que prefieren la categoría X". Se llena desde la
+# antigua columna usuarios.categorias_preferidas (texto separado por comas), que
+# queda sin uso.
+PREFERENCIAS = [
+    '''
+    CREATE TABLE IF NOT EXISTS usuario_categorias (
+        usuario_id INTEGER NOT NULL,
+        categoria TEXT NOT NULL,
+        PRIMARY KEY (usuario_id, categoria),
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_usuario_categorias_categoria ON usuario_categorias (categoria, usuario_id)',
+    '''
+    INSERT OR IGNORE INTO usuario_categorias (usuario_id, categoria)
+    WITH RECURSIVE partes (usuario_id, categoria, resto) AS (
+        SELECT id, '', categorias_preferidas || ',' FROM usuarios
+        WHERE categorias_preferidas IS NOT NULL AND categorias_preferidas <> ''
+        UNION ALL
+        SELECT usuario_id, trim(substr(resto, 1, instr(resto, ',') - 1)), substr(resto, instr(resto, ',') + 1)
+        FROM partes WHERE resto <> ''
+    )
+    SELECT usuario_id, categoria FROM partes WHERE categoria <> ''
+    ''',
+]
+
+# Notificaciones ya entregadas: una por usuario, evento y tipo, para no repetirlas
+NOTIFICACIONES = [
+    '''
+    CREATE TABLE IF NOT EXISTS notificaciones (
+        usuario_id INTEGER NOT NULL,
+        evento_id INTEGER NOT NULL,
+        tipo TEXT NOT NULL,
+        enviada TEXT NOT NULL,
+        PRIMARY KEY (usuario_id, evento_id, tipo)
+    ) WITHOUT ROWID
+    ''',
+]
+
+# Asistencia con cupo: contador de inscritos mantenido junto a la capacidad (se
+# inicializa desde asistentes) y lista de espera en orden de llegada (id)
+ASISTENCIA = [
+    'ALTER TABLE eventos ADD COLUMN inscritos INTEGER NOT NULL DEFAULT 0',
+    '''
+    UPDATE eventos SET inscritos = (SELECT count(*) FROM asistentes a WHERE a.evento_id = eventos.id)
+    WHERE id IN (SELECT evento_id FROM asistentes)
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS lista_espera (
+        id INTEGER PRIMARY KEY,
+        evento_id INTEGER NOT NULL,
+        usuario_id INTEGER NOT NULL,
+        UNIQUE (evento_id, usuario_id),
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
+        FOREIGN KEY (evento_id) REFERENCES eventos(id)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_lista_espera_evento ON lista_espera (evento_id, id)',
+]
+
+# Coordenadas opcionales de los eventos con un índice espacial R*Tree (cada evento
+# es un punto: mínimo = máximo) mantenido por triggers, y la tabla de lugares
+# conocidos con la que se geocodifican sin conexión las ubicaciones existentes
+GEO = [
+    'ALTER TABLE eventos ADD COLUMN latitud REAL',
+    'ALTER TABLE eventos ADD COLUMN longitud REAL',
+    '''
+    CREATE TABLE IF NOT EXISTS lugares (
+        nombre TEXT PRIMARY KEY,
+        latitud REAL NOT NULL,
+        longitud REAL NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    'INSERT OR IGNORE INTO lugares (nombre, latitud, longitud) VALUES {}'.format(', '.join(
+        "('{}', {}, {})".format(nombre.replace("'", "''"), latitud, longitud) for nombre, latitud, longitud in LUGARES)),
+    'CREATE VIRTUAL TABLE IF NOT EXISTS eventos_geo USING rtree(id, min_lat, max_lat, min_lon, max_lon)',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_geo_insert AFTER INSERT ON eventos
+    WHEN new.latitud IS NOT NULL AND new.longitud IS NOT NULL BEGIN
+        INSERT INTO eventos_geo VALUES (new.id, new.latitud, new.latitud, new.longitud, new.longitud);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_geo_update AFTER UPDATE OF latitud, longitud ON eventos BEGIN
+        DELETE FROM eventos_geo WHERE id = old.id;
+        INSERT INTO eventos_geo SELECT new.id, new.latitud, new.latitud, new.longitud, new.longitud
+        WHERE new.latitud IS NOT NULL AND new.longitud IS NOT NULL;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_geo_delete AFTER DELETE ON eventos BEGIN
+        DELETE FROM eventos_geo WHERE id = old.id;
+    END
+    ''',
+    GEOCODIFICAR.format(0),
+]
+
+# Fecha como entero ordenable: días desde 1970-01-01, calculados por SQLite desde
+# el texto YYYY-MM-DD (NULL si no es una fecha válida). La columna es virtual, así
+# que no hay que reescribir la tabla ni mantenerla al insertar; el índice guarda
+# el entero y los rangos de fechas se resuelven sobre él en lugar de comparar texto.
+# idx_eventos_fecha se conserva para los recordatorios y las recomendaciones (fecha >=).
+FECHAS = [
+    'ALTER TABLE eventos ADD COLUMN dia INTEGER GENERATED ALWAYS AS '
+    '(CAST(julianday(fecha) - 2440587.5 AS INTEGER)) VIRTUAL',
+    # Hora opcional del evento, HH:MM
+    'ALTER TABLE eventos ADD COLUMN hora TEXT',
+    'CREATE INDEX IF NOT EXISTS idx_eventos_dia ON eventos (dia, id)',
+    'CREATE INDEX IF NOT EXISTS idx_eventos_categoria_dia ON eventos (categoria, dia, id)',
+    'DROP INDEX IF EXISTS idx_eventos_categoria_fecha',
+]
+
+# Registro de cambios de eventos mantenido por triggers y vista materializada de
+# eventos por día y categoría que se refresca desde él (ver models/cambios.py).
+# Cambiar los inscritos no es un cambio del evento: se consultan en vivo y cambian
+# con cada asistencia. La vista arranca con los eventos existentes y cursor 0.
+CAMBIOS = [
+    '''
+    CREATE TABLE IF NOT EXISTS cambios_eventos (
+        secuencia INTEGER PRIMARY KEY AUTOINCREMENT,
+        evento_id INTEGER NOT NULL,
+        operacion TEXT NOT NULL,
+        dia_anterior INTEGER,       -- grupo antes del cambio (NULL en las altas)
+        categoria_anterior TEXT,
+        dia INTEGER,                -- grupo después del cambio (NULL en las bajas)
+        categoria TEXT
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_cambios_insert AFTER INSERT ON eventos BEGIN
+        INSERT INTO cambios_eventos (evento_id, operacion, dia, categoria)
+        VALUES (new.id, 'alta', new.dia, new.categoria);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_cambios_update
+    AFTER UPDATE OF nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id,
+                    latitud, longitud, hora ON eventos BEGIN
+        INSERT INTO cambios_eventos (evento_id, operacion, dia_anterior, categoria_anterior, dia, categoria)
+        VALUES (new.id, 'modificacion', old.dia, old.categoria, new.dia, new.categoria);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_cambios_delete AFTER DELETE ON eventos BEGIN
+        INSERT INTO cambios_eventos (evento_id, operacion, dia_anterior, categoria_anterior)
+        VALUES (old.id, 'baja', old.dia, old.categoria);
+    END
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS proximos_por_dia (
+        dia INTEGER NOT NULL,
+        categoria TEXT NOT NULL,
+        eventos INTEGER NOT NULL,
+        secuencia INTEGER NOT NULL,
+        PRIMARY KEY (dia, categoria)
+    ) WITHOUT ROWID
+    ''',
+    # Hasta qué secuencia aplicó la vista y hasta cuál se podó el registro
+    '''
+    CREATE TABLE IF NOT EXISTS cursores_cambios (
+        nombre TEXT PRIMARY KEY,
+        secuencia INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    "INSERT OR IGNORE INTO cursores_cambios (nombre, secuencia) VALUES ('proximos_por_dia', 0), ('podado', 0)",
+    '''
+    INSERT OR IGNORE INTO proximos_por_dia (dia, categoria, eventos, secuencia)
+    SELECT dia, categoria, count(*), 0 FROM eventos WHERE dia IS NOT NULL GROUP BY dia, categoria
+    ''',
+]
+
+# Contadores de favoritos y puntaje de tendencia por evento (ver models/contadores.py),
+# con la categoría copiada del evento para el top-N por categoría. Los triggers
+# la mantienen al cambiar o borrar el evento; los incrementos los escribe
+# BufferContadores. Los favoritos existentes se cuentan al migrar; la tendencia arranca en 0.
+CONTADORES = [
+    '''
+    CREATE TABLE IF NOT EXISTS contadores_eventos (
+        evento_id INTEGER PRIMARY KEY,
+        categoria TEXT NOT NULL,
+        favoritos INTEGER NOT NULL DEFAULT 0,
+        tendencia REAL NOT NULL DEFAULT 0
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_contadores_tendencia ON contadores_eventos (categoria, tendencia DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_contadores_favoritos ON contadores_eventos (categoria, favoritos DESC)',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_contadores_update AFTER UPDATE OF categoria ON eventos BEGIN
+        UPDATE contadores_eventos SET categoria = new.categoria WHERE evento_id = new.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_contadores_delete AFTER DELETE ON eventos BEGIN
+        DELETE FROM contadores_eventos WHERE evento_id = old.id;
+    END
+    ''',
+    # Momento (segundos Unix) al que están referidos los puntajes de tendencia guardados
+    'CREATE TABLE IF NOT EXISTS tendencia_base (base REAL NOT NULL)',
+    # strftime('%s') y no unixepoch(), que requiere SQLite 3.38
+    "INSERT INTO tendencia_base (base) SELECT CAST(strftime('%s', 'now') AS INTEGER) "
+    "WHERE NOT EXISTS (SELECT 1 FROM tendencia_base)",
+    '''
+    INSERT OR IGNORE INTO contadores_eventos (evento_id, categoria, favoritos, tendencia)
+    SELECT e.id, e.categoria, f.cantidad, 0
+    FROM (SELECT evento_id, count(*) AS cantidad FROM favoritos GROUP BY evento_id) f
+    JOIN eventos e ON e.id = f.evento_id
+    ''',
+]
+
+# Firmas MinHash y bloque (día y ubicación normalizada) de cada evento para detectar
+# duplicados (ver models/duplicados.py), al día con el registro de cambios desde su
+# cursor. Con eventos existentes el cursor queda en -1 hasta que se construya el
+# índice (Sistema.construir_indice_duplicados), para no firmar todo el catálogo al migrar.
+DUPLICADOS = [
+    '''
+    CREATE TABLE IF NOT EXISTS firmas_eventos (
+        evento_id INTEGER PRIMARY KEY,
+        dia INTEGER NOT NULL,
+        lugar TEXT NOT NULL,
+        nombre BLOB NOT NULL,
+        descripcion BLOB NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_firmas_bloque ON firmas_eventos (dia, lugar)',
+    '''
+    INSERT OR IGNORE INTO cursores_cambios (nombre, secuencia)
+    VALUES ('duplicados', CASE WHEN EXISTS (SELECT 1 FROM eventos) THEN -1 ELSE 0 END)
+    ''',
+]
+
+# GEOCODIFICAR completa las coordenadas con un UPDATE tras el alta (o la importación);
+# ese relleno no es una modificación del evento y no se registra en cambios_eventos.
+# Sí se registra cualquier otro cambio, incluidas coordenadas que ya estaban puestas.
+CAMBIOS_COORDENADAS = [
+    'DROP TRIGGER IF EXISTS eventos_cambios_update',
+    '''
+    CREATE TRIGGER IF NOT EXISTS eventos_cambios_update
+    AFTER UPDATE OF nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id,
+                    latitud, longitud, hora ON eventos
+    WHEN NOT (old.latitud IS NULL AND old.longitud IS NULL
+              AND new.nombre IS old.nombre AND new.ubicacion IS old.ubicacion AND new.fecha IS old.fecha
+              AND new.categoria IS old.categoria AND new.capacidad IS old.capacidad
+              AND new.descripcion IS old.descripcion AND new.organizador_id IS old.organizador_id
+              AND new.hora IS old.hora)
+    BEGIN
+        INSERT INTO cambios_eventos (evento_id, operacion, dia_anterior, categoria_anterior, dia, categoria)
+        VALUES (new.id, 'modificacion', old.dia, old.categoria, new.dia, new.categoria);
+    END
+    ''',
+]
+
+# Migraciones del esquema en orden. La versión aplicada se guarda en
+# PRAGMA user_version: la migración i lleva la base de datos a la versión i + 1.
+MIGRACIONES = [
+    INDICES,
+    BUSQUEDA,
+    CLAVE_NATURAL,
+    RECOMENDACIONES,
+    PREFERENCIAS,
+    NOTIFICACIONES,
+    ASISTENCIA,
+    GEO,
+    FECHAS,
+    CAMBIOS,
+    CONTADORES,
+    DUPLICADOS,
+    CAMBIOS_COORDENADAS,
+]
+
+# Máximo de nombres de organizador guardados en memoria
+TAMANO_CACHE_ORGANIZADORES = 1024
+
+# Resultados de exploración guardados en memoria y su tiempo de vida en segundos
+TAMANO_CACHE_EVENTOS = 256
+TTL_CACHE_EVENTOS = 60.0
+
+# Pesos BM25 de las columnas de eventos_fts (nombre, descripcion, ubicacion)
+PESOS_BUSQUEDA = (10.0, 1.0, 5.0)
+
+# Búsqueda por cercanía: primer círculo (fracción del radio pedido) y factor de crecimiento
+RADIO_INICIAL = 1 / 16
+CRECIMIENTO_RADIO = 4
+
+# Motores de almacenamiento: 'sqlite' (archivo en ruta_db) o 'memoria' (AlmacenamientoMemoria,
+# sin búsqueda de texto, geografía, recordatorios, recomendaciones por lotes ni importación)
+MOTORES = ('sqlite', 'memoria')
+
 
 class Sistema:
-    def __init__(self):
-        self.conn = sqlite3.connect('database/quehaypahacer.db')
-        self.usuario_actual: Optional[Usuario] = None
-        self._crear_tablas()
+    def __init__(self, ruta_db: str = 'database/quehaypahacer.db', tamano_pool: int = 4, motor: str = 'sqlite',
+                 metricas: Optional[Metricas] = None, claves: Optional[PoolClaves] = None):
+        if motor not in MOTORES:
+            raise ValueError(f"Motor desconocido: {motor!r} (disponibles: {', '.join(MOTORES)})")
+        self.motor = motor
+        # Latencias por consulta y por acción; activas por defecto, Metricas(activa=False) las apaga
+        self.metricas = metricas if metricas is not None else Metricas()
+        self.pool: Optional[PoolConexiones] = None
+        self.almacen: Almacenamiento
+        if motor == 'memoria':
+            self.almacen = AlmacenamientoMemoria()
+        else:
+            # La base de datos se abre (y se migra) con la primera consulta, no al construir Sistema
+            self.pool = PoolConexiones(ruta_db, tamano_pool, metricas=self.metricas, preparar=self._migrar)
+            self.almacen = AlmacenamientoSQLite(self.pool)
+        # Hashes de contraseñas (scrypt) en hilos propios, con control de admisión
+        self.claves = claves if claves is not None else PoolClaves()
+        # Sesión usada cuando un método no recibe una explícita (interfaz de consola)
+        self.sesion = Sesion()
+        self._cache_organizadores: OrderedDict = OrderedDict()
+        self._lock_cache = threading.Lock()
+        # Listados de explorar_eventos(_pagina); se invalidan al crear o importar eventos
+        self.cache_eventos = CacheConsultas(TAMANO_CACHE_EVENTOS, TTL_CACHE_EVENTOS)
+        # Se construye desde el almacenamiento la primera vez que se pide una recomendación
+        self.recomendador = MotorRecomendaciones()
+        # Recordatorios de favoritos; el hilo solo corre tras iniciar_recordatorios
+        self.recordatorios = PlanificadorRecordatorios(self.pool)
+        # Favoritos y tendencia por evento, escritos en diferido y por lotes (solo SQLite)
+        self.contadores = BufferContadores(self.pool) if self.pool is not None else None
+        # crear_evento avisa y no crea un evento con esta similitud a otro del mismo día y lugar
+        # salvo con forzar=True (ver models/duplicados.py); None desactiva la comprobación
+        self.umbral_duplicados: Optional[float] = duplicados.UMBRAL_CREACION
+
+    @property
+    def usuario_actual(self) -> Optional[Usuario]:
+        return self.sesion.usuario
 
-    def _crear_tablas(self):
-        cursor = self.conn.cursor()
+    @usuario_actual.setter
+    def usuario_actual(self, usuario: Optional[Usuario]):
+        self.sesion.usuario = usuario
+
+    def _usuario(self, sesion: Optional[Sesion]) -> Optional[Usuario]:
+        return (sesion or self.sesion).usuario
+
+    def _crear_tablas(self, conn: sqlite3.Connection):
+        cursor = conn.cursor()
         
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS usuarios (
@@ -21,7 +435,7 @@ class Sistema:
             nombre TEXT NOT NULL,
             email TEXT UNIQUE NOT NULL,
             password_hash TEXT NOT NULL,
-            categorias_preferidas TEXT
+            categorias_preferidas TEXT  -- sin uso desde la migración PREFERENCIAS
         )
         ''')
         
@@ -59,11 +473,62 @@ class Sistema:
         )
         ''')
         
-        self.conn.commit()
+        conn.commit()
+
+    def _migrar(self, conn: sqlite3.Connection):
+        """Crea las tablas y aplica las migraciones de MIGRACIONES posteriores a la versión de
+        la base de datos. Con el esquema al día solo lee PRAGMA user_version: el pool lo llama
+        al abrir su primera conexión, en cada arranque.
+
+        Cada migración se aplica en su propia transacción junto con su PRAGMA user_version
+        (sqlite3 no abre transacciones para el DDL por sí solo): si el proceso muere a
+        mitad de una, no queda nada de ella y se repite entera en el siguiente arranque."""
+        cursor = conn.cursor()
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if version >= len(MIGRACIONES):
+            return
+
+        # Las tablas base son anteriores a las migraciones: existen desde la versión 1
+        if version == 0:
+            self._crear_tablas(conn)
+        for numero, sentencias in enumerate(MIGRACIONES[version:], version + 1):
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                # Otro proceso pudo aplicarla mientras se esperaba el bloqueo
+                if cursor.execute('PRAGMA user_version').fetchone()[0] < numero:
+                    for sentencia in sentencias:
+                        cursor.execute(sentencia)
+                    cursor.execute(f'PRAGMA user_version = {numero}')
+                cursor.execute('COMMIT')
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def _sqlite(self) -> PoolConexiones:
+        """Pool de conexiones, para las funciones que solo tiene el motor SQLite"""
+        if self.pool is None:
+            raise NotImplementedError(f"Función no disponible con el motor '{self.motor}'")
+        return self.pool
+
+    def _conexion(self):
+        return self._sqlite().conexion()
+
+    def iniciar_recordatorios(self, salidas: Iterable[Salida]):
+        """Arranca el envío de recordatorios en segundo plano hacia las salidas dadas"""
+        self._sqlite()
+        self.recordatorios.bandeja.salidas = list(salidas)
+        self.recordatorios.iniciar()
+
+    def cerrar(self):
+        self.recordatorios.detener()
+        if self.contadores is not None:
+            self.contadores.cerrar()
+        self.claves.cerrar()
+        self.almacen.cerrar()
 
     # Métodos de usuario
-    def registrar_usuario(self, nombre: str, email: str, password: str) -> bool:
-        email = email.strip()  # Eliminar espacios en blanco o saltos de línea
+    @staticmethod
+    def _validar_registro(nombre: str, email: str, password: str) -> bool:
         if not nombre or not email or not password:
             print("Error: Todos los campos son obligatorios.")
             return False
@@ -71,60 +536,112 @@ class Sistema:
         if len(password) < 6:
             print("Error: La contraseña debe tener al menos 6 caracteres.")
             return False
-            
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT INTO usuarios (nombre, email, password_hash)
-                VALUES (?, ?, ?)
-            ''', (nombre, email, password_hash))
-            self.conn.commit()
-            print("Usuario registrado exitosamente!")
-            return True
-        except sqlite3.IntegrityError:
+        return True
+
+    def _crear_usuario(self, nombre: str, email: str, password_hash: str) -> bool:
+        if self.almacen.crear_usuario(nombre, email, password_hash) is None:
             print("Error: El email ya está registrado.")
             return False
+        print("Usuario registrado exitosamente!")
+        return True
 
-    def iniciar_sesion(self, email: str, password: str) -> bool:
+    @medido
+    def registrar_usuario(self, nombre: str, email: str, password: str) -> bool:
         email = email.strip()  # Eliminar espacios en blanco o saltos de línea
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT id, nombre, email, password_hash FROM usuarios WHERE email = ?', (email,))
-        usuario_data = cursor.fetchone()
-        
-        if not usuario_data:
+        if not self._validar_registro(nombre, email, password):
+            return False
+        return self._crear_usuario(nombre, email, self.claves.hashear(password))
+
+    @medido_async
+    async def registrar_usuario_async(self, nombre: str, email: str, password: str,
+                                      ejecutor=None) -> bool:
+        """registrar_usuario sin bloquear el bucle de eventos: el hash corre en el pool de
+        claves y la escritura en `ejecutor`. Lanza ClavesSaturadas si el pool está lleno."""
+        import asyncio  # solo lo usan la API y los benchmarks, que ya lo importaron
+        email = email.strip()
+        if not self._validar_registro(nombre, email, password):
+            return False
+        password_hash = await self.claves.hashear_async(password)
+        return await asyncio.get_running_loop().run_in_executor(
+            ejecutor, self._crear_usuario, nombre, email, password_hash)
+
+    def _abrir_sesion(self, usuario: Optional[Usuario], valida: bool, nuevo_hash: Optional[str],
+                      sesion: Optional[Sesion]) -> bool:
+        if not usuario:
             print("Error: Usuario no encontrado.")
             return False
-            
-        usuario_id, nombre, email_db, password_hash = usuario_data
-        
-        if hashlib.sha256(password.encode()).hexdigest() == password_hash:
-            cursor.execute('SELECT evento_id FROM favoritos WHERE usuario_id = ?', (usuario_id,))
-            favoritos = [row[0] for row in cursor.fetchall()]
-            
-            cursor.execute('SELECT categorias_preferidas FROM usuarios WHERE id = ?', (usuario_id,))
-            categorias_preferidas = cursor.fetchone()[0]
-            categorias = categorias_preferidas.split(',') if categorias_preferidas else []
-            
-            self.usuario_actual = Usuario(usuario_id, nombre, email_db, password_hash)
-            self.usuario_actual.favoritos = favoritos
-            self.usuario_actual.categorias_preferidas = categorias
-            
-            print(f"Bienvenido, {nombre}!")
-            return True
-        else:
+
+        if not valida:
             print("Error: Contraseña incorrecta.")
             return False
 
-    def cerrar_sesion(self):
-        self.usuario_actual = None
+        # Hash antiguo o con parámetros viejos: se reemplaza ahora que se conoce la contraseña
+        if nuevo_hash is not None:
+            self.almacen.actualizar_passwords([(usuario.id, usuario.password_hash, nuevo_hash)])
+            usuario.password_hash = nuevo_hash
+
+        usuario.favoritos, usuario.categorias_preferidas = self.almacen.datos_usuario(usuario.id)
+
+        (sesion or self.sesion).usuario = usuario
+        
+        print(f"Bienvenido, {usuario.nombre}!")
+        return True
+
+    @medido
+    def iniciar_sesion(self, email: str, password: str, sesion: Optional[Sesion] = None) -> bool:
+        email = email.strip()  # Eliminar espacios en blanco o saltos de línea
+        usuario = self.almacen.usuario_por_email(email)
+        # Sin usuario se verifica igual contra un hash ficticio: no se delata qué emails existen
+        valida = self.claves.verificar(password, usuario.password_hash if usuario else None)
+        nuevo_hash = None
+        if valida and necesita_rehash(usuario.password_hash):
+            nuevo_hash = self.claves.hashear(password)
+        return self._abrir_sesion(usuario, valida, nuevo_hash, sesion)
+
+    @medido_async
+    async def iniciar_sesion_async(self, email: str, password: str, sesion: Optional[Sesion] = None,
+                                   ejecutor=None) -> bool:
+        """iniciar_sesion sin bloquear el bucle de eventos: los hashes corren en el pool de
+        claves y las consultas en `ejecutor`. Lanza ClavesSaturadas si el pool está lleno."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        email = email.strip()
+        usuario = await loop.run_in_executor(ejecutor, self.almacen.usuario_por_email, email)
+        valida = await self.claves.verificar_async(password, usuario.password_hash if usuario else None)
+        nuevo_hash = None
+        if valida and necesita_rehash(usuario.password_hash):
+            nuevo_hash = await self.claves.hashear_async(password)
+        return await loop.run_in_executor(ejecutor, self._abrir_sesion, usuario, valida, nuevo_hash, sesion)
+
+    @medido
+    def migrar_claves(self, lote: int = 500) -> int:
+        """Envuelve en scrypt los hashes SHA-256 antiguos sin esperar a que cada usuario
+        inicie sesión (ver claves.envolver_legado); devuelve cuántos se migraron"""
+        migrados = 0
+        ultimo = 0
+        while True:
+            legados = self.almacen.hashes_legados(ultimo, lote)
+            if not legados:
+                return migrados
+            nuevos = self.claves.envolver_legados([password_hash for _, password_hash in legados])
+            migrados += self.almacen.actualizar_passwords(
+                (usuario_id, anterior, nuevo) for (usuario_id, anterior), nuevo in zip(legados, nuevos))
+            ultimo = legados[-1][0]
+
+    def cerrar_sesion(self, sesion: Optional[Sesion] = None):
+        (sesion or self.sesion).usuario = None
         print("Sesión cerrada exitosamente.")
 
     # Métodos de eventos
+    @medido
     def crear_evento(self, nombre: str, ubicacion: str, fecha: str, categoria: str, 
-                    capacidad: int, descripcion: str) -> bool:
-        if not self.usuario_actual:
+                    capacidad: int, descripcion: str, sesion: Optional[Sesion] = None,
+                    latitud: Optional[float] = None, longitud: Optional[float] = None,
+                    hora: Optional[str] = None, forzar: bool = False) -> bool:
+        """Sin latitud y longitud, las coordenadas se buscan por la ubicación en la tabla lugares.
+        Si ya hay un evento casi idéntico ese día en ese lugar avisa y no lo crea, salvo con forzar=True."""
+        usuario = self._usuario(sesion)
+        if not usuario:
             print("Error: Debes iniciar sesión para crear un evento.")
             return False
             
@@ -133,235 +650,618 @@ class Sistema:
             return False
             
         try:
-            datetime.strptime(fecha, '%Y-%m-%d')
+            leer_fecha(fecha)
         except ValueError:
             print("Error: Formato de fecha inválido. Use YYYY-MM-DD.")
             return False
+
+        hora = hora or None
+        if not hora_valida(hora):
+            print("Error: Formato de hora inválido. Use HH:MM.")
+            return False
+
+        if not coordenadas_validas(latitud, longitud):
+            print("Error: Coordenadas inválidas.")
+            return False
+
+        if not forzar:
+            parecido = self.evento_parecido(nombre, ubicacion, fecha, descripcion)
+            if parecido is not None:
+                print(f"Aviso: Ya existe un evento muy parecido ese día en ese lugar (ID: {parecido.evento_id}, "
+                      f"similitud {parecido.similitud:.0%}). Confirma para crearlo de todos modos.")
+                return False
             
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO eventos (nombre, ubicacion, fecha, categoria, capacidad, descripcion, organizador_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (nombre, ubicacion, fecha, categoria, capacidad, descripcion, self.usuario_actual.id))
-        self.conn.commit()
+        evento_id = self.almacen.crear_evento(nombre, ubicacion, fecha, categoria, capacidad, descripcion,
+                                              usuario.id, latitud, longitud, hora)
+        if self.pool is not None:
+            with self.pool.conexion() as conn:
+                if duplicados.construido(conn):
+                    duplicados.guardar(conn, evento_id, nombre, ubicacion, fecha, descripcion)
+        # Toda escritura de eventos debe invalidar después del commit
+        self.cache_eventos.invalidar(categoria, fecha, ubicacion)
+        self.recomendador.agregar_evento(evento_id, fecha, categoria)
+        self.recordatorios.evento_creado(evento_id, fecha)
         
         print("Evento creado exitosamente!")
         return True
 
-    def explorar_eventos(self, categoria: str = None, ubicacion: str = None, 
-                        fecha: str = None, orden: str = 'fecha') -> List[Evento]:
-        query = 'SELECT * FROM eventos WHERE 1=1'
-        params = []
-        
-        if categoria:
-            query += ' AND categoria = ?'
-            params.append(categoria)
-            
-        if ubicacion:
-            query += ' AND ubicacion LIKE ?'
-            params.append(f'%{ubicacion}%')
-            
-        if fecha:
-            query += ' AND fecha = ?'
-            params.append(fecha)
-            
-        if orden == 'fecha':
-            query += ' ORDER BY fecha'
-        elif orden == 'nombre':
-            query += ' ORDER BY nombre'
-        elif orden == 'categoria':
-            query += ' ORDER BY categoria'
-            
-        cursor = self.conn.cursor()
-        cursor.execute(query, params)
-        
-        eventos = []
-        for row in cursor.fetchall():
-            eventos.append(Evento(
-                id=row[0],
-                nombre=row[1],
-                ubicacion=row[2],
-                fecha=row[3],
-                categoria=row[4],
-                capacidad=row[5],
-                descripcion=row[6],
-                organizador_id=row[7]
-            ))
-            
-        return eventos
+    @medido
+    def evento_parecido(self, nombre: str, ubicacion: str, fecha: str,
+                        descripcion: Optional[str] = None) -> Optional[Parecido]:
+        """El evento del mismo día y lugar más parecido si supera umbral_duplicados (solo SQLite y
+        con el índice construido). Solo lee las firmas guardadas: no refresca el índice."""
+        if self.pool is None or self.umbral_duplicados is None:
+            return None
+        with self.pool.conexion() as conn:
+            if not duplicados.construido(conn):
+                return None
+            parecidos = duplicados.buscar(conn, nombre, ubicacion, fecha, descripcion, self.umbral_duplicados)
+        return parecidos[0] if parecidos else None
+
+    @medido
+    def importar_eventos(self, filas: Iterable[Dict], organizador_id: Optional[int] = None,
+                         lote: int = 5000, sesion: Optional[Sesion] = None) -> ResumenImportacion:
+        """Importación masiva; las filas sin organizador_id se asignan al usuario de la sesión"""
+        usuario = self._usuario(sesion)
+        if organizador_id is None and usuario:
+            organizador_id = usuario.id
+        with self._conexion() as conn:
+            primero = conn.execute('SELECT coalesce(max(id), 0) + 1 FROM eventos').fetchone()[0]
+            resumen = importar_eventos(conn, filas, organizador_id, lote)
+            if resumen.insertadas:
+                conn.execute(GEOCODIFICAR.format('?'), (primero,))
+                conn.commit()
+                for categoria, fecha in conn.execute('SELECT DISTINCT categoria, fecha FROM eventos WHERE id >= ?',
+                                                     (primero,)).fetchall():
+                    self.cache_eventos.invalidar(categoria, fecha)
+                # Los feeds no se rechazan fila por fila: los casi duplicados se reportan para fusionarlos
+                duplicados.refrescar(conn)
+                if duplicados.construido(conn):
+                    resumen.parecidas = duplicados.pares(conn, duplicados.UMBRAL, desde_id=primero)
+        if resumen.insertadas:
+            # Más barato reconstruir el índice que aplicarle miles de eventos uno a uno
+            self.recomendador.reiniciar()
+            self.recordatorios.recargar()
+        return resumen
+
+    @medido
+    def exportar_eventos(self, destino: IO[str], formato: str = 'jsonl', categoria: Categorias = None,
+                         ubicacion: str = None, fecha: str = None,
+                         desde: FechaFiltro = None, hasta: FechaFiltro = None) -> int:
+        filtros, params = self._filtros_eventos(categoria, ubicacion, fecha, desde, hasta)
+        with self._conexion() as conn:
+            return exportar_eventos(conn, destino, formato, filtros, params)
+
+    def _filtros_eventos(self, categoria: Categorias = None, ubicacion: str = None,
+                         fecha: str = None, desde: FechaFiltro = None, hasta: FechaFiltro = None,
+                         hora_desde: str = None, hora_hasta: str = None):
+        """Devuelve la cláusula WHERE y los parámetros de los filtros de exploración (ver filtros_eventos)"""
+        return filtros_sql(filtros_eventos(categoria, ubicacion, fecha, desde, hasta, hora_desde, hora_hasta))
+
+    @medido
+    def explorar_eventos(self, categoria: Categorias = None, ubicacion: str = None,
+                        fecha: str = None, orden: str = 'fecha',
+                        desde: FechaFiltro = None, hasta: FechaFiltro = None,
+                        hora_desde: str = None, hora_hasta: str = None) -> List[Evento]:
+        # Los Evento guardados se comparten entre llamadas: no deben modificarse
+        filtros = filtros_eventos(categoria, ubicacion, fecha, desde, hasta, hora_desde, hora_hasta)
+        orden = orden if orden in ORDENES_EVENTOS else None
+        return list(self.cache_eventos.obtener(
+            ('explorar', filtros, orden), lambda: tuple(self.almacen.iterar_eventos(filtros, orden)),
+            filtros.una_categoria, filtros.fecha, filtros.ubicacion))
+
+    def iterar_eventos(self, categoria: Categorias = None, ubicacion: str = None,
+                       fecha: str = None, orden: str = 'fecha',
+                       lote: int = 500, desde: FechaFiltro = None, hasta: FechaFiltro = None,
+                       hora_desde: str = None, hora_hasta: str = None) -> Iterator[Evento]:
+        """Recorre los eventos filtrados leyendo de a `lote` filas, sin cargar todo el resultado"""
+        filtros = filtros_eventos(categoria, ubicacion, fecha, desde, hasta, hora_desde, hora_hasta)
+        return self.almacen.iterar_eventos(filtros, orden if orden in ORDENES_EVENTOS else None, lote)
 
-    def agregar_favorito(self, evento_id: int) -> bool:
-        if not self.usuario_actual:
+    @medido
+    def explorar_eventos_pagina(self, categoria: Categorias = None, ubicacion: str = None,
+                                fecha: str = None, orden: str = 'fecha',
+                                despues: Optional[tuple] = None, antes: Optional[tuple] = None,
+                                tamano: int = 20, desde: FechaFiltro = None, hasta: FechaFiltro = None,
+                                hora_desde: str = None, hora_hasta: str = None) -> List[Evento]:
+        """Página de eventos por búsqueda de clave (keyset) en lugar de OFFSET.
+
+        `despues` y `antes` son claves obtenidas con `clave_pagina` sobre el último
+        o el primer evento de la página actual.
+        """
+        filtros = filtros_eventos(categoria, ubicacion, fecha, desde, hasta, hora_desde, hora_hasta)
+        orden = orden if orden in ORDENES_EVENTOS else 'fecha'
+        despues = None if despues is None else tuple(despues)
+        antes = None if antes is None else tuple(antes)
+        return list(self.cache_eventos.obtener(
+            ('pagina', filtros, orden, despues, antes, tamano),
+            lambda: tuple(self.almacen.listar_eventos(filtros, orden, despues, antes, tamano)),
+            filtros.una_categoria, filtros.fecha, filtros.ubicacion))
+
+    def _explorar_eventos_pagina(self, categoria: Categorias, ubicacion: str, fecha: str, orden: str,
+                                 despues: Optional[tuple], antes: Optional[tuple], tamano: int,
+                                 desde: FechaFiltro = None, hasta: FechaFiltro = None,
+                                 hora_desde: str = None, hora_hasta: str = None) -> List[Evento]:
+        """explorar_eventos_pagina sin pasar por la caché"""
+        filtros = filtros_eventos(categoria, ubicacion, fecha, desde, hasta, hora_desde, hora_hasta)
+        return self.almacen.listar_eventos(filtros, orden if orden in ORDENES_EVENTOS else 'fecha',
+                                           None if despues is None else tuple(despues),
+                                           None if antes is None else tuple(antes), tamano)
+
+    @staticmethod
+    def clave_pagina(evento: Evento, orden: str = 'fecha') -> tuple:
+        """Clave de ordenamiento de un evento, usada como cursor de explorar_eventos_pagina"""
+        columnas = ORDENES_EVENTOS.get(orden, ORDENES_EVENTOS['fecha'])
+        clave = (getattr(evento, columna) for columna in columnas)
+        return tuple(valor.isoformat() if isinstance(valor, date) else valor for valor in clave)
+
+    @medido
+    def eventos_cercanos(self, latitud: float, longitud: float, radio_km: float = 5.0,
+                         categoria: Categorias = None, ubicacion: str = None, fecha: str = None,
+                         limite: int = 20, desde: FechaFiltro = None, hasta: FechaFiltro = None) -> List[Evento]:
+        """Eventos a menos de radio_km del punto, del más cercano al más lejano"""
+        return self._eventos_cercanos(caja_radio(latitud, longitud, radio_km), latitud, longitud, radio_km,
+                                      categoria, ubicacion, fecha, limite, desde, hasta)
+
+    @medido
+    def eventos_en_area(self, lat_min: float, lon_min: float, lat_max: float, lon_max: float,
+                        categoria: Categorias = None, ubicacion: str = None, fecha: str = None,
+                        limite: int = 20, desde: FechaFiltro = None, hasta: FechaFiltro = None) -> List[Evento]:
+        """Eventos dentro del rectángulo (p. ej. el área visible de un mapa), del centro hacia afuera"""
+        latitud, longitud = (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+        # Radio que cubre el rectángulo entero: la distancia del centro a una esquina
+        escala = math.cos(math.radians(latitud)) ** 2
+        radio_km = math.sqrt((lat_max - latitud) ** 2 + (lon_max - longitud) ** 2 * escala) * KM_POR_GRADO
+        return self._eventos_cercanos((lat_min, lon_min, lat_max, lon_max), latitud, longitud, radio_km,
+                                      categoria, ubicacion, fecha, limite, desde, hasta)
+
+    def _eventos_cercanos(self, caja: tuple, latitud: float, longitud: float, radio_km: float,
+                          categoria: Categorias, ubicacion: str, fecha: str, limite: int,
+                          desde: FechaFiltro, hasta: FechaFiltro) -> List[Evento]:
+        # Búsqueda en círculos crecientes: si un círculo ya contiene `limite` eventos,
+        # cualquier otro está más lejos y no hace falta recorrer el resto de la caja.
+        # En zonas densas se leen pocos candidatos; en zonas vacías el último
+        # círculo es la caja completa.
+        radio = radio_km * RADIO_INICIAL
+        while True:
+            radio = min(radio, radio_km)
+            lat_min, lon_min, lat_max, lon_max = caja_radio(latitud, longitud, radio)
+            recorte = (max(lat_min, caja[0]), max(lon_min, caja[1]),
+                                 min(lat_max, caja[2]), min(lon_max, caja[3]))
+            eventos = self._eventos_en_caja(recorte, latitud, longitud, radio,
+                                            categoria, ubicacion, fecha, limite, desde, hasta)
+            if len(eventos) >= limite or radio >= radio_km:
+                return eventos
+            radio *= CRECIMIENTO_RADIO
+
+    def _eventos_en_caja(self, caja: tuple, latitud: float, longitud: float, radio_km: float,
+                         categoria: Categorias, ubicacion: str, fecha: str, limite: int,
+                         desde: FechaFiltro, hasta: FechaFiltro) -> List[Evento]:
+        # El R*Tree descarta lo que está fuera de la caja; la distancia exacta se
+        # compara y ordena con la aproximación equirectangular (en grados de
+        # latitud al cuadrado), suficiente a escala de ciudad y sin trigonometría en SQL.
+        # CROSS JOIN fija el R*Tree como tabla externa: con un filtro de categoría el
+        # planificador preferiría recorrer idx_eventos_categoria_dia entero.
+        # Las columnas del evento y el organizador se leen solo para los `limite` elegidos.
+        filtros, params = self._filtros_eventos(categoria, ubicacion, fecha, desde, hasta)
+        filtros += ' AND g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ?'
+        lat_min, lon_min, lat_max, lon_max = caja
+        params.extend((lat_min, lat_max, lon_min, lon_max))
+
+        escala = math.cos(math.radians(latitud)) ** 2
+        distancia = '((e.latitud - ?) * (e.latitud - ?) + (e.longitud - ?) * (e.longitud - ?) * ?)'
+        params_distancia = (latitud, latitud, longitud, longitud, escala)
+        params = [*params_distancia, *params, *params_distancia, (radio_km / KM_POR_GRADO) ** 2, limite]
+
+        with self._conexion() as conn:
+            cursor = self._cursor_eventos(conn)
+            cursor.execute(f'''
+                SELECT {COLUMNAS_EVENTOS}
+                FROM (
+                    SELECT e.id, {distancia} AS distancia
+                    FROM eventos_geo g
+                    CROSS JOIN eventos e ON e.id = g.id
+                    {filtros} AND {distancia} <= ?
+                    ORDER BY distancia, e.id
+                    LIMIT ?
+                ) c
+                JOIN eventos e ON e.id = c.id
+                LEFT JOIN usuarios u ON u.id = e.organizador_id
+                ORDER BY c.distancia, c.id
+            ''', params)
+            return cursor.fetchall()
+
+    @medido
+    def geocodificar_eventos(self) -> int:
+        """Completa las coordenadas de los eventos sin ellas desde la tabla lugares; devuelve cuántos quedaron ubicados"""
+        with self._conexion() as conn:
+            antes = conn.execute('SELECT count(*) FROM eventos_geo').fetchone()[0]
+            conn.execute(GEOCODIFICAR.format('?'), (0,))
+            conn.commit()
+            ubicados = conn.execute('SELECT count(*) FROM eventos_geo').fetchone()[0] - antes
+        if ubicados:
+            self.cache_eventos.limpiar()
+        return ubicados
+
+    def agregar_lugar(self, nombre: str, latitud: float, longitud: float) -> bool:
+        """Agrega o corrige un lugar conocido para la geocodificación"""
+        nombre = nombre.strip().lower()
+        if not nombre or not coordenadas_validas(latitud, longitud):
+            print("Error: Nombre o coordenadas inválidos.")
+            return False
+        with self._conexion() as conn:
+            conn.execute('INSERT OR REPLACE INTO lugares (nombre, latitud, longitud) VALUES (?, ?, ?)',
+                         (nombre, latitud, longitud))
+            conn.commit()
+        return True
+
+    @medido
+    def buscar_eventos(self, texto: str, limite: int = 20) -> List[Evento]:
+        """Búsqueda de texto libre en nombre, descripción y ubicación, ordenada por relevancia (BM25)"""
+        # Cada palabra se busca como prefijo; las comillas evitan que se interprete la sintaxis de FTS5
+        terminos = ['"{}"*'.format(palabra.replace('"', '""')) for palabra in texto.split()]
+        if not terminos:
+            return []
+
+        with self._conexion() as conn:
+            cursor = self._cursor_eventos(conn)
+            cursor.execute('''
+                SELECT {}
+                FROM (
+                    SELECT rowid, bm25(eventos_fts, ?, ?, ?) AS puntaje FROM eventos_fts
+                    WHERE eventos_fts MATCH ?
+                    ORDER BY puntaje
+                    LIMIT ?
+                ) f
+                JOIN eventos e ON e.id = f.rowid
+                LEFT JOIN usuarios u ON u.id = e.organizador_id
+                ORDER BY f.puntaje
+            '''.format(COLUMNAS_EVENTOS), (*PESOS_BUSQUEDA, ' '.join(terminos), limite))
+            return cursor.fetchall()
+
+    @medido
+    def agregar_favorito(self, evento_id: int, sesion: Optional[Sesion] = None) -> bool:
+        usuario = self._usuario(sesion)
+        if not usuario:
             print("Error: Debes iniciar sesión para agregar favoritos.")
             return False
             
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT id FROM eventos WHERE id = ?', (evento_id,))
-        if not cursor.fetchone():
+        agregado = self.almacen.agregar_favorito(usuario.id, evento_id)
+        if agregado is None:
             print("Error: El evento no existe.")
             return False
-            
-        try:
-            cursor.execute('''
-                INSERT INTO favoritos (usuario_id, evento_id)
-                VALUES (?, ?)
-            ''', (self.usuario_actual.id, evento_id))
-            self.conn.commit()
-            
-            if evento_id not in self.usuario_actual.favoritos:
-                self.usuario_actual.favoritos.append(evento_id)
-                
-            print("Evento agregado a favoritos!")
-            return True
-        except sqlite3.IntegrityError:
+        if not agregado:
             print("Este evento ya está en tus favoritos.")
             return False
 
-    def eliminar_favorito(self, evento_id: int) -> bool:
-        if not self.usuario_actual:
+        usuario.favoritos.add(evento_id)
+        self.recomendador.agregar_favorito(usuario.id, evento_id)
+        self.recordatorios.favorito_agregado(usuario.id, evento_id)
+        if self.contadores is not None:
+            self.contadores.sumar(evento_id, 1, PESO_FAVORITO)
+            
+        print("Evento agregado a favoritos!")
+        return True
+
+    @medido
+    def eliminar_favorito(self, evento_id: int, sesion: Optional[Sesion] = None) -> bool:
+        usuario = self._usuario(sesion)
+        if not usuario:
             print("Error: Debes iniciar sesión para eliminar favoritos.")
             return False
             
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            DELETE FROM favoritos 
-            WHERE usuario_id = ? AND evento_id = ?
-        ''', (self.usuario_actual.id, evento_id))
-        
-        if cursor.rowcount > 0:
-            self.conn.commit()
-            if evento_id in self.usuario_actual.favoritos:
-                self.usuario_actual.favoritos.remove(evento_id)
+        if self.almacen.eliminar_favorito(usuario.id, evento_id):
+            usuario.favoritos.discard(evento_id)
+            self.recomendador.eliminar_favorito(usuario.id, evento_id)
+            if self.contadores is not None:
+                self.contadores.sumar(evento_id, -1)
             print("Evento eliminado de favoritos.")
             return True
         else:
             print("Este evento no estaba en tus favoritos.")
             return False
 
-    def obtener_favoritos(self) -> List[Evento]:
-        if not self.usuario_actual:
+    @medido
+    def obtener_favoritos(self, sesion: Optional[Sesion] = None) -> List[Evento]:
+        usuario = self._usuario(sesion)
+        if not usuario:
             return []
             
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT e.* FROM eventos e
-            JOIN favoritos f ON e.id = f.evento_id
-            WHERE f.usuario_id = ?
-        ''', (self.usuario_actual.id,))
-        
-        return [
-            Evento(
-                id=row[0],
-                nombre=row[1],
-                ubicacion=row[2],
-                fecha=row[3],
-                categoria=row[4],
-                capacidad=row[5],
-                descripcion=row[6],
-                organizador_id=row[7]
-            ) for row in cursor.fetchall()
-        ]
+        return self.almacen.eventos_favoritos(usuario.id)
+
+    # Asistencia
+    @medido
+    def confirmar_asistencia(self, evento_id: int, sesion: Optional[Sesion] = None) -> Optional[str]:
+        """Inscribe al usuario en el evento; devuelve CONFIRMADO, EN_ESPERA o None si no se pudo"""
+        usuario = self._usuario(sesion)
+        if not usuario:
+            print("Error: Debes iniciar sesión para confirmar asistencia.")
+            return None
+
+        estado, nuevo = self.almacen.inscribir(usuario.id, evento_id)
+
+        if nuevo and self.contadores is not None:
+            self.contadores.sumar(evento_id, peso=PESO_ASISTENCIA)
+        if estado is None:
+            print("Error: El evento no existe.")
+        elif not nuevo:
+            print("Ya estás inscrito en este evento." if estado == asistencia.CONFIRMADO
+                  else "Ya estás en la lista de espera de este evento.")
+        elif estado == asistencia.CONFIRMADO:
+            print("¡Asistencia confirmada!")
+        else:
+            print("El evento está lleno: quedaste en la lista de espera.")
+        return estado
+
+    @medido
+    def cancelar_asistencia(self, evento_id: int, sesion: Optional[Sesion] = None) -> bool:
+        """Cancela la asistencia (o el lugar en la lista de espera); el cupo pasa al siguiente en espera"""
+        usuario = self._usuario(sesion)
+        if not usuario:
+            print("Error: Debes iniciar sesión para cancelar tu asistencia.")
+            return False
+
+        cancelado, promovido = self.almacen.cancelar_asistencia(usuario.id, evento_id)
+
+        if not cancelado:
+            print("No estabas inscrito en este evento.")
+            return False
+        print("Asistencia cancelada.")
+        if promovido is not None:
+            print("Tu cupo pasó al primero de la lista de espera.")
+        return True
+
+    @medido
+    def estado_asistencia(self, evento_id: int, sesion: Optional[Sesion] = None) -> Optional[str]:
+        usuario = self._usuario(sesion)
+        if not usuario:
+            return None
+        return self.almacen.estado_asistencia(usuario.id, evento_id)
+
+    @medido
+    def obtener_asistencia(self, evento_id: int) -> Optional[Asistencia]:
+        """Capacidad, inscritos y personas en espera del evento"""
+        return self.almacen.consultar_asistencia(evento_id)
+
+    # Cambios de eventos
+    def ultimo_cambio(self) -> int:
+        """Cursor inicial: se toma antes de leer el catálogo y luego se piden los cambios desde él"""
+        with self._conexion() as conn:
+            return cambios.ultimo(conn)
+
+    @medido
+    def cambios_eventos(self, despues: int = 0, limite: int = 100) -> Tuple[List[Cambio], int]:
+        """Altas, modificaciones y bajas de eventos posteriores a la secuencia `despues`, en
+        orden, y el cursor para pedir las siguientes. Lanza CursorVencido si ya se podaron."""
+        with self._conexion() as conn:
+            return cambios.leer(conn, despues, limite)
+
+    @medido
+    def refrescar_proximos(self) -> int:
+        """Aplica a la vista de próximos eventos los cambios pendientes; devuelve cuántos"""
+        with self._conexion() as conn:
+            return cambios.refrescar(conn, dia_epoca(date.today()))
+
+    @medido
+    def proximos_por_dia(self, despues: int = 0, dias: Optional[int] = None,
+                         categoria: Categorias = None) -> Tuple[List[GrupoProximos], int]:
+        """Eventos por día y categoría desde hoy (los próximos `dias` días, o todos), tras
+        refrescar la vista. Con `despues` solo los grupos que cambiaron después de esa
+        secuencia: un panel que sondea pasa el cursor devuelto por la llamada anterior."""
+        categorias = [categoria] if isinstance(categoria, str) else list(categoria or ())
+        hoy = dia_epoca(date.today())
+        with self._conexion() as conn:
+            cambios.refrescar(conn, hoy)
+            return cambios.proximos(conn, hoy, despues, dias, categorias)
+
+    def podar_cambios(self, hasta: int) -> int:
+        """Descarta los cambios hasta la secuencia `hasta` (nunca los que la vista o el índice de
+        duplicados no aplicaron)"""
+        with self._conexion() as conn:
+            return cambios.podar(conn, hasta)
+
+    # Contadores y tendencias
+    @medido
+    def eventos_destacados(self, categoria: str, n: int = 10, orden: str = 'tendencia') -> List[Destacado]:
+        """Los n próximos eventos de la categoría con mayor tendencia (favoritos e inscripciones
+        recientes, ver models/contadores.py) o, con orden='favoritos', los más guardados"""
+        if self.contadores is None:
+            raise NotImplementedError(f"Función no disponible con el motor '{self.motor}'")
+        # Lo que esté en el búfer entra al ranking antes de consultarlo
+        self.contadores.vaciar()
+        with self._conexion() as conn:
+            return contadores.destacados(conn, categoria, n, dia_epoca(date.today()), orden)
+
+    @medido
+    def recontar_contadores(self) -> int:
+        """Corrige los favoritos de contadores_eventos desde la tabla favoritos"""
+        self._sqlite()
+        self.contadores.vaciar()
+        with self._conexion() as conn:
+            return contadores.recontar(conn)
+
+    # Eventos duplicados
+    @medido
+    def construir_indice_duplicados(self) -> int:
+        """Firma todos los eventos existentes (una vez, p. ej. tras migrar una base con eventos);
+        desde entonces el índice se mantiene solo. Devuelve cuántos eventos indexó."""
+        with self._conexion() as conn:
+            return duplicados.construir(conn)
+
+    @medido
+    def refrescar_duplicados(self) -> int:
+        """Firma los eventos cambiados desde el último refresco (trabajo por lotes: tras una
+        importación grande tarda segundos con el bloqueo de escritura); devuelve cuántos cambios aplicó"""
+        with self._conexion() as conn:
+            return duplicados.refrescar(conn)
+
+    @medido
+    def reporte_duplicados(self, umbral: float = duplicados.UMBRAL, desde_id: int = 0, limite: Optional[int] = None,
+                           desde: FechaFiltro = None, hasta: FechaFiltro = None,
+                           actualizar: bool = True) -> List[ParDuplicado]:
+        """Pares de eventos del mismo día y lugar con similitud >= umbral, en orden de fecha y
+        lugar, hasta `limite` pares. Con actualizar=True (trabajo por lotes) antes construye o
+        refresca el índice; con actualizar=False solo lee las firmas guardadas y lanza
+        IndiceNoConstruido si el índice no está construido."""
+        with self._conexion() as conn:
+            if actualizar:
+                if not duplicados.construido(conn):
+                    duplicados.construir(conn)
+                duplicados.refrescar(conn)
+            elif not duplicados.construido(conn):
+                raise duplicados.IndiceNoConstruido("El índice de duplicados no está construido")
+            return duplicados.pares(conn, umbral, desde_id, limite,
+                                    dia_epoca(desde) if desde else None, dia_epoca(hasta) if hasta else None)
+
+    @medido
+    def fusionar_eventos(self, conservar_id: int, duplicado_id: int) -> bool:
+        """Pasa favoritos, inscritos, lista de espera y tendencia del duplicado al evento
+        conservado y borra el duplicado"""
+        if self.contadores is not None:
+            # Los incrementos en el búfer del duplicado se escribirían sobre un evento borrado
+            self.contadores.vaciar()
+        with self._conexion() as conn:
+            if not duplicados.fusionar(conn, conservar_id, duplicado_id):
+                print("Error: Los dos eventos deben existir y ser distintos.")
+                return False
+        self.cache_eventos.limpiar()
+        self.recomendador.reiniciar()
+        self.recordatorios.recargar()
+        print(f"Evento {duplicado_id} fusionado en el evento {conservar_id}.")
+        return True
 
     # Notificaciones y recomendaciones
-    def verificar_recordatorios(self):
-        if not self.usuario_actual:
+    def verificar_recordatorios(self, sesion: Optional[Sesion] = None):
+        """Muestra los recordatorios pendientes del usuario de la sesión (solo los suyos)"""
+        usuario = self._usuario(sesion)
+        if not usuario or self.pool is None:
             return
-            
-        hoy = datetime.now().strftime('%Y-%m-%d')
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT e.* FROM eventos e
-            JOIN favoritos f ON e.id = f.evento_id
-            WHERE f.usuario_id = ? 
-            AND e.fecha BETWEEN ? AND date(?, '+3 days')
-        ''', (self.usuario_actual.id, hoy, hoy))
-        
-        eventos_proximos = cursor.fetchall()
-        
-        if eventos_proximos:
+
+        salida = SalidaLista()
+        self.recordatorios.del_usuario(usuario.id, [salida])
+        if salida.notificaciones:
             print("\n=== RECORDATORIOS ===")
-            for evento in eventos_proximos:
-                print(f"¡No olvides el evento '{evento[1]}' el {evento[3]}!")
+            for notificacion in salida.notificaciones:
+                print(notificacion.texto())
             print("===================\n")
 
-    def obtener_recomendaciones(self) -> List[Evento]:
-        if not self.usuario_actual or not self.usuario_actual.categorias_preferidas:
+    @medido
+    def obtener_recomendaciones(self, sesion: Optional[Sesion] = None, k: int = 5) -> List[Evento]:
+        """Los k eventos próximos con mejor puntaje para el usuario (ver MotorRecomendaciones);
+        k no puede superar recomendaciones.TAMANO_TOP (ValueError)"""
+        usuario = self._usuario(sesion)
+        if not usuario:
             return []
-            
-        hoy = datetime.now().strftime('%Y-%m-%d')
-        categorias = self.usuario_actual.categorias_preferidas
-        
-        cursor = self.conn.cursor()
-        query = '''
-            SELECT e.* FROM eventos e
-            WHERE e.categoria IN ({})
-            AND e.fecha >= ?
-            AND e.id NOT IN (
-                SELECT evento_id FROM favoritos 
-                WHERE usuario_id = ?
-            )
-            ORDER BY e.fecha
-            LIMIT 5
-        '''.format(','.join(['?']*len(categorias)))
-        
-        params = categorias + [hoy, self.usuario_actual.id]
-        cursor.execute(query, params)
-        
-        return [
-            Evento(
-                id=row[0],
-                nombre=row[1],
-                ubicacion=row[2],
-                fecha=row[3],
-                categoria=row[4],
-                capacidad=row[5],
-                descripcion=row[6],
-                organizador_id=row[7]
-            ) for row in cursor.fetchall()
-        ]
-
-    def agregar_categoria_preferida(self, categoria: str):
-        if not self.usuario_actual:
+
+        if not self.recomendador.construido:
+            self.almacen.construir_recomendaciones(self.recomendador)
+        return self.almacen.eventos_por_ids(self.recomendador.recomendar(usuario.id, k))
+
+    @medido
+    def calcular_recomendaciones(self, k: int = 5, usuarios_por_bloque: int = 500) -> int:
+        """Guarda en la tabla recomendaciones el top-k de todos los usuarios (requiere NumPy)"""
+        with self._conexion() as conn:
+            return calcular_recomendaciones(conn, k, usuarios_por_bloque)
+
+    @medido
+    def barrer_usuarios(self, tarea: str, directorio: str, procesos: Optional[int] = None,
+                        bloque: int = BLOQUE_USUARIOS, **parametros) -> ResumenBarrido:
+        """Ejecuta una tarea de lotes.TAREAS sobre todos los usuarios, repartida por tramos de
+        id entre procesos con conexiones de solo lectura. Reanuda un barrido interrumpido
+        en el mismo directorio; la salida combinada queda en directorio/salida.jsonl."""
+        # Los procesos no migran: el esquema tiene que estar al día antes de abrirla solo para leer
+        with self._conexion():
+            pass
+        parametros.setdefault('hoy', date.today().isoformat())
+        return lotes.barrer(self.pool.ruta_db, tarea, directorio, parametros, procesos, bloque)
+
+    @medido
+    def enviar_recordatorios_lote(self, directorio: str, procesos: Optional[int] = None,
+                                  bloque: int = BLOQUE_USUARIOS) -> int:
+        """Barrido completo de recordatorios en varios procesos; las notificaciones se registran
+        y entregan desde aquí por la bandeja del planificador (las ya registradas se descartan,
+        así repetir la entrega tras un corte no duplica envíos). Devuelve cuántas eran nuevas."""
+        resumen = self.barrer_usuarios('recordatorios', directorio, procesos, bloque, dias=self.recordatorios.dias)
+        bandeja = self.recordatorios.bandeja
+        enviadas = bandeja.enviadas
+        with self._conexion() as conn:
+            for registro in lotes.leer_salida(resumen.salida):
+                bandeja.agregar(conn, Notificacion(*registro))
+            bandeja.vaciar(conn)
+        return bandeja.enviadas - enviadas
+
+    @medido
+    def agregar_categoria_preferida(self, categoria: str, sesion: Optional[Sesion] = None):
+        usuario = self._usuario(sesion)
+        if not usuario:
             print("Error: Debes iniciar sesión para agregar categorías preferidas.")
             return False
 
-        if categoria not in self.usuario_actual.categorias_preferidas:
-            self.usuario_actual.categorias_preferidas.append(categoria)
-            categorias_str = ','.join(self.usuario_actual.categorias_preferidas)
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                UPDATE usuarios 
-                SET categorias_preferidas = ?
-                WHERE id = ?
-            ''', (categorias_str, self.usuario_actual.id))
-            self.conn.commit()
+        if self.almacen.agregar_categoria(usuario.id, categoria):
+            usuario.categorias_preferidas.add(categoria)
+            self.recomendador.cambiar_preferencias(usuario.id, usuario.categorias_preferidas)
             print(f"Categoría '{categoria}' agregada a tus preferencias.")
             return True
         else:
             print(f"La categoría '{categoria}' ya está en tus preferencias.")
             return False
 
+    @medido
+    def eliminar_categoria_preferida(self, categoria: str, sesion: Optional[Sesion] = None):
+        usuario = self._usuario(sesion)
+        if not usuario:
+            print("Error: Debes iniciar sesión para eliminar categorías preferidas.")
+            return False
+
+        if self.almacen.eliminar_categoria(usuario.id, categoria):
+            usuario.categorias_preferidas.discard(categoria)
+            self.recomendador.cambiar_preferencias(usuario.id, usuario.categorias_preferidas)
+            return True
+        return False
+
+    @medido
+    def usuarios_por_categoria(self, categoria: str) -> List[int]:
+        """Ids de los usuarios que prefieren la categoría"""
+        return self.almacen.usuarios_por_categoria(categoria)
+
     # Métodos auxiliares
+    @medido
     def obtener_evento_por_id(self, evento_id: int) -> Optional[Evento]:
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM eventos WHERE id = ?', (evento_id,))
-        row = cursor.fetchone()
-        
-        if row:
-            return Evento(
-                id=row[0],
-                nombre=row[1],
-                ubicacion=row[2],
-                fecha=row[3],
-                categoria=row[4],
-                capacidad=row[5],
-                descripcion=row[6],
-                organizador_id=row[7]
-            )
-        return None
+        return self.almacen.obtener_evento(evento_id)
+
+    def _cursor_eventos(self, conn: sqlite3.Connection) -> sqlite3.Cursor:
+        return AlmacenamientoSQLite._cursor_eventos(conn)
+
+    def estadisticas_consultas(self) -> Dict[str, Any]:
+        """Latencias, filas y errores por consulta y por acción, y las últimas consultas lentas"""
+        return self.metricas.instantanea()
+
+    def estadisticas_cache(self) -> Dict[str, int]:
+        """Aciertos, fallos, expulsiones, expiraciones e invalidaciones de la caché de exploración"""
+        return self.cache_eventos.estadisticas()
 
     def obtener_organizador_nombre(self, organizador_id: int) -> str:
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT nombre FROM usuarios WHERE id = ?', (organizador_id,))
-        row = cursor.fetchone()
-        return row[0] if row else "Desconocido"
\ No newline at end of file
+        # Caché LRU: el nombre usado más recientemente queda al final
+        with self._lock_cache:
+            nombre = self._cache_organizadores.get(organizador_id)
+            if nombre is not None:
+                self._cache_organizadores.move_to_end(organizador_id)
+                return nombre
+
+        nombre = self.almacen.nombre_usuario(organizador_id)
+        if nombre is None:
+            return "Desconocido"
+
+        with self._lock_cache:
+            self._cache_organizadores[organizador_id] = nombre
+            if len(self._cache_organizadores) > TAMANO_CACHE_ORGANIZADORES:
+                self._cache_organizadores.popitem(last=False)
+        return nombre
+
+    def invalidar_organizador(self, organizador_id: Optional[int] = None):
+        """Descarta el nombre en caché de un organizador, o de todos si no se indica"""
+        with self._lock_cache:
+            if organizador_id is None:
+                self._cache_organizadores.clear()
+            else:
+                self._cache_organizadores.pop(organizador_id, None)
\ No newline at end of file
@@ -1,26 +1,31 @@
-import hashlib
-from typing import List
+from typing import Set
+from . import claves
 
 class Usuario:
+    __slots__ = ('id', 'nombre', 'email', 'password_hash', 'favoritos', 'categorias_preferidas')
+
     def __init__(self, id: int, nombre: str, email: str, password_hash: str):
         self.id = id
         self.nombre = nombre
         self.email = email
         self.password_hash = password_hash
-        self.favoritos: List[int] = []
-        self.categorias_preferidas: List[str] = []
+        self.favoritos: Set[int] = set()
+        self.categorias_preferidas: Set[str] = set()
+
+    @classmethod
+    def desde_fila(cls, cursor, row) -> 'Usuario':
+        """row_factory de sqlite3 para filas (id, nombre, email, password_hash)"""
+        return cls(*row)
 
     def verificar_password(self, password: str) -> bool:
-        return hashlib.sha256(password.encode()).hexdigest() == self.password_hash
+        """Calcula el hash en el hilo actual; Sistema verifica en su PoolClaves"""
+        return claves.verificar(password, self.password_hash)
 
     def agregar_favorito(self, evento_id: int):
-        if evento_id not in self.favoritos:
-            self.favoritos.append(evento_id)
+        self.favoritos.add(evento_id)
 
     def eliminar_favorito(self, evento_id: int):
-        if evento_id in self.favoritos:
-            self.favoritos.remove(evento_id)
+        self.favoritos.discard(evento_id)
 
     def agregar_categoria_preferida(self, categoria: str):
-        if categoria not in self.categorias_preferidas:
-            self.categorias_preferidas.append(categoria)
\ No newline at end of file
+        self.categorias_preferidas.add(categoria)
\ No newline at end of file